@@ -7,16 +7,29 @@ app = Flask(__name__)
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Listing cache, rebuilt only when the upload folder's mtime changes (add/remove/rename)
+_file_info_cache = {'mtime_ns': None, 'info': ([], {}, {})}
+
 def get_file_info():
-    files = os.listdir(UPLOAD_FOLDER)
+    mtime_ns = os.stat(UPLOAD_FOLDER).st_mtime_ns
+    if _file_info_cache['mtime_ns'] == mtime_ns:
+        return _file_info_cache['info']
+    files = []
     file_sizes = {}
     file_times = {}
-    for f in files:
-        path = os.path.join(UPLOAD_FOLDER, f)
-        file_sizes[f] = round(os.path.getsize(path)/1024, 2)  # Size in KB
-        file_times[f] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(os.path.getmtime(path)))
+    with os.scandir(UPLOAD_FOLDER) as entries:
+        for entry in entries:
+            stat = entry.stat()
+            files.append(entry.name)
+            file_sizes[entry.name] = round(stat.st_size/1024, 2)  # Size in KB
+            file_times[entry.name] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stat.st_mtime))
+    _file_info_cache['mtime_ns'] = mtime_ns
+    _file_info_cache['info'] = (files, file_sizes, file_times)
     return files, file_sizes, file_times
 
+def invalidate_file_info():
+    _file_info_cache['mtime_ns'] = None
+
 @app.route('/')
 def index():
     files, file_sizes, file_times = get_file_info()
@@ -28,6 +41,7 @@ def upload():
     if uploaded_file.filename != '':
         path = os.path.join(UPLOAD_FOLDER, uploaded_file.filename)
         uploaded_file.save(path)
+        invalidate_file_info()  # overwriting an existing file leaves the folder mtime unchanged
     files, file_sizes, file_times = get_file_info()
     return render_template('upload_success.html', files=files, file_sizes=file_sizes, file_times=file_times)
 
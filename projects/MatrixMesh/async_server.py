@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""
+Asyncio Chat Server with Matrix Operations
+Single-threaded event loop engine for MatrixMesh that scales to thousands of clients
+"""
+
+import argparse
+import asyncio
+import base64
+import functools
+import logging
+import os
+import socket
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+from matrix_codec import (MAX_LINE_BYTES, MAX_PAYLOAD_BYTES, UNJOINED_PAYLOAD_BYTES, FrameError,
+                          encode_message, read_message_async)
+from job_manager import JobManager
+from result_cache import ResultCache
+from result_delivery import ResultStore, chunk_message, summarize_result
+from gateway import SESSION_CLOSE, SESSION_KEY, GatewaySession, fan_out_message, tag_message
+from distributed import WORKER_HOSTS_ENV, WORKER_TOKEN_ENV, TileScheduler, WorkerAuth
+from matrix_store import MatrixStore
+from matrix_operations import MatrixProcessor
+from metrics import DEFAULT_SUMMARY_INTERVAL, ServerMetrics, start_metrics_server, start_summary_reporter
+
+# Per-client outbound limits before the slow-consumer policy applies
+OUTBOUND_MAX_MESSAGES = 1000
+OUTBOUND_MAX_BYTES = 16 * 1024 * 1024
+# Messages a 'drop' client may lose before it is disconnected anyway
+SLOW_CLIENT_MAX_DROPS = 100
+# A gateway's outbound limits grow with its sessions, up to this many times a client's
+GATEWAY_MAX_BUDGET_FACTOR = 32
+
+
+class ClientConnection:
+    """State of one connected client"""
+
+    def __init__(self, writer, address):
+        self.writer = writer
+        self.address = address
+        self.username = None
+        self.binary = False
+        self.queue = asyncio.Queue()  # bounded by send_to_client, since gateways get a larger budget
+        self.queued_bytes = 0
+        self.dropped = 0
+        self.closing = False
+        self.writer_task = None
+        self.drained = asyncio.Event()  # set whenever the writer has flushed a message
+        self.tasks = set()  # background tasks such as result downloads
+        self.sessions = {}  # {session_id: GatewaySession} when this connection is a gateway
+        self.worker = None  # RemoteWorker when this connection is a compute worker
+
+
+class AsyncChatServer:
+    def __init__(self, host='localhost', port=12345, slow_client_policy='drop',
+                 max_queued_messages=OUTBOUND_MAX_MESSAGES, max_queued_bytes=OUTBOUND_MAX_BYTES,
+                 cache_spill_dir=None, store_dir=None, metrics_port=None,
+                 summary_interval=DEFAULT_SUMMARY_INTERVAL, worker_auth=None):
+        if slow_client_policy not in ('drop', 'disconnect'):
+            raise ValueError(f"Unknown slow client policy: {slow_client_policy}")
+
+        self.host = host
+        self.port = port
+        self.slow_client_policy = slow_client_policy
+        self.max_queued_messages = max_queued_messages
+        self.max_queued_bytes = max_queued_bytes
+
+        self.connections = set()  # every open connection
+        self.clients = {}  # {username: ClientConnection or GatewaySession} for joined clients
+        self.stats = {'dropped_messages': 0, 'slow_disconnects': 0}
+
+        self.tile_scheduler = TileScheduler()
+        self.worker_auth = worker_auth or WorkerAuth.from_env()
+        self.job_manager = JobManager(cache=ResultCache(spill_dir=cache_spill_dir),
+                                      tile_scheduler=self.tile_scheduler)
+        self.job_manager.on_progress = self.on_job_progress
+        self.job_manager.on_complete = self.on_job_complete
+        self.job_manager.on_error = self.on_job_error
+        self.result_store = ResultStore()
+        self.matrix_store = MatrixStore(store_dir)  # .npy matrices kept on disk
+
+        # Scrapes run on the metrics server's thread; the gauges only take len() or copies
+        self.metrics = ServerMetrics(MatrixProcessor().supported_operations)
+        self.metrics.describe('matrixmesh_slow_client_events_total', 'counter',
+                              "Messages dropped for, and disconnects of, clients that could not keep up")
+        self.metrics.gauge_function('matrixmesh_active_clients', lambda: len(self.clients))
+        self.metrics.gauge_function('matrixmesh_connections', lambda: len(self.connections))
+        self.metrics.gauge_function('matrixmesh_jobs', self.job_counts, label='status')
+        self.metrics.gauge_function('matrixmesh_slow_client_events_total', lambda: dict(self.stats), label='kind')
+        self.metrics_port = metrics_port
+        self.summary_interval = summary_interval
+
+        self.loop = None
+        self.server = None
+
+    async def start_server(self):
+        """Start listening and serve until cancelled"""
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(
+            self.handle_client, self.host, self.port,
+            limit=MAX_LINE_BYTES, backlog=1024
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+        print(f"🚀 Async chat server started on {self.host}:{self.port}")
+        if self.metrics_port is not None:
+            start_metrics_server(self.metrics, self.host, self.metrics_port)
+        if self.summary_interval:
+            start_summary_reporter(self.metrics, self.summary_interval)
+        print("Waiting for clients to connect...")
+
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        """Read messages from one client until it disconnects"""
+        address = writer.get_extra_info('peername')
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        client = ClientConnection(writer, address)
+        client.writer_task = asyncio.create_task(self._write_loop(client))
+        self.connections.add(client)
+
+        try:
+            while not client.closing:
+                # Large binary payloads only from clients that joined or registered as workers
+                max_payload = MAX_PAYLOAD_BYTES if self.is_trusted(client) else UNJOINED_PAYLOAD_BYTES
+                message = await read_message_async(reader, self.metrics.record_received, max_payload)
+                if message is None:
+                    break
+
+                session_id = message.pop(SESSION_KEY, None)
+                if session_id is None:
+                    self.dispatch(client, message)
+                    continue
+
+                # A gateway speaking for one of its users
+                session = client.sessions.get(session_id)
+                if message.get('type') == SESSION_CLOSE:
+                    if session:
+                        self.disconnect_client(session)
+                    continue
+                if session is None:
+                    session = client.sessions[session_id] = GatewaySession(client, session_id, address)
+                self.dispatch(session, message)
+        except FrameError as e:
+            print(f"❌ Bad frame from {address}: {e}")
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            # Cancelled when the server shuts down
+            pass
+        except Exception as e:
+            print(f"❌ Error handling client {address}: {e}")
+        finally:
+            self.disconnect_client(client)
+
+    @staticmethod
+    def is_trusted(client):
+        """Whether a connection has joined, speaks for a joined gateway session, or is a worker"""
+        if client.username is not None or client.worker is not None:
+            return True
+        return any(session.username is not None for session in client.sessions.values())
+
+    def dispatch(self, client, message):
+        """Route one decoded message"""
+        message_type = message.get('type')
+        if message_type == 'join':
+            self.handle_user_join(client, message.get('username'), bool(message.get('binary')))
+            return
+
+        if message_type == 'worker_register':
+            self.handle_worker_register(client, message)
+            return
+        if message_type in ('tile_result', 'tile_error'):
+            if getattr(client, 'worker', None):
+                # Checksumming and placing a tile is CPU work; keep it off the loop
+                self.loop.run_in_executor(None, self.tile_scheduler.handle_result, client.worker, message)
+            return
+
+        if client.username is None:
+            return
+
+        if message_type == 'chat':
+            self.broadcast_message({
+                'type': 'chat',
+                'username': client.username,
+                'message': message.get('message', ''),
+                'timestamp': self._timestamp()
+            })
+
+        elif message_type == 'matrix_file':
+            matrix_data = message.get('matrix_data')
+            if isinstance(matrix_data, np.ndarray):
+                # Raw file bytes (e.g. a .npy upload) sent as a uint8 binary frame
+                matrix_data = matrix_data.tobytes()
+            self._start_task(client, self.submit_job(client, message.get('operation', 'display'),
+                                                     matrix_data=matrix_data, kind='file'))
+
+        elif message_type == 'matrix_operation':
+            if message.get('matrix_ids'):
+                # Matrices stored on disk by an earlier upload or operation
+                self.submit_stored_job(client, message.get('operation'), message['matrix_ids'])
+            else:
+                self._start_task(client, self.submit_job(client, message.get('operation'),
+                                                         matrices=message.get('matrices', []),
+                                                         matrix_data=message.get('matrix_data')))
+
+        elif message_type == 'upload_chunk':
+            self.handle_upload_chunk(client, message)
+
+        elif message_type == 'upload_end':
+            self.handle_upload_end(client, message)
+
+        elif message_type == 'download_matrix':
+            self._start_task(client, self.stream_matrix(client, message.get('matrix_id')))
+
+        elif message_type == 'cancel_job':
+            job_id = message.get('job_id')
+            if not self.job_manager.cancel(job_id, client):
+                self.send_to_client(client, {'type': 'error', 'message': f'No active job {job_id} to cancel'})
+
+        elif message_type == 'fetch_result':
+            self._start_task(client, self.stream_result(client, message))
+
+        elif message_type == 'list_jobs':
+            self.send_to_client(client, {
+                'type': 'job_list',
+                'jobs': self.job_manager.list_jobs(owner=client),
+                'cache': self.job_manager.cache.get_stats(),
+                'workers': self.tile_scheduler.get_stats(),
+                'stored': self.matrix_store.list()
+            })
+
+    def handle_user_join(self, client, username, binary=False):
+        """Handle user joining the chat"""
+        if not username:
+            self.send_to_client(client, {'type': 'error', 'message': 'Username is required'})
+            return
+        if client.username is not None:
+            self.send_to_client(client, {'type': 'error', 'message': 'Already joined'})
+            return
+        if username in self.clients:
+            self.send_to_client(client, {'type': 'error', 'message': 'Username already taken'})
+            return
+
+        client.username = username
+        client.binary = binary
+        self.clients[username] = client
+
+        self.send_to_client(client, {
+            'type': 'system',
+            'message': f'Welcome to the chat, {username}! 🎉',
+            'timestamp': self._timestamp()
+        })
+        self.send_to_client(client, {'type': 'user_list', 'users': list(self.clients)})
+        self.broadcast_message({
+            'type': 'system',
+            'message': f"👋 {username} joined the chat",
+            'timestamp': self._timestamp()
+        }, exclude_client=client)
+
+    def handle_worker_register(self, client, message):
+        """Turn a connection into a compute worker that receives matrix tiles"""
+        if isinstance(client, GatewaySession) or client.worker or client.username:
+            return
+        if not self.worker_auth.allows(message.get('token'), client.address[0] if client.address else None):
+            print(f"⛔ Refused worker registration from {client.address}")
+            self.send_to_client(client, {'type': 'error', 'message': 'Worker registration refused'})
+            return
+
+        def send(task):
+            # Called from scheduler threads; encode there, queue on the loop
+            self._call_in_loop(self.send_to_client, client, None, encode_message(task, binary=True))
+
+        try:
+            capacity = int(message.get('capacity', 1))
+        except (TypeError, ValueError):
+            capacity = 1
+        client.worker = self.tile_scheduler.register(send, capacity, message.get('name'))
+        self.send_to_client(client, {'type': 'worker_registered', 'worker_id': client.worker.worker_id})
+
+    async def submit_job(self, client, operation, matrices=None, matrix_data=None, kind='operation'):
+        """Queue a matrix operation on the job manager"""
+        try:
+            # Hashing the input for the cache key (and small inline jobs) costs time in
+            # proportion to the upload; keep it off the loop so other clients are not stalled
+            await self.loop.run_in_executor(None, functools.partial(
+                self.job_manager.submit, client, client.username, operation,
+                matrices=matrices, matrix_data=matrix_data, kind=kind))
+        except Exception as e:
+            self.send_to_client(client, {'type': 'error', 'message': f'Operation rejected: {str(e)}'})
+
+    def submit_stored_job(self, client, operation, matrix_ids):
+        """Queue an operation on stored matrices; large results are written back to the store"""
+        try:
+            paths = self.matrix_store.paths(list(matrix_ids))
+            matrix_id, out_path = self.matrix_store.reserve()
+            self.job_manager.submit_stored(client, client.username, operation, paths, out_path, matrix_id)
+        except Exception as e:
+            self.send_to_client(client, {'type': 'error', 'message': f'Operation rejected: {str(e)}'})
+
+    def handle_upload_chunk(self, client, message):
+        """Append one chunk of a streamed .npy upload to the matrix store"""
+        data = message.get('data')
+        if isinstance(data, str):
+            data = base64.b64decode(data)
+        elif not isinstance(data, np.ndarray):
+            self.send_to_client(client, {'type': 'error', 'message': 'Upload chunk has no data'})
+            return
+
+        try:
+            # Appends go to the page cache; ordering matters more than the brief block
+            self.matrix_store.write_chunk(client, str(message.get('upload_id')), data, message.get('filename'))
+        except (ValueError, OSError) as e:
+            self.send_to_client(client, {'type': 'error', 'message': f'Upload failed: {e}'})
+
+    def handle_upload_end(self, client, message):
+        """Finish an upload and announce the stored matrix to the room"""
+        try:
+            info = self.matrix_store.finish_upload(client, str(message.get('upload_id')))
+        except ValueError as e:
+            self.send_to_client(client, {'type': 'error', 'message': f'Upload failed: {e}'})
+            return
+
+        announcement = {'type': 'matrix_stored', 'username': client.username, 'timestamp': self._timestamp()}
+        announcement.update(info)
+        self.broadcast_message(announcement)
+        print(f"💾 {client.username} stored {info['filename']} {tuple(info['shape'])} as {info['matrix_id']}")
+
+    async def stream_matrix(self, client, matrix_id):
+        """Stream a stored matrix to the client as its .npy file"""
+        try:
+            total = self.matrix_store.chunk_count(matrix_id)
+        except ValueError as e:
+            self.send_to_client(client, {'type': 'error', 'message': str(e)})
+            return
+
+        async def read_chunk(seq):
+            return await self.loop.run_in_executor(None, self.matrix_store.read_chunk, matrix_id, seq)
+
+        await self._send_chunks(client, matrix_id, total, read_chunk, 'npy', 'none')
+
+    async def stream_result(self, client, message):
+        """Stream a stored full result, waiting for the client to keep up between chunks"""
+        result_id = message.get('result_id')
+        fmt = message.get('format') or ('binary' if client.binary else 'json')
+        compression = message.get('compression', 'none')
+
+        try:
+            # Serializing and compressing a large result is CPU work; keep it off the loop
+            chunks = await self.loop.run_in_executor(None, self.result_store.get_chunks,
+                                                     result_id, fmt, compression)
+        except ValueError as e:
+            self.send_to_client(client, {'type': 'error', 'message': f'Cannot fetch result: {e}'})
+            return
+        if chunks is None:
+            self.send_to_client(client, {'type': 'error', 'message': f'Result {result_id} is no longer available'})
+            return
+
+        async def get_chunk(seq):
+            return chunks[seq]
+
+        await self._send_chunks(client, result_id, len(chunks), get_chunk, fmt, compression)
+
+    async def _send_chunks(self, client, result_id, total, get_chunk, fmt, compression):
+        """Send result_chunk messages, waiting for the client to keep up between chunks"""
+        # A gateway user's chunks queue on the gateway's connection
+        conn = client.conn if isinstance(client, GatewaySession) else client
+        for seq in range(total):
+            # Stay within half the outbound budget so chat messages still fit
+            scale = self._budget_scale(conn)
+            while not client.closing and (conn.queued_bytes > self.max_queued_bytes * scale // 2 or
+                                          conn.queue.qsize() > self.max_queued_messages * scale // 2):
+                conn.drained.clear()
+                await conn.drained.wait()
+            if client.closing:
+                return
+            chunk = await get_chunk(seq)
+            self.send_to_client(client, chunk_message(result_id, seq, total, chunk,
+                                                      fmt, compression, client.binary))
+
+    # ---------------- OUTBOUND ---------------- #
+
+    def send_to_client(self, client, message, encoded=None, size=None):
+        """Queue a message for one client, applying the slow-consumer policy"""
+        if client.closing:
+            return False
+        if isinstance(client, GatewaySession):
+            # Goes out on the gateway's connection, tagged with the user's session
+            return self.send_to_client(client.conn, None,
+                                       encode_message(tag_message(message, client.session_id), binary=client.binary))
+        if encoded is None:
+            encoded = encode_message(message, binary=client.binary)
+        if size is None:
+            size = sum(memoryview(buffer).nbytes for buffer in encoded)
+
+        # A single oversized message is allowed through an empty queue. Workers are
+        # exempt: the scheduler already bounds the tiles each one has outstanding.
+        scale = self._budget_scale(client)
+        over_budget = client.queued_bytes > 0 and client.queued_bytes + size > self.max_queued_bytes * scale
+        full = client.queue.qsize() >= self.max_queued_messages * scale
+        if (full or over_budget) and client.worker is None:
+            client.dropped += 1
+            self.stats['dropped_messages'] += 1
+            # Disconnecting a gateway would cut off every user behind it, so it only drops
+            if not client.sessions and (self.slow_client_policy == 'disconnect' or
+                                        client.dropped > SLOW_CLIENT_MAX_DROPS):
+                self.stats['slow_disconnects'] += 1
+                print(f"🐢 Disconnecting slow client {client.username or client.address}")
+                self.disconnect_client(client)
+            return False
+
+        client.queued_bytes += size
+        client.queue.put_nowait((encoded, size))
+        return True
+
+    @staticmethod
+    def _budget_scale(client):
+        """Multiplier on the outbound limits: a gateway carries the traffic of all its sessions"""
+        return min(max(len(client.sessions), 1), GATEWAY_MAX_BUDGET_FACTOR)
+
+    def broadcast_message(self, message, exclude_client=None, encodings=None):
+        """Queue a message for every joined client, encoding it once per wire format"""
+        encodings = dict(encodings or {})
+        gateways = {}  # {(gateway connection, binary): [session IDs]}; one copy per gateway
+        for client in list(self.clients.values()):
+            if client is exclude_client:
+                continue
+            if isinstance(client, GatewaySession):
+                gateways.setdefault((client.conn, client.binary), []).append(client.session_id)
+                continue
+            if client.binary not in encodings:
+                encoded = encode_message(message, binary=client.binary)
+                encodings[client.binary] = (encoded, sum(memoryview(buffer).nbytes for buffer in encoded))
+            encoded, size = encodings[client.binary]
+            self.send_to_client(client, message, encoded, size)
+
+        for (conn, binary), session_ids in gateways.items():
+            self.send_to_client(conn, None, encode_message(fan_out_message(message, session_ids), binary=binary))
+
+    async def _write_loop(self, client):
+        """Drain one client's outbound queue into its socket"""
+        try:
+            while True:
+                encoded, size = await client.queue.get()
+                client.writer.writelines(encoded)
+                await client.writer.drain()
+                self.metrics.record_sent(size)
+                client.queued_bytes -= size
+                client.drained.set()
+                # Keeping up again resets the drop allowance
+                if client.queue.empty():
+                    client.dropped = 0
+        except (ConnectionError, OSError):
+            self.disconnect_client(client)
+        except asyncio.CancelledError:
+            pass
+
+    def disconnect_client(self, client):
+        """Handle client disconnection"""
+        if client.closing:
+            return
+        client.closing = True
+        self.matrix_store.abort_uploads(client)
+        for task in list(client.tasks):
+            task.cancel()
+
+        if isinstance(client, GatewaySession):
+            # The gateway's connection stays open for its other users
+            client.conn.sessions.pop(client.session_id, None)
+        else:
+            self.connections.discard(client)
+            if client.writer_task and client.writer_task is not asyncio.current_task():
+                client.writer_task.cancel()
+            client.drained.set()
+            # abort() does not wait for a slow peer to accept buffered data
+            client.writer.transport.abort()
+            for session in list(client.sessions.values()):
+                self.disconnect_client(session)
+            if client.worker:
+                self.loop.run_in_executor(None, self.tile_scheduler.unregister, client.worker)
+
+        if client.username and self.clients.get(client.username) is client:
+            del self.clients[client.username]
+            self.broadcast_message({
+                'type': 'system',
+                'message': f"👋 {client.username} left the chat",
+                'timestamp': self._timestamp()
+            })
+            print(f"📤 {client.username} disconnected")
+
+    # ---------------- JOB CALLBACKS (background threads) ---------------- #
+
+    def on_job_progress(self, job):
+        """Tell the job's owner that it changed state"""
+        message = {'type': 'job_status'}
+        message.update(job.to_dict())
+        self._call_in_loop(self.send_to_client, job.owner, message)
+
+    def job_counts(self):
+        """Number of known jobs per status, for the metrics gauge"""
+        return Counter(job['status'] for job in self.job_manager.list_jobs())
+
+    def on_job_complete(self, job, result):
+        """Encode a finished job's result off the event loop, then broadcast it"""
+        start = time.perf_counter()
+        if job.kind == 'stored' and result.get('matrix_id'):
+            # Out-of-core results stay on disk; clients get their ID and a preview
+            self.matrix_store.register(result['matrix_id'])
+        # Large arrays are summarized; the full result is fetched on demand
+        summary, truncated = summarize_result(result)
+        response = {
+            'type': 'matrix_result',
+            'username': job.username,
+            'operation': job.operation,
+            'job_id': job.job_id,
+            'result': summary,
+            'timestamp': self._timestamp()
+        }
+        if truncated:
+            response['truncated'] = True
+            response['result_id'] = self.result_store.put(result)
+        try:
+            formats = {client.binary for client in list(self.clients.values())}
+            encodings = {}
+            for binary in formats:
+                encoded = encode_message(response, binary=binary)
+                encodings[binary] = (encoded, sum(memoryview(buffer).nbytes for buffer in encoded))
+        except Exception as e:
+            self.on_job_error(job, str(e))
+            return
+
+        self._call_in_loop(self.broadcast_message, response, None, encodings)
+        # Delivery here is summarizing and encoding; the writes are paced by each client
+        self.metrics.record_job(job, time.perf_counter() - start)
+        print(f"🔢 {job.username} performed operation: {job.operation}")
+
+    def on_job_error(self, job, error):
+        """Report a failed job to its owner"""
+        self.metrics.record_job(job, error=True)
+        prefix = 'Matrix operation failed' if job.kind == 'file' else 'Operation failed'
+        self._call_in_loop(self.send_to_client, job.owner, {
+            'type': 'error',
+            'job_id': job.job_id,
+            'message': f'{prefix}: {error}'
+        })
+
+    @staticmethod
+    def _start_task(client, coroutine):
+        """Run a coroutine for a client; it is cancelled if the client disconnects"""
+        task = asyncio.create_task(coroutine)
+        client.tasks.add(task)
+        task.add_done_callback(client.tasks.discard)
+
+    def _call_in_loop(self, callback, *args):
+        """Run a callback on the event loop from any thread"""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    @staticmethod
+    def _timestamp():
+        return datetime.now().strftime('%H:%M:%S')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MatrixMesh asyncio chat server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--slow-client-policy', choices=['drop', 'disconnect'], default='drop',
+                        help="What to do when a client cannot keep up with its messages")
+    parser.add_argument('--cache-spill-dir', default=None,
+                        help="Directory for results evicted from the in-memory cache")
+    parser.add_argument('--store-dir', default=None,
+                        help="Directory for uploaded .npy matrices (default: a temporary directory)")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve Prometheus metrics at http://<host>:<port>/metrics")
+    parser.add_argument('--summary-interval', type=float, default=DEFAULT_SUMMARY_INTERVAL,
+                        help="Seconds between metric summaries in the log (0 to disable)")
+    parser.add_argument('--worker-token', default=os.environ.get(WORKER_TOKEN_ENV),
+                        help=f"Shared secret compute workers must present (default: ${WORKER_TOKEN_ENV})")
+    parser.add_argument('--worker-hosts', default=os.environ.get(WORKER_HOSTS_ENV, ''),
+                        help=f"Comma-separated hosts allowed to register as workers (default: ${WORKER_HOSTS_ENV})")
+    args = parser.parse_args()
+
+    # Structured events are JSON lines; see metrics.log_event
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    server = AsyncChatServer(args.host, args.port, slow_client_policy=args.slow_client_policy,
+                             cache_spill_dir=args.cache_spill_dir, store_dir=args.store_dir,
+                             metrics_port=args.metrics_port, summary_interval=args.summary_interval,
+                             worker_auth=WorkerAuth(args.worker_token, args.worker_hosts.split(',')))
+    try:
+        asyncio.run(server.start_server())
+    except KeyboardInterrupt:
+        print("\n🛑 Server shutting down...")
+    finally:
+        server.job_manager.shutdown()
+        server.matrix_store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+MatrixMesh Load Generator
+Simulates many chat clients mixing chat and matrix operations; reports throughput, latency and server memory
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from matrix_codec import FrameError, encode_message, read_message_async
+
+try:
+    import psutil
+except ImportError:  # optional; /proc is read directly on Linux
+    psutil = None
+
+MAX_LINE_BYTES = 64 * 1024 * 1024
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Servers the benchmark can start itself; {port} is filled in
+SERVER_COMMANDS = {
+    'thread': [sys.executable, '-c',
+               "import sys; from server import ChatServer; "
+               "ChatServer('127.0.0.1', int(sys.argv[1]), summary_interval=0).start_server()", '{port}'],
+    'async': [sys.executable, 'async_server.py', '--host', '127.0.0.1', '--port', '{port}',
+              '--summary-interval', '0']
+}
+BINARY_OPERATIONS = ('add', 'subtract', 'multiply', 'solve')
+
+
+# ---------------- SERVER PROCESS ---------------- #
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """Resident memory in bytes of a process and its children (e.g. the job pool)"""
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes if p.is_running())
+        except psutil.Error:
+            return None
+    if not os.path.isdir('/proc'):
+        return None
+
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields resume after its ')'
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    total, stack, found = 0, [pid], False
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        found = True
+                        break
+        except OSError:
+            continue
+        stack.extend(children.get(current, []))
+    return total if found else None
+
+
+def start_server(command: List[str], port: int, log_path: Optional[str]) -> subprocess.Popen:
+    """Start a server process and wait until it accepts connections"""
+    command = [part.replace('{port}', str(port)) for part in command]
+    log = open(log_path, 'w') if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(command, cwd=HERE, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Server did not start listening")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ---------------- RESULTS ---------------- #
+
+class Recorder:
+    """Latencies, errors and counts gathered by every simulated client"""
+
+    def __init__(self, warmup_until: float):
+        self.warmup_until = warmup_until
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.timeouts = 0
+        self.received = 0
+        self.received_bytes = 0
+        self.rss_samples: List[int] = []
+
+    def record(self, key: str, started: float, finished: float) -> None:
+        if started >= self.warmup_until:
+            self.latencies.setdefault(key, []).append(finished - started)
+
+    def error(self, message: str) -> None:
+        # Job IDs and numbers make every message unique; group by the text before them
+        key = message.split(':', 1)[0][:80]
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        actions = {}
+        for key, values in sorted(self.latencies.items()):
+            values_ms = np.array(values) * 1000
+            actions[key] = {
+                'count': len(values),
+                'per_second': round(len(values) / elapsed, 2),
+                'p50_ms': round(float(np.percentile(values_ms, 50)), 2),
+                'p99_ms': round(float(np.percentile(values_ms, 99)), 2),
+                'max_ms': round(float(values_ms.max()), 2)
+            }
+        report = {
+            'measured_seconds': round(elapsed, 2),
+            'actions': actions,
+            'total_per_second': round(sum(a['count'] for a in actions.values()) / elapsed, 2),
+            'errors': dict(self.errors),
+            'timeouts': self.timeouts,
+            'messages_received': self.received,
+            'megabytes_received': round(self.received_bytes / 1e6, 2)
+        }
+        if self.rss_samples:
+            report['server_rss_mb'] = {
+                'start': round(self.rss_samples[0] / 1e6, 1),
+                'peak': round(max(self.rss_samples) / 1e6, 1),
+                'end': round(self.rss_samples[-1] / 1e6, 1)
+            }
+        return report
+
+
+def print_report(report: Dict[str, Any], config: argparse.Namespace) -> None:
+    print(f"\n📈 {config.clients} clients, {report['measured_seconds']}s measured, "
+          f"{'binary frames' if config.binary else 'JSON'}")
+    print(f"   {'action':<24}{'count':>8}{'per s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for key, stats in report['actions'].items():
+        print(f"   {key:<24}{stats['count']:>8}{stats['per_second']:>10}{stats['p50_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    print(f"   total {report['total_per_second']} actions/s; {report['messages_received']} messages "
+          f"({report['megabytes_received']} MB) received by the clients")
+    if report['errors'] or report['timeouts']:
+        print(f"   ⚠️ errors: {report['errors']}, timeouts: {report['timeouts']}")
+    if 'server_rss_mb' in report:
+        rss = report['server_rss_mb']
+        print(f"   server RSS (with workers): start {rss['start']} MB, peak {rss['peak']} MB, end {rss['end']} MB")
+
+
+# ---------------- SIMULATED CLIENTS ---------------- #
+
+def make_matrices(operation: str, size: int, rng: np.random.Generator) -> List[np.ndarray]:
+    """Random, well-conditioned operands for an operation"""
+    a = rng.random((size, size)) + size * np.eye(size)
+    if operation == 'solve':
+        return [a, rng.random((size, 1))]
+    if operation in BINARY_OPERATIONS:
+        return [a, rng.random((size, size))]
+    return [a]
+
+
+class SimulatedClient:
+    """
+    One chat user running a closed loop of actions
+
+    Each action waits for its own answer (the chat echo or the job's result)
+    before the next one starts, with an optional exponential think time in
+    between, so the measured latency is what a user would see.
+    """
+
+    def __init__(self, index: int, config: argparse.Namespace, recorder: Recorder,
+                 matrix_pool: Dict[tuple, List[np.ndarray]]):
+        self.username = f"bench-{os.getpid()}-{index}"
+        self.config = config
+        self.recorder = recorder
+        self.matrix_pool = matrix_pool
+        self.rng = np.random.default_rng(index)
+        self.reader = None
+        self.writer = None
+        self.waiting: Optional[asyncio.Future] = None
+        self.waiting_for: Optional[str] = None
+        self.chat_seq = 0
+
+    async def connect(self) -> None:
+        self.reader, self.writer = await asyncio.open_connection(
+            self.config.host, self.config.port, limit=MAX_LINE_BYTES)
+        self.waiting_for = 'join'
+        self.waiting = asyncio.get_running_loop().create_future()
+        self.listener = asyncio.create_task(self._read_loop())
+        await self._send({'type': 'join', 'username': self.username, 'binary': self.config.binary})
+        await asyncio.wait_for(self.waiting, self.config.timeout)
+
+    async def run(self, deadline: float) -> None:
+        while time.time() < deadline:
+            if self.config.rate > 0:
+                await asyncio.sleep(random.expovariate(self.config.rate))
+            if random.random() < self.config.op_ratio:
+                operation = random.choice(self.config.operations)
+                size = random.choice(self.config.sizes)
+                await self._action(f"{operation} {size}", {
+                    'type': 'matrix_operation',
+                    'operation': operation,
+                    'matrices': self._matrices(operation, size)
+                }, 'result')
+            else:
+                self.chat_seq += 1
+                await self._action('chat', {'type': 'chat', 'message': f"bench {self.chat_seq}"},
+                                   f"bench {self.chat_seq}")
+
+    async def close(self) -> None:
+        self.listener.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+    def _matrices(self, operation: str, size: int) -> List[np.ndarray]:
+        if not self.config.reuse_matrices:
+            # Fresh data every time, so the server's result cache cannot answer
+            return make_matrices(operation, size, self.rng)
+        key = (operation, size)
+        if key not in self.matrix_pool:
+            self.matrix_pool[key] = make_matrices(operation, size, self.rng)
+        return self.matrix_pool[key]
+
+    async def _action(self, key: str, message: Dict[str, Any], expect: str) -> None:
+        self.waiting_for = expect
+        self.waiting = asyncio.get_running_loop().create_future()
+        started = time.time()
+        await self._send(message)
+        try:
+            ok = await asyncio.wait_for(self.waiting, self.config.timeout)
+        except asyncio.TimeoutError:
+            self.recorder.timeouts += 1
+            return
+        if ok:
+            self.recorder.record(key, started, time.time())
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        self.writer.writelines(encode_message(message, binary=self.config.binary))
+        await self.writer.drain()
+
+    def _resolve(self, ok: bool) -> None:
+        if self.waiting is not None and not self.waiting.done():
+            self.waiting.set_result(ok)
+
+    def _count(self, size: int) -> None:
+        self.recorder.received += 1
+        self.recorder.received_bytes += size
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                message = await read_message_async(self.reader, self._count)
+                if message is None:
+                    break
+                kind = message.get('type')
+                if kind == 'error':
+                    self.recorder.error(str(message.get('message', '')))
+                    self._resolve(False)
+                elif self.waiting_for == 'join' and kind in ('system', 'user_list'):
+                    self._resolve(True)
+                elif kind == 'chat' and message.get('username') == self.username:
+                    if message.get('message') == self.waiting_for:
+                        self._resolve(True)
+                elif kind == 'matrix_result' and message.get('username') == self.username:
+                    self._resolve(True)
+        except (ConnectionError, OSError, FrameError) as e:
+            self.recorder.error(f"connection: {e}")
+        finally:
+            self._resolve(False)
+
+
+async def sample_rss(pid: int, recorder: Recorder, interval: float = 0.5) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        rss = await loop.run_in_executor(None, process_tree_rss, pid)
+        if rss:
+            recorder.rss_samples.append(rss)
+        await asyncio.sleep(interval)
+
+
+async def run_benchmark(config: argparse.Namespace, server_pid: Optional[int]) -> Dict[str, Any]:
+    recorder = Recorder(warmup_until=float('inf'))
+    sampler = asyncio.create_task(sample_rss(server_pid, recorder)) if server_pid else None
+    matrix_pool: Dict[tuple, List[np.ndarray]] = {}
+    clients = [SimulatedClient(i, config, recorder, matrix_pool) for i in range(config.clients)]
+
+    # Many servers have short listen backlogs; connect a batch at a time
+    limit = asyncio.Semaphore(config.connect_concurrency)
+
+    async def connect(client):
+        async with limit:
+            await client.connect()
+
+    connected = await asyncio.gather(*(connect(client) for client in clients), return_exceptions=True)
+    clients = [client for client, outcome in zip(clients, connected) if outcome is None]
+    print(f"🔌 {len(clients)}/{config.clients} clients joined")
+    if not clients:
+        raise RuntimeError("No client could join the server")
+
+    start = time.time()
+    recorder.warmup_until = start + config.warmup
+    deadline = start + config.warmup + config.duration
+    await asyncio.gather(*(client.run(deadline) for client in clients), return_exceptions=True)
+    elapsed = max(time.time() - recorder.warmup_until, 1e-9)
+
+    await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+    if sampler:
+        sampler.cancel()
+    return recorder.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MatrixMesh load generator and benchmark")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--spawn', choices=sorted(SERVER_COMMANDS),
+                        help="Start this server engine on a free port and measure it")
+    parser.add_argument('--server-cmd', default=None,
+                        help="Start any server with this command line; {port} is replaced")
+    parser.add_argument('--server-pid', type=int, default=None,
+                        help="PID of an already running server, to sample its memory")
+    parser.add_argument('--server-log', default=None, help="Write a spawned server's output here")
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to measure")
+    parser.add_argument('--warmup', type=float, default=3.0, help="Seconds before measuring starts")
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help="Actions per second per client (0 = back to back)")
+    parser.add_argument('--op-ratio', type=float, default=0.2,
+                        help="Fraction of actions that are matrix operations rather than chat")
+    parser.add_argument('--operations', default='multiply,add,inverse,determinant',
+                        help="Comma-separated operations to mix")
+    parser.add_argument('--sizes', default='10,100', help="Comma-separated square matrix sizes")
+    parser.add_argument('--binary', action='store_true', help="Use binary matrix frames")
+    parser.add_argument('--reuse-matrices', action='store_true',
+                        help="Send the same operands every time (exercises the result cache)")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Seconds to wait for an answer")
+    parser.add_argument('--connect-concurrency', type=int, default=50)
+    parser.add_argument('--json', default=None, help="Also write the report to this file")
+    config = parser.parse_args()
+    config.operations = [op.strip() for op in config.operations.split(',') if op.strip()]
+    config.sizes = [int(size) for size in config.sizes.split(',')]
+
+    server = None
+    server_pid = config.server_pid
+    command = config.server_cmd.split() if config.server_cmd else SERVER_COMMANDS.get(config.spawn)
+    if command:
+        config.host, config.port = '127.0.0.1', free_port()
+        server = start_server(command, config.port, config.server_log)
+        server_pid = server.pid
+        print(f"🚀 Started {config.spawn or config.server_cmd} server (pid {server.pid}) on port {config.port}")
+
+    try:
+        report = asyncio.run(run_benchmark(config, server_pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    report['config'] = {key: value for key, value in vars(config).items() if key != 'json'}
+    print_report(report, config)
+    if config.json:
+        with open(config.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 import asyncio
 import json
 import os
+import numpy as np
 from textual.app import App, ComposeResult
 from textual.containers import Vertical
 from textual.widgets import Input, Static, Log
 from textual.reactive import var
+from matrix_codec import encode_message
+from result_delivery import ResultAssembler
 
 SERVER_HOST = "127.0.0.1"
 SERVER_PORT = 5000
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 class ChatClient:
@@ -15,6 +19,8 @@ class ChatClient:
         self.ui = ui_app
         self.reader = None
         self.writer = None
+        self.assembler = ResultAssembler()
+        self.results = {}
 
     async def connect(self):
         try:
@@ -32,10 +38,32 @@ class ChatClient:
                     self.ui.write_system("⚠️ Server disconnected.")
                     break
                 message = data.decode().strip()
+                if '"result_chunk"' in message and self.handle_result_chunk(message):
+                    continue
                 self.ui.write_server(message)
         except Exception as e:
             self.ui.write_system(f"⚠️ Error receiving data: {e}")
 
+    def handle_result_chunk(self, line):
+        """Collect a downloaded result chunk; True if the line was one"""
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            return False
+        if message.get('type') != 'result_chunk':
+            return False
+
+        result = self.assembler.add(message)
+        if result is not None:
+            self.results[message['result_id']] = result
+            self.ui.write_system(f"📥 Result {message['result_id']} downloaded ({message['total']} chunks)")
+        return True
+
+    def fetch_result(self, result_id):
+        """Download the full data of a summarized result"""
+        self.send_message({'type': 'fetch_result', 'result_id': result_id,
+                           'format': 'json', 'compression': 'zlib'})
+
     def send_message(self, message_dict):
         """Send JSON-encoded message to server"""
         if not self.writer:
@@ -59,22 +87,65 @@ class ChatClient:
             return
 
         try:
-            with open(file_path, 'r') as file:
-                matrix_data = file.read()
+            if file_path.endswith(('.npy', '.npz')):
+                # NumPy files go as raw bytes in a binary frame
+                with open(file_path, 'rb') as file:
+                    matrix_data = np.frombuffer(file.read(), dtype=np.uint8)
+            else:
+                with open(file_path, 'r') as file:
+                    matrix_data = file.read()  # send as string
 
             message = {
                 'type': 'matrix_file',
-                'matrix_data': str(matrix_data),  # send as string
+                'matrix_data': matrix_data,
                 'operation': operation,
                 'filename': os.path.basename(file_path)
             }
 
-            self.send_message(message)
+            if isinstance(matrix_data, np.ndarray):
+                if self.writer:
+                    self.writer.writelines(encode_message(message, binary=True))
+            else:
+                self.send_message(message)
             self.ui.write_system(f"📁 Sent matrix file: {file_path} (operation: {operation})")
 
         except Exception as e:
             self.ui.write_system(f"❌ Failed to send matrix file: {e}")
 
+    async def upload_matrix(self, file_path):
+        """Stream a .npy file to the server's matrix store in chunks"""
+        if not self.writer:
+            self.ui.write_system("⚠️ Not connected to server.")
+            return
+        if not file_path.endswith('.npy') or not os.path.exists(file_path):
+            self.ui.write_system(f"❌ Not a .npy file: {file_path}")
+            return
+
+        upload_id = os.urandom(6).hex()
+        filename = os.path.basename(file_path)
+        try:
+            with open(file_path, 'rb') as file:
+                while True:
+                    chunk = file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self.writer.writelines(encode_message({
+                        'type': 'upload_chunk',
+                        'upload_id': upload_id,
+                        'filename': filename,
+                        'data': np.frombuffer(chunk, dtype=np.uint8)
+                    }, binary=True))
+                    await self.writer.drain()
+            self.send_message({'type': 'upload_end', 'upload_id': upload_id})
+            self.ui.write_system(f"📤 Uploaded {file_path}")
+        except Exception as e:
+            self.ui.write_system(f"❌ Upload failed: {e}")
+
+    def request_stored_operation(self, operation, matrix_ids):
+        """Run an operation on matrices already in the server's store"""
+        self.send_message({'type': 'matrix_operation', 'operation': operation, 'matrix_ids': matrix_ids})
+        self.ui.write_system(f"🔢 Requested {operation} on {', '.join(matrix_ids)}")
+
     def request_matrix_operation(self, operation, matrices_text):
         """Request a specific matrix operation"""
         try:
@@ -107,7 +178,8 @@ class ChatApp(App):
         self.msg_input = self.query_one("#msg_input", Input)
         self.client = ChatClient(self)
         await self.client.connect()
-        self.write_system("💡 Commands: /sendfile <path> [operation], /op <operation> <matrix text>")
+        self.write_system("💡 Commands: /sendfile <path> [operation], /op <operation> <matrix text>, /fetch <result_id>, "
+                          "/upload <file.npy>, /stored <operation> <matrix_id>...")
 
     def write_system(self, text):
         self.chat_box.write(f"[green]{text}[/green]")
@@ -142,6 +214,27 @@ class ChatApp(App):
                 matrix_data = parts[2]
                 self.client.request_matrix_operation(operation, matrix_data)
 
+        elif text.startswith("/fetch"):
+            parts = text.split()
+            if len(parts) != 2:
+                self.write_system("⚠️ Usage: /fetch <result_id>")
+            else:
+                self.client.fetch_result(parts[1])
+
+        elif text.startswith("/upload"):
+            parts = text.split(maxsplit=1)
+            if len(parts) != 2:
+                self.write_system("⚠️ Usage: /upload <file.npy>")
+            else:
+                asyncio.create_task(self.client.upload_matrix(parts[1]))
+
+        elif text.startswith("/stored"):
+            parts = text.split()
+            if len(parts) < 3:
+                self.write_system("⚠️ Usage: /stored <operation> <matrix_id>...")
+            else:
+                self.client.request_stored_operation(parts[1], parts[2:])
+
         else:
             self.client.send_chat_message(text)
 
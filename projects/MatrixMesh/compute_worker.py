@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+MatrixMesh Compute Worker
+Registers with a MatrixMesh server and computes the matrix tiles it is sent
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import time
+
+from matrix_codec import FrameError, FrameReader, encode_message, send_buffers
+from distributed import WORKER_TOKEN_ENV, compute_tile, tile_checksum
+
+# Tiles a worker accepts at once; the second arrives while the first computes
+DEFAULT_CAPACITY = 2
+
+
+def run_worker(host: str = 'localhost', port: int = 12345, name: str = None,
+               capacity: int = DEFAULT_CAPACITY, retry_delay: float = 5.0, token: str = None):
+    """Serve tiles for a server, reconnecting if the connection drops"""
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+        except OSError as e:
+            print(f"❌ Cannot reach server {host}:{port}: {e}; retrying in {retry_delay:.0f}s")
+            time.sleep(retry_delay)
+            continue
+
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        send_buffers(sock, encode_message({'type': 'worker_register', 'name': name, 'capacity': capacity,
+                                           'token': token}))
+        print(f"🛠️ Worker {name} connected to {host}:{port}")
+        try:
+            serve(sock)
+        except (FrameError, OSError) as e:
+            print(f"❌ Worker connection error: {e}")
+        finally:
+            sock.close()
+        print(f"⚠️ Lost server; reconnecting in {retry_delay:.0f}s")
+        time.sleep(retry_delay)
+
+
+def serve(sock):
+    """Answer tile_task messages until the server closes the connection"""
+    reader = FrameReader(sock)
+    while True:
+        message = reader.read_message()
+        if message is None:
+            return
+        if message.get('type') == 'error':
+            print(f"❌ Server: {message.get('message')}")
+            return
+        if message.get('type') != 'tile_task':
+            continue
+
+        task_id = message.get('task_id')
+        try:
+            operands = message.get('operands') or []
+            if [tile_checksum(operand) for operand in operands] != message.get('checksums'):
+                raise ValueError("operand checksum mismatch")
+            result = compute_tile(message.get('operation'), operands)
+            reply = {'type': 'tile_result', 'task_id': task_id, 'result': result,
+                     'checksum': tile_checksum(result)}
+        except Exception as e:
+            reply = {'type': 'tile_error', 'task_id': task_id, 'message': str(e)}
+        send_buffers(sock, encode_message(reply, binary=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MatrixMesh compute worker")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--name', default=None)
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY,
+                        help="Tiles to accept at once")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="Run several local workers, e.g. to test without other machines")
+    parser.add_argument('--token', default=os.environ.get(WORKER_TOKEN_ENV),
+                        help=f"Shared secret configured on the server (default: ${WORKER_TOKEN_ENV})")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(args.host, args.port, args.name, args.capacity, token=args.token)
+        return
+
+    base = args.name or socket.gethostname()
+    # Forking after NumPy loaded can deadlock BLAS thread pools in the children
+    context = multiprocessing.get_context('spawn')
+    workers = [
+        context.Process(target=run_worker, args=(args.host, args.port, f"{base}-{i}", args.capacity),
+                        kwargs={'token': args.token}, daemon=True)
+        for i in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        print("\n🛑 Workers shutting down...")
+
+
+if __name__ == "__main__":
+    main()
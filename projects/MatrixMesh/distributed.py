@@ -0,0 +1,394 @@
+"""
+Distributed Tiles for MatrixMesh
+Splits large multiply, add and transpose jobs into tiles computed by remote workers
+"""
+
+import hmac
+import math
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+TILED_OPERATIONS = ('multiply', 'add', 'transpose')
+# Jobs smaller than this are faster on one machine than over the network
+MIN_DISTRIBUTED_ELEMENTS = 1_000_000
+MIN_TILE_SIZE = 256
+# Aim for this many tiles per unit of worker capacity so fast workers take more
+TILES_PER_SLOT = 2
+TASK_TIMEOUT = 120.0
+# Attempts on remote workers before a tile is computed locally
+MAX_ATTEMPTS = 3
+# Shared secret workers must present, and hosts allowed to register (comma separated)
+WORKER_TOKEN_ENV = 'MATRIXMESH_WORKER_TOKEN'
+WORKER_HOSTS_ENV = 'MATRIXMESH_WORKER_HOSTS'
+
+
+def tile_checksum(array: np.ndarray) -> int:
+    """CRC32 of an array's raw bytes"""
+    array = np.ascontiguousarray(array)
+    return zlib.crc32(array.reshape(-1).view(np.uint8))
+
+
+def compute_tile(operation: str, operands: List[np.ndarray]) -> np.ndarray:
+    """The work of one tile; runs on a worker (or locally as a fallback)"""
+    if operation == 'multiply':
+        a, b = operands
+        return a @ b
+    if operation == 'add':
+        result = operands[0] + operands[1]
+        for operand in operands[2:]:
+            result += operand
+        return result
+    if operation == 'transpose':
+        return np.ascontiguousarray(operands[0].T)
+    raise ValueError(f"Operation cannot be tiled: {operation}")
+
+
+class RemoteWorker:
+    """A registered compute worker and the tiles it is working on"""
+
+    def __init__(self, worker_id: str, send: Callable[[Dict[str, Any]], None], capacity: int = 1,
+                 name: Optional[str] = None):
+        self.worker_id = worker_id
+        self.send = send
+        self.capacity = max(1, capacity)
+        self.name = name or worker_id
+        self.in_flight: Dict[str, 'Tile'] = {}
+        self.completed = 0
+        self.stalled = False  # missed a deadline; gets no new tiles until it answers again
+
+
+class WorkerAuth:
+    """
+    Who may register as a compute worker
+
+    Workers compute results the server places unseen (the CRC32 only guards
+    the transport), so registration needs a shared token, an allow-list of
+    hosts, or both. With neither configured no worker is accepted.
+    """
+
+    def __init__(self, token: Optional[str] = None, hosts: Optional[List[str]] = None):
+        self.token = token or None
+        self.hosts = {host.strip() for host in hosts or [] if host.strip()}
+
+    @classmethod
+    def from_env(cls) -> 'WorkerAuth':
+        """Settings from MATRIXMESH_WORKER_TOKEN and MATRIXMESH_WORKER_HOSTS"""
+        return cls(os.environ.get(WORKER_TOKEN_ENV), os.environ.get(WORKER_HOSTS_ENV, '').split(','))
+
+    @property
+    def enabled(self) -> bool:
+        return self.token is not None or bool(self.hosts)
+
+    def allows(self, token: Any, host: Optional[str]) -> bool:
+        """Whether a registration with this token from this host is accepted"""
+        if not self.enabled:
+            return False
+        if self.hosts and host not in self.hosts:
+            return False
+        if self.token is not None:
+            return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+        return True
+
+
+class Tile:
+    """One block of a distributed job"""
+
+    def __init__(self, job: '_TiledJob', operands: List[np.ndarray], target: Tuple[slice, slice]):
+        self.task_id = uuid.uuid4().hex[:12]
+        self.job = job
+        self.operands = operands
+        self.checksums = [tile_checksum(operand) for operand in operands]
+        self.target = target  # where the result goes in the output matrix
+        self.attempts = 0
+        self.sent_at = 0.0
+
+
+class _TiledJob:
+    """Bookkeeping for one operation while its tiles are out"""
+
+    def __init__(self, operation: str, out: np.ndarray):
+        self.operation = operation
+        self.out = out
+        self.remaining = 0
+        self.local: deque = deque()  # tiles to compute on the server
+        self.workers = set()
+        self.retries = 0
+
+
+class TileScheduler:
+    """
+    Farms tiles of large matrix operations out to registered workers
+
+    The transport is up to the server: each worker is registered with a send
+    callable, and the server passes tile_result / tile_error messages back in.
+    Results are checked against the worker's checksum before they are placed.
+    Tiles that fail, time out or belong to a lost worker are retried, and
+    finally computed locally, so a job never depends on any one worker.
+    """
+
+    def __init__(self, min_elements: int = MIN_DISTRIBUTED_ELEMENTS, task_timeout: float = TASK_TIMEOUT):
+        self.min_elements = min_elements
+        self.task_timeout = task_timeout
+        self.workers: Dict[str, RemoteWorker] = {}
+        self._pending: deque = deque()
+        self._tasks: Dict[str, Tuple[Tile, RemoteWorker]] = {}
+        self._cond = threading.Condition()
+        self.stats = {'tiles_remote': 0, 'tiles_local': 0, 'checksum_failures': 0, 'timeouts': 0}
+
+    # ---------------- WORKERS ---------------- #
+
+    def register(self, send: Callable[[Dict[str, Any]], None], capacity: int = 1,
+                 name: Optional[str] = None) -> RemoteWorker:
+        """Add a worker; it starts receiving tiles immediately"""
+        worker = RemoteWorker(uuid.uuid4().hex[:8], send, capacity, name)
+        with self._cond:
+            self.workers[worker.worker_id] = worker
+            assignments = self._assign_locked()
+        print(f"🛠️ Worker {worker.name} registered (capacity {worker.capacity})")
+        self._send(assignments)
+        return worker
+
+    def unregister(self, worker: RemoteWorker) -> None:
+        """Remove a worker and requeue everything it was computing"""
+        with self._cond:
+            if self.workers.pop(worker.worker_id, None) is None:
+                return
+            for task_id, tile in list(worker.in_flight.items()):
+                self._tasks.pop(task_id, None)
+                self._retry_locked(tile)
+            worker.in_flight.clear()
+            assignments = self._assign_locked()
+            self._cond.notify_all()
+        print(f"🛠️ Worker {worker.name} left")
+        self._send(assignments)
+
+    def handle_result(self, worker: RemoteWorker, message: Dict[str, Any]) -> None:
+        """Accept a tile_result or tile_error message from a worker"""
+        task_id = message.get('task_id')
+        with self._cond:
+            # Any answer shows a stalled worker is alive again
+            worker.stalled = False
+            entry = self._tasks.get(task_id)
+            if entry is not None and entry[1] is worker:
+                del self._tasks[task_id]
+                worker.in_flight.pop(task_id, None)
+                self._accept_locked(worker, entry[0], message)
+            # Otherwise it timed out and was reassigned, or is unknown
+
+            assignments = self._assign_locked()
+            self._cond.notify_all()
+        self._send(assignments)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Registered workers and tile counters"""
+        with self._cond:
+            stats = dict(self.stats)
+            stats['workers'] = [
+                {'name': w.name, 'capacity': w.capacity, 'busy': len(w.in_flight),
+                 'completed': w.completed, 'stalled': w.stalled}
+                for w in self.workers.values()
+            ]
+        return stats
+
+    # ---------------- JOBS ---------------- #
+
+    def should_distribute(self, operation: str, matrices: Optional[List[Any]]) -> bool:
+        """Whether an operation is large enough, and workers are available, to tile it"""
+        if operation not in TILED_OPERATIONS or not self.workers or not matrices:
+            return False
+        if not all(isinstance(m, np.ndarray) and m.ndim == 2 for m in matrices):
+            return False
+        if operation == 'multiply' and len(matrices) == 2:
+            # Work grows with rows x inner x cols, not with the input size
+            return matrices[0].shape[0] * matrices[1].shape[1] >= self.min_elements
+        return matrices[0].size >= self.min_elements
+
+    def run(self, operation: str, matrices: List[np.ndarray]) -> Dict[str, Any]:
+        """
+        Compute an operation across the workers; blocks until every tile is in
+
+        Returns a result shaped like MatrixProcessor's for the same operation.
+        """
+        job, tiles, description = self._plan(operation, matrices)
+        job.remaining = len(tiles)
+        with self._cond:
+            if self.workers:
+                self._pending.extend(tiles)
+            else:
+                job.local.extend(tiles)
+            assignments = self._assign_locked()
+        self._send(assignments)
+
+        while True:
+            with self._cond:
+                if not self._available_locked():
+                    # Nobody left to send to: take this job's queued tiles back
+                    for tile in [t for t in self._pending if t.job is job]:
+                        self._pending.remove(tile)
+                        job.local.append(tile)
+                if not job.remaining:
+                    break
+                if not job.local:
+                    self._cond.wait(timeout=1.0)
+                assignments = self._expire_locked()
+                local = list(job.local)
+                job.local.clear()
+            self._send(assignments)
+
+            for tile in local:
+                job.out[tile.target] = compute_tile(job.operation, tile.operands)
+                with self._cond:
+                    job.remaining -= 1
+                    self.stats['tiles_local'] += 1
+
+        workers = sorted(job.workers)
+        return {
+            'matrix': job.out,
+            'shape': job.out.shape,
+            'description': f"{description} ({len(tiles)} tiles on {len(workers) or 'no'} remote workers)",
+            'distributed': {'tiles': len(tiles), 'workers': workers, 'retries': job.retries}
+        }
+
+    def _plan(self, operation: str, matrices: List[np.ndarray]) -> Tuple[_TiledJob, List[Tile], str]:
+        """Validate an operation and cut it into tiles"""
+        if operation == 'multiply':
+            if len(matrices) != 2:
+                raise ValueError("Matrix multiplication requires exactly 2 matrices")
+            a, b = matrices
+            if a.shape[1] != b.shape[0]:
+                raise ValueError(f"Cannot multiply matrices: {a.shape} × {b.shape}")
+            rows, cols = a.shape[0], b.shape[1]
+            dtype = np.result_type(a, b)
+            description = f"Product of {a.shape} and {b.shape} matrices"
+        elif operation == 'add':
+            if len(matrices) < 2:
+                raise ValueError("Addition requires at least 2 matrices")
+            for m in matrices[1:]:
+                if m.shape != matrices[0].shape:
+                    raise ValueError(f"Matrix shapes don't match for addition: {matrices[0].shape} vs {m.shape}")
+            rows, cols = matrices[0].shape
+            dtype = np.result_type(*matrices)
+            description = f"Sum of {len(matrices)} matrices"
+        elif operation == 'transpose':
+            if len(matrices) != 1:
+                raise ValueError("Transpose requires exactly 1 matrix")
+            cols, rows = matrices[0].shape
+            dtype = matrices[0].dtype
+            description = f"Transpose of {matrices[0].shape} matrix"
+        else:
+            raise ValueError(f"Operation cannot be tiled: {operation}")
+
+        job = _TiledJob(operation, np.empty((rows, cols), dtype=dtype))
+        tile_rows, tile_cols = self._tile_shape(rows, cols)
+        column_blocks = {}  # B's column strips are shared by a whole column of tiles
+        tiles = []
+        for r0 in range(0, rows, tile_rows):
+            for c0 in range(0, cols, tile_cols):
+                target = (slice(r0, r0 + tile_rows), slice(c0, c0 + tile_cols))
+                if operation == 'multiply':
+                    if c0 not in column_blocks:
+                        column_blocks[c0] = np.ascontiguousarray(b[:, target[1]])
+                    operands = [a[target[0]], column_blocks[c0]]
+                elif operation == 'add':
+                    operands = [m[target] for m in matrices]
+                else:
+                    operands = [matrices[0][target[1], target[0]]]
+                tiles.append(Tile(job, operands, target))
+        return job, tiles, description
+
+    def _tile_shape(self, rows: int, cols: int) -> Tuple[int, int]:
+        """Tile size giving a few tiles per worker slot; bigger tiles send less data twice"""
+        with self._cond:
+            slots = sum(w.capacity for w in self.workers.values()) or 1
+        target = max(1, slots * TILES_PER_SLOT)
+        grid_rows = max(1, min(round(math.sqrt(target * rows / max(cols, 1))), math.ceil(rows / MIN_TILE_SIZE)))
+        grid_cols = max(1, min(math.ceil(target / grid_rows), math.ceil(cols / MIN_TILE_SIZE)))
+        return math.ceil(rows / grid_rows), math.ceil(cols / grid_cols)
+
+    # ---------------- DISPATCH (caller holds the lock unless noted) ---------------- #
+
+    def _assign_locked(self) -> List[Tuple[RemoteWorker, Tile]]:
+        """Hand pending tiles to the least busy workers with free capacity"""
+        assignments = []
+        while self._pending:
+            free = [w for w in self._available_locked() if len(w.in_flight) < w.capacity]
+            if not free:
+                break
+            worker = min(free, key=lambda w: len(w.in_flight) / w.capacity)
+            tile = self._pending.popleft()
+            tile.attempts += 1
+            tile.sent_at = time.monotonic()
+            worker.in_flight[tile.task_id] = tile
+            self._tasks[tile.task_id] = (tile, worker)
+            assignments.append((worker, tile))
+        return assignments
+
+    def _accept_locked(self, worker: RemoteWorker, tile: Tile, message: Dict[str, Any]) -> None:
+        """Place a verified tile result, or retry the tile"""
+        result = message.get('result')
+        ok = (message.get('type') == 'tile_result' and isinstance(result, np.ndarray)
+              and result.shape == tile.job.out[tile.target].shape
+              and tile_checksum(result) == message.get('checksum'))
+        if ok:
+            tile.job.out[tile.target] = result
+            tile.job.remaining -= 1
+            tile.job.workers.add(worker.name)
+            worker.completed += 1
+            self.stats['tiles_remote'] += 1
+            return
+
+        if message.get('type') == 'tile_result':
+            self.stats['checksum_failures'] += 1
+            print(f"⚠️ Tile {tile.task_id} from {worker.name} failed verification")
+        else:
+            print(f"⚠️ Worker {worker.name} failed tile {tile.task_id}: {message.get('message')}")
+        self._retry_locked(tile)
+
+    def _available_locked(self) -> List[RemoteWorker]:
+        """Workers that may be given new tiles"""
+        return [w for w in self.workers.values() if not w.stalled]
+
+    def _retry_locked(self, tile: Tile) -> None:
+        """Queue a tile again, or give it to its job to compute locally"""
+        tile.job.retries += 1
+        tile.task_id = uuid.uuid4().hex[:12]  # late answers to the old ID are ignored
+        if tile.attempts >= MAX_ATTEMPTS or not self._available_locked():
+            tile.job.local.append(tile)
+        else:
+            self._pending.append(tile)
+        self._cond.notify_all()
+
+    def _expire_locked(self) -> List[Tuple[RemoteWorker, Tile]]:
+        """Retry tiles a worker has held past the timeout"""
+        now = time.monotonic()
+        for task_id, (tile, worker) in list(self._tasks.items()):
+            if now - tile.sent_at > self.task_timeout:
+                print(f"⚠️ Tile {task_id} timed out on {worker.name}")
+                self.stats['timeouts'] += 1
+                worker.stalled = True
+                del self._tasks[task_id]
+                worker.in_flight.pop(task_id, None)
+                self._retry_locked(tile)
+        return self._assign_locked()
+
+    def _send(self, assignments: List[Tuple[RemoteWorker, Tile]]) -> None:
+        """Send assigned tiles, outside the lock since a send can block on the network"""
+        for worker, tile in assignments:
+            try:
+                worker.send({
+                    'type': 'tile_task',
+                    'task_id': tile.task_id,
+                    'operation': tile.job.operation,
+                    'operands': tile.operands,
+                    'checksums': tile.checksums
+                })
+            except Exception as e:
+                print(f"❌ Could not send tile to {worker.name}: {e}")
+                self.unregister(worker)
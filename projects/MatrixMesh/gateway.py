@@ -0,0 +1,48 @@
+"""
+Gateway Sessions for MatrixMesh
+Lets one upstream connection carry many chat users, each tagged with a session ID
+"""
+
+from typing import Any, Dict, List, Optional
+
+# A message for or from one multiplexed user
+SESSION_KEY = 'session'
+# A broadcast delivered once per gateway, listing the users it is for
+SESSIONS_KEY = 'sessions'
+# Sent by a gateway when one of its users goes away
+SESSION_CLOSE = 'session_close'
+
+
+class GatewaySession:
+    """
+    One chat user multiplexed over a gateway connection
+
+    The servers treat it like a directly connected client; replies are tagged
+    with its session ID and written to the gateway's connection.
+    """
+
+    def __init__(self, conn: Any, session_id: str, address: Optional[tuple] = None):
+        self.conn = conn  # the gateway's socket or ClientConnection
+        self.session_id = session_id
+        self.address = address
+        self.username = None
+        self.binary = False
+        self.closing = False
+        self.tasks = set()  # background tasks such as result downloads
+
+    def __repr__(self) -> str:
+        return f"GatewaySession({self.session_id!r})"
+
+
+def tag_message(message: Dict[str, Any], session_id: str) -> Dict[str, Any]:
+    """Address a message to one multiplexed user"""
+    tagged = dict(message)
+    tagged[SESSION_KEY] = session_id
+    return tagged
+
+
+def fan_out_message(message: Dict[str, Any], session_ids: List[str]) -> Dict[str, Any]:
+    """Address one copy of a broadcast to several users behind the same gateway"""
+    tagged = dict(message)
+    tagged[SESSIONS_KEY] = session_ids
+    return tagged
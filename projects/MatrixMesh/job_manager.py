@@ -0,0 +1,474 @@
+"""
+Background Matrix Jobs for MatrixMesh
+Runs matrix operations in a process pool so heavy math never blocks chat connections
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from matrix_operations import MatrixProcessor
+from result_cache import ResultCache, result_key, text_key
+from distributed import TileScheduler
+from out_of_core import run_stored
+from sparse_matrices import MATRIX_MARKET_HEADER, as_matrix, is_sparse, is_sparse_description
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATES = {JOB_DONE, JOB_FAILED, JOB_CANCELLED}
+
+# Jobs this small finish faster inline than a round trip through the pool; sparse
+# and compressed inputs never run inline, since their size says nothing about the work
+INLINE_MAX_ELEMENTS = 4096
+# Finished jobs kept around for status queries
+MAX_FINISHED_JOBS = 256
+
+# Set in each pool worker by _init_worker
+_progress_queue = None
+_processor = None
+
+
+def _init_worker(progress_queue):
+    """Pool initializer: keep the progress queue and one processor per worker"""
+    global _progress_queue, _processor
+    _progress_queue = progress_queue
+    _processor = MatrixProcessor()
+
+
+def run_operation(job_id: str, operation: str, matrices: Optional[List[Any]] = None,
+                  matrix_data: Optional[str] = None, auto_correct: bool = False,
+                  return_parsed: bool = False) -> tuple:
+    """
+    Parse and compute one matrix job; runs inside a pool worker (or inline for tiny jobs)
+
+    Returns (result, parsed, timings): the raw result with NumPy arrays, as
+    MatrixProcessor.perform_operation(raw=True); if return_parsed is set, the
+    matrices parsed from matrix_data (otherwise None); and the seconds spent
+    in each phase.
+    """
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, JOB_RUNNING, os.getpid()))
+
+    processor = _processor or MatrixProcessor()
+    parsed = None
+    timings = {}
+    start = time.perf_counter()
+    if not matrices and matrix_data:
+        try:
+            matrices = processor.parse_matrix_data(matrix_data)
+        except Exception as e:
+            prefix = "Matrix processing error" if auto_correct else "Failed to parse matrices"
+            raise ValueError(f"{prefix}: {e}")
+
+    matrices = [as_matrix(m) for m in matrices or []]
+    timings['parse'] = time.perf_counter() - start
+    if return_parsed and matrix_data:
+        parsed = matrices
+
+    start = time.perf_counter()
+    if auto_correct:
+        # Uploaded files may get their operation adjusted to the matrix count
+        result = processor.process_parsed_matrices(matrices, operation, raw=True)
+    else:
+        result = processor.perform_operation(operation, matrices, raw=True)
+    timings['compute'] = time.perf_counter() - start
+    return result, parsed, timings
+
+
+def run_stored_operation(job_id: str, operation: str, paths: List[str], out_path: str,
+                         matrix_id: str) -> tuple:
+    """
+    Compute a job on stored .npy matrices; runs inside a pool worker
+
+    The worker memory-maps the files itself, so no matrix data is pickled.
+    A result written to out_path is returned as its description plus matrix_id.
+    """
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, JOB_RUNNING, os.getpid()))
+
+    start = time.perf_counter()
+    result = run_stored(operation, paths, out_path)
+    if os.path.exists(out_path):
+        result['matrix_id'] = matrix_id
+    return result, None, {'compute': time.perf_counter() - start}
+
+
+@dataclass
+class Job:
+    """A matrix operation submitted by a chat user"""
+    job_id: str
+    owner: Any
+    username: str
+    operation: str
+    kind: str = 'operation'  # 'operation', 'file' or 'stored'
+    status: str = JOB_QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    cached: bool = False  # served from the result cache or another user's identical job
+    input_elements: int = 0  # rough input size, for metrics
+    timings: Dict[str, float] = field(default_factory=dict, repr=False)  # seconds per phase
+    future: Any = field(default=None, repr=False)
+    cache_key: Optional[str] = field(default=None, repr=False)
+    text_key: Optional[str] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Status of the job as sent to clients"""
+        now = time.time()
+        return {
+            'job_id': self.job_id,
+            'username': self.username,
+            'operation': self.operation,
+            'status': self.status,
+            'queued_seconds': round((self.started_at or self.finished_at or now) - self.submitted_at, 3),
+            'run_seconds': round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            'cached': self.cached,
+            'error': self.error
+        }
+
+
+class JobManager:
+    """
+    Submits matrix jobs to a process pool and reports their progress through callbacks
+
+    Callbacks run on background threads:
+        on_progress(job)          - job changed state (queued, running, cancelled)
+        on_complete(job, result)  - job finished; result holds NumPy arrays
+        on_error(job, message)    - job failed
+
+    With a cache, repeated operations on the same content are answered from
+    it, identical jobs already in flight are joined instead of recomputed, and
+    parsed text uploads are kept so later operations on them skip parsing.
+
+    With a tile scheduler, large multiply, add and transpose jobs are split
+    into tiles for registered remote workers instead of using the local pool.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_jobs_per_user: int = 4,
+                 inline_max_elements: int = INLINE_MAX_ELEMENTS, cache: Optional[ResultCache] = None,
+                 tile_scheduler: Optional[TileScheduler] = None):
+        self.max_workers = max_workers
+        self.max_jobs_per_user = max_jobs_per_user
+        self.inline_max_elements = inline_max_elements
+        self.cache = cache
+        self.tile_scheduler = tile_scheduler
+
+        self.on_progress: Optional[Callable[[Job], None]] = None
+        self.on_complete: Optional[Callable[[Job, Dict[str, Any]], None]] = None
+        self.on_error: Optional[Callable[[Job, str], None]] = None
+
+        self.jobs: Dict[str, Job] = {}
+        self._finished = deque()
+        self._inflight: Dict[str, Job] = {}  # result key -> job computing it
+        self._followers: Dict[str, List[Job]] = {}  # result key -> jobs waiting on it
+        self._lock = threading.Lock()
+
+        # Spawned workers do not inherit the server's sockets and threads
+        self._context = multiprocessing.get_context('spawn')
+        self._progress_queue = self._context.Queue()
+        self._executor = None
+        self._listener = threading.Thread(target=self._listen_progress, daemon=True)
+        self._listener.start()
+
+    def submit(self, owner: Any, username: str, operation: str, matrices: Optional[List[Any]] = None,
+               matrix_data: Optional[str] = None, kind: str = 'operation') -> Job:
+        """
+        Queue a matrix operation
+
+        Raises ValueError if the user already has too many unfinished jobs.
+        """
+        job = self._new_job(owner, username, operation, kind)
+        job.input_elements = self._estimate_elements(matrices, matrix_data)
+
+        if self.cache is not None and not self._attach_cached(job, matrices, matrix_data):
+            return job
+
+        if self.cache is not None and not matrices and matrix_data:
+            job.text_key = text_key(matrix_data)
+            parsed = self.cache.get(job.text_key)
+            if parsed is not None:
+                matrices, matrix_data = parsed, None
+
+        args = (job.job_id, operation, matrices, matrix_data, kind == 'file', job.text_key is not None)
+        self._notify_progress(job)
+
+        if (not self._may_expand(matrices, matrix_data)
+                and self._estimate_elements(matrices, matrix_data) <= self.inline_max_elements):
+            self._run_inline(job, args)
+            return job
+
+        if (kind == 'operation' and self.tile_scheduler is not None
+                and self.tile_scheduler.should_distribute(operation, matrices)):
+            # The scheduler only waits on the network; the work happens on remote workers
+            threading.Thread(target=self._run_distributed, args=(job, operation, matrices), daemon=True).start()
+            return job
+
+        self._submit_to_pool(job, run_operation, args)
+        return job
+
+    def submit_stored(self, owner: Any, username: str, operation: str, paths: List[str],
+                      out_path: str, matrix_id: str) -> Job:
+        """
+        Queue an operation on matrices stored as .npy files
+
+        Large add, subtract, transpose and multiply jobs run blocked over
+        memory maps and write their result to out_path under matrix_id.
+        """
+        job = self._new_job(owner, username, operation, 'stored')
+        self._notify_progress(job)
+        self._submit_to_pool(job, run_stored_operation, (job.job_id, operation, paths, out_path, matrix_id))
+        return job
+
+    def cancel(self, job_id: str, owner: Any) -> bool:
+        """
+        Cancel a job owned by the caller
+
+        A queued job is removed from the pool. A running job keeps its worker busy
+        until the computation ends, but its result is discarded.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not job or job.owner is not owner or job.status in FINISHED_STATES:
+                return False
+            job.status = JOB_CANCELLED
+            job.finished_at = time.time()
+            self._finished.append(job_id)
+
+            followers = self._followers.get(job.cache_key, [])
+            if job in followers:
+                followers.remove(job)
+            elif not followers and job.future is not None and job.future.cancel():
+                # Nobody else waits on this computation, so it never runs
+                if self._inflight.get(job.cache_key) is job:
+                    del self._inflight[job.cache_key]
+            # Otherwise the computation continues for the others and only this job is dropped
+
+        self._notify_progress(job)
+        return True
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        """Look up a job by ID"""
+        return self.jobs.get(job_id)
+
+    def list_jobs(self, owner: Any = None) -> List[Dict[str, Any]]:
+        """Status of all known jobs, optionally only those of one owner"""
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if owner is None or job.owner is owner]
+        return [job.to_dict() for job in jobs]
+
+    def shutdown(self):
+        """Stop the worker pool, dropping queued jobs"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._progress_queue.put(None)
+
+    def _new_job(self, owner: Any, username: str, operation: str, kind: str) -> Job:
+        """Register a job, enforcing the per-user limit"""
+        with self._lock:
+            active = sum(1 for job in self.jobs.values()
+                         if job.owner is owner and job.status not in FINISHED_STATES)
+            if active >= self.max_jobs_per_user:
+                raise ValueError(f"Too many jobs in progress (limit {self.max_jobs_per_user})")
+
+            job = Job(uuid.uuid4().hex[:12], owner, username, operation, kind)
+            self.jobs[job.job_id] = job
+        return job
+
+    def _submit_to_pool(self, job: Job, function: Callable, args: tuple):
+        """Run a job function in the worker pool, restarting the pool if a crash broke it"""
+        try:
+            try:
+                job.future = self._get_executor().submit(function, *args)
+            except BrokenProcessPool:
+                self._executor = None
+                job.future = self._get_executor().submit(function, *args)
+        except Exception as e:
+            self._complete(job, error=f"Could not start job: {e}")
+            return
+        job.future.add_done_callback(lambda future, job=job: self._finish(job, future))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the pool on first use (or after a worker crash broke it)"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self._context,
+                initializer=_init_worker,
+                initargs=(self._progress_queue,)
+            )
+        return self._executor
+
+    @staticmethod
+    def _estimate_elements(matrices: Optional[List[Any]], matrix_data: Optional[str]) -> int:
+        """Rough size of a job's input without converting it"""
+        total = 0
+        for m in matrices or []:
+            if isinstance(m, np.ndarray):
+                total += m.size
+            elif isinstance(m, dict):
+                # Sparse descriptions: the work follows the nonzeros
+                values = m.get('data')
+                total += len(values if values is not None else m.get('row', []))
+            elif isinstance(m, list) and m and isinstance(m[0], list):
+                total += len(m) * len(m[0])
+            elif isinstance(m, list):
+                total += len(m)
+            else:
+                total += 1
+        if matrix_data:
+            # Every number takes at least a digit and a separator
+            total += len(matrix_data) // 2
+        return total
+
+    @staticmethod
+    def _may_expand(matrices: Optional[List[Any]], matrix_data: Any) -> bool:
+        """Whether an input can describe far more elements than it contains (sparse or compressed)"""
+        if any(is_sparse(m) or is_sparse_description(m) for m in matrices or []):
+            return True
+        if isinstance(matrix_data, (bytes, bytearray)):
+            # .npy/.npz uploads, which may be compressed or sparse
+            return True
+        return isinstance(matrix_data, str) and MATRIX_MARKET_HEADER in matrix_data
+
+    def _run_inline(self, job: Job, args: tuple):
+        """Compute a tiny job on the calling thread"""
+        self._mark_running(job)
+        try:
+            result, parsed, timings = run_operation(*args)
+        except Exception as e:
+            self._complete(job, error=str(e))
+        else:
+            job.timings.update(timings)
+            self._complete(job, result=result, parsed=parsed)
+
+    def _run_distributed(self, job: Job, operation: str, matrices: List[np.ndarray]):
+        """Compute a large job as tiles on the registered workers"""
+        self._mark_running(job)
+        start = time.perf_counter()
+        try:
+            result = self.tile_scheduler.run(operation, matrices)
+        except Exception as e:
+            self._complete(job, error=str(e))
+        else:
+            job.timings['compute'] = time.perf_counter() - start
+            self._complete(job, result=result)
+
+    def _finish(self, job: Job, future):
+        """Done-callback for pool jobs"""
+        if future.cancelled():
+            return
+        try:
+            result, parsed, timings = future.result()
+        except BrokenProcessPool:
+            self._executor = None
+            self._complete(job, error="Worker process crashed (matrix may be too large)")
+        except Exception as e:
+            self._complete(job, error=str(e))
+        else:
+            job.timings.update(timings)
+            self._complete(job, result=result, parsed=parsed)
+
+    def _attach_cached(self, job: Job, matrices: Optional[List[Any]], matrix_data: Optional[str]) -> bool:
+        """
+        Answer a job from the cache or attach it to an identical running job
+
+        Returns True if the job still has to be computed (it becomes the leader
+        that other identical jobs wait on).
+        """
+        job.cache_key = result_key(job.operation, matrices, matrix_data, job.kind)
+        cached = self.cache.get(job.cache_key)
+        if cached is not None:
+            job.cached = True
+            self._deliver(job, result=cached)
+            return False
+
+        with self._lock:
+            leader = self._inflight.get(job.cache_key)
+            if leader is None:
+                self._inflight[job.cache_key] = job
+                return True
+            job.cached = True
+            self._followers.setdefault(job.cache_key, []).append(job)
+
+        self._notify_progress(job)
+        return False
+
+    def _complete(self, job: Job, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None,
+                  parsed: Optional[List[np.ndarray]] = None):
+        """Cache the outcome of a computed job and deliver it to the job and its followers"""
+        followers = []
+        if job.cache_key is not None:
+            with self._lock:
+                if self._inflight.get(job.cache_key) is job:
+                    del self._inflight[job.cache_key]
+                    followers = self._followers.pop(job.cache_key, [])
+            if error is None:
+                self.cache.put(job.cache_key, result)
+            if parsed is not None and job.text_key is not None:
+                self.cache.put(job.text_key, parsed)
+
+        for waiting_job in [job] + followers:
+            self._deliver(waiting_job, result=result, error=error)
+
+    def _deliver(self, job: Job, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        """Record the outcome of a job and fire the matching callback"""
+        with self._lock:
+            if job.status == JOB_CANCELLED:
+                return
+            job.status = JOB_FAILED if error is not None else JOB_DONE
+            job.error = error
+            job.finished_at = time.time()
+            if job.started_at is None:
+                job.started_at = job.submitted_at
+            job.future = None
+            self._finished.append(job.job_id)
+            while len(self._finished) > MAX_FINISHED_JOBS:
+                self.jobs.pop(self._finished.popleft(), None)
+
+        if error is not None:
+            if self.on_error:
+                self.on_error(job, error)
+        elif self.on_complete:
+            self.on_complete(job, result)
+
+    def _mark_running(self, job: Job):
+        """Move a queued job to running"""
+        with self._lock:
+            if job.status != JOB_QUEUED:
+                return
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+        self._notify_progress(job)
+
+    def _listen_progress(self):
+        """Apply progress events sent by pool workers"""
+        while True:
+            event = self._progress_queue.get()
+            if event is None:
+                break
+            job_id, status, _ = event
+            job = self.jobs.get(job_id)
+            if job and status == JOB_RUNNING:
+                self._mark_running(job)
+
+    def _notify_progress(self, job: Job):
+        """Fire on_progress, keeping callback errors away from the caller"""
+        if self.on_progress:
+            try:
+                self.on_progress(job)
+            except Exception as e:
+                print(f"❌ Job progress callback failed: {e}")
@@ -0,0 +1,327 @@
+"""
+Binary Matrix Framing for MatrixMesh
+Sends NumPy arrays as a JSON header line followed by their raw buffers
+"""
+
+import asyncio
+import json
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+try:
+    import scipy.sparse as scipy_sparse
+except ImportError:  # SciPy is optional; sparse results only exist when it is installed
+    scipy_sparse = None
+
+# Only plain numeric buffers may be decoded from the wire
+ALLOWED_KINDS = set('biufc')
+# Buffers in a payload start on this boundary so decoded arrays are aligned
+ALIGNMENT = 8
+# Refuse payloads that would exhaust memory; the buffer is allocated before any data arrives
+MAX_PAYLOAD_BYTES = 256 * 1024 * 1024
+# Connections that have not joined (or registered as a worker) only get this much
+UNJOINED_PAYLOAD_BYTES = 64 * 1024
+# Longest JSON line accepted; large matrices should use binary frames
+MAX_LINE_BYTES = 64 * 1024 * 1024
+ARRAY_KEY = '__ndarray__'
+PAYLOAD_KEY = '__payload__'
+# Sparse matrices travel as their CSR arrays under this key
+SPARSE_KEY = '__sparse__'
+
+
+class FrameError(ValueError):
+    """Raised when a binary frame header is malformed; the stream cannot be resynchronized"""
+
+
+def encode_sparse(matrix) -> dict:
+    """CSR description of a scipy.sparse matrix; only the nonzeros are sent"""
+    csr = matrix.tocsr()
+    return {
+        SPARSE_KEY: 'csr',
+        'shape': list(csr.shape),
+        'data': csr.data,
+        'indices': csr.indices,
+        'indptr': csr.indptr
+    }
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Convert NumPy arrays and scalars inside a message to plain JSON types"""
+    if scipy_sparse is not None and scipy_sparse.issparse(obj):
+        return to_jsonable(encode_sparse(obj))
+    if isinstance(obj, np.ndarray):
+        if np.iscomplexobj(obj):
+            return to_jsonable(obj.tolist())
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return to_jsonable(obj.item())
+    if isinstance(obj, complex):
+        # JSON has no complex type
+        return {'real': obj.real, 'imag': obj.imag}
+    if isinstance(obj, dict):
+        return {key: to_jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(value) for value in obj]
+    return obj
+
+
+def _extract_arrays(obj: Any, arrays: List[np.ndarray]) -> Any:
+    """Replace every ndarray in a message with a placeholder and collect it"""
+    if scipy_sparse is not None and scipy_sparse.issparse(obj):
+        return _extract_arrays(encode_sparse(obj), arrays)
+    if isinstance(obj, np.ndarray):
+        arrays.append(obj)
+        return {ARRAY_KEY: len(arrays) - 1}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, dict):
+        return {key: _extract_arrays(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_extract_arrays(value, arrays) for value in obj]
+    return obj
+
+
+def _insert_arrays(obj: Any, arrays: List[np.ndarray]) -> Any:
+    """Replace placeholders in a decoded header with their arrays"""
+    if isinstance(obj, dict):
+        if len(obj) == 1 and ARRAY_KEY in obj:
+            index = obj[ARRAY_KEY]
+            if not isinstance(index, int) or not 0 <= index < len(arrays):
+                raise FrameError(f"Invalid array reference: {index!r}")
+            return arrays[index]
+        return {key: _insert_arrays(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_insert_arrays(value, arrays) for value in obj]
+    return obj
+
+
+def encode_message(message: dict, binary: bool = False) -> List[Any]:
+    """
+    Encode a message for the wire
+
+    Text mode produces one newline-terminated JSON line with arrays as nested
+    lists. Binary mode produces the JSON header line, with arrays replaced by
+    references and described under PAYLOAD_KEY, followed by each array's raw
+    buffer without copying the array data.
+
+    Returns:
+        List of bytes-like objects to write in order
+    """
+    if not binary:
+        return [(json.dumps(to_jsonable(message)) + "\n").encode('utf-8')]
+
+    arrays: List[np.ndarray] = []
+    header = _extract_arrays(message, arrays)
+    if not arrays:
+        return [(json.dumps(header) + "\n").encode('utf-8')]
+
+    descriptors = []
+    buffers: List[Any] = []
+    offset = 0
+    for array in arrays:
+        if array.dtype.kind not in ALLOWED_KINDS:
+            raise ValueError(f"Cannot send arrays of dtype {array.dtype} in binary form")
+        array = np.ascontiguousarray(array)
+
+        padding = -offset % ALIGNMENT
+        if padding:
+            buffers.append(bytes(padding))
+            offset += padding
+
+        descriptors.append({
+            'dtype': array.dtype.str,  # includes byte order, e.g. '<f8'
+            'shape': list(array.shape),
+            'offset': offset,
+            'nbytes': array.nbytes
+        })
+        if array.nbytes:
+            buffers.append(memoryview(array.reshape(-1).view(np.uint8)))
+        offset += array.nbytes
+
+    header[PAYLOAD_KEY] = {'arrays': descriptors, 'payload_bytes': offset}
+    return [(json.dumps(header) + "\n").encode('utf-8')] + buffers
+
+
+def payload_size(header: dict, limit: int = MAX_PAYLOAD_BYTES) -> int:
+    """Number of raw bytes that follow a header line (0 for plain JSON messages)"""
+    descriptor = header.get(PAYLOAD_KEY)
+    if descriptor is None:
+        return 0
+    if not isinstance(descriptor, dict):
+        raise FrameError("Invalid payload descriptor")
+
+    size = descriptor.get('payload_bytes')
+    if not isinstance(size, int) or size < 0:
+        raise FrameError(f"Invalid payload size: {size!r}")
+    if size > limit:
+        raise FrameError(f"Payload of {size} bytes exceeds limit of {limit}")
+    return size
+
+
+def decode_message(header: dict, payload=None) -> dict:
+    """
+    Rebuild a message from its header and raw payload
+
+    Arrays are views into the payload buffer (np.frombuffer), so decoding
+    does not copy the matrix data.
+    """
+    descriptor = header.pop(PAYLOAD_KEY, None)
+    if not descriptor:
+        return header
+
+    payload = payload if payload is not None else b''
+    arrays = []
+    for array_info in descriptor.get('arrays', []):
+        try:
+            dtype = np.dtype(array_info['dtype'])
+            shape = tuple(int(dim) for dim in array_info['shape'])
+            offset = int(array_info['offset'])
+        except (KeyError, TypeError, ValueError) as e:
+            raise FrameError(f"Invalid array descriptor: {e}")
+
+        if dtype.kind not in ALLOWED_KINDS:
+            raise FrameError(f"Unsupported dtype: {dtype}")
+        if any(dim < 0 for dim in shape):
+            raise FrameError(f"Invalid shape: {shape}")
+
+        count = int(np.prod(shape, dtype=np.int64))
+        if offset < 0 or offset + count * dtype.itemsize > len(payload):
+            raise FrameError("Array descriptor points outside the payload")
+
+        arrays.append(np.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(shape))
+
+    return _insert_arrays(header, arrays)
+
+
+def parse_header(line: bytes) -> Optional[dict]:
+    """Decode one JSON line; blank, malformed and non-object lines give None"""
+    if not line.strip():
+        return None
+    try:
+        header = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        print(f"⚠️ Skipping malformed message ({len(line)} bytes)")
+        return None
+    return header if isinstance(header, dict) else None
+
+
+async def read_message_async(reader: asyncio.StreamReader,
+                             on_bytes: Optional[Callable[[int], None]] = None,
+                             max_payload: int = MAX_PAYLOAD_BYTES) -> Optional[dict]:
+    """
+    Read the next message from an asyncio stream
+
+    Returns None when the connection closes. A line longer than the stream's
+    limit, a payload larger than max_payload or a malformed binary header
+    raises FrameError. on_bytes, if given, is called with the wire size of
+    each message read.
+    """
+    while True:
+        try:
+            line = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise FrameError("Message line exceeds the size limit")
+
+        header = parse_header(line)
+        if header is None:
+            continue
+
+        size = payload_size(header, max_payload)
+        if on_bytes is not None:
+            on_bytes(len(line) + size)
+        if not size:
+            return decode_message(header)
+
+        try:
+            payload = await reader.readexactly(size)
+        except asyncio.IncompleteReadError:
+            return None
+        return decode_message(header, payload)
+
+
+def send_buffers(sock, buffers: List[Any]) -> None:
+    """Write encoded buffers to a socket"""
+    if len(buffers) == 1:
+        sock.sendall(buffers[0])
+        return
+    for buffer in buffers:
+        sock.sendall(buffer)
+
+
+class FrameReader:
+    """Reads newline-delimited JSON messages, with optional binary payloads, from a socket"""
+
+    def __init__(self, sock, recv_size: int = 65536, on_bytes: Optional[Callable[[int], None]] = None,
+                 max_line: int = MAX_LINE_BYTES, max_payload: int = MAX_PAYLOAD_BYTES):
+        self.sock = sock
+        self.recv_size = recv_size
+        self.on_bytes = on_bytes  # called with the wire size of each message read
+        self.max_line = max_line
+        self.max_payload = max_payload  # may be raised once the peer is trusted
+        self._buffer = bytearray()
+        self._scanned = 0  # bytes already searched for a newline
+
+    def read_message(self) -> Optional[dict]:
+        """
+        Read the next message
+
+        Returns None when the connection closes. Lines that are not valid JSON
+        are skipped; a line longer than max_line, a payload larger than
+        max_payload or a malformed binary header raises FrameError.
+        """
+        while True:
+            newline = self._buffer.find(b"\n", self._scanned)
+            if newline < 0:
+                if len(self._buffer) > self.max_line:
+                    raise FrameError("Message line exceeds the size limit")
+                self._scanned = len(self._buffer)
+                if not self._fill():
+                    return None
+                continue
+
+            if newline > self.max_line:
+                raise FrameError("Message line exceeds the size limit")
+            line = bytes(self._buffer[:newline])
+            del self._buffer[:newline + 1]
+            self._scanned = 0
+
+            header = parse_header(line)
+            if header is None:
+                continue
+
+            size = payload_size(header, self.max_payload)
+            if self.on_bytes is not None:
+                self.on_bytes(len(line) + 1 + size)
+            if not size:
+                return decode_message(header)
+
+            payload = self._read_payload(size)
+            if payload is None:
+                return None
+            return decode_message(header, payload)
+
+    def _fill(self) -> bool:
+        """Receive more bytes into the line buffer"""
+        data = self.sock.recv(self.recv_size)
+        if not data:
+            return False
+        self._buffer += data
+        return True
+
+    def _read_payload(self, size: int) -> Optional[bytearray]:
+        """Read exactly size raw bytes, receiving straight into the final buffer"""
+        payload = bytearray(size)
+        view = memoryview(payload)
+        have = min(len(self._buffer), size)
+        view[:have] = self._buffer[:have]
+        del self._buffer[:have]
+
+        while have < size:
+            count = self.sock.recv_into(view[have:], size - have)
+            if not count:
+                return None
+            have += count
+        return payload
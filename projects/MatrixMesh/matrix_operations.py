@@ -4,9 +4,21 @@ Handles various matrix operations for the chat server
 """
 
 import numpy as np
+import functools
+import io
 import json
 import re
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Union
+
+import solvers
+from matrix_codec import to_jsonable
+from metrics import log_event
+from sparse_matrices import (MATRIX_MARKET_HEADER, SPARSE_NPZ_KEYS, from_description, is_sparse,
+                             is_sparse_description, load_sparse_npz, parse_matrix_market)
+
+# Leading bytes of NumPy's binary file formats
+NPY_MAGIC = b'\x93NUMPY'
+NPZ_MAGIC = b'PK\x03\x04'
 
 
 class MatrixProcessor:
@@ -19,16 +31,25 @@ class MatrixProcessor:
             'determinant': self.determinant,
             'inverse': self.inverse_matrix,
             'eigenvalues': self.eigenvalues,
+            'solve': self.solve,
+            'stack': self.stack_matrices,
             'display': self.display_matrix
         }
 
     # ---------------- CORE LOGIC ---------------- #
 
-    def process_matrix_data(self, matrix_data: str, operation: str = 'display') -> Dict[str, Any]:
+    def process_matrix_data(self, matrix_data: str, operation: str = 'display', raw: bool = False) -> Dict[str, Any]:
         """Process matrix data from file content or direct input"""
         try:
             matrices = self.parse_matrix_data(matrix_data)
+        except Exception as e:
+            raise Exception(f"Matrix processing error: {str(e)}")
+        return self.process_parsed_matrices(matrices, operation, raw=raw)
 
+    def process_parsed_matrices(self, matrices: List[np.ndarray], operation: str = 'display',
+                                raw: bool = False) -> Dict[str, Any]:
+        """Process already parsed file matrices, adjusting the operation to the matrix count"""
+        try:
             if len(matrices) == 0:
                 raise ValueError("No valid matrices found in the data")
 
@@ -38,7 +59,7 @@ class MatrixProcessor:
             elif len(matrices) == 2 and operation in ['transpose', 'determinant', 'inverse', 'eigenvalues']:
                 operation = 'add'
 
-            result = self.perform_operation(operation, matrices)
+            result = self.perform_operation(operation, matrices, raw=raw)
             return result
 
         except Exception as e:
@@ -46,13 +67,27 @@ class MatrixProcessor:
 
     # ---------------- PARSING ---------------- #
 
-    def parse_matrix_data(self, data: str) -> List[np.ndarray]:
-        """Parse matrix data from various formats"""
+    def parse_matrix_data(self, data: Union[str, bytes]) -> List[np.ndarray]:
+        """Parse matrix data from various formats (JSON, CSV, whitespace text, Matrix Market, .npy/.npz bytes)"""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data)
+            if data.startswith(NPY_MAGIC) or data.startswith(NPZ_MAGIC):
+                return self.parse_numpy_file(data)
+            data = data.decode('utf-8')
+
+        if data.lstrip().startswith(MATRIX_MARKET_HEADER):
+            # Coordinate (COO triplet) files stay sparse
+            return parse_matrix_market(data)
+
         try:
             json_data = json.loads(data)
             matrices = []
 
-            if isinstance(json_data, list) and len(json_data) > 0:
+            if is_sparse_description(json_data):
+                matrices = [from_description(json_data)]
+            elif isinstance(json_data, list) and json_data and all(map(is_sparse_description, json_data)):
+                matrices = [from_description(m) for m in json_data]
+            elif isinstance(json_data, list) and len(json_data) > 0:
                 if isinstance(json_data[0], list):
                     if isinstance(json_data[0][0], list):
                         # 3D array (list of matrices)
@@ -71,6 +106,27 @@ class MatrixProcessor:
 
         return matrices
 
+    @staticmethod
+    def parse_numpy_file(data: bytes) -> List[np.ndarray]:
+        """Load matrices from the bytes of a .npy or .npz file"""
+        loaded = np.load(io.BytesIO(data), allow_pickle=False)
+        if isinstance(loaded, np.lib.npyio.NpzFile):
+            with loaded:
+                if SPARSE_NPZ_KEYS <= set(loaded.files):
+                    # Written by scipy.sparse.save_npz
+                    return [load_sparse_npz(data)]
+                arrays = [loaded[name] for name in loaded.files]
+        else:
+            arrays = [loaded]
+
+        matrices = []
+        for array in arrays:
+            if array.ndim == 3:
+                matrices.extend(array)  # stack of matrices
+            else:
+                matrices.append(np.atleast_2d(array))
+        return matrices
+
     def parse_text_matrices(self, text: str) -> List[np.ndarray]:
         """Parse matrices from text format"""
         matrices = []
@@ -81,31 +137,62 @@ class MatrixProcessor:
             if not block:
                 continue
 
-            rows = []
-            for line in block.split('\n'):
-                numbers = re.findall(r'-?\d+\.?\d*', line)
-                if numbers:
-                    rows.append([float(x) for x in numbers])
-
-            if rows:
-                max_cols = max(len(row) for row in rows)
-                normalized = [row + [0.0] * (max_cols - len(row)) for row in rows]
-                matrices.append(np.array(normalized))
+            matrix = self._parse_block_fast(block)
+            if matrix is None:
+                matrix = self._parse_block_lenient(block)
+            if matrix is not None:
+                matrices.append(matrix)
 
         return matrices
 
+    @staticmethod
+    def _parse_block_fast(block: str):
+        """Bulk-convert a rectangular CSV or whitespace block in C; None if it is not one"""
+        first_line = block.split('\n', 1)[0]
+        delimiter = ',' if ',' in first_line else None
+        try:
+            matrix = np.loadtxt(io.StringIO(block), delimiter=delimiter, ndmin=2, dtype=float)
+        except ValueError:
+            # Ragged rows, labels or other free-form text
+            return None
+        return matrix if matrix.size else None
+
+    @staticmethod
+    def _parse_block_lenient(block: str):
+        """Extract every number line by line, padding short rows with zeros"""
+        rows = []
+        for line in block.split('\n'):
+            numbers = re.findall(r'-?\d+\.?\d*', line)
+            if numbers:
+                rows.append([float(x) for x in numbers])
+
+        if not rows:
+            return None
+        max_cols = max(len(row) for row in rows)
+        normalized = [row + [0.0] * (max_cols - len(row)) for row in rows]
+        return np.array(normalized)
+
     # ---------------- MAIN OPERATION CALLER ---------------- #
 
-    def perform_operation(self, operation: str, matrices: List[Any]) -> Dict[str, Any]:
-        """Perform the specified matrix operation with full NumPy normalization"""
-        if operation not in self.supported_operations:
-            raise ValueError(f"Unsupported operation: {operation}")
+    def perform_operation(self, operation: str, matrices: List[Any], raw: bool = False) -> Dict[str, Any]:
+        """Perform the specified matrix operation with full NumPy normalization
+
+        With raw=True the result keeps its NumPy arrays (for binary transport);
+        otherwise arrays are converted to nested lists for JSON.
+        """
+        if MatrixPipeline.SEPARATOR in operation:
+            pipeline = MatrixPipeline.parse(self, operation)
+            function = pipeline.evaluate
+        else:
+            function = self.resolve_operation(operation)
 
-        # Convert every element safely to np.ndarray
+        # Convert every element safely to np.ndarray; sparse input stays sparse
         np_matrices = []
         for m in matrices:
-            if isinstance(m, np.ndarray):
+            if isinstance(m, np.ndarray) or is_sparse(m):
                 np_matrices.append(m)
+            elif is_sparse_description(m):
+                np_matrices.append(from_description(m))
             elif isinstance(m, list):
                 np_matrices.append(np.array(m))
             else:
@@ -114,29 +201,51 @@ class MatrixProcessor:
                 except Exception:
                     raise ValueError(f"Invalid matrix type: {type(m)}")
 
-        # Debug: show matrix shapes being processed
-        print(f"[DEBUG] Performing '{operation}' on {[m.shape for m in np_matrices]}")
+        log_event('operation', operation=operation, shapes=[m.shape for m in np_matrices])
 
         try:
-            result = self.supported_operations[operation](np_matrices)
-            return result
+            result = function(np_matrices)
+            return result if raw else to_jsonable(result)
         except Exception as e:
             raise Exception(f"Operation '{operation}' failed: {str(e)}")
 
+    def resolve_operation(self, operation: str) -> Callable[[List[np.ndarray]], Dict[str, Any]]:
+        """Function for an operation name with an optional structure hint, e.g. inverse:symmetric"""
+        name, _, structure = operation.partition(solvers.STRUCTURE_SEPARATOR)
+        name, structure = name.strip(), structure.strip()
+        if name not in self.supported_operations:
+            raise ValueError(f"Unsupported operation: {operation}")
+        if not structure:
+            return self.supported_operations[name]
+        if name not in self.STRUCTURED_OPERATIONS:
+            raise ValueError(f"'{name}' does not take a structure hint")
+        if structure not in solvers.STRUCTURES:
+            raise ValueError(f"Unknown matrix structure '{structure}'; use one of {', '.join(solvers.STRUCTURES)}")
+        return functools.partial(self.supported_operations[name], structure=structure)
+
     # ---------------- OPERATIONS ---------------- #
 
+    # Operations that detect matrix structure and accept a hint for it
+    STRUCTURED_OPERATIONS = ('determinant', 'inverse', 'eigenvalues', 'solve')
+
     def add_matrices(self, matrices: List[np.ndarray]) -> Dict[str, Any]:
         if len(matrices) < 2:
             raise ValueError("Addition requires at least 2 matrices")
 
-        result = matrices[0].copy()
         for m in matrices[1:]:
-            if result.shape != m.shape:
-                raise ValueError(f"Matrix shapes don't match for addition: {result.shape} vs {m.shape}")
-            result += m
+            if matrices[0].shape != m.shape:
+                raise ValueError(f"Matrix shapes don't match for addition: {matrices[0].shape} vs {m.shape}")
+
+        # The first sum allocates the result (with the promoted dtype); the rest accumulate in place
+        result = self._plain(matrices[0] + matrices[1])
+        for m in matrices[2:]:
+            if is_sparse(result) or is_sparse(m):
+                result = self._plain(result + m)
+            else:
+                result += m
 
         return {
-            'matrix': result.tolist(),
+            'matrix': result,
             'shape': result.shape,
             'description': f"Sum of {len(matrices)} matrices"
         }
@@ -149,20 +258,21 @@ class MatrixProcessor:
         if a.shape != b.shape:
             raise ValueError(f"Matrix shapes don't match for subtraction: {a.shape} vs {b.shape}")
 
-        result = a - b
-        return {'matrix': result.tolist(), 'shape': result.shape, 'description': "Difference of matrices"}
+        result = self._plain(a - b)
+        return {'matrix': result, 'shape': result.shape, 'description': "Difference of matrices"}
 
     def multiply_matrices(self, matrices: List[np.ndarray]) -> Dict[str, Any]:
         if len(matrices) != 2:
             raise ValueError("Matrix multiplication requires exactly 2 matrices")
 
         a, b = matrices
-        if a.shape[1] != b.shape[0]:
+        if a.ndim < 2 or b.ndim < 2 or a.shape[-1] != b.shape[-2]:
             raise ValueError(f"Cannot multiply matrices: {a.shape} × {b.shape}")
 
-        result = np.dot(a, b)
+        # matmul also multiplies stacks of matrices pairwise; sparse @ sparse stays sparse
+        result = self._plain(a @ b)
         return {
-            'matrix': result.tolist(),
+            'matrix': result,
             'shape': result.shape,
             'description': f"Product of {a.shape} and {b.shape} matrices"
         }
@@ -171,65 +281,136 @@ class MatrixProcessor:
         if len(matrices) != 1:
             raise ValueError("Transpose requires exactly 1 matrix")
 
-        matrix = np.array(matrices[0])
-        print(type(matrix))
-        result = matrix.T
+        if is_sparse(matrices[0]):
+            matrix = matrices[0]
+            result = matrix.T.tocsr()
+        else:
+            matrix = np.asarray(matrices[0])
+            result = np.swapaxes(matrix, -1, -2)
         return {
-            'matrix': result.tolist(),
+            'matrix': result,
             'shape': result.shape,
             'description': f"Transpose of {matrix.shape} matrix"
         }
 
-    def determinant(self, matrices: List[np.ndarray]) -> Dict[str, Any]:
+    def determinant(self, matrices: List[np.ndarray], structure: str = 'auto') -> Dict[str, Any]:
         if len(matrices) != 1:
             raise ValueError("Determinant requires exactly 1 matrix")
 
-        matrix = np.array(matrices[0])
-        if matrix.shape[0] != matrix.shape[1]:
-            raise ValueError("Determinant only valid for square matrices")
-
-        det = np.linalg.det(matrix)
-        return {'determinant': float(det), 'matrix': matrix.tolist(), 'description': f"Determinant of {matrix.shape}"}
+        matrix = self._square(matrices[0], "Determinant")
+        # slogdet-style results stay usable where det itself over- or underflows
+        sign, log_abs, method = solvers.log_determinant(matrix, structure)
+        with np.errstate(over='ignore', under='ignore'):
+            det = sign * np.exp(log_abs)
+        det = np.asarray(det)
+        return {
+            'determinant': det.item() if det.ndim == 0 else det,
+            'sign': np.asarray(sign).item() if np.ndim(sign) == 0 else sign,
+            'log_abs_determinant': float(log_abs) if np.ndim(log_abs) == 0 else log_abs,
+            'matrix': matrix,
+            'method': method,
+            'description': f"Determinant of {matrix.shape} ({method})"
+        }
 
-    def inverse_matrix(self, matrices: List[np.ndarray]) -> Dict[str, Any]:
+    def inverse_matrix(self, matrices: List[np.ndarray], structure: str = 'auto') -> Dict[str, Any]:
         if len(matrices) != 1:
             raise ValueError("Inverse requires exactly 1 matrix")
 
-        matrix = np.array(matrices[0])
-        if matrix.shape[0] != matrix.shape[1]:
-            raise ValueError("Inverse only valid for square matrices")
+        matrix = self._square(matrices[0], "Inverse")
 
         try:
-            result = np.linalg.inv(matrix)
+            result, method = solvers.inverse(matrix, structure)
             return {
-                'matrix': result.tolist(),
+                'matrix': result,
                 'shape': result.shape,
-                'description': f"Inverse of {matrix.shape} matrix"
+                'method': method,
+                'description': f"Inverse of {matrix.shape} matrix ({method})"
             }
         except np.linalg.LinAlgError:
             raise ValueError("Matrix is singular and cannot be inverted")
 
-    def eigenvalues(self, matrices: List[np.ndarray]) -> Dict[str, Any]:
+    def eigenvalues(self, matrices: List[np.ndarray], structure: str = 'auto') -> Dict[str, Any]:
         if len(matrices) != 1:
             raise ValueError("Eigenvalue calculation requires exactly 1 matrix")
 
-        matrix = np.array(matrices[0])
-        if matrix.shape[0] != matrix.shape[1]:
-            raise ValueError("Eigenvalues only valid for square matrices")
+        matrix = self._square(matrices[0], "Eigenvalues")
+
+        vals, vecs, method = solvers.eigen(matrix, structure)
+        return {
+            'eigenvalues': vals,
+            'eigenvectors': vecs,
+            'method': method,
+            'description': f"Eigenvalues and eigenvectors of {matrix.shape} matrix ({method})"
+        }
+
+    def solve(self, matrices: List[np.ndarray], structure: str = 'auto') -> Dict[str, Any]:
+        if len(matrices) != 2:
+            raise ValueError("Solve requires a matrix A and a right-hand side b")
+
+        a = self._square(matrices[0], "Solve")
+        b = np.asarray(matrices[1])
+        rows = b.shape[0] if b.ndim == 1 else b.shape[-2]
+        if rows != a.shape[-1]:
+            raise ValueError(f"Right-hand side has {rows} rows, expected {a.shape[-1]}")
+
+        # Solving A·x = b directly is faster and more accurate than forming inv(A) @ b
+        try:
+            result, method = solvers.solve(a, b, structure)
+        except np.linalg.LinAlgError as e:
+            raise ValueError(f"Cannot solve system: {e}")
+        return {
+            'matrix': result,
+            'shape': result.shape,
+            'method': method,
+            'description': f"Solution of A·x = b for {a.shape} A ({method})"
+        }
+
+    def stack_matrices(self, matrices: List[np.ndarray]) -> Dict[str, Any]:
+        if len(matrices) < 1:
+            raise ValueError("Stacking requires at least 1 matrix")
+
+        if any(is_sparse(m) for m in matrices):
+            raise ValueError("Sparse matrices cannot be stacked; they are only 2-D")
+        shapes = {m.shape for m in matrices}
+        if len(shapes) > 1:
+            raise ValueError(f"Only matrices of the same shape can be stacked: {sorted(shapes)}")
 
-        vals, vecs = np.linalg.eig(matrix)
+        # One (N, rows, cols) array lets the following operations run as single batched calls
+        result = np.stack(matrices)
         return {
-            'eigenvalues': vals.tolist(),
-            'eigenvectors': vecs.tolist(),
-            'description': f"Eigenvalues and eigenvectors of {matrix.shape} matrix"
+            'matrix': result,
+            'shape': result.shape,
+            'description': f"Stack of {len(matrices)} {matrices[0].shape} matrices"
         }
 
+    @staticmethod
+    def _square(matrix: Any, name: str) -> np.ndarray:
+        """A square matrix, or a stack of them, without copying"""
+        if not is_sparse(matrix):
+            matrix = np.asarray(matrix)
+        if matrix.ndim < 2 or matrix.shape[-1] != matrix.shape[-2]:
+            raise ValueError(f"{name} only valid for square matrices")
+        return matrix
+
+    @staticmethod
+    def _plain(result: Any) -> Any:
+        """Mixed sparse/dense arithmetic gives np.matrix; use a plain array instead"""
+        return np.asarray(result) if isinstance(result, np.matrix) else result
+
     def display_matrix(self, matrices: List[np.ndarray]) -> Dict[str, Any]:
         results = []
         for i, m in enumerate(matrices):
-            m = np.array(m)
+            if is_sparse(m):
+                results.append({
+                    'matrix': m,
+                    'shape': m.shape,
+                    'nnz': m.nnz,
+                    'description': f"Sparse matrix {i+1} ({m.shape[0]}×{m.shape[1]}, {m.nnz} nonzeros)"
+                })
+                continue
+            m = np.asarray(m)
             results.append({
-                'matrix': m.tolist(),
+                'matrix': m,
                 'shape': m.shape,
                 'description': f"Matrix {i+1} ({m.shape[0]}×{m.shape[1]})"
             })
@@ -251,4 +432,95 @@ class MatrixProcessor:
             return "Empty matrix"
 
         rows = ["[" + " ".join(f"{val:8.3f}" for val in row) + "]" for row in matrix]
-        return "\n".join(rows)
\ No newline at end of file
+        return "\n".join(rows)
+
+
+class MatrixPipeline:
+    """
+    A chain of operations such as "multiply -> inverse -> eigenvalues"
+
+    The chain is checked when it is built and only evaluated on demand. Each
+    step hands its result matrix to the next as a NumPy array. The first step
+    takes as many input matrices as it needs. A later binary step combines the
+    running result with the next unused input, so "multiply -> multiply"
+    computes (A @ B) @ C. Use "stack -> ..." to run the remaining steps as
+    batched calls over a stack of same-shaped matrices.
+    """
+
+    SEPARATOR = '->'
+    BINARY_OPERATIONS = ('add', 'subtract', 'multiply', 'solve')
+    # Operations that consume every remaining input
+    VARIADIC_OPERATIONS = ('stack', 'display')
+    # Operations whose result is a matrix that a further step can use
+    MATRIX_OPERATIONS = ('add', 'subtract', 'multiply', 'transpose', 'inverse', 'solve', 'stack')
+
+    def __init__(self, processor: MatrixProcessor, steps: List[str]):
+        if not steps:
+            raise ValueError("Pipeline has no steps")
+        self.functions = []
+        for i, spec in enumerate(steps):
+            try:
+                self.functions.append(processor.resolve_operation(spec))
+            except ValueError as e:
+                raise ValueError(f"Invalid pipeline step: {e}")
+            step = self._name(spec)
+            if i < len(steps) - 1 and step not in self.MATRIX_OPERATIONS:
+                raise ValueError(f"'{step}' does not produce a matrix and must be the last step")
+            if i > 0 and step in self.VARIADIC_OPERATIONS:
+                raise ValueError(f"'{step}' can only be the first step")
+
+        self.processor = processor
+        self.steps = steps
+
+    @classmethod
+    def parse(cls, processor: MatrixProcessor, spec: str) -> 'MatrixPipeline':
+        """Build a pipeline from "op -> op -> ..." text"""
+        return cls(processor, [step.strip().lower() for step in spec.split(cls.SEPARATOR)])
+
+    @staticmethod
+    def _name(step: str) -> str:
+        """Operation name of a step, without its structure hint"""
+        return step.partition(solvers.STRUCTURE_SEPARATOR)[0].strip()
+
+    def plan(self, input_count: int) -> List[int]:
+        """Number of input matrices each step consumes; raises before anything is computed"""
+        names = [self._name(step) for step in self.steps]
+        first = names[0]
+        if first in self.VARIADIC_OPERATIONS:
+            counts = [input_count]
+        else:
+            counts = [2 if first in self.BINARY_OPERATIONS else 1]
+        counts += [1 if name in self.BINARY_OPERATIONS else 0 for name in names[1:]]
+
+        if sum(counts) != input_count:
+            raise ValueError(f"Pipeline '{self}' needs {sum(counts)} matrices, got {input_count}")
+        return counts
+
+    def evaluate(self, matrices: List[np.ndarray]) -> Dict[str, Any]:
+        """Run every step; intermediate results stay NumPy arrays"""
+        counts = self.plan(len(matrices))
+        pending = list(matrices)
+        current: List[np.ndarray] = []
+        trace = []
+        result: Dict[str, Any] = {}
+
+        for step, function, count in zip(self.steps, self.functions, counts):
+            operands = current + pending[:count]
+            del pending[:count]
+            try:
+                result = function(operands)
+            except Exception as e:
+                raise ValueError(f"step '{step}' failed: {e}")
+
+            if self._name(step) in self.MATRIX_OPERATIONS:
+                current = [result['matrix']]
+                trace.append({'operation': step, 'shape': result['matrix'].shape})
+            else:
+                trace.append({'operation': step})
+
+        result['pipeline'] = trace
+        result['description'] = f"{result.get('description', '')} (pipeline: {self})"
+        return result
+
+    def __str__(self) -> str:
+        return f" {self.SEPARATOR} ".join(self.steps)
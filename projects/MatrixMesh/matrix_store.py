@@ -0,0 +1,203 @@
+"""
+Matrix Store for MatrixMesh
+Keeps uploaded and computed matrices as .npy files on disk instead of in memory
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from out_of_core import open_matrix
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class MatrixStore:
+    """
+    Directory of .npy matrices addressed by matrix ID
+
+    Uploads arrive in chunks that are appended straight to a file, so a
+    matrix never has to fit in memory. Matrices are opened with
+    np.load(mmap_mode='r') when an operation needs them.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._temporary = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix='matrixmesh-store-')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._matrices: Dict[str, Dict[str, Any]] = {}
+        self._uploads: Dict[Tuple[Any, str], Dict[str, Any]] = {}  # (owner, upload_id) -> partial file
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # ---------------- UPLOADS ---------------- #
+
+    def write_chunk(self, owner: Any, upload_id: str, data, filename: Optional[str] = None) -> int:
+        """Append one chunk to an upload, starting it on the first chunk; returns bytes received"""
+        size = memoryview(data).nbytes
+        key = (owner, upload_id)
+        with self._lock:
+            upload = self._uploads.get(key)
+            if upload is None:
+                matrix_id = self._new_id()
+                upload = self._uploads[key] = {
+                    'matrix_id': matrix_id,
+                    'path': self.path(matrix_id),
+                    'filename': filename or f"{matrix_id}.npy",
+                    'size': 0
+                }
+                upload['file'] = open(upload['path'], 'wb')
+            if self._bytes + size > self.max_bytes:
+                self._abort_locked(key)
+                raise ValueError(f"Matrix store is full ({self.max_bytes} bytes)")
+            upload['size'] += size
+            self._bytes += size
+
+        upload['file'].write(data)
+        return upload['size']
+
+    def finish_upload(self, owner: Any, upload_id: str) -> Dict[str, Any]:
+        """Close an upload and check that it is a numeric 2-D .npy file"""
+        key = (owner, upload_id)
+        with self._lock:
+            upload = self._uploads.pop(key, None)
+        if upload is None:
+            raise ValueError(f"Unknown upload {upload_id}")
+
+        upload['file'].close()
+        try:
+            matrix = open_matrix(upload['path'])
+        except Exception as e:
+            self._remove_file(upload['path'], upload['size'])
+            raise ValueError(f"Not a usable .npy matrix: {e}")
+
+        info = {
+            'matrix_id': upload['matrix_id'],
+            'filename': upload['filename'],
+            'shape': list(matrix.shape),
+            'dtype': matrix.dtype.str,
+            'nbytes': upload['size']
+        }
+        del matrix
+        with self._lock:
+            self._matrices[info['matrix_id']] = info
+        return info
+
+    def abort_uploads(self, owner: Any) -> None:
+        """Drop every unfinished upload of a disconnected client"""
+        with self._lock:
+            for key in [key for key in self._uploads if key[0] is owner]:
+                self._abort_locked(key)
+
+    # ---------------- MATRICES ---------------- #
+
+    def reserve(self) -> Tuple[str, str]:
+        """ID and path for a result an operation is about to write"""
+        matrix_id = self._new_id()
+        return matrix_id, self.path(matrix_id)
+
+    def register(self, matrix_id: str, filename: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Add a result file written at a reserved path"""
+        path = self.path(matrix_id)
+        try:
+            matrix = open_matrix(path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not register stored matrix {matrix_id}: {e}")
+            return None
+
+        info = {
+            'matrix_id': matrix_id,
+            'filename': filename or f"{matrix_id}.npy",
+            'shape': list(matrix.shape),
+            'dtype': matrix.dtype.str,
+            'nbytes': os.path.getsize(path)
+        }
+        del matrix
+        with self._lock:
+            self._matrices[matrix_id] = info
+            self._bytes += info['nbytes']
+        return info
+
+    def get(self, matrix_id: str) -> Optional[Dict[str, Any]]:
+        """Description of a stored matrix"""
+        with self._lock:
+            return self._matrices.get(matrix_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Descriptions of all stored matrices"""
+        with self._lock:
+            return list(self._matrices.values())
+
+    def path(self, matrix_id: str) -> str:
+        return os.path.join(self.directory, f"{matrix_id}.npy")
+
+    def paths(self, matrix_ids: List[str]) -> List[str]:
+        """File paths of stored matrices; raises ValueError for unknown IDs"""
+        with self._lock:
+            missing = [matrix_id for matrix_id in matrix_ids if matrix_id not in self._matrices]
+        if missing:
+            raise ValueError(f"Unknown stored matrix: {', '.join(map(str, missing))}")
+        return [self.path(matrix_id) for matrix_id in matrix_ids]
+
+    def delete(self, matrix_id: str) -> bool:
+        """Remove a stored matrix"""
+        with self._lock:
+            info = self._matrices.pop(matrix_id, None)
+        if info is None:
+            return False
+        self._remove_file(self.path(matrix_id), info['nbytes'])
+        return True
+
+    # ---------------- DOWNLOADS ---------------- #
+
+    def chunk_count(self, matrix_id: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> int:
+        """Number of chunks a download of the .npy file takes"""
+        info = self.get(matrix_id)
+        if info is None:
+            raise ValueError(f"Unknown stored matrix: {matrix_id}")
+        return max(1, math.ceil(info['nbytes'] / chunk_size))
+
+    def read_chunk(self, matrix_id: str, seq: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> bytes:
+        """One chunk of a stored .npy file"""
+        with open(self.path(matrix_id), 'rb') as f:
+            f.seek(seq * chunk_size)
+            return f.read(chunk_size)
+
+    def close(self) -> None:
+        """Close open uploads, and delete the directory if it was a temporary one"""
+        with self._lock:
+            for key in list(self._uploads):
+                self._abort_locked(key)
+        if self._temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    # ---------------- INTERNALS ---------------- #
+
+    @staticmethod
+    def _new_id() -> str:
+        return 'mx-' + uuid.uuid4().hex[:10]
+
+    def _abort_locked(self, key) -> None:
+        """Discard a partial upload; caller must hold the lock"""
+        upload = self._uploads.pop(key)
+        upload['file'].close()
+        self._bytes -= upload['size']
+        try:
+            os.remove(upload['path'])
+        except OSError:
+            pass
+
+    def _remove_file(self, path: str, size: int) -> None:
+        with self._lock:
+            self._bytes -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,321 @@
+"""
+Server Metrics for MatrixMesh
+Counters, gauges and latency histograms, a Prometheus text endpoint and sampled structured logs
+"""
+
+import bisect
+import json
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# Upper bounds of the latency buckets, in seconds
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Upper bounds of the matrix size buckets, in elements
+ELEMENT_BUCKETS = (10, 100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+# Fraction of routine events written to the structured log
+LOG_SAMPLE_RATE = float(os.environ.get('MATRIXMESH_LOG_SAMPLE_RATE', '0.01'))
+DEFAULT_SUMMARY_INTERVAL = 60.0
+
+logger = logging.getLogger('matrixmesh')
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def log_event(event: str, sample_rate: Optional[float] = None, **fields: Any) -> None:
+    """
+    Write one JSON log line for an event, keeping only a sample of them
+
+    Routine per-message events are sampled so that logging never costs more
+    than the work it describes; pass sample_rate=1 for events that must
+    always be logged.
+    """
+    rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate < 1 and random.random() >= rate:
+        return
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    record = {'ts': round(time.time(), 3), 'event': event}
+    record.update(fields)
+    logger.info(json.dumps(record, default=str))
+
+
+def operation_label(operation: str, known: Iterable[str]) -> str:
+    """Bounded metric label for an operation name (hints and pipelines collapse)"""
+    if '->' in operation:
+        return 'pipeline'
+    name = operation.partition(':')[0].strip()
+    return name if name in known else 'other'
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets: Tuple[float, ...] = SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate of a quantile, interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and histograms
+
+    Metrics are keyed by name and a set of labels. Gauges can also be
+    functions evaluated at scrape time, so values such as the number of
+    connected clients never go stale.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._gauge_functions: Dict[str, Tuple[Callable[[], Any], Optional[str]]] = {}
+        self.started_at = time.time()
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        """Declare a metric's type and help line"""
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[self._key(labels)] = value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = SECONDS_BUCKETS,
+                **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def gauge_function(self, name: str, function: Callable[[], Any], label: Optional[str] = None) -> None:
+        """Gauge read at scrape time; with a label, the function returns {label value: number}"""
+        self._gauge_functions[name] = (function, label)
+
+    # ---------------- EXPORT ---------------- #
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            histograms = {name: {key: (h.buckets, list(h.counts), h.count, h.sum) for key, h in series.items()}
+                          for name, series in self._histograms.items()}
+
+        for name, (function, label) in self._gauge_functions.items():
+            try:
+                value = function()
+            except Exception:
+                continue
+            if label is None:
+                gauges[name] = {(): value}
+            else:
+                gauges[name] = {((label, str(key)),): number for key, number in value.items()}
+
+        for name, series in sorted(counters.items()):
+            self._header(lines, name, 'counter')
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{self._format_labels(key)} {self._number(value)}")
+        for name, series in sorted(gauges.items()):
+            self._header(lines, name, 'gauge')
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{self._format_labels(key)} {self._number(value)}")
+        for name, series in sorted(histograms.items()):
+            self._header(lines, name, 'histogram')
+            for key, (buckets, counts, count, total) in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    le = bound if bound == '+Inf' else self._number(bound)
+                    lines.append(f"{name}_bucket{self._format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{self._format_labels(key)} {self._number(total)}")
+                lines.append(f"{name}_count{self._format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, histogram: str, by: str) -> Dict[str, Dict[str, float]]:
+        """Count, mean, p50 and p95 of a histogram, grouped by one label"""
+        groups: Dict[str, Histogram] = {}
+        with self._lock:
+            for key, source in self._histograms.get(histogram, {}).items():
+                value = dict(key).get(by, '')
+                merged = groups.setdefault(value, Histogram(source.buckets))
+                merged.counts = [a + b for a, b in zip(merged.counts, source.counts)]
+                merged.count += source.count
+                merged.sum += source.sum
+        return {
+            value: {
+                'count': h.count,
+                'mean': h.sum / h.count if h.count else 0.0,
+                'p50': h.quantile(0.5),
+                'p95': h.quantile(0.95)
+            }
+            for value, h in groups.items()
+        }
+
+    def counter_total(self, name: str) -> float:
+        with self._lock:
+            return sum(self._counters.get(name, {}).values())
+
+    def _header(self, lines, name: str, default_kind: str) -> None:
+        kind, help_text = self._help.get(name, (default_kind, ''))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    @staticmethod
+    def _format_labels(key: LabelKey) -> str:
+        if not key:
+            return ''
+        pairs = []
+        for name, value in key:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            pairs.append(f'{name}="{value}"')
+        return '{' + ','.join(pairs) + '}'
+
+    @staticmethod
+    def _number(value: float) -> str:
+        value = float(value)
+        return str(int(value)) if value.is_integer() else repr(value)
+
+
+# ---------------- SERVER INSTRUMENTATION ---------------- #
+
+class ServerMetrics(Metrics):
+    """The metrics both chat servers record, with helpers for their events"""
+
+    def __init__(self, known_operations: Iterable[str]):
+        super().__init__()
+        self.known_operations = set(known_operations)
+        self.describe('matrixmesh_jobs_total', 'counter', "Finished matrix jobs by operation and outcome")
+        self.describe('matrixmesh_job_phase_seconds', 'histogram',
+                      "Time spent in each phase of a job: queue, parse, compute, deliver")
+        self.describe('matrixmesh_job_seconds', 'histogram', "Time from submission to delivered result")
+        self.describe('matrixmesh_job_input_elements', 'histogram', "Input size of matrix jobs in elements")
+        self.describe('matrixmesh_bytes_received_total', 'counter', "Bytes read from client connections")
+        self.describe('matrixmesh_bytes_sent_total', 'counter', "Bytes written to client connections")
+        self.describe('matrixmesh_messages_received_total', 'counter', "Messages read from client connections")
+        self.describe('matrixmesh_active_clients', 'gauge', "Joined chat users")
+        self.describe('matrixmesh_connections', 'gauge', "Open client connections, including gateways and workers")
+        self.describe('matrixmesh_jobs', 'gauge', "Jobs the job manager currently knows, by status")
+        self.describe('matrixmesh_uptime_seconds', 'gauge', "Seconds since the server started")
+        self.gauge_function('matrixmesh_uptime_seconds', lambda: round(time.time() - self.started_at, 3))
+
+    def record_job(self, job, deliver_seconds: float = 0.0, error: bool = False) -> None:
+        """Record a finished job's phase timings, size and outcome"""
+        operation = operation_label(job.operation, self.known_operations)
+        status = 'error' if error else ('cached' if job.cached else 'ok')
+        self.inc('matrixmesh_jobs_total', operation=operation, status=status)
+        self.observe('matrixmesh_job_input_elements', job.input_elements, ELEMENT_BUCKETS, operation=operation)
+
+        phases = dict(job.timings)
+        if job.started_at is not None and not job.cached:
+            phases['queue'] = max(0.0, job.started_at - job.submitted_at)
+        if not error:
+            phases['deliver'] = deliver_seconds
+        for phase, seconds in phases.items():
+            self.observe('matrixmesh_job_phase_seconds', seconds, operation=operation, phase=phase)
+
+        total = (job.finished_at or time.time()) - job.submitted_at + deliver_seconds
+        self.observe('matrixmesh_job_seconds', total, operation=operation, status=status)
+        log_event('job_finished', job_id=job.job_id, operation=job.operation, status=status,
+                  elements=job.input_elements, seconds=round(total, 6),
+                  phases={phase: round(seconds, 6) for phase, seconds in phases.items()},
+                  sample_rate=1 if error else None)
+
+    def record_received(self, size: int) -> None:
+        self.inc('matrixmesh_messages_received_total')
+        self.inc('matrixmesh_bytes_received_total', size)
+
+    def record_sent(self, size: int) -> None:
+        self.inc('matrixmesh_bytes_sent_total', size)
+
+    def summary_line(self) -> str:
+        """One-line digest for the periodic log"""
+        parts = []
+        for operation, stats in sorted(self.summary('matrixmesh_job_seconds', 'operation').items()):
+            parts.append(f"{operation} n={stats['count']} p50={stats['p50'] * 1000:.1f}ms "
+                         f"p95={stats['p95'] * 1000:.1f}ms")
+        received = self.counter_total('matrixmesh_bytes_received_total')
+        sent = self.counter_total('matrixmesh_bytes_sent_total')
+        clients = self._gauge_functions.get('matrixmesh_active_clients')
+        active = clients[0]() if clients else 0
+        jobs = ', '.join(parts) or 'no jobs'
+        return f"📊 {active} clients, in {received / 1e6:.1f} MB, out {sent / 1e6:.1f} MB; {jobs}"
+
+
+def start_metrics_server(metrics: Metrics, host: str = '0.0.0.0', port: int = 9100) -> ThreadingHTTPServer:
+    """Serve GET /metrics in the Prometheus text format on a background thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes every few seconds would drown the server log
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def start_summary_reporter(metrics: ServerMetrics, interval: float = DEFAULT_SUMMARY_INTERVAL) -> threading.Event:
+    """Print a summary line every interval seconds; set the returned event to stop"""
+    stop = threading.Event()
+
+    def report():
+        while not stop.wait(interval):
+            print(metrics.summary_line())
+
+    threading.Thread(target=report, daemon=True).start()
+    return stop
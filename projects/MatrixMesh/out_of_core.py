@@ -0,0 +1,146 @@
+"""
+Out-of-Core Matrix Operations for MatrixMesh
+Blocked algorithms over memory-mapped .npy files, for matrices larger than RAM
+"""
+
+import math
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+
+from matrix_codec import ALLOWED_KINDS
+from matrix_operations import MatrixProcessor
+
+# Working memory one operation may use for its blocks
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+BLOCKED_OPERATIONS = ('add', 'subtract', 'transpose', 'multiply')
+PREVIEW_SIZE = 6
+
+
+def open_matrix(path: str) -> np.ndarray:
+    """Memory-map a stored .npy matrix read-only; nothing is read until it is indexed"""
+    matrix = np.load(path, mmap_mode='r', allow_pickle=False)
+    if matrix.ndim != 2:
+        raise ValueError(f"Stored matrices must be 2-D, got shape {matrix.shape}")
+    if matrix.dtype.kind not in ALLOWED_KINDS:
+        raise ValueError(f"Unsupported dtype: {matrix.dtype}")
+    return matrix
+
+
+def blocked_elementwise(a: np.ndarray, b: np.ndarray, out: np.ndarray, ufunc,
+                        budget: int = DEFAULT_MEMORY_BUDGET) -> None:
+    """out = ufunc(a, b), a band of rows at a time"""
+    row_bytes = a.shape[1] * max(a.itemsize, b.itemsize, out.itemsize)
+    rows = max(1, budget // (3 * max(row_bytes, 1)))
+    for r0 in range(0, a.shape[0], rows):
+        band = slice(r0, r0 + rows)
+        out[band] = ufunc(a[band], b[band])
+
+
+def blocked_transpose(a: np.ndarray, out: np.ndarray, budget: int = DEFAULT_MEMORY_BUDGET) -> None:
+    """out = a.T in square blocks, so both the reads and the writes stay local"""
+    size = max(1, int(math.sqrt(budget / (2 * a.itemsize))))
+    for r0 in range(0, a.shape[0], size):
+        for c0 in range(0, a.shape[1], size):
+            block = np.asarray(a[r0:r0 + size, c0:c0 + size])
+            out[c0:c0 + size, r0:r0 + size] = block.T
+
+
+def blocked_multiply(a: np.ndarray, b: np.ndarray, out: np.ndarray,
+                     budget: int = DEFAULT_MEMORY_BUDGET) -> None:
+    """
+    out = a @ b with square blocks
+
+    One block each of a, b and the accumulator is in memory at a time; every
+    output block is written once.
+    """
+    itemsize = max(a.itemsize, b.itemsize, out.itemsize)
+    size = max(1, int(math.sqrt(budget / (3 * itemsize))))
+    rows, inner = a.shape
+    cols = b.shape[1]
+    for r0 in range(0, rows, size):
+        for c0 in range(0, cols, size):
+            acc = None
+            for k0 in range(0, inner, size):
+                product = np.asarray(a[r0:r0 + size, k0:k0 + size]) @ np.asarray(b[k0:k0 + size, c0:c0 + size])
+                if acc is None:
+                    acc = product
+                else:
+                    acc += product
+            out[r0:r0 + size, c0:c0 + size] = acc
+
+
+def run_blocked(operation: str, paths: List[str], out_path: str,
+                budget: int = DEFAULT_MEMORY_BUDGET) -> Dict[str, Any]:
+    """
+    Run an operation on stored matrices and write its result to out_path as .npy
+
+    Returns a small description of the result (shape, dtype, preview); the
+    result itself stays on disk.
+    """
+    matrices = [open_matrix(path) for path in paths]
+
+    if operation in ('add', 'subtract'):
+        if len(matrices) != 2:
+            raise ValueError(f"{operation.capitalize()} requires exactly 2 matrices")
+        a, b = matrices
+        if a.shape != b.shape:
+            raise ValueError(f"Matrix shapes don't match: {a.shape} vs {b.shape}")
+        shape, dtype = a.shape, np.result_type(a, b)
+        description = "Sum of 2 matrices" if operation == 'add' else "Difference of matrices"
+    elif operation == 'multiply':
+        if len(matrices) != 2:
+            raise ValueError("Matrix multiplication requires exactly 2 matrices")
+        a, b = matrices
+        if a.shape[1] != b.shape[0]:
+            raise ValueError(f"Cannot multiply matrices: {a.shape} × {b.shape}")
+        shape, dtype = (a.shape[0], b.shape[1]), np.result_type(a, b)
+        description = f"Product of {a.shape} and {b.shape} matrices"
+    elif operation == 'transpose':
+        if len(matrices) != 1:
+            raise ValueError("Transpose requires exactly 1 matrix")
+        shape, dtype = matrices[0].shape[::-1], matrices[0].dtype
+        description = f"Transpose of {matrices[0].shape} matrix"
+    else:
+        raise ValueError(f"Operation cannot run out of core: {operation}")
+
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=shape)
+    try:
+        if operation == 'add':
+            blocked_elementwise(matrices[0], matrices[1], out, np.add, budget)
+        elif operation == 'subtract':
+            blocked_elementwise(matrices[0], matrices[1], out, np.subtract, budget)
+        elif operation == 'multiply':
+            blocked_multiply(matrices[0], matrices[1], out, budget)
+        else:
+            blocked_transpose(matrices[0], out, budget)
+        out.flush()
+    except BaseException:
+        del out
+        os.remove(out_path)
+        raise
+
+    return {
+        'shape': list(shape),
+        'dtype': np.dtype(dtype).str,
+        'preview': np.array(out[:PREVIEW_SIZE, :PREVIEW_SIZE]),
+        'description': f"{description} (out of core)"
+    }
+
+
+def run_stored(operation: str, paths: List[str], out_path: str,
+               budget: int = DEFAULT_MEMORY_BUDGET) -> Dict[str, Any]:
+    """
+    Operation on stored matrices: blocked on disk where possible, otherwise in
+    memory if the inputs fit the budget
+    """
+    if operation in BLOCKED_OPERATIONS:
+        return run_blocked(operation, paths, out_path, budget)
+
+    matrices = [open_matrix(path) for path in paths]
+    total = sum(m.nbytes for m in matrices)
+    if total > budget:
+        raise ValueError(f"'{operation}' needs its inputs in memory ({total} bytes exceeds the "
+                         f"{budget} byte budget); only {', '.join(BLOCKED_OPERATIONS)} run out of core")
+    return MatrixProcessor().perform_operation(operation, [np.array(m) for m in matrices], raw=True)
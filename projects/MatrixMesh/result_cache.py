@@ -0,0 +1,234 @@
+"""
+Result Cache for MatrixMesh
+Content-hash keyed LRU of parsed matrices and operation results, with optional disk spill
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from sparse_matrices import is_sparse
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 1024 * 1024 * 1024
+
+
+def estimate_size(obj: Any) -> int:
+    """Approximate memory held by a cached value"""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + 112
+    if is_sparse(obj):
+        return sum(estimate_size(getattr(obj, name, None)) for name in ('data', 'indices', 'indptr', 'row', 'col'))
+    if isinstance(obj, dict):
+        return 64 + sum(estimate_size(key) + estimate_size(value) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return 56 + sum(estimate_size(value) for value in obj)
+    if isinstance(obj, (str, bytes)):
+        return 49 + len(obj)
+    return 32
+
+
+def _hash_array(digest, m: np.ndarray):
+    m = np.ascontiguousarray(m)
+    digest.update(f"A{m.dtype.str}{m.shape}".encode('ascii'))
+    digest.update(m.reshape(-1).view(np.uint8))
+
+
+def _hash_input(digest, matrices: Optional[List[Any]], matrix_data: Optional[str]):
+    """Feed a job's input into a hash, matching what the worker will actually use"""
+    if matrices:
+        for m in matrices:
+            if isinstance(m, np.ndarray):
+                _hash_array(digest, m)
+            elif isinstance(m, dict):
+                # Sparse descriptions; their index arrays arrive as ndarrays in binary frames
+                digest.update(b"D")
+                for key in sorted(m):
+                    digest.update(f"{key}=".encode('utf-8'))
+                    if isinstance(m[key], np.ndarray):
+                        _hash_array(digest, m[key])
+                    else:
+                        digest.update(json.dumps(m[key], separators=(',', ':')).encode('utf-8'))
+            else:
+                digest.update(b"J")
+                digest.update(json.dumps(m, separators=(',', ':')).encode('utf-8'))
+    elif isinstance(matrix_data, str):
+        digest.update(b"T")
+        digest.update(matrix_data.encode('utf-8'))
+    elif matrix_data:
+        # Raw file bytes, e.g. an uploaded .npy
+        digest.update(b"B")
+        digest.update(matrix_data)
+
+
+def text_key(matrix_data) -> str:
+    """Cache key for the parsed form of a text upload"""
+    digest = hashlib.blake2b(digest_size=20)
+    _hash_input(digest, None, matrix_data)
+    return 'm:' + digest.hexdigest()
+
+
+def result_key(operation: str, matrices: Optional[List[Any]] = None,
+               matrix_data: Optional[str] = None, kind: str = 'operation') -> str:
+    """Cache key for the result of an operation on some input"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{kind}\0{operation}\0".encode('utf-8'))
+    _hash_input(digest, matrices, matrix_data)
+    return 'r:' + digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache bounded by approximate memory use
+
+    Entries evicted from memory are pickled to spill_dir (if given) and
+    promoted back on their next hit, so popular results survive memory pressure.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, spill_dir: Optional[str] = None,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_dir = spill_dir
+
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> file size
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0, 'misses': 0, 'disk_hits': 0,
+            'evictions': 0, 'spills': 0, 'rejected': 0
+        }
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            # Spilled entries from a previous run are not indexed; start clean
+            for name in os.listdir(spill_dir):
+                if name.endswith('.pkl'):
+                    try:
+                        os.remove(os.path.join(spill_dir, name))
+                    except OSError:
+                        pass
+
+    def get(self, key: str) -> Optional[Any]:
+        """Look up a value, promoting it to most recently used"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._entries[key]
+            on_disk = key in self._disk
+
+        if on_disk:
+            value = self._load(key)
+            if value is not None:
+                with self._lock:
+                    self.stats['hits'] += 1
+                    self.stats['disk_hits'] += 1
+                self.put(key, value)
+                return value
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a value, evicting least recently used entries beyond the memory bound"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            # Would evict everything else; keep it on disk only
+            with self._lock:
+                self.stats['rejected'] += 1
+            self._spill(key, value)
+            return
+
+        spilled = []
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._sizes[key]
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._bytes += size
+
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_value = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+                self.stats['evictions'] += 1
+                spilled.append((old_key, old_value))
+
+        for old_key, old_value in spilled:
+            self._spill(old_key, old_value)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current usage"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            stats = dict(self.stats)
+            stats.update({
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else None
+            })
+        return stats
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, key.replace(':', '_') + '.pkl')
+
+    def _spill(self, key: str, value: Any) -> None:
+        """Write an evicted entry to disk, dropping the oldest spilled entries beyond the disk bound"""
+        if not self.spill_dir:
+            return
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+                return
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.spill_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self._path(key))
+        except (OSError, pickle.PicklingError) as e:
+            print(f"⚠️ Could not spill cache entry: {e}")
+            return
+
+        removed = []
+        with self._lock:
+            self._disk[key] = size
+            self._disk_bytes += size
+            self.stats['spills'] += 1
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_key, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                removed.append(old_key)
+
+        for old_key in removed:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def _load(self, key: str) -> Optional[Any]:
+        """Read a spilled entry back (the file is written only by this cache)"""
+        try:
+            with open(self._path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
@@ -0,0 +1,240 @@
+"""
+Result Delivery for MatrixMesh
+Summarizes large results for broadcast and streams the full data in compressed chunks on request
+"""
+
+import base64
+import io
+import json
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from matrix_codec import decode_message, encode_message, parse_header, payload_size, to_jsonable
+from result_cache import estimate_size
+from sparse_matrices import is_sparse
+
+# Arrays larger than this are replaced by a summary in broadcasts
+MAX_INLINE_ELEMENTS = 10000
+PREVIEW_ROWS = 6
+PREVIEW_COLS = 6
+CHUNK_SIZE = 256 * 1024
+FORMATS = ('binary', 'json')
+COMPRESSIONS = ('none', 'zlib')
+DEFAULT_STORE_BYTES = 512 * 1024 * 1024
+
+
+def summarize_array(array: np.ndarray) -> Dict[str, Any]:
+    """Shape, statistics and a top-left preview of an array"""
+    summary = {
+        'summary': True,
+        'shape': list(array.shape),
+        'dtype': array.dtype.str,
+        'size': int(array.size)
+    }
+    if array.size:
+        values = array.real if np.iscomplexobj(array) else array
+        with np.errstate(all='ignore'):
+            summary.update({
+                'min': float(np.nanmin(values)),
+                'max': float(np.nanmax(values)),
+                'mean': float(np.nanmean(values)),
+                'std': float(np.nanstd(values)),
+                'nonzero': int(np.count_nonzero(array))
+            })
+        summary['complex'] = bool(np.iscomplexobj(array))
+
+    if array.ndim >= 2:
+        preview = array[:PREVIEW_ROWS, :PREVIEW_COLS]
+    else:
+        preview = array.reshape(-1)[:PREVIEW_ROWS * PREVIEW_COLS]
+    summary['preview'] = to_jsonable(preview)
+    return summary
+
+
+def summarize_sparse(matrix) -> Dict[str, Any]:
+    """Shape, nonzero count and a dense top-left preview of a sparse matrix"""
+    size = matrix.shape[0] * matrix.shape[1]
+    return {
+        'summary': True,
+        'sparse': True,
+        'shape': list(matrix.shape),
+        'dtype': matrix.dtype.str,
+        'size': int(size),
+        'nonzero': int(matrix.nnz),
+        'density': matrix.nnz / size if size else 0.0,
+        'preview': to_jsonable(matrix[:PREVIEW_ROWS, :PREVIEW_COLS].toarray())
+    }
+
+
+def summarize_result(result: Any, max_inline_elements: int = MAX_INLINE_ELEMENTS) -> Tuple[Any, bool]:
+    """
+    Replace large arrays in a result with summaries
+
+    Returns:
+        (summarized result, True if anything was summarized)
+    """
+    if isinstance(result, np.ndarray):
+        if result.size > max_inline_elements:
+            return summarize_array(result), True
+        return result, False
+    if is_sparse(result):
+        # Sparse results are sent as their nonzeros, so only the nonzero count matters
+        if result.nnz > max_inline_elements:
+            return summarize_sparse(result), True
+        return result, False
+    if isinstance(result, dict):
+        truncated = False
+        summarized = {}
+        for key, value in result.items():
+            summarized[key], changed = summarize_result(value, max_inline_elements)
+            truncated = truncated or changed
+        return summarized, truncated
+    if isinstance(result, (list, tuple)):
+        truncated = False
+        summarized = []
+        for value in result:
+            item, changed = summarize_result(value, max_inline_elements)
+            summarized.append(item)
+            truncated = truncated or changed
+        return summarized, truncated
+    return result, False
+
+
+def serialize_result(result: Any, fmt: str = 'binary', compression: str = 'none') -> bytes:
+    """Encode a full result as one blob: a binary frame or JSON, optionally zlib-compressed"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown result format: {fmt}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+
+    if fmt == 'binary':
+        data = b''.join(encode_message({'result': result}, binary=True))
+    else:
+        data = json.dumps(to_jsonable(result)).encode('utf-8')
+
+    if compression == 'zlib':
+        # Level 1: most of the size win on structured matrices at a fraction of the CPU
+        data = zlib.compress(data, 1)
+    return data
+
+
+def deserialize_result(data: bytes, fmt: str = 'binary', compression: str = 'none') -> Any:
+    """Inverse of serialize_result"""
+    if compression == 'zlib':
+        data = zlib.decompress(data)
+
+    if fmt == 'npy':
+        # Downloads of stored matrices are the raw .npy file
+        return np.load(io.BytesIO(data), allow_pickle=False)
+    if fmt == 'json':
+        return json.loads(data)
+
+    newline = data.index(b"\n")
+    header = parse_header(data[:newline])
+    size = payload_size(header)
+    payload = memoryview(data)[newline + 1:newline + 1 + size]
+    return decode_message(header, payload)['result']
+
+
+def chunk_message(result_id: str, seq: int, total: int, chunk: bytes, fmt: str,
+                  compression: str, binary: bool) -> Dict[str, Any]:
+    """Build one result_chunk message; binary clients get raw bytes, others base64"""
+    data = np.frombuffer(chunk, dtype=np.uint8) if binary else base64.b64encode(chunk).decode('ascii')
+    return {
+        'type': 'result_chunk',
+        'result_id': result_id,
+        'seq': seq,
+        'total': total,
+        'format': fmt,
+        'compression': compression,
+        'encoding': 'raw' if binary else 'base64',
+        'data': data
+    }
+
+
+class ResultStore:
+    """
+    Full results kept for on-demand download, bounded by approximate memory use
+
+    Each result is serialized at most once per (format, compression) and the
+    same chunks are streamed to every client that asks for it.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_STORE_BYTES, chunk_size: int = CHUNK_SIZE):
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, result: Any) -> str:
+        """Keep a full result and return its ID"""
+        result_id = uuid.uuid4().hex[:12]
+        entry = {'result': result, 'encoded': {}, 'size': estimate_size(result)}
+        with self._lock:
+            self._entries[result_id] = entry
+            self._bytes += entry['size']
+            self._evict()
+        return result_id
+
+    def get_chunks(self, result_id: str, fmt: str = 'binary', compression: str = 'none') -> Optional[List[bytes]]:
+        """Serialized chunks of a stored result (None if it expired or never existed)"""
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(result_id)
+            chunks = entry['encoded'].get((fmt, compression))
+            if chunks is not None:
+                return chunks
+
+        data = serialize_result(entry['result'], fmt, compression)
+        view = memoryview(data)
+        chunks = [view[i:i + self.chunk_size] for i in range(0, len(data), self.chunk_size)] or [view]
+
+        with self._lock:
+            if result_id in self._entries:
+                entry['encoded'][(fmt, compression)] = chunks
+                entry['size'] += len(data)
+                self._bytes += len(data)
+                self._evict(keep=result_id)
+        return chunks
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Drop least recently used results beyond the bound; caller must hold the lock"""
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            old_id = next(iter(self._entries))
+            if old_id == keep:
+                self._entries.move_to_end(old_id)
+                old_id = next(iter(self._entries))
+            self._bytes -= self._entries.pop(old_id)['size']
+
+
+class ResultAssembler:
+    """Client-side reassembly of result_chunk messages"""
+
+    def __init__(self):
+        self._parts: Dict[str, Dict[int, bytes]] = {}
+
+    def add(self, message: Dict[str, Any]) -> Optional[Any]:
+        """Add one chunk; returns the full result once every chunk of it has arrived"""
+        result_id = message['result_id']
+        data = message['data']
+        if isinstance(data, str):
+            data = base64.b64decode(data)
+        elif isinstance(data, np.ndarray):
+            data = data.tobytes()
+
+        parts = self._parts.setdefault(result_id, {})
+        parts[message['seq']] = data
+        if len(parts) < message['total']:
+            return None
+
+        del self._parts[result_id]
+        blob = b''.join(parts[seq] for seq in range(message['total']))
+        return deserialize_result(blob, message['format'], message['compression'])
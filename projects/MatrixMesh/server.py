@@ -7,19 +7,52 @@ Handles multiple clients, message broadcasting, and matrix file processing
 import socket
 import threading
 import json
+import base64
+import logging
 import os
+import time
+from collections import Counter
 from datetime import datetime
 from matrix_operations import MatrixProcessor
+from matrix_codec import (MAX_PAYLOAD_BYTES, UNJOINED_PAYLOAD_BYTES, FrameReader, FrameError,
+                          encode_message, send_buffers)
+from job_manager import JobManager
+from result_cache import ResultCache
+from result_delivery import ResultStore, chunk_message, summarize_result
+from gateway import SESSION_CLOSE, SESSION_KEY, GatewaySession, fan_out_message, tag_message
+from distributed import TileScheduler, WorkerAuth
+from matrix_store import MatrixStore
+from metrics import (DEFAULT_SUMMARY_INTERVAL, ServerMetrics, log_event, start_metrics_server,
+                     start_summary_reporter)
 import numpy as np
 
 class ChatServer:
-    def __init__(self, host='localhost', port=12345):
+    def __init__(self, host='localhost', port=12345, cache_spill_dir=None, store_dir=None,
+                 metrics_port=None, summary_interval=DEFAULT_SUMMARY_INTERVAL, worker_auth=None):
         self.host = host
         self.port = port
-        self.clients = {}  # {socket: {'username': str, 'address': tuple}}
+        self.clients = {}  # {socket or GatewaySession: {'username': str, 'address': tuple, 'binary': bool}}
+        self.send_locks = {}  # {socket: Lock} keeps concurrent frames from interleaving
         self.matrix_processor = MatrixProcessor()
+        self.tile_scheduler = TileScheduler()
+        self.worker_auth = worker_auth or WorkerAuth.from_env()  # who may register as a worker
+        self.workers = {}  # {socket: RemoteWorker} for registered compute workers
+        self.job_manager = JobManager(cache=ResultCache(spill_dir=cache_spill_dir),
+                                      tile_scheduler=self.tile_scheduler)
+        self.job_manager.on_progress = self.on_job_progress
+        self.job_manager.on_complete = self.on_job_complete
+        self.job_manager.on_error = self.on_job_error
+        self.result_store = ResultStore()
+        self.matrix_store = MatrixStore(store_dir)  # .npy matrices kept on disk
         self.server_socket = None
         
+        self.metrics = ServerMetrics(self.matrix_processor.supported_operations)
+        self.metrics.gauge_function('matrixmesh_active_clients', lambda: len(self.clients))
+        self.metrics.gauge_function('matrixmesh_connections', lambda: len(self.send_locks))
+        self.metrics.gauge_function('matrixmesh_jobs', self.job_counts, label='status')
+        self.metrics_port = metrics_port  # serve /metrics over HTTP when set
+        self.summary_interval = summary_interval
+        
     def start_server(self):
         """Start the TCP server and listen for connections"""
         try:
@@ -29,10 +62,16 @@ class ChatServer:
             self.server_socket.listen(5)
             
             print(f"🚀 Chat server started on {self.host}:{self.port}")
+            if self.metrics_port is not None:
+                start_metrics_server(self.metrics, self.host, self.metrics_port)
+            if self.summary_interval:
+                start_summary_reporter(self.metrics, self.summary_interval)
             print("Waiting for clients to connect...")
             
             while True:
                 client_socket, client_address = self.server_socket.accept()
+                # job_status and matrix_result are small back-to-back writes; don't let Nagle hold them
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 print(f"📱 New connection from {client_address}")
                 
                 # Start a new thread for each client
@@ -51,55 +90,101 @@ class ChatServer:
     
     def handle_client(self, client_socket, client_address):
         """Handle individual client connections"""
-        username = None
-        buffer = ""
+        self.send_locks[client_socket] = threading.Lock()
+        sessions = {}  # {session_id: GatewaySession} when this connection is a gateway
+        # Newline-delimited JSON, where a line may announce a raw binary payload
+        # Large binary payloads only once the connection has joined or registered as a worker
+        reader = FrameReader(client_socket, on_bytes=self.metrics.record_received,
+                             max_payload=UNJOINED_PAYLOAD_BYTES)
         try:
             while True:
-                # Receive data from client (may contain partial or multiple JSON messages)
-                chunk = client_socket.recv(4096).decode('utf-8')
-                if not chunk:
+                if reader.max_payload < MAX_PAYLOAD_BYTES and self.is_trusted(client_socket, sessions):
+                    reader.max_payload = MAX_PAYLOAD_BYTES
+                message = reader.read_message()
+                if message is None:
                     break
-                buffer += chunk
-
-                # Process complete lines (newline-delimited JSON)
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    if not line.strip():
-                        continue
-                    try:
-                        message = json.loads(line)
-                    except json.JSONDecodeError:
-                        # Incomplete JSON, wait for more data
-                        buffer = line + "\n" + buffer
-                        break
-
-                    message_type = message.get('type')
-                    if message_type == 'join':
-                        username = message.get('username')
-                        if self.handle_user_join(client_socket, client_address, username):
-                            self.broadcast_message({
-                                'type': 'system',
-                                'message': f"👋 {username} joined the chat",
-                                'timestamp': datetime.now().strftime('%H:%M:%S')
-                            }, exclude_client=client_socket)
-
-                    elif message_type == 'chat':
-                        if client_socket in self.clients:
-                            self.handle_chat_message(client_socket, message)
-
-                    elif message_type == 'matrix_file':
-                        if client_socket in self.clients:
-                            self.handle_matrix_file(client_socket, message)
-
-                    elif message_type == 'matrix_operation':
-                        if client_socket in self.clients:
-                            self.handle_matrix_operation(client_socket, message)
+                
+                session_id = message.pop(SESSION_KEY, None)
+                if session_id is None:
+                    self.dispatch(client_socket, client_address, message)
+                    continue
+                
+                # A gateway speaking for one of its users
+                session = sessions.get(session_id)
+                if message.get('type') == SESSION_CLOSE:
+                    if session:
+                        del sessions[session_id]
+                        self.disconnect_client(session)
+                    continue
+                if session is None:
+                    session = sessions[session_id] = GatewaySession(client_socket, session_id, client_address)
+                self.dispatch(session, client_address, message)
+        except FrameError as e:
+            print(f"❌ Bad frame from {client_address}: {e}")
         except Exception as e:
             print(f"❌ Error handling client {client_address}: {e}")
         finally:
-            self.disconnect_client(client_socket, username)
+            for session in list(sessions.values()):
+                self.disconnect_client(session)
+            self.disconnect_client(client_socket)
+    
+    def is_trusted(self, client_socket, sessions):
+        """Whether a connection has joined, speaks for a joined gateway session, or is a worker"""
+        if client_socket in self.clients or client_socket in self.workers:
+            return True
+        return any(session in self.clients for session in sessions.values())
+    
+    def dispatch(self, client, client_address, message):
+        """Route one message from a client or gateway session"""
+        message_type = message.get('type')
+        if message_type == 'join':
+            username = message.get('username')
+            if self.handle_user_join(client, client_address, username,
+                                     binary=bool(message.get('binary'))):
+                self.broadcast_message({
+                    'type': 'system',
+                    'message': f"👋 {username} joined the chat",
+                    'timestamp': datetime.now().strftime('%H:%M:%S')
+                }, exclude_client=client)
+            return
+        
+        if message_type == 'worker_register':
+            self.handle_worker_register(client, client_address, message)
+            return
+        if message_type in ('tile_result', 'tile_error'):
+            worker = self.workers.get(client)
+            if worker:
+                self.tile_scheduler.handle_result(worker, message)
+            return
+        
+        if client not in self.clients:
+            return
+        
+        if message_type == 'chat':
+            self.handle_chat_message(client, message)
+        
+        elif message_type == 'matrix_file':
+            self.handle_matrix_file(client, message)
+        
+        elif message_type == 'matrix_operation':
+            self.handle_matrix_operation(client, message)
+        
+        elif message_type in ('cancel_job', 'list_jobs'):
+            self.handle_job_control(client, message)
+        
+        elif message_type == 'fetch_result':
+            self.handle_fetch_result(client, message)
+        
+        elif message_type == 'upload_chunk':
+            self.handle_upload_chunk(client, message)
+        
+        elif message_type == 'upload_end':
+            self.handle_upload_end(client, message)
+        
+        elif message_type == 'download_matrix':
+            self.handle_download_matrix(client, message)
     
-    def handle_user_join(self, client_socket, client_address, username):
+    def handle_user_join(self, client_socket, client_address, username, binary=False):
         """Handle user joining the chat"""
         if not username:
             self.send_to_client(client_socket, {
@@ -120,7 +205,8 @@ class ChatServer:
         # Add client to the list
         self.clients[client_socket] = {
             'username': username,
-            'address': client_address
+            'address': client_address,
+            'binary': binary  # receive matrices as raw buffers instead of JSON lists
         }
         
         # Send welcome message
@@ -140,6 +226,28 @@ class ChatServer:
         print(f"✅ {username} ({client_address}) joined the chat")
         return True
     
+    def handle_worker_register(self, client_socket, client_address, message):
+        """Turn a connection into a compute worker that receives matrix tiles"""
+        if isinstance(client_socket, GatewaySession) or client_socket in self.workers:
+            return
+        if client_socket in self.clients or not self.worker_auth.allows(message.get('token'), client_address[0]):
+            print(f"⛔ Refused worker registration from {client_address}")
+            self.send_to_client(client_socket, {'type': 'error', 'message': 'Worker registration refused'})
+            return
+        
+        def send(task):
+            self.send_to_client(client_socket, task, encode_message(task, binary=True))
+        
+        try:
+            capacity = int(message.get('capacity', 1))
+        except (TypeError, ValueError):
+            capacity = 1
+        self.workers[client_socket] = self.tile_scheduler.register(send, capacity, message.get('name'))
+        self.send_to_client(client_socket, {
+            'type': 'worker_registered',
+            'worker_id': self.workers[client_socket].worker_id
+        })
+    
     def handle_chat_message(self, client_socket, message):
         """Handle regular chat messages"""
         username = self.clients[client_socket]['username']
@@ -157,27 +265,11 @@ class ChatServer:
         username = self.clients[client_socket]['username']
         matrix_data = message.get('matrix_data')
         operation = message.get('operation', 'display')
+        if isinstance(matrix_data, np.ndarray):
+            # Raw file bytes (e.g. a .npy upload) sent as a uint8 binary frame
+            matrix_data = matrix_data.tobytes()
         
-        try:
-            result = self.matrix_processor.process_matrix_data(matrix_data, operation)
-            
-            response = {
-                'type': 'matrix_result',
-                'username': username,
-                'operation': operation,
-                'result': result,
-                'timestamp': datetime.now().strftime('%H:%M:%S')
-            }
-            
-            self.broadcast_message(response)
-            print(f"🔢 {username} performed matrix operation: {operation}")
-            
-        except Exception as e:
-            error_response = {
-                'type': 'error',
-                'message': f'Matrix operation failed: {str(e)}'
-            }
-            self.send_to_client(client_socket, error_response)
+        self.submit_job(client_socket, username, operation, matrix_data=matrix_data, kind='file')
     
     def handle_matrix_operation(self, client_socket, message):
         """Handle specific matrix operations requested by users"""
@@ -186,88 +278,233 @@ class ChatServer:
         matrices = message.get('matrices', [])
         matrix_data_text = message.get('matrix_data')
         
-        # If no explicit list provided but text is, parse it
-        if (not matrices or len(matrices) == 0) and matrix_data_text:
-            try:
-                matrices = self.matrix_processor.parse_matrix_data(matrix_data_text)
-            except Exception as e:
+        if message.get('matrix_ids'):
+            # Matrices stored on disk by an earlier upload or operation
+            self.submit_stored_job(client_socket, username, operation, message['matrix_ids'])
+            return
+        
+        log_event('operation_received', operation=operation, username=username,
+                  matrix_types=[type(m).__name__ for m in matrices])
+        
+        # Parsing and coercion to NumPy happen in the worker, off this connection's thread
+        self.submit_job(client_socket, username, operation, matrices=matrices, matrix_data=matrix_data_text)
+    
+    def submit_job(self, client_socket, username, operation, matrices=None, matrix_data=None, kind='operation'):
+        """Queue a matrix operation on the job manager"""
+        try:
+            self.job_manager.submit(client_socket, username, operation, matrices=matrices,
+                                    matrix_data=matrix_data, kind=kind)
+        except Exception as e:
+            self.send_to_client(client_socket, {
+                'type': 'error',
+                'message': f'Operation rejected: {str(e)}'
+            })
+    
+    def submit_stored_job(self, client_socket, username, operation, matrix_ids):
+        """Queue an operation on stored matrices; large results are written back to the store"""
+        try:
+            paths = self.matrix_store.paths(list(matrix_ids))
+            matrix_id, out_path = self.matrix_store.reserve()
+            self.job_manager.submit_stored(client_socket, username, operation, paths, out_path, matrix_id)
+        except Exception as e:
+            self.send_to_client(client_socket, {
+                'type': 'error',
+                'message': f'Operation rejected: {str(e)}'
+            })
+    
+    def handle_upload_chunk(self, client_socket, message):
+        """Append one chunk of a streamed .npy upload to the matrix store"""
+        data = message.get('data')
+        if isinstance(data, str):
+            data = base64.b64decode(data)
+        elif not isinstance(data, np.ndarray):
+            self.send_to_client(client_socket, {'type': 'error', 'message': 'Upload chunk has no data'})
+            return
+        
+        try:
+            self.matrix_store.write_chunk(client_socket, str(message.get('upload_id')), data,
+                                          message.get('filename'))
+        except (ValueError, OSError) as e:
+            self.send_to_client(client_socket, {'type': 'error', 'message': f'Upload failed: {e}'})
+    
+    def handle_upload_end(self, client_socket, message):
+        """Finish an upload and announce the stored matrix to the room"""
+        try:
+            info = self.matrix_store.finish_upload(client_socket, str(message.get('upload_id')))
+        except ValueError as e:
+            self.send_to_client(client_socket, {'type': 'error', 'message': f'Upload failed: {e}'})
+            return
+        
+        announcement = {
+            'type': 'matrix_stored',
+            'username': self.clients[client_socket]['username'],
+            'timestamp': datetime.now().strftime('%H:%M:%S')
+        }
+        announcement.update(info)
+        self.broadcast_message(announcement)
+        print(f"💾 {announcement['username']} stored {info['filename']} {tuple(info['shape'])} as {info['matrix_id']}")
+    
+    def handle_download_matrix(self, client_socket, message):
+        """Stream a stored matrix to the client as its .npy file"""
+        matrix_id = message.get('matrix_id')
+        try:
+            total = self.matrix_store.chunk_count(matrix_id)
+        except ValueError as e:
+            self.send_to_client(client_socket, {'type': 'error', 'message': str(e)})
+            return
+        
+        binary = self.wants_binary(client_socket)
+        for seq in range(total):
+            chunk = self.matrix_store.read_chunk(matrix_id, seq)
+            self.send_to_client(client_socket, chunk_message(matrix_id, seq, total, chunk, 'npy', 'none', binary))
+    
+    def handle_job_control(self, client_socket, message):
+        """Handle job cancellation and status queries"""
+        if message.get('type') == 'cancel_job':
+            job_id = message.get('job_id')
+            if not self.job_manager.cancel(job_id, client_socket):
                 self.send_to_client(client_socket, {
                     'type': 'error',
-                    'message': f'Failed to parse matrices: {e}'
+                    'message': f'No active job {job_id} to cancel'
                 })
-                return
+            return
         
-        # Debug: incoming types
-        try:
-            print(f"🔎 Received op='{operation}' with matrix types: {[type(m).__name__ for m in matrices]}")
-        except Exception:
-            pass
+        self.send_to_client(client_socket, {
+            'type': 'job_list',
+            'jobs': self.job_manager.list_jobs(owner=client_socket),
+            'cache': self.job_manager.cache.get_stats(),
+            'workers': self.tile_scheduler.get_stats(),
+            'stored': self.matrix_store.list()
+        })
+    
+    def handle_fetch_result(self, client_socket, message):
+        """Stream a stored full result to the client that asked for it"""
+        result_id = message.get('result_id')
+        binary = self.wants_binary(client_socket)
+        fmt = message.get('format') or ('binary' if binary else 'json')
+        compression = message.get('compression', 'none')
         
-        # Coerce incoming lists/arrays to NumPy arrays for safety
         try:
-            matrices_np = [m if isinstance(m, np.ndarray) else np.array(m) for m in matrices]
-        except Exception:
-            matrices_np = matrices
+            chunks = self.result_store.get_chunks(result_id, fmt, compression)
+        except ValueError as e:
+            self.send_to_client(client_socket, {'type': 'error', 'message': f'Cannot fetch result: {e}'})
+            return
+        if chunks is None:
+            self.send_to_client(client_socket, {
+                'type': 'error',
+                'message': f'Result {result_id} is no longer available'
+            })
+            return
         
-        # Debug: coerced types and shapes
-        try:
-            shapes = []
-            for m in matrices_np:
-                try:
-                    shapes.append(getattr(m, 'shape', None))
-                except Exception:
-                    shapes.append(None)
-            print(f"🔧 Coerced matrix types: {[type(m).__name__ for m in matrices_np]} shapes={shapes}")
-        except Exception:
-            pass
+        for seq, chunk in enumerate(chunks):
+            self.send_to_client(client_socket, chunk_message(result_id, seq, len(chunks), chunk,
+                                                             fmt, compression, binary))
+    
+    def on_job_progress(self, job):
+        """Tell the job's owner that it changed state"""
+        message = {'type': 'job_status'}
+        message.update(job.to_dict())
+        self.send_to_client(job.owner, message)
+    
+    def job_counts(self):
+        """Number of known jobs per status, for the metrics gauge"""
+        return Counter(job['status'] for job in self.job_manager.list_jobs())
+    
+    def on_job_complete(self, job, result):
+        """Broadcast a finished job's result to the room"""
+        start = time.perf_counter()
+        if job.kind == 'stored' and result.get('matrix_id'):
+            # Out-of-core results stay on disk; clients get their ID and a preview
+            self.matrix_store.register(result['matrix_id'])
+        # Large arrays are summarized; the full result is fetched on demand
+        summary, truncated = summarize_result(result)
+        response = {
+            'type': 'matrix_result',
+            'username': job.username,
+            'operation': job.operation,
+            'job_id': job.job_id,
+            'result': summary,
+            'timestamp': datetime.now().strftime('%H:%M:%S')
+        }
+        if truncated:
+            response['truncated'] = True
+            response['result_id'] = self.result_store.put(result)
         
         try:
-            result = self.matrix_processor.perform_operation(operation, matrices_np)
-            
-            response = {
-                'type': 'matrix_result',
-                'username': username,
-                'operation': operation,
-                'result': result,
-                'timestamp': datetime.now().strftime('%H:%M:%S')
-            }
-            
             self.broadcast_message(response)
-            print(f"🔢 {username} performed operation: {operation}")
-            
+            print(f"🔢 {job.username} performed operation: {job.operation}")
         except Exception as e:
-            error_response = {
-                'type': 'error',
-                'message': f'Operation failed: {str(e)}'
-            }
-            self.send_to_client(client_socket, error_response)
+            self.on_job_error(job, str(e))
+            return
+        self.metrics.record_job(job, time.perf_counter() - start)
+    
+    def on_job_error(self, job, error):
+        """Report a failed job to its owner"""
+        self.metrics.record_job(job, error=True)
+        prefix = 'Matrix operation failed' if job.kind == 'file' else 'Operation failed'
+        self.send_to_client(job.owner, {
+            'type': 'error',
+            'job_id': job.job_id,
+            'message': f'{prefix}: {error}'
+        })
     
-    def send_to_client(self, client_socket, message):
+    def wants_binary(self, client_socket):
+        """Check whether a client asked for binary matrix frames"""
+        client_info = self.clients.get(client_socket)
+        return bool(client_info and client_info.get('binary'))
+    
+    def send_to_client(self, client_socket, message, encoded=None):
         """Send message to a specific client"""
         try:
-            # Delimit JSON messages with a newline for safe streaming
-            client_socket.send((json.dumps(message) + "\n").encode('utf-8'))
+            if isinstance(client_socket, GatewaySession):
+                # Goes out on the gateway's connection, tagged with the user's session
+                encoded = encode_message(tag_message(message, client_socket.session_id),
+                                         binary=self.wants_binary(client_socket))
+                client_socket = client_socket.conn
+            elif encoded is None:
+                encoded = encode_message(message, binary=self.wants_binary(client_socket))
+            lock = self.send_locks.get(client_socket)
+            if lock:
+                with lock:
+                    send_buffers(client_socket, encoded)
+            else:
+                send_buffers(client_socket, encoded)
+            self.metrics.record_sent(sum(memoryview(buffer).nbytes for buffer in encoded))
         except Exception as e:
             print(f"❌ Failed to send message to client: {e}")
     
     def broadcast_message(self, message, exclude_client=None):
         """Broadcast message to all connected clients"""
         disconnected_clients = []
+        encodings = {}  # serialize once per wire format, not once per client
+        gateways = {}  # {(gateway socket, binary): [session IDs]}; one copy per gateway
         
         for client_socket in list(self.clients.keys()):
-            if client_socket != exclude_client:
+            if isinstance(client_socket, GatewaySession):
+                if client_socket != exclude_client:
+                    key = (client_socket.conn, self.wants_binary(client_socket))
+                    gateways.setdefault(key, []).append(client_socket.session_id)
+            elif client_socket != exclude_client:
+                binary = self.wants_binary(client_socket)
+                if binary not in encodings:
+                    encodings[binary] = encode_message(message, binary=binary)
                 try:
-                    self.send_to_client(client_socket, message)
+                    self.send_to_client(client_socket, message, encodings[binary])
                 except Exception as e:
                     print(f"❌ Failed to send to client: {e}")
                     disconnected_clients.append(client_socket)
         
+        for (gateway_socket, binary), session_ids in gateways.items():
+            tagged = fan_out_message(message, session_ids)
+            self.send_to_client(gateway_socket, tagged, encode_message(tagged, binary=binary))
+        
         # Remove disconnected clients
         for client in disconnected_clients:
             self.disconnect_client(client, None)
     
     def disconnect_client(self, client_socket, username=None):
         """Handle client disconnection"""
+        self.matrix_store.abort_uploads(client_socket)
         if client_socket in self.clients:
             if not username:
                 username = self.clients[client_socket]['username']
@@ -283,18 +520,30 @@ class ChatServer:
             
             print(f"📤 {username} disconnected")
         
+        if isinstance(client_socket, GatewaySession):
+            # The gateway's connection stays open for its other users
+            return
+        worker = self.workers.pop(client_socket, None)
+        if worker:
+            self.tile_scheduler.unregister(worker)
+        self.send_locks.pop(client_socket, None)
         try:
             client_socket.close()
         except:
             pass
 
 def main():
-    server = ChatServer()
+    # Structured events are JSON lines; see metrics.log_event
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    metrics_port = os.environ.get('METRICS_PORT')
+    server = ChatServer(metrics_port=int(metrics_port) if metrics_port else None)
     try:
         server.start_server()
     except KeyboardInterrupt:
         print("\n🛑 Server shutting down...")
     finally:
+        server.job_manager.shutdown()
+        server.matrix_store.close()
         if server.server_socket:
             server.server_socket.close()
 
@@ -0,0 +1,253 @@
+"""
+Structure-Aware Solvers for MatrixMesh
+Picks the cheapest stable LAPACK/SciPy routine for a matrix's structure
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import scipy.linalg as scipy_linalg
+    import scipy.sparse as scipy_sparse
+    import scipy.sparse.linalg as scipy_sparse_linalg
+except ImportError:  # SciPy is optional; the NumPy routines cover every case
+    scipy_linalg = scipy_sparse = scipy_sparse_linalg = None
+
+# Structure hints a request can give, e.g. "inverse:symmetric"; a hint the matrix does not
+# satisfy is ignored in favour of detection, so a wrong hint costs speed, never correctness
+STRUCTURES = ('auto', 'general', 'diagonal', 'upper', 'lower', 'symmetric', 'positive_definite', 'sparse')
+STRUCTURE_SEPARATOR = ':'
+
+# A matrix counts as sparse when it is at least this large and this empty
+SPARSE_MIN_DIMENSION = 256
+SPARSE_MAX_DENSITY = 0.05
+SYMMETRY_RTOL = 1e-10
+SYMMETRY_ATOL = 1e-12
+# Largest sparse input that is converted to dense for a routine without a sparse form,
+# or inverted (the inverse of a sparse matrix is usually dense)
+MAX_DENSIFY_ELEMENTS = 25_000_000
+
+
+# ---------------- STRUCTURE DETECTION ---------------- #
+
+def _is_diagonal(matrix: np.ndarray) -> bool:
+    return not np.any(matrix * ~np.eye(matrix.shape[-1], dtype=bool))
+
+
+def _is_upper(matrix: np.ndarray) -> bool:
+    return not np.any(np.tril(matrix, -1))
+
+
+def _is_lower(matrix: np.ndarray) -> bool:
+    return not np.any(np.triu(matrix, 1))
+
+
+def _is_symmetric(matrix: np.ndarray) -> bool:
+    # Covers Hermitian matrices too; eigh and Cholesky take either
+    return np.allclose(matrix, np.swapaxes(matrix, -1, -2).conj(), rtol=SYMMETRY_RTOL, atol=SYMMETRY_ATOL)
+
+
+def _is_sparse(matrix: np.ndarray) -> bool:
+    if scipy_sparse is None or matrix.ndim != 2 or matrix.shape[0] < SPARSE_MIN_DIMENSION:
+        return False
+    return np.count_nonzero(matrix) <= SPARSE_MAX_DENSITY * matrix.size
+
+
+_CHECKS: Dict[str, Callable[[np.ndarray], bool]] = {
+    'diagonal': _is_diagonal,
+    'upper': _is_upper,
+    'lower': _is_lower,
+    'symmetric': _is_symmetric,
+    'sparse': _is_sparse
+}
+
+
+def detect_structure(matrix: np.ndarray, candidates: Tuple[str, ...] = tuple(_CHECKS)) -> str:
+    """First candidate structure the matrix has, checked in order; 'general' if none"""
+    for structure in candidates:
+        if _CHECKS[structure](matrix):
+            return structure
+    return 'general'
+
+
+def _resolve(matrix: np.ndarray, structure: str, candidates: Tuple[str, ...]) -> str:
+    """Structure to solve with: the request's hint if the matrix has it, else the best one detected"""
+    if structure not in STRUCTURES:
+        raise ValueError(f"Unknown matrix structure '{structure}'; use one of {', '.join(STRUCTURES)}")
+    if structure in ('general', 'sparse'):
+        # Both routines are correct for any matrix
+        return structure
+    # Cholesky only reads one triangle, so positive definite implies a symmetry check
+    check = _CHECKS.get('symmetric' if structure == 'positive_definite' else structure)
+    if check is not None and check(matrix):
+        return structure
+    return detect_structure(matrix, candidates)
+
+
+def _prepare(matrix, structure: str, candidates: Tuple[str, ...]):
+    """(matrix, structure) for a routine; sparse input is densified unless a sparse path applies"""
+    if scipy_sparse is None or not scipy_sparse.issparse(matrix):
+        return matrix, _resolve(matrix, structure, candidates)
+    if structure in ('auto', 'sparse') and 'sparse' in candidates:
+        return matrix, 'sparse'
+    matrix = _densify(matrix)
+    return matrix, _resolve(matrix, structure, candidates)
+
+
+def _check_dense_size(matrix) -> None:
+    if matrix.shape[0] * matrix.shape[1] > MAX_DENSIFY_ELEMENTS:
+        raise ValueError(f"Sparse {matrix.shape} matrix is too large to convert to dense for this operation")
+
+
+def _densify(matrix) -> np.ndarray:
+    if scipy_sparse is None or not scipy_sparse.issparse(matrix):
+        return np.asarray(matrix)
+    _check_dense_size(matrix)
+    return matrix.toarray()
+
+
+def _nonsingular_diagonal(matrix: np.ndarray) -> np.ndarray:
+    diagonal = np.diagonal(matrix, axis1=-2, axis2=-1)
+    if not np.all(diagonal):
+        raise np.linalg.LinAlgError("Singular matrix")
+    return diagonal
+
+
+def _cholesky(matrix: np.ndarray) -> Optional[np.ndarray]:
+    """Lower Cholesky factor, or None if the matrix is not positive definite"""
+    try:
+        return np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        return None
+
+
+def _permutation_sign(permutation: np.ndarray) -> int:
+    """+1 for an even permutation, -1 for an odd one"""
+    seen = np.zeros(len(permutation), dtype=bool)
+    sign = 1
+    for start in range(len(permutation)):
+        if seen[start]:
+            continue
+        length = 0
+        i = start
+        while not seen[i]:
+            seen[i] = True
+            i = permutation[i]
+            length += 1
+        if length % 2 == 0:
+            sign = -sign
+    return sign
+
+
+# ---------------- SOLVERS ---------------- #
+
+def solve(a: np.ndarray, b: np.ndarray, structure: str = 'auto') -> Tuple[np.ndarray, str]:
+    """x with a @ x = b, and the method used; never forms the inverse"""
+    a, structure = _prepare(a, structure, ('diagonal', 'upper', 'lower', 'sparse', 'symmetric'))
+    b = _densify(b)
+    two_dimensional = a.ndim == 2
+
+    if structure == 'diagonal':
+        diagonal = _nonsingular_diagonal(a)
+        if b.ndim == a.ndim - 1:
+            return b / diagonal, 'diagonal'
+        return b / diagonal[..., :, None], 'diagonal'
+    if structure in ('upper', 'lower') and scipy_linalg is not None and two_dimensional:
+        _nonsingular_diagonal(a)
+        return scipy_linalg.solve_triangular(a, b, lower=structure == 'lower'), f"{structure} triangular"
+    if structure == 'sparse' and scipy_sparse is not None and two_dimensional:
+        try:
+            lu = scipy_sparse_linalg.splu(scipy_sparse.csc_matrix(a))
+        except RuntimeError as e:  # exactly singular
+            raise np.linalg.LinAlgError(str(e))
+        return lu.solve(np.asarray(b, dtype=np.result_type(a.dtype, b.dtype, float))), 'sparse LU'
+    a = _densify(a)
+    if structure in ('symmetric', 'positive_definite'):
+        factor = _cholesky(a)
+        if factor is not None:
+            if scipy_linalg is not None and two_dimensional:
+                return scipy_linalg.cho_solve((factor, True), b), 'Cholesky'
+            y = np.linalg.solve(factor, b)
+            return np.linalg.solve(np.swapaxes(factor, -1, -2).conj(), y), 'Cholesky'
+        if structure == 'positive_definite':
+            raise np.linalg.LinAlgError("Matrix is not positive definite")
+        if scipy_linalg is not None and two_dimensional:
+            return scipy_linalg.solve(a, b, assume_a='sym' if np.isrealobj(a) else 'her'), 'symmetric LDLᵀ'
+    return np.linalg.solve(a, b), 'LU'
+
+
+def log_determinant(a: np.ndarray, structure: str = 'auto') -> Tuple[np.ndarray, np.ndarray, str]:
+    """(sign, log|det|, method); stays finite where det itself would overflow"""
+    a, structure = _prepare(a, structure, ('diagonal', 'upper', 'lower', 'sparse', 'symmetric'))
+
+    if structure in ('diagonal', 'upper', 'lower'):
+        diagonal = np.diagonal(a, axis1=-2, axis2=-1)
+        with np.errstate(divide='ignore'):
+            log_abs = np.sum(np.log(np.abs(diagonal)), axis=-1)
+        if np.iscomplexobj(diagonal):
+            phases = np.where(diagonal == 0, 0, diagonal / np.where(diagonal == 0, 1, np.abs(diagonal)))
+            return np.prod(phases, axis=-1), log_abs, 'diagonal product'
+        return np.prod(np.sign(diagonal), axis=-1), log_abs, 'diagonal product'
+    if structure == 'sparse' and scipy_sparse is not None and a.ndim == 2:
+        try:
+            lu = scipy_sparse_linalg.splu(scipy_sparse.csc_matrix(a))
+        except RuntimeError:  # exactly singular
+            return np.float64(0.0), np.float64(-np.inf), 'sparse LU'
+        pivots = lu.U.diagonal()
+        sign = _permutation_sign(lu.perm_r) * _permutation_sign(lu.perm_c) * np.prod(np.sign(pivots))
+        return sign, np.sum(np.log(np.abs(pivots))), 'sparse LU'
+    a = _densify(a)
+    if structure in ('symmetric', 'positive_definite'):
+        factor = _cholesky(a)
+        if factor is not None:
+            log_abs = 2 * np.sum(np.log(np.abs(np.diagonal(factor, axis1=-2, axis2=-1))), axis=-1)
+            return np.ones_like(log_abs), log_abs, 'Cholesky'
+        if structure == 'positive_definite':
+            raise np.linalg.LinAlgError("Matrix is not positive definite")
+    sign, log_abs = np.linalg.slogdet(a)
+    return sign, log_abs, 'LU'
+
+
+def inverse(a: np.ndarray, structure: str = 'auto') -> Tuple[np.ndarray, str]:
+    """Inverse of a, and the method used"""
+    a, structure = _prepare(a, structure, ('diagonal', 'upper', 'lower', 'sparse', 'symmetric'))
+
+    if scipy_sparse is not None and scipy_sparse.issparse(a):
+        # Sparse in, sparse out; the inverse usually fills in, so it is capped like a dense copy
+        _check_dense_size(a)
+        try:
+            return scipy_sparse.csr_matrix(scipy_sparse_linalg.inv(scipy_sparse.csc_matrix(a))), 'sparse LU'
+        except RuntimeError as e:
+            raise np.linalg.LinAlgError(str(e))
+
+    if structure == 'diagonal':
+        diagonal = _nonsingular_diagonal(a)
+        result = np.zeros(a.shape, dtype=np.result_type(a, float))
+        np.einsum('...ii->...i', result)[...] = 1 / diagonal
+        return result, 'diagonal'
+    if structure in ('upper', 'lower', 'symmetric', 'positive_definite', 'sparse'):
+        # Inverses of sparse matrices are dense; the sparse LU still saves the factorization
+        identity = np.broadcast_to(np.eye(a.shape[-1], dtype=np.result_type(a, float)), a.shape)
+        result, method = solve(a, identity, structure)
+        return result, method
+    return np.linalg.inv(a), 'LU'
+
+
+def eigen(a: np.ndarray, structure: str = 'auto') -> Tuple[np.ndarray, np.ndarray, str]:
+    """(eigenvalues, eigenvectors, method)"""
+    a, structure = _prepare(a, structure, ('diagonal', 'symmetric'))
+
+    if structure == 'diagonal':
+        values = np.diagonal(a, axis1=-2, axis2=-1).copy()
+        vectors = np.broadcast_to(np.eye(a.shape[-1], dtype=a.dtype), a.shape).copy()
+        return values, vectors, 'diagonal'
+    if structure in ('symmetric', 'positive_definite'):
+        values, vectors = np.linalg.eigh(a)
+        return values, vectors, 'symmetric eigh'
+    if structure == 'sparse' and _is_symmetric(a):
+        # Every eigenvalue is wanted, so sparse iterative solvers do not help
+        values, vectors = np.linalg.eigh(a)
+        return values, vectors, 'symmetric eigh'
+    values, vectors = np.linalg.eig(a)
+    return values, vectors, 'general eig'
@@ -0,0 +1,119 @@
+"""
+Sparse Matrices for MatrixMesh
+Builds scipy.sparse matrices from COO, CSR and Matrix Market input
+"""
+
+import io
+from typing import Any, List
+
+import numpy as np
+
+from matrix_codec import ALLOWED_KINDS, SPARSE_KEY, scipy_sparse
+
+try:
+    import scipy.io as scipy_io
+except ImportError:  # SciPy is optional; without it sparse input is rejected
+    scipy_io = None
+
+SPARSE_FORMATS = ('coo', 'csr')
+MATRIX_MARKET_HEADER = '%%MatrixMarket'
+# Keys of a scipy.sparse.save_npz file
+SPARSE_NPZ_KEYS = {'format', 'shape', 'data'}
+
+
+def is_sparse(obj: Any) -> bool:
+    """Whether obj is a scipy.sparse matrix"""
+    return scipy_sparse is not None and scipy_sparse.issparse(obj)
+
+
+def is_sparse_description(obj: Any) -> bool:
+    """Whether obj is a COO/CSR description such as {"format": "coo", "shape": ..., ...}"""
+    if not isinstance(obj, dict):
+        return False
+    return obj.get(SPARSE_KEY, obj.get('format')) in SPARSE_FORMATS
+
+
+def _require_scipy():
+    if scipy_sparse is None:
+        raise ValueError("Sparse matrices need SciPy, which is not installed")
+
+
+def _index_array(values: Any, name: str) -> np.ndarray:
+    array = np.asarray(values if values is not None else [])
+    if array.ndim != 1 or (array.size and array.dtype.kind not in 'iu'):
+        raise ValueError(f"Sparse '{name}' must be a flat list of integers")
+    return array.astype(np.int64, copy=False)
+
+
+def from_description(description: dict):
+    """
+    CSR matrix from a COO or CSR description
+
+    COO: {"format": "coo", "shape": [m, n], "row": [...], "col": [...], "data": [...]}
+    ("data" may be left out for a 0/1 adjacency matrix).
+    CSR: {"format": "csr", "shape": [m, n], "indptr": [...], "indices": [...], "data": [...]}.
+    Results sent by the server, which use "__sparse__" instead of "format", are accepted too.
+    """
+    _require_scipy()
+    fmt = description.get(SPARSE_KEY, description.get('format'))
+    try:
+        shape = tuple(int(dim) for dim in description['shape'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Sparse matrix needs a 'shape' of [rows, cols]")
+    if len(shape) != 2 or min(shape) < 0:
+        raise ValueError(f"Invalid sparse matrix shape: {shape}")
+
+    if fmt == 'coo':
+        row = _index_array(description.get('row'), 'row')
+        col = _index_array(description.get('col'), 'col')
+        data = description.get('data')
+        data = np.ones(len(row)) if data is None else np.asarray(data)
+        if not len(row) == len(col) == len(data):
+            raise ValueError("Sparse 'row', 'col' and 'data' must have the same length")
+        if len(row) and (row.min() < 0 or row.max() >= shape[0] or col.min() < 0 or col.max() >= shape[1]):
+            raise ValueError(f"Sparse indices outside the {shape} matrix")
+        if data.size and data.dtype.kind not in ALLOWED_KINDS:
+            raise ValueError(f"Unsupported dtype: {data.dtype}")
+        # Duplicate coordinates are summed, as in scipy
+        return scipy_sparse.coo_matrix((data, (row, col)), shape=shape).tocsr()
+
+    indptr = _index_array(description.get('indptr'), 'indptr')
+    indices = _index_array(description.get('indices'), 'indices')
+    data = np.asarray(description.get('data') if description.get('data') is not None else [])
+    if data.size and data.dtype.kind not in ALLOWED_KINDS:
+        raise ValueError(f"Unsupported dtype: {data.dtype}")
+    if len(indptr) != shape[0] + 1 or len(indices) != len(data):
+        raise ValueError("Sparse 'indptr', 'indices' and 'data' do not match the shape")
+    matrix = scipy_sparse.csr_matrix((data, indices, indptr), shape=shape)
+    matrix.check_format(full_check=True)
+    return matrix
+
+
+def as_matrix(obj: Any):
+    """ndarray or CSR matrix for one matrix of a request"""
+    if isinstance(obj, np.ndarray) or is_sparse(obj):
+        return obj
+    if is_sparse_description(obj):
+        return from_description(obj)
+    return np.array(obj)
+
+
+def parse_matrix_market(text: str) -> List[Any]:
+    """CSR matrices from one or more Matrix Market (COO triplet) blocks"""
+    _require_scipy()
+    matrices = []
+    for block in text.split(MATRIX_MARKET_HEADER)[1:]:
+        matrix = scipy_io.mmread(io.StringIO(MATRIX_MARKET_HEADER + block))
+        matrices.append(scipy_sparse.csr_matrix(matrix))
+    return matrices
+
+
+def load_sparse_npz(data: bytes):
+    """CSR matrix from the bytes of a scipy.sparse.save_npz file"""
+    _require_scipy()
+    return scipy_sparse.csr_matrix(scipy_sparse.load_npz(io.BytesIO(data)))
+
+
+def sparse_preview(matrix, size: int) -> np.ndarray:
+    """Dense top-left corner of a sparse matrix"""
+    return matrix[:size, :size].toarray()
@@ -0,0 +1,92 @@
+"""
+Tests for distributed tiles and worker authorization
+Run with pytest from the MatrixMesh directory
+"""
+
+import threading
+
+import numpy as np
+
+from distributed import TileScheduler, WorkerAuth, compute_tile, tile_checksum
+
+
+def _inline_worker(scheduler, corrupt=False):
+    """Register a worker that answers each tile on a background thread"""
+    holder = {}
+
+    def send(task):
+        def answer():
+            result = compute_tile(task['operation'], task['operands'])
+            checksum = tile_checksum(result)
+            if corrupt:
+                result = result + 1
+            scheduler.handle_result(holder['worker'], {'type': 'tile_result', 'task_id': task['task_id'],
+                                                       'result': result, 'checksum': checksum})
+        threading.Thread(target=answer, daemon=True).start()
+
+    holder['worker'] = scheduler.register(send, capacity=2, name='corrupt' if corrupt else 'honest')
+    return holder['worker']
+
+
+def test_worker_auth_requires_configuration():
+    """With nothing configured, no worker may register"""
+    assert not WorkerAuth().allows('anything', '127.0.0.1')
+    assert not WorkerAuth('', []).enabled
+
+
+def test_worker_auth_token_and_hosts():
+    """Token and host allow-list are both enforced when set"""
+    token_only = WorkerAuth('sekrit')
+    assert token_only.allows('sekrit', '10.0.0.9')
+    assert not token_only.allows('wrong', '10.0.0.9')
+    assert not token_only.allows(None, '10.0.0.9')
+
+    hosts_only = WorkerAuth(hosts=['10.0.0.5', ' 10.0.0.6 '])
+    assert hosts_only.allows(None, '10.0.0.6')
+    assert not hosts_only.allows(None, '10.0.0.7')
+
+    both = WorkerAuth('sekrit', ['10.0.0.5'])
+    assert both.allows('sekrit', '10.0.0.5')
+    assert not both.allows('sekrit', '10.0.0.6')
+    assert not both.allows('wrong', '10.0.0.5')
+
+
+def test_should_distribute_only_large_jobs_with_workers():
+    scheduler = TileScheduler(min_elements=100)
+    big = np.ones((20, 20))
+    assert not scheduler.should_distribute('multiply', [big, big])
+    _inline_worker(scheduler)
+    assert scheduler.should_distribute('multiply', [big, big])
+    assert not scheduler.should_distribute('determinant', [big])
+    assert not scheduler.should_distribute('add', [np.ones((5, 5)), np.ones((5, 5))])
+
+
+def test_tiled_operations_match_numpy():
+    """Tiles computed remotely are assembled into the right result"""
+    scheduler = TileScheduler(min_elements=1)
+    _inline_worker(scheduler)
+    rng = np.random.default_rng(0)
+    a, b = rng.random((600, 300)), rng.random((300, 520))
+
+    np.testing.assert_allclose(scheduler.run('multiply', [a, b])['matrix'], a @ b)
+    np.testing.assert_array_equal(scheduler.run('add', [a, a])['matrix'], a + a)
+    np.testing.assert_array_equal(scheduler.run('transpose', [a])['matrix'], a.T)
+    assert scheduler.stats['tiles_remote'] > 0
+
+
+def test_bad_results_are_retried_then_computed_locally():
+    """Results that fail verification never reach the output"""
+    scheduler = TileScheduler(min_elements=1)
+    _inline_worker(scheduler, corrupt=True)
+    a = np.arange(600 * 600, dtype=np.float64).reshape(600, 600)
+
+    result = scheduler.run('transpose', [a])
+    np.testing.assert_array_equal(result['matrix'], a.T)
+    assert scheduler.stats['checksum_failures'] > 0
+    assert scheduler.stats['tiles_local'] > 0
+
+
+def test_no_workers_computes_locally():
+    scheduler = TileScheduler(min_elements=1)
+    a = np.ones((300, 300))
+    np.testing.assert_array_equal(scheduler.run('add', [a, a, a])['matrix'], 3 * a)
@@ -0,0 +1,92 @@
+"""
+Tests for background matrix jobs
+Run with pytest from the MatrixMesh directory
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from job_manager import JOB_DONE, JOB_QUEUED, JOB_RUNNING, JobManager
+from result_cache import ResultCache
+from sparse_matrices import scipy_sparse
+
+
+class Recorder:
+    """Collects job callbacks and lets tests wait for completion"""
+
+    def __init__(self, manager: JobManager):
+        self.results = {}
+        self.errors = {}
+        self.done = threading.Event()
+        manager.on_complete = self.on_complete
+        manager.on_error = self.on_error
+
+    def on_complete(self, job, result):
+        self.results[job.job_id] = result
+        self.done.set()
+
+    def on_error(self, job, message):
+        self.errors[job.job_id] = message
+        self.done.set()
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1, max_jobs_per_user=2, cache=ResultCache())
+    yield manager
+    manager.shutdown()
+
+
+def test_small_dense_job_runs_inline(manager):
+    """A tiny job completes before submit returns"""
+    recorder = Recorder(manager)
+    job = manager.submit('alice', 'alice', 'add', matrices=[np.eye(2), np.eye(2)])
+    assert job.status == JOB_DONE
+    np.testing.assert_array_equal(recorder.results[job.job_id]['matrix'], 2 * np.eye(2))
+
+
+def test_identical_job_is_served_from_cache(manager):
+    """The second identical request does not recompute"""
+    Recorder(manager)
+    manager.submit('alice', 'alice', 'transpose', matrices=[np.arange(4).reshape(2, 2)])
+    job = manager.submit('bob', 'bob', 'transpose', matrices=[np.arange(4).reshape(2, 2)])
+    assert job.cached and job.status == JOB_DONE
+
+
+def test_per_user_limit():
+    """A user cannot queue more than max_jobs_per_user unfinished jobs"""
+    manager = JobManager(max_jobs_per_user=1, inline_max_elements=0)
+    try:
+        manager.submit('alice', 'alice', 'transpose', matrices=[np.ones((3, 3))])
+        with pytest.raises(ValueError):
+            manager.submit('alice', 'alice', 'transpose', matrices=[np.ones((3, 3))])
+    finally:
+        manager.shutdown()
+
+
+@pytest.mark.skipif(scipy_sparse is None, reason="SciPy not installed")
+def test_sparse_job_never_runs_inline(manager):
+    """A large matrix with few nonzeros goes to the pool instead of blocking submit"""
+    recorder = Recorder(manager)
+    n = 4000
+    coo = {'format': 'coo', 'shape': [n, n], 'row': list(range(10)), 'col': list(range(10)),
+           'data': [1.0] * 10}
+
+    start = time.perf_counter()
+    job = manager.submit('alice', 'alice', 'transpose', matrices=[coo])
+    assert time.perf_counter() - start < 0.5
+    assert job.status in (JOB_QUEUED, JOB_RUNNING)
+
+    assert recorder.done.wait(60)
+    assert job.status == JOB_DONE
+    assert recorder.results[job.job_id]['shape'] == (n, n)
+
+
+def test_matrix_market_text_never_runs_inline():
+    """Matrix Market text declares its shape, so a short upload can still be huge"""
+    text = "%%MatrixMarket matrix coordinate real general\n4000 4000 1\n1 1 1.0\n"
+    assert JobManager._may_expand(None, text)
+    assert not JobManager._may_expand([np.eye(2)], "1 2\n3 4")
@@ -0,0 +1,116 @@
+"""
+Tests for the MatrixMesh wire codec
+Run with pytest from the MatrixMesh directory
+"""
+
+import asyncio
+import json
+import socket
+
+import numpy as np
+import pytest
+
+from matrix_codec import (PAYLOAD_KEY, FrameError, FrameReader, decode_message, encode_message,
+                          payload_size, read_message_async, scipy_sparse)
+
+
+def _pair_reader(**kwargs):
+    left, right = socket.socketpair()
+    return left, right, FrameReader(right, **kwargs)
+
+
+def _send(sock, message, binary=True):
+    for buffer in encode_message(message, binary=binary):
+        sock.sendall(buffer)
+
+
+def test_text_round_trip():
+    """Text mode sends arrays as nested lists"""
+    matrix = np.arange(6, dtype=np.float64).reshape(2, 3)
+    [line] = encode_message({'type': 'matrix_result', 'result': matrix})
+    assert json.loads(line) == {'type': 'matrix_result', 'result': [[0.0, 1.0, 2.0], [3.0, 4.0, 5.0]]}
+
+
+def test_binary_round_trip_preserves_dtype_and_alignment():
+    """Binary mode keeps dtypes and shapes, and aligns every buffer"""
+    left, right, reader = _pair_reader()
+    with left, right:
+        message = {
+            'type': 'matrix_operation',
+            'matrices': [np.arange(3, dtype=np.int8), np.eye(3), np.array([1 + 2j])],
+        }
+        _send(left, message)
+        decoded = reader.read_message()
+
+    assert decoded['type'] == 'matrix_operation'
+    for sent, received in zip(message['matrices'], decoded['matrices']):
+        assert received.dtype == sent.dtype
+        np.testing.assert_array_equal(received, sent)
+        assert received.ctypes.data % 8 == 0
+
+
+@pytest.mark.skipif(scipy_sparse is None, reason="SciPy not installed")
+def test_sparse_matrix_travels_as_csr():
+    """Sparse matrices are sent as their CSR arrays"""
+    matrix = scipy_sparse.random(50, 40, density=0.05, format='coo', random_state=0)
+    buffers = encode_message({'result': matrix}, binary=True)
+    header = json.loads(buffers[0])
+    payload = b''.join(bytes(buffer) for buffer in buffers[1:])
+    decoded = decode_message(header, payload)['result']
+    rebuilt = scipy_sparse.csr_matrix((decoded['data'], decoded['indices'], decoded['indptr']),
+                                      shape=tuple(decoded['shape']))
+    np.testing.assert_array_equal(rebuilt.toarray(), matrix.toarray())
+
+
+def test_payload_limit():
+    """Announced payloads above the limit are refused before reading them"""
+    header = {PAYLOAD_KEY: {'arrays': [], 'payload_bytes': 1025}}
+    assert payload_size(header, limit=1025) == 1025
+    with pytest.raises(FrameError):
+        payload_size(header, limit=1024)
+    with pytest.raises(FrameError):
+        payload_size({PAYLOAD_KEY: {'payload_bytes': -1}})
+
+
+def test_frame_reader_enforces_max_payload():
+    """A reader with a small budget rejects a large binary frame"""
+    left, right, reader = _pair_reader(max_payload=1024)
+    with left, right:
+        _send(left, {'matrices': [np.zeros(1000)]})
+        with pytest.raises(FrameError):
+            reader.read_message()
+
+
+def test_frame_reader_enforces_max_line():
+    """A line that never ends cannot grow the buffer without bound"""
+    left, right, reader = _pair_reader(max_line=1000, recv_size=256)
+    with left, right:
+        left.sendall(b'{"type": "chat", "message": "' + b'x' * 2000)
+        with pytest.raises(FrameError):
+            reader.read_message()
+
+
+def test_frame_reader_skips_malformed_lines():
+    """Invalid JSON lines are skipped and the next message is returned"""
+    left, right, reader = _pair_reader()
+    with left, right:
+        left.sendall(b'not json\n\n[1, 2]\n')
+        _send(left, {'type': 'chat', 'message': 'hi'}, binary=False)
+        assert reader.read_message() == {'type': 'chat', 'message': 'hi'}
+        left.close()
+        assert reader.read_message() is None
+
+
+def test_async_reader_round_trip_and_limit():
+    """The asyncio reader decodes binary frames and applies max_payload"""
+    async def read(data, max_payload):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_message_async(reader, max_payload=max_payload)
+
+    data = b''.join(bytes(buffer) for buffer in encode_message({'m': np.ones((4, 4))}, binary=True))
+    decoded = asyncio.run(read(data, 1024))
+    np.testing.assert_array_equal(decoded['m'], np.ones((4, 4)))
+    with pytest.raises(FrameError):
+        asyncio.run(read(data, 64))
@@ -0,0 +1,98 @@
+"""
+Tests for the on-disk matrix store
+Run with pytest from the MatrixMesh directory
+"""
+
+import io
+import os
+
+import numpy as np
+import pytest
+
+from matrix_store import MatrixStore
+
+
+def _npy(matrix) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, matrix)
+    return buffer.getvalue()
+
+
+def _upload(store, data, owner='client', upload_id='u1', chunk=100):
+    for start in range(0, len(data), chunk):
+        store.write_chunk(owner, upload_id, data[start:start + chunk], filename='m.npy')
+    return store.finish_upload(owner, upload_id)
+
+
+def test_chunked_upload_and_download(tmp_path):
+    matrix = np.arange(200, dtype=np.float64).reshape(10, 20)
+    data = _npy(matrix)
+    store = MatrixStore(str(tmp_path))
+    info = _upload(store, data)
+
+    assert info['shape'] == [10, 20] and info['filename'] == 'm.npy'
+    assert store.get(info['matrix_id']) == info
+    np.testing.assert_array_equal(np.load(store.paths([info['matrix_id']])[0]), matrix)
+
+    count = store.chunk_count(info['matrix_id'], chunk_size=256)
+    downloaded = b''.join(store.read_chunk(info['matrix_id'], seq, chunk_size=256) for seq in range(count))
+    assert downloaded == data
+
+
+def test_invalid_upload_is_discarded(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    store.write_chunk('client', 'u1', b'not a matrix')
+    with pytest.raises(ValueError):
+        store.finish_upload('client', 'u1')
+    assert store.list() == [] and list(tmp_path.iterdir()) == []
+    assert store._bytes == 0
+
+
+def test_unknown_upload_and_matrix(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.finish_upload('client', 'missing')
+    with pytest.raises(ValueError):
+        store.paths(['mx-missing'])
+    assert not store.delete('mx-missing')
+
+
+def test_size_limit(tmp_path):
+    store = MatrixStore(str(tmp_path), max_bytes=150)
+    store.write_chunk('client', 'u1', b'x' * 100)
+    with pytest.raises(ValueError):
+        store.write_chunk('client', 'u1', b'x' * 100)
+    # The failed upload was dropped and its bytes returned
+    assert list(tmp_path.iterdir()) == []
+    store.write_chunk('client', 'u2', b'x' * 150)
+
+
+def test_abort_uploads_of_one_owner(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    first, second = object(), object()
+    store.write_chunk(first, 'u1', b'abc')
+    store.write_chunk(second, 'u1', b'abc')
+    store.abort_uploads(first)
+    with pytest.raises(ValueError):
+        store.finish_upload(first, 'u1')
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_register_and_delete_results(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    matrix_id, path = store.reserve()
+    np.save(path, np.eye(3))
+    info = store.register(matrix_id, filename='eye.npy')
+    assert info['shape'] == [3, 3] and store._bytes == info['nbytes']
+
+    assert store.delete(matrix_id)
+    assert store.get(matrix_id) is None and store._bytes == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_temporary_directory_is_removed_on_close():
+    store = MatrixStore()
+    directory = store.directory
+    _upload(store, _npy(np.ones((2, 2))))
+    store.close()
+    assert not os.path.exists(directory)
@@ -0,0 +1,88 @@
+"""
+Tests for server metrics and the Prometheus endpoint
+Run with pytest from the MatrixMesh directory
+"""
+
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import Histogram, Metrics, ServerMetrics, operation_label, start_metrics_server
+
+
+def test_operation_label_is_bounded():
+    known = {'inverse', 'solve'}
+    assert operation_label('inverse', known) == 'inverse'
+    assert operation_label('solve:positive_definite', known) == 'solve'
+    assert operation_label('transpose->inverse', known) == 'pipeline'
+    assert operation_label('anything else', known) == 'other'
+
+
+def test_histogram_quantiles():
+    histogram = Histogram((1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.count == 4 and histogram.sum == pytest.approx(6.5)
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(4.0)
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_render_prometheus_text():
+    metrics = Metrics()
+    metrics.describe('requests_total', 'counter', "Requests")
+    metrics.inc('requests_total', route='/a')
+    metrics.inc('requests_total', 2, route='/a')
+    metrics.set('queue_depth', 3)
+    metrics.observe('latency_seconds', 0.2, buckets=(0.1, 1))
+    metrics.gauge_function('clients', lambda: {'web': 2}, label='kind')
+    metrics.gauge_function('broken', lambda: 1 / 0)
+
+    text = metrics.render()
+    assert '# HELP requests_total Requests\n# TYPE requests_total counter\n' in text
+    assert 'requests_total{route="/a"} 3\n' in text
+    assert 'queue_depth 3\n' in text
+    assert 'clients{kind="web"} 2\n' in text
+    assert 'latency_seconds_bucket{le="0.1"} 0\n' in text
+    assert 'latency_seconds_bucket{le="1"} 1\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 1\n' in text
+    assert 'latency_seconds_count 1\n' in text
+    assert 'broken' not in text
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.inc('events_total', user='say "hi"\n')
+    assert 'events_total{user="say \\"hi\\"\\n"} 1' in metrics.render()
+
+
+def test_record_job_phases_and_summary():
+    metrics = ServerMetrics(['inverse'])
+    job = SimpleNamespace(job_id='j1', operation='inverse', cached=False, input_elements=100,
+                          timings={'compute': 0.02}, submitted_at=10.0, started_at=10.5, finished_at=11.0)
+    metrics.record_job(job, deliver_seconds=0.01)
+    metrics.record_job(job, error=True)
+
+    text = metrics.render()
+    assert 'matrixmesh_jobs_total{operation="inverse",status="ok"} 1' in text
+    assert 'matrixmesh_jobs_total{operation="inverse",status="error"} 1' in text
+    assert 'matrixmesh_job_phase_seconds_count{operation="inverse",phase="queue"} 2' in text
+    assert 'matrixmesh_job_phase_seconds_count{operation="inverse",phase="deliver"} 1' in text
+
+    summary = metrics.summary('matrixmesh_job_seconds', 'operation')
+    assert summary['inverse']['count'] == 2
+    assert 'inverse n=2' in metrics.summary_line()
+
+
+def test_metrics_endpoint():
+    metrics = Metrics()
+    metrics.inc('pings_total')
+    server = start_metrics_server(metrics, host='127.0.0.1', port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert 'pings_total 1' in response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,82 @@
+"""
+Tests for the content-hash result cache
+Run with pytest from the MatrixMesh directory
+"""
+
+import numpy as np
+
+from result_cache import ResultCache, estimate_size, result_key, text_key
+
+
+def test_keys_follow_content():
+    """Equal inputs share a key; dtype, shape, operation and kind all change it"""
+    a = np.arange(6, dtype=np.float64).reshape(2, 3)
+    assert result_key('transpose', [a]) == result_key('transpose', [a.copy()])
+    assert result_key('transpose', [a]) != result_key('transpose', [a.reshape(3, 2)])
+    assert result_key('transpose', [a]) != result_key('transpose', [a.astype(np.float32)])
+    assert result_key('transpose', [a]) != result_key('inverse', [a])
+    assert result_key('transpose', [a]) != result_key('transpose', [a], kind='chunk')
+
+
+def test_text_and_binary_inputs_do_not_collide():
+    assert text_key('1 2\n3 4') == text_key('1 2\n3 4')
+    assert text_key('1 2\n3 4') != text_key(b'1 2\n3 4')
+    assert result_key('det', matrix_data='1 2\n3 4') != result_key('det', matrix_data=b'1 2\n3 4')
+
+
+def test_sparse_descriptions_are_hashed():
+    description = {'format': 'coo', 'shape': [2, 2], 'row': np.array([0, 1]), 'col': np.array([1, 0]),
+                   'data': np.array([1.0, 2.0])}
+    changed = dict(description, data=np.array([1.0, 3.0]))
+    assert result_key('det', [description]) == result_key('det', [dict(description)])
+    assert result_key('det', [description]) != result_key('det', [changed])
+
+
+def test_lru_eviction_by_size():
+    entry = np.zeros(100)
+    cache = ResultCache(max_bytes=2 * estimate_size(entry))
+    cache.put('a', entry)
+    cache.put('b', entry)
+    assert cache.get('a') is entry  # 'a' is now the most recent
+    cache.put('c', entry)
+
+    assert cache.get('b') is None
+    assert cache.get('a') is entry and cache.get('c') is entry
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1 and stats['entries'] == 2
+
+
+def test_evicted_entries_spill_and_come_back(tmp_path):
+    entry = np.arange(100.0)
+    cache = ResultCache(max_bytes=estimate_size(entry), spill_dir=str(tmp_path))
+    cache.put('r:a', entry)
+    cache.put('r:b', entry + 1)
+
+    value = cache.get('r:a')
+    np.testing.assert_array_equal(value, entry)
+    stats = cache.get_stats()
+    assert stats['spills'] >= 1 and stats['disk_hits'] == 1
+
+
+def test_oversized_values_stay_on_disk(tmp_path):
+    cache = ResultCache(max_bytes=100, spill_dir=str(tmp_path))
+    cache.put('r:big', np.zeros(1000))
+    assert cache.get_stats()['entries'] == 0
+    assert cache.get_stats()['rejected'] == 1
+    assert cache.get('r:big').shape == (1000,)
+
+
+def test_disk_bound_drops_oldest_spills(tmp_path):
+    cache = ResultCache(max_bytes=100, spill_dir=str(tmp_path), max_disk_bytes=1)
+    cache.put('r:old', np.zeros(1000))
+    cache.put('r:new', np.ones(1000))
+    assert cache.get('r:old') is None
+    assert cache.get('r:new') is not None
+    assert len(list(tmp_path.glob('*.pkl'))) == 1
+
+
+def test_stale_spill_files_are_cleared(tmp_path):
+    (tmp_path / 'r_leftover.pkl').write_bytes(b'not a pickle')
+    cache = ResultCache(spill_dir=str(tmp_path))
+    assert not (tmp_path / 'r_leftover.pkl').exists()
+    assert cache.get('r:leftover') is None
@@ -0,0 +1,96 @@
+"""
+Tests for the structure-aware solvers
+Run with pytest from the MatrixMesh directory
+"""
+
+import numpy as np
+import pytest
+
+import solvers
+from solvers import detect_structure, eigen, inverse, log_determinant, scipy_sparse, solve
+
+GENERAL = np.array([[1.0, 2.0], [3.0, 4.0]])
+UPPER = np.array([[2.0, 1.0, 4.0], [0.0, 3.0, 5.0], [0.0, 0.0, 6.0]])
+SPD = np.array([[4.0, 1.0, 0.5], [1.0, 3.0, 0.2], [0.5, 0.2, 2.0]])
+
+
+def _det(a, structure='auto'):
+    sign, log_abs, _ = log_determinant(a, structure)
+    return float(sign * np.exp(log_abs))
+
+
+def test_detect_structure():
+    """Detection picks the first matching candidate"""
+    assert detect_structure(np.diag([1.0, 2.0])) == 'diagonal'
+    assert detect_structure(UPPER) == 'upper'
+    assert detect_structure(UPPER.T) == 'lower'
+    assert detect_structure(SPD) == 'symmetric'
+    assert detect_structure(GENERAL) == 'general'
+
+
+@pytest.mark.parametrize('structure', ['diagonal', 'upper', 'lower', 'symmetric', 'positive_definite'])
+def test_wrong_hint_does_not_change_the_answer(structure):
+    """A hint the matrix does not satisfy falls back to detection"""
+    assert _det(GENERAL, structure) == pytest.approx(-2.0)
+    np.testing.assert_allclose(inverse(GENERAL, structure)[0], np.linalg.inv(GENERAL))
+    b = np.array([1.0, 1.0])
+    np.testing.assert_allclose(solve(GENERAL, b, structure)[0], np.linalg.solve(GENERAL, b))
+
+
+def test_correct_hints_use_the_specialised_routine():
+    """Matching hints select the cheaper method"""
+    b = np.arange(3.0)
+    x, method = solve(UPPER, b, 'upper')
+    assert method == 'upper triangular'
+    np.testing.assert_allclose(UPPER @ x, b)
+
+    x, method = solve(SPD, b, 'positive_definite')
+    assert method == 'Cholesky'
+    np.testing.assert_allclose(SPD @ x, b)
+
+    assert _det(UPPER, 'upper') == pytest.approx(36.0)
+    assert log_determinant(SPD, 'symmetric')[2] == 'Cholesky'
+
+
+def test_unknown_hint_is_rejected():
+    with pytest.raises(ValueError):
+        solve(GENERAL, np.ones(2), 'triangular')
+
+
+def test_eigen_symmetric():
+    """Symmetric matrices use eigh and agree with the general routine"""
+    values, vectors, method = eigen(SPD)
+    assert method == 'symmetric eigh'
+    np.testing.assert_allclose(SPD @ vectors, vectors * values, atol=1e-12)
+
+
+def test_singular_diagonal_raises():
+    with pytest.raises(np.linalg.LinAlgError):
+        inverse(np.diag([1.0, 0.0]))
+
+
+@pytest.mark.skipif(scipy_sparse is None, reason="SciPy not installed")
+def test_sparse_solve_and_determinant():
+    """Sparse input uses the sparse LU and matches the dense result"""
+    dense = np.diag(np.arange(1.0, 301.0))
+    dense[0, 299] = 1.0
+    matrix = scipy_sparse.csr_matrix(dense)
+    b = np.ones(300)
+
+    x, method = solve(matrix, b)
+    assert method == 'sparse LU'
+    np.testing.assert_allclose(dense @ x, b)
+    sign, log_abs, _ = log_determinant(matrix)
+    assert sign == 1.0
+    assert log_abs == pytest.approx(np.linalg.slogdet(dense)[1])
+
+
+@pytest.mark.skipif(scipy_sparse is None, reason="SciPy not installed")
+def test_sparse_inverse_respects_densify_limit(monkeypatch):
+    """The sparse inverse fills in, so it is capped like densifying"""
+    matrix = scipy_sparse.identity(100, format='csr')
+    assert inverse(matrix)[1] == 'sparse LU'
+
+    monkeypatch.setattr(solvers, 'MAX_DENSIFY_ELEMENTS', 99 * 99)
+    with pytest.raises(ValueError):
+        inverse(matrix)
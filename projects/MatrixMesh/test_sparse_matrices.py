@@ -0,0 +1,80 @@
+"""
+Tests for sparse matrix input
+Run with pytest from the MatrixMesh directory
+"""
+
+import io
+
+import numpy as np
+import pytest
+
+from matrix_codec import SPARSE_KEY
+from sparse_matrices import (as_matrix, from_description, is_sparse, is_sparse_description,
+                             load_sparse_npz, parse_matrix_market, scipy_sparse, sparse_preview)
+
+needs_scipy = pytest.mark.skipif(scipy_sparse is None, reason="SciPy is not installed")
+
+DENSE = np.array([[0.0, 2.0, 0.0], [1.0, 0.0, 3.0]])
+COO = {'format': 'coo', 'shape': [2, 3], 'row': [0, 1, 1], 'col': [1, 0, 2], 'data': [2.0, 1.0, 3.0]}
+CSR = {'format': 'csr', 'shape': [2, 3], 'indptr': [0, 1, 3], 'indices': [1, 0, 2], 'data': [2.0, 1.0, 3.0]}
+
+
+def test_description_detection():
+    assert is_sparse_description(COO)
+    assert is_sparse_description({SPARSE_KEY: 'csr'})
+    assert not is_sparse_description({'format': 'dense'})
+    assert not is_sparse_description([[1, 2]])
+
+
+@needs_scipy
+def test_coo_and_csr_descriptions():
+    for description in (COO, CSR):
+        matrix = from_description(description)
+        assert is_sparse(matrix) and matrix.format == 'csr'
+        np.testing.assert_array_equal(matrix.toarray(), DENSE)
+
+
+@needs_scipy
+def test_coo_duplicates_are_summed_and_data_defaults_to_ones():
+    matrix = from_description({'format': 'coo', 'shape': [2, 2], 'row': [0, 0, 1], 'col': [1, 1, 0]})
+    np.testing.assert_array_equal(matrix.toarray(), [[0.0, 2.0], [1.0, 0.0]])
+
+
+@needs_scipy
+@pytest.mark.parametrize('bad', [
+    dict(COO, shape=[2]),
+    dict(COO, row=[0, 2, 1]),
+    dict(COO, col=[0, 1]),
+    dict(COO, row=[0.5, 1, 1]),
+    dict(COO, data=['a', 'b', 'c']),
+    dict(CSR, indptr=[0, 3]),
+    dict(CSR, indices=[1, 0, 5]),
+])
+def test_invalid_descriptions(bad):
+    with pytest.raises(ValueError):
+        from_description(bad)
+
+
+@needs_scipy
+def test_as_matrix():
+    assert as_matrix(DENSE) is DENSE
+    assert is_sparse(as_matrix(COO))
+    np.testing.assert_array_equal(as_matrix([[1, 2]]), [[1, 2]])
+
+
+@needs_scipy
+def test_matrix_market_blocks():
+    text = ("%%MatrixMarket matrix coordinate real general\n2 3 3\n1 2 2.0\n2 1 1.0\n2 3 3.0\n"
+            "%%MatrixMarket matrix coordinate real general\n1 1 1\n1 1 7.0\n")
+    first, second = parse_matrix_market(text)
+    np.testing.assert_array_equal(first.toarray(), DENSE)
+    np.testing.assert_array_equal(second.toarray(), [[7.0]])
+
+
+@needs_scipy
+def test_npz_round_trip_and_preview():
+    buffer = io.BytesIO()
+    scipy_sparse.save_npz(buffer, scipy_sparse.csr_matrix(DENSE))
+    matrix = load_sparse_npz(buffer.getvalue())
+    np.testing.assert_array_equal(matrix.toarray(), DENSE)
+    np.testing.assert_array_equal(sparse_preview(matrix, 2), DENSE[:2, :2])
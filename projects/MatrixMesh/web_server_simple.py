@@ -4,92 +4,192 @@ Web Interface for TCP/IP Matrix Chat
 Provides a browser-based UI that connects to the existing chat server
 """
 
+# Green threads let one process serve thousands of browser sessions; fall back to OS threads
+try:
+    import eventlet
+    eventlet.monkey_patch()
+    ASYNC_MODE = 'eventlet'
+except ImportError:
+    try:
+        from gevent import monkey
+        monkey.patch_all()
+        ASYNC_MODE = 'gevent'
+    except ImportError:
+        ASYNC_MODE = 'threading'
+
 from flask import Flask, render_template, request, jsonify
 from flask_socketio import SocketIO, emit
 import socket
-import json
 import threading
 import os
 from datetime import datetime
 from typing import Any, cast
 
+from matrix_codec import FrameError, FrameReader, encode_message, send_buffers
+from gateway import SESSION_CLOSE, SESSION_KEY, SESSIONS_KEY, tag_message
+
+CHAT_HOST = os.environ.get('CHAT_HOST', 'localhost')
+CHAT_PORT = int(os.environ.get('CHAT_PORT', '12345'))
+# Upstream TCP connections shared by all browser sessions
+UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', '4'))
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'matrix_chat_secret_key'
-# Use default threading async mode; sufficient for development
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
 
-class WebChatClient:
-    def __init__(self, web_sid: str, chat_host='localhost', chat_port=12345):
-        self.web_sid = web_sid  # Socket.IO session id for the browser client
+class UpstreamConnection:
+    """One TCP connection to the chat server, shared by many browser sessions"""
+    
+    def __init__(self, index: int, chat_host=CHAT_HOST, chat_port=CHAT_PORT):
+        self.room = f'upstream-{index}'  # Socket.IO room of the sessions using this connection
         self.chat_host = chat_host
         self.chat_port = chat_port
         self.chat_socket = None
         self.connected = False
-        self.username = None
+        self.sessions = set()  # Socket.IO session ids the server has accepted on this connection
+        self.pending = set()  # session ids with a slot reserved, waiting for the server to accept the join
+        self.send_lock = threading.Lock()
+        self.connect_lock = threading.Lock()
+    
+    def ensure_connected(self) -> bool:
+        with self.connect_lock:
+            if self.connected:
+                return True
+            try:
+                self.chat_socket = socket.create_connection((self.chat_host, self.chat_port))
+                self.chat_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.connected = True
+                socketio.start_background_task(self._listen_loop, self.chat_socket)
+                return True
+            except Exception as e:
+                print(f"Failed to connect to chat server: {e}")
+                return False
+    
+    def _listen_loop(self, chat_socket):
+        # FrameReader scans only newly received bytes for the next newline
+        reader = FrameReader(chat_socket)
+        try:
+            while True:
+                message = reader.read_message()
+                if message is None:
+                    break
+                self._route(message)
+        except (FrameError, OSError) as e:
+            print(f"Error receiving from chat server: {e}")
+        finally:
+            self._drop_connection(chat_socket)
+    
+    def _route(self, message: dict):
+        session_id = message.pop(SESSION_KEY, None)
+        if session_id is not None:
+            if session_id in self.pending:
+                self._join_answered(session_id, message.get('type') != 'error')
+            socketio.emit('chat_message', message, to=session_id)
+            return
         
-    def connect_to_chat_server(self) -> bool:
+        session_ids = message.pop(SESSIONS_KEY, None)
+        if not session_ids:
+            return
+        if self.sessions.issubset(session_ids):
+            # Everyone on this connection: serialize the event once for the whole room
+            socketio.emit('chat_message', message, to=self.room)
+        else:
+            for session_id in session_ids:
+                socketio.emit('chat_message', message, to=session_id)
+    
+    def _join_answered(self, session_id: str, accepted: bool):
+        """The server's first reply to a pending session: its welcome, or why the join failed"""
+        with gateway.lock:
+            if session_id not in self.pending:
+                return
+            self.pending.discard(session_id)
+            if accepted:
+                self.sessions.add(session_id)
+        if accepted:
+            # Only accepted users share the room, so room-wide emits reach exactly the joined sessions
+            socketio.server.enter_room(session_id, self.room, namespace='/')
+            return
+        # e.g. the username is taken: forget the session so the next join starts afresh
+        client = web_clients.pop(session_id, None)
+        if client:
+            client.disconnect()
+
+    def send(self, message: dict) -> bool:
+        if not self.connected:
+            return False
         try:
-            self.chat_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.chat_socket.connect((self.chat_host, self.chat_port))
-            self.connected = True
-            # Start listening thread to forward messages to this web client
-            threading.Thread(target=self._listen_loop, daemon=True).start()
+            with self.send_lock:
+                send_buffers(self.chat_socket, encode_message(message))
             return True
         except Exception as e:
-            print(f"Failed to connect to chat server: {e}")
+            print(f"Error sending to chat server: {e}")
+            self._drop_connection(self.chat_socket)
             return False
     
-    def _listen_loop(self):
-        buffer = ""
-        decoder = json.JSONDecoder()
-        while self.connected and self.chat_socket:
+    def _drop_connection(self, chat_socket):
+        with self.connect_lock:
+            if chat_socket is not self.chat_socket or not self.connected:
+                return
+            self.connected = False
             try:
-                data = self.chat_socket.recv(4096)
-                if not data:
-                    break
-                buffer += data.decode('utf-8')
-                # Stream-parse as many JSON objects as are fully available
-                while True:
-                    # Trim leading whitespace/newlines
-                    tmp = buffer.lstrip()
-                    if not tmp:
-                        buffer = ""
-                        break
-                    consumed = len(buffer) - len(tmp)
-                    buffer = tmp
-                    try:
-                        message, idx = decoder.raw_decode(buffer)
-                    except json.JSONDecodeError:
-                        # Not enough data for a full JSON object yet
-                        break
-                    # Forward message to the specific web client
-                    socketio.emit('chat_message', message, to=self.web_sid)
-                    # Remove the parsed JSON from the buffer and continue
-                    buffer = buffer[idx:]
-            except Exception as e:
-                print(f"Error receiving from chat server: {e}")
-                break
-        self.connected = False
+                chat_socket.close()
+            except Exception:
+                pass
+            self.chat_socket = None
+            orphaned, self.sessions = self.sessions | self.pending, set()
+            self.pending = set()
+        
+        for session_id in orphaned:
+            web_clients.pop(session_id, None)
+            # Otherwise the sid would get this room's broadcasts once the slot reconnects
+            socketio.server.leave_room(session_id, self.room, namespace='/')
+            socketio.emit('error', {'message': 'Lost connection to chat server'}, to=session_id)
+
+class ChatGateway:
+    """Multiplexes every browser session over a small pool of upstream connections"""
+    
+    def __init__(self, pool_size=UPSTREAM_POOL_SIZE):
+        self.upstreams = [UpstreamConnection(i) for i in range(pool_size)]
+        self.lock = threading.Lock()
+    
+    def acquire(self, web_sid: str):
+        """Assign a session to the least loaded upstream connection"""
+        tried = set()
+        while True:
+            with self.lock:
+                candidates = [u for u in self.upstreams if u not in tried]
+                if not candidates:
+                    return None
+                upstream = min(candidates, key=lambda u: (len(u.sessions) + len(u.pending), not u.connected))
+                # Reserve the slot so concurrent joins spread over the pool
+                upstream.pending.add(web_sid)
+            # Connecting can be slow; only this upstream's connect_lock is held meanwhile
+            if upstream.ensure_connected():
+                return upstream
+            self.release(upstream, web_sid)
+            tried.add(upstream)
+    
+    def release(self, upstream: UpstreamConnection, web_sid: str):
+        """Give back a session's slot on an upstream connection"""
+        with self.lock:
+            upstream.sessions.discard(web_sid)
+            upstream.pending.discard(web_sid)
+
+class WebChatClient:
+    def __init__(self, web_sid: str, upstream: UpstreamConnection):
+        self.web_sid = web_sid  # Socket.IO session id for the browser client
+        self.upstream = upstream
+        self.username = None
     
     def send_to_chat_server(self, message: dict) -> bool:
-        if self.chat_socket and self.connected:
-            try:
-                # Send with newline delimiter
-                self.chat_socket.send((json.dumps(message) + "\n").encode('utf-8'))
-                return True
-            except Exception as e:
-                print(f"Error sending to chat server: {e}")
-        return False
+        # Tagged so the server knows which multiplexed user is speaking
+        return self.upstream.send(tag_message(message, self.web_sid))
     
     def disconnect(self):
-        self.connected = False
-        if self.chat_socket:
-            try:
-                self.chat_socket.close()
-            except Exception:
-                pass
-            self.chat_socket = None
+        gateway.release(self.upstream, self.web_sid)
+        self.upstream.send(tag_message({'type': SESSION_CLOSE}, self.web_sid))
 
+gateway = ChatGateway()
 # Map Socket.IO sid -> WebChatClient
 web_clients = {}
 
@@ -131,18 +231,22 @@ def on_join_chat(data):
         emit('error', {'message': 'Username is required'})
         return
     sid = cast(Any, request).sid
-    # Create client for this web socket
-    client = WebChatClient(web_sid=sid)
-    if not client.connect_to_chat_server():
-        emit('error', {'message': 'Could not connect to chat server'})
-        return
-    # Send join to TCP chat
+    client = web_clients.get(sid)
+    if client is None:
+        # Share an upstream connection instead of opening one per browser
+        upstream = gateway.acquire(sid)
+        if upstream is None:
+            emit('error', {'message': 'Could not connect to chat server'})
+            return
+        client = web_clients[sid] = WebChatClient(sid, upstream)
+    # Send join to TCP chat; the sid joins the upstream's room once the server accepts it
     if client.send_to_chat_server({'type': 'join', 'username': username}):
         client.username = username
-        web_clients[sid] = client
         print(f"User {username} connected via web UI (sid={sid})")
     else:
-        client.disconnect()
+        # Undo the assignment so the load balancing forgets this sid
+        web_clients.pop(sid, None)
+        gateway.release(client.upstream, sid)
         emit('error', {'message': 'Failed to join chat'})
 
 @socketio.on('send_message')
@@ -184,12 +288,64 @@ def on_matrix_operation(data):
         'operation': (data or {}).get('operation'),
         'matrices': (data or {}).get('matrices', [])
     }
+    if (data or {}).get('matrix_ids'):
+        payload['matrix_ids'] = data['matrix_ids']
     if not client.send_to_chat_server(payload):
         emit('error', {'message': 'Failed to perform matrix operation'})
 
+@socketio.on('cancel_job')
+def on_cancel_job(data):
+    sid = cast(Any, request).sid
+    client = web_clients.get(sid)
+    if not client:
+        emit('error', {'message': 'Not connected to chat'})
+        return
+    payload = {'type': 'cancel_job', 'job_id': (data or {}).get('job_id')}
+    if not client.send_to_chat_server(payload):
+        emit('error', {'message': 'Failed to cancel job'})
+
+@socketio.on('fetch_result')
+def on_fetch_result(data):
+    sid = cast(Any, request).sid
+    client = web_clients.get(sid)
+    if not client:
+        emit('error', {'message': 'Not connected to chat'})
+        return
+    payload = {
+        'type': 'fetch_result',
+        'result_id': (data or {}).get('result_id'),
+        'format': 'json',
+        'compression': (data or {}).get('compression', 'none')
+    }
+    if not client.send_to_chat_server(payload):
+        emit('error', {'message': 'Failed to fetch result'})
+
+@socketio.on('download_matrix')
+def on_download_matrix(data):
+    sid = cast(Any, request).sid
+    client = web_clients.get(sid)
+    if not client:
+        emit('error', {'message': 'Not connected to chat'})
+        return
+    payload = {'type': 'download_matrix', 'matrix_id': (data or {}).get('matrix_id')}
+    if not client.send_to_chat_server(payload):
+        emit('error', {'message': 'Failed to download matrix'})
+
+@socketio.on('list_jobs')
+def on_list_jobs(data=None):
+    sid = cast(Any, request).sid
+    client = web_clients.get(sid)
+    if not client:
+        emit('error', {'message': 'Not connected to chat'})
+        return
+    if not client.send_to_chat_server({'type': 'list_jobs'}):
+        emit('error', {'message': 'Failed to list jobs'})
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', '5050'))  # Avoid macOS AirPlay on 5000
     print("🌐 Starting web interface for Matrix Chat...")
-    print("💡 Make sure the TCP chat server is running on localhost:12345")
+    print(f"💡 Make sure the TCP chat server is running on {CHAT_HOST}:{CHAT_PORT}")
+    print(f"🔀 {UPSTREAM_POOL_SIZE} upstream connections, Socket.IO async mode: {ASYNC_MODE}")
     print(f"🚀 Web interface available at http://localhost:{port}")
-    socketio.run(app, host='127.0.0.1', port=port, debug=True)
+    debug = os.environ.get('FLASK_DEBUG') == '1'  # the debugger allows code execution; opt in only
+    socketio.run(app, host='127.0.0.1', port=port, debug=debug)
@@ -1,7 +1,12 @@
 import socket, json, time, argparse, pygame
+from game_links import HEARTBEAT_INTERVAL
+from game_snapshots import SnapshotDecoder, is_snapshot
 
 SERVER_PORT = 9999
 HEARTBEAT_SEND_DT = 1.0  # Send a packet every 1 second minimum
+ACK_SEND_DT = 0.05  # Acknowledge snapshots at most 20 times a second
+HEARTBEAT_LOSS_AFTER = 2.0  # A heartbeat unanswered this long counts as lost
+HEARTBEAT_LOSS_WINDOW = 10  # Loss is reported over this many recent heartbeats
 
 SCREEN_W, SCREEN_H = 1000, 700
 ROAD_LEFT, ROAD_RIGHT = 200, 800
@@ -27,7 +32,7 @@ join_confirmed = False
 # Send initial join message (will be resent until ack)
 def send_join():
     try:
-        sock.sendto(json.dumps({"type": "join", "name": args.name}).encode(), server)
+        sock.sendto(json.dumps({"type": "join", "name": args.name, "snapshots": "binary"}).encode(), server)
     except Exception as ex:
         print("Join send error:", ex)
 
@@ -89,6 +94,21 @@ key_down_down = False  # Backward movement
 
 last_seq = -1  # sequence filtering for 'state' packets
 
+# Binary snapshots: deltas against the last one we acknowledged; names come from the roster
+snapshots = SnapshotDecoder()
+obstacle_type_order = list(OBSTACLE_TYPES)
+roster_names = {}
+roster_version = None
+ack_pending = False
+last_ack = 0.0
+
+# Numbered heartbeats: the server sets our snapshot rate from the RTT and loss we report
+heartbeat_seq = 0
+heartbeat_sent = {}  # seq -> send time, until answered or counted as lost
+heartbeat_outcomes = []  # recent True (answered) / False (lost)
+last_heartbeat = 0.0
+link_rtt = None
+
 # --- Pygame Initialization ---
 pygame.init()
 screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
@@ -213,21 +233,47 @@ while running:
     try:
         while True:
             try:
-                data, addr = sock.recvfrom(8192)
+                data, addr = sock.recvfrom(65536)
             except BlockingIOError:
                 break
             except Exception as ex:
                 print("Recv error (inner):", ex)
                 break
 
-            try:
-                p = json.loads(data.decode())
-            except json.JSONDecodeError as ex:
-                print("JSON decode error:", ex)
-                continue
-            except Exception as ex:
-                print("Unexpected decode error:", ex)
-                continue
+            if is_snapshot(data):
+                try:
+                    snapshot = snapshots.decode(data)
+                except Exception as ex:
+                    print("Snapshot decode error:", ex)
+                    continue
+                if snapshot is None:  # stale, or its baseline is gone; the next ack fixes it
+                    continue
+                ack_pending = True
+                players = snapshot.player_dicts()
+                # Cars outside our viewport are left out of snapshots; stop drawing them
+                present = {info["id"] for info in players}
+                for pid in [pid for pid in targets if pid not in present]:
+                    del targets[pid]
+                    interp.pop(pid, None)
+                for info in players:
+                    info["name"] = roster_names.get(info["id"], f"Player{info['id']}")
+                # Same shape as a JSON state, so both take the same path below
+                p = {
+                    "type": "state",
+                    "players": players,
+                    "obstacles": snapshot.obstacle_dicts(obstacle_type_order),
+                    "time_left": snapshot.time_left_seconds,
+                    "game_running": snapshot.game_running
+                }
+            else:
+                try:
+                    p = json.loads(data.decode())
+                except json.JSONDecodeError as ex:
+                    print("JSON decode error:", ex)
+                    continue
+                except Exception as ex:
+                    print("Unexpected decode error:", ex)
+                    continue
 
             # Handle join_ack
             if p.get("type") == "join_ack":
@@ -241,6 +287,25 @@ while running:
                     if "obstacle_types" in p:
                         OBSTACLE_TYPES.update(p["obstacle_types"])
                         print("Updated obstacle types from server")
+                    if "obstacle_type_order" in p:
+                        obstacle_type_order = p["obstacle_type_order"]
+
+            elif p.get("type") == "heartbeat_ack":
+                sent_at = heartbeat_sent.pop(p.get("seq"), None)
+                if sent_at is not None:
+                    sample = time.time() - sent_at
+                    link_rtt = sample if link_rtt is None else link_rtt + 0.125 * (sample - link_rtt)
+                    heartbeat_outcomes.append(True)
+
+            elif p.get("type") == "roster":
+                # Static player data; snapshots only carry ids
+                roster_names = {info["id"]: info["name"] for info in p.get("players", [])}
+                roster_version = p.get("version")
+                ack_pending = True
+                for pid, target in targets.items():
+                    if pid in roster_names:
+                        target["name"] = roster_names[pid]
+                        player_scores[pid]["name"] = roster_names[pid]
                         
             elif p.get("type") == "state":
                 # sequence check
@@ -289,6 +354,31 @@ while running:
     except Exception as ex:
         print("Receive loop exception:", ex)
 
+    # Numbered heartbeat carrying our link measurements
+    if join_confirmed and now - last_heartbeat >= HEARTBEAT_INTERVAL:
+        for seq, sent_at in list(heartbeat_sent.items()):
+            if now - sent_at > HEARTBEAT_LOSS_AFTER:
+                del heartbeat_sent[seq]
+                heartbeat_outcomes.append(False)
+        heartbeat_outcomes = heartbeat_outcomes[-HEARTBEAT_LOSS_WINDOW:]
+        loss = heartbeat_outcomes.count(False) / len(heartbeat_outcomes) if heartbeat_outcomes else 0.0
+        heartbeat_seq += 1
+        heartbeat_sent[heartbeat_seq] = now
+        try:
+            sock.sendto(json.dumps({"type": "heartbeat", "seq": heartbeat_seq, "rtt": link_rtt, "loss": loss}).encode(), server)
+        except Exception as ex:
+            print("Heartbeat send error:", ex)
+        last_heartbeat = now
+
+    # Acknowledge the newest snapshot and roster, so the server can send deltas against them
+    if ack_pending and now - last_ack >= ACK_SEND_DT:
+        try:
+            sock.sendto(json.dumps({"type": "ack", "seq": snapshots.latest_seq, "roster": roster_version}).encode(), server)
+        except Exception as ex:
+            print("Ack send error:", ex)
+        ack_pending = False
+        last_ack = now
+
     # interpolate player positions
     for pid, t in targets.items():
         ip = interp.get(pid, {"x": t["x"], "y": t["y"]})
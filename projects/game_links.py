@@ -0,0 +1,88 @@
+"""
+Per-client link quality and snapshot send rate for the lane racing GameServer
+RTT and loss come from heartbeats; the send rate adapts AIMD-style so slow links are not flooded
+"""
+
+from collections import deque
+from typing import Optional
+
+HEARTBEAT_INTERVAL = 0.5      # how often clients send sequenced heartbeats
+MIN_SEND_RATE = 6.0           # snapshots per second a client never drops below
+RATE_INCREASE = 5.0           # Hz added per healthy heartbeat
+RATE_DECREASE = 0.5           # factor applied when the link looks congested
+LOSS_THRESHOLD = 0.05
+RTT_THRESHOLD = 0.25          # seconds
+QUEUEING_THRESHOLD = 0.1      # seconds of RTT above the best seen, a sign of queues building up
+LOSS_WINDOW = 10              # heartbeats the upstream loss estimate covers (5 s)
+RTT_SMOOTHING = 0.125
+
+
+class LinkMonitor:
+    """
+    Link estimate and send-rate controller for one client
+
+    Clients number their heartbeats and report the RTT and loss they measure
+    from heartbeat_ack replies; gaps in the numbering also give the server its
+    own (upstream) loss estimate. The rate grows additively while the link is
+    healthy and halves, at most once per RTT, when it is not.
+    """
+
+    def __init__(self, max_rate: float, min_rate: float = MIN_SEND_RATE):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max_rate
+        self.rtt: Optional[float] = None
+        self.min_rtt: Optional[float] = None
+        self.reported_loss = 0.0
+        self.last_seq: Optional[int] = None
+        self.arrivals = deque(maxlen=LOSS_WINDOW)  # True per heartbeat received, False per gap
+        self.last_decrease = 0.0
+        self.credit = 1.0
+
+    @property
+    def upstream_loss(self) -> float:
+        if not self.arrivals:
+            return 0.0
+        return self.arrivals.count(False) / len(self.arrivals)
+
+    @property
+    def loss(self) -> float:
+        return max(self.reported_loss, self.upstream_loss)
+
+    def on_heartbeat(self, seq: Optional[int], rtt: Optional[float], loss: Optional[float], now: float) -> None:
+        """Update the estimates from one heartbeat and adjust the send rate"""
+        if seq is not None:
+            if self.last_seq is not None and seq <= self.last_seq:
+                return  # duplicate or reordered
+            if self.last_seq is not None:
+                self.arrivals.extend([False] * min(seq - self.last_seq - 1, LOSS_WINDOW))
+            self.arrivals.append(True)
+            self.last_seq = seq
+        if rtt is not None and rtt >= 0:
+            self.rtt = rtt if self.rtt is None else self.rtt + RTT_SMOOTHING * (rtt - self.rtt)
+            self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        if loss is not None:
+            self.reported_loss = min(max(loss, 0.0), 1.0)
+
+        if self._congested():
+            # Back off at most once per round trip, so one bad spell halves the rate once
+            if now - self.last_decrease >= max(self.rtt or 0.0, HEARTBEAT_INTERVAL):
+                self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+                self.last_decrease = now
+        else:
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+
+    def _congested(self) -> bool:
+        if self.loss > LOSS_THRESHOLD:
+            return True
+        if self.rtt is None:
+            return False
+        return self.rtt > RTT_THRESHOLD or self.rtt - self.min_rtt > QUEUEING_THRESHOLD
+
+    def due(self) -> bool:
+        """Whether this tick's snapshot goes to the client; call once per tick"""
+        self.credit = min(self.credit + self.rate / self.max_rate, 1.0)
+        if self.credit >= 1.0 - 1e-9:
+            self.credit -= 1.0
+            return True
+        return False
@@ -0,0 +1,311 @@
+"""
+Vectorized simulation core for the lane racing GameServer
+Players and obstacles live in NumPy struct-of-arrays tables; each tick is a handful of array operations
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Player car bounding box half-extents (matching client car rendering)
+PLAYER_HALF_WIDTH = 30
+PLAYER_HALF_HEIGHT = 40
+# Obstacle boxes are shrunk by this much on each side for a fairer feel
+OBSTACLE_PADDING = 5
+
+PLAYER_FIELDS = {
+    "id": np.int64,
+    "lane": np.int8,
+    "target_lane": np.int8,
+    "x": np.float64,
+    "y": np.float64,
+    "score": np.float64,
+    "blink": np.float64,
+    "last_heartbeat": np.float64,
+    "finished": np.bool_,
+    "move_progress": np.float64,
+    "consecutive_collisions": np.int32,
+    "last_collision_time": np.float64,
+    "vertical_speed": np.float64,
+    "target_y": np.float64,
+}
+
+OBSTACLE_FIELDS = {
+    "id": np.float64,
+    "uid": np.int64,  # small unique integer, for compact snapshots
+    "type_index": np.int16,
+    "lane": np.int8,
+    "x": np.float64,
+    "y": np.float64,
+    "width": np.int32,
+    "height": np.int32,
+    "speed": np.float64,
+    "penalty": np.int32,
+}
+
+
+class EntityTable:
+    """Growable struct-of-arrays; row order is insertion order and survives removals"""
+
+    def __init__(self, fields: Dict[str, Any], capacity: int = 64):
+        self.fields = fields
+        self.count = 0
+        self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in fields.items()}
+        self.handles: List[Any] = []  # Python-side object per row (or None), kept in row order
+
+    def __len__(self) -> int:
+        return self.count
+
+    def column(self, name: str) -> np.ndarray:
+        """Live view of the used part of a column"""
+        return self.arrays[name][:self.count]
+
+    def add(self, handle: Any = None, **values) -> int:
+        """Append a row and return its index"""
+        if self.count == len(self.arrays["id"]):
+            self._grow()
+        row = self.count
+        for name, array in self.arrays.items():
+            array[row] = values.get(name, 0)
+        self.count += 1
+        self.handles.append(handle)
+        if handle is not None:
+            handle.row = row
+        return row
+
+    def remove(self, row: int) -> None:
+        """Remove one row"""
+        keep = np.ones(self.count, dtype=bool)
+        keep[row] = False
+        self.keep(keep)
+
+    def keep(self, mask: np.ndarray) -> None:
+        """Drop every row where mask is False, preserving the order of the rest"""
+        kept = int(np.count_nonzero(mask))
+        if kept == self.count:
+            return
+        for array in self.arrays.values():
+            array[:kept] = array[:self.count][mask]
+        self.handles = [handle for handle, keep_row in zip(self.handles, mask) if keep_row]
+        for row, handle in enumerate(self.handles):
+            if handle is not None:
+                handle.row = row
+        self.count = kept
+
+    def clear(self) -> None:
+        self.count = 0
+        self.handles = []
+
+    def _grow(self) -> None:
+        for name, array in self.arrays.items():
+            grown = np.zeros(len(array) * 2, dtype=array.dtype)
+            grown[:self.count] = array[:self.count]
+            self.arrays[name] = grown
+
+
+class EntityView:
+    """Attribute access to one row of an EntityTable, for per-entity code such as input handling"""
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: EntityTable):
+        self.table = table
+        self.row = -1
+
+
+def _column_property(name: str) -> property:
+    def getter(self):
+        return self.table.arrays[name][self.row].item()
+
+    def setter(self, value):
+        self.table.arrays[name][self.row] = value
+
+    return property(getter, setter)
+
+
+class Player(EntityView):
+    """A player: name and address in Python, everything numeric in the simulation's player table"""
+
+    __slots__ = ("name", "addr")
+
+    def __init__(self, table: EntityTable, name: str, addr: Any):
+        super().__init__(table)
+        self.name = name
+        self.addr = addr
+
+
+for _name in PLAYER_FIELDS:
+    setattr(Player, _name, _column_property(_name))
+
+
+def ease_out_back(x):
+    """Easing curve for lane changes; works on scalars and arrays"""
+    c1 = 1.70158
+    c2 = c1 * 1.525
+    return 1 + c2 * (x - 1) ** 3 + c1 * (x - 1) ** 2
+
+
+class LaneSimulation:
+    """Movement, collision and scoring for every player and obstacle at once"""
+
+    def __init__(self, lane_x: List[float], obstacle_types: Dict[str, Dict[str, Any]]):
+        self.lane_x = np.asarray(lane_x, dtype=np.float64)
+        self.type_names = list(obstacle_types)
+        self.type_index = {name: i for i, name in enumerate(self.type_names)}
+        self.players = EntityTable(PLAYER_FIELDS)
+        self.obstacles = EntityTable(OBSTACLE_FIELDS)
+        self.next_obstacle_uid = 1
+
+    # ---------------- ENTITIES ---------------- #
+
+    def add_player(self, name: str, addr: Any, **values) -> Player:
+        player = Player(self.players, name, addr)
+        self.players.add(player, **values)
+        return player
+
+    def remove_player(self, player: Player) -> None:
+        self.players.remove(player.row)
+
+    def add_obstacle(self, obstacle_type: str, **values) -> int:
+        uid = self.next_obstacle_uid
+        self.next_obstacle_uid += 1
+        return self.obstacles.add(type_index=self.type_index[obstacle_type], uid=uid, **values)
+
+    # ---------------- TICK ---------------- #
+
+    def move_players(self, dt: float, transition_duration: float, min_y: float, max_y: float) -> None:
+        """Advance lane transitions (eased) and vertical movement"""
+        p = self.players
+        if not p.count:
+            return
+        lane, target_lane = p.column("lane"), p.column("target_lane")
+        x, y = p.column("x"), p.column("y")
+        progress_col = p.column("move_progress")
+
+        moving = np.flatnonzero(progress_col < 1.0)
+        if moving.size:
+            progress = np.minimum(1.0, progress_col[moving] + dt / transition_duration)
+            progress_col[moving] = progress
+            start_x = self.lane_x[lane[moving]]
+            target_x = self.lane_x[target_lane[moving]]
+            x[moving] = start_x + (target_x - start_x) * ease_out_back(progress)
+
+            done = moving[progress >= 1.0]
+            lane[done] = target_lane[done]
+            x[done] = self.lane_x[lane[done]]
+
+        vertical_speed = p.column("vertical_speed")
+        climbing = np.flatnonzero(vertical_speed != 0.0)
+        if climbing.size:
+            y[climbing] = np.clip(y[climbing] + vertical_speed[climbing] * dt, min_y, max_y)
+
+    def move_obstacles(self, dt: float, speed_multiplier: float, screen_h: float) -> None:
+        """Move obstacles down the road and drop those that have left the screen"""
+        o = self.obstacles
+        if not o.count:
+            return
+        y = o.column("y")
+        y += (o.column("speed") * speed_multiplier) * dt
+        # Keep an obstacle while any part is still on screen, with a buffer
+        o.keep(y < screen_h + o.column("height") + 100)
+
+    def collide(self, now: float, blink_duration: float, reset_time: float) -> List[Tuple[int, int, int]]:
+        """
+        Resolve this tick's collisions; returns (player row, obstacle type index, penalty) per hit
+
+        Overlaps are found with one AABB test per lane. Each obstacle hits at most
+        the first eligible player in join order, and a hit player blinks (is
+        invulnerable) for the rest of the tick; obstacles that hit are removed.
+        """
+        p, o = self.players, self.obstacles
+        if not p.count or not o.count:
+            return []
+
+        last_collision = p.column("last_collision_time")
+        consecutive = p.column("consecutive_collisions")
+        consecutive[now - last_collision > reset_time] = 0
+
+        blink = p.column("blink")
+        eligible = ~p.column("finished") & (now - blink >= blink_duration)
+        if not eligible.any():
+            return []
+
+        player_lane, px, py = p.column("lane"), p.column("x"), p.column("y")
+        obstacle_lane, ox, oy = o.column("lane"), o.column("x"), o.column("y")
+        half_w = o.column("width") / 2 - OBSTACLE_PADDING
+        half_h = o.column("height") / 2 - OBSTACLE_PADDING
+
+        hits = []
+        hit_obstacles = np.zeros(o.count, dtype=bool)
+        for lane in range(len(self.lane_x)):
+            players = np.flatnonzero(eligible & (player_lane == lane))
+            obstacles = np.flatnonzero(obstacle_lane == lane)
+            if not players.size or not obstacles.size:
+                continue
+            # overlap[i, j]: obstacle i overlaps player j
+            overlap = ((np.abs(ox[obstacles, None] - px[None, players]) < half_w[obstacles, None] + PLAYER_HALF_WIDTH) &
+                       (np.abs(oy[obstacles, None] - py[None, players]) < half_h[obstacles, None] + PLAYER_HALF_HEIGHT))
+            if not overlap.any():
+                continue
+            # Overlaps are rare; resolve them in obstacle order, then player order
+            hit_players = set()
+            for i, j in np.argwhere(overlap):
+                if hit_obstacles[obstacles[i]] or j in hit_players:
+                    continue
+                hit_obstacles[obstacles[i]] = True
+                hit_players.add(j)
+                hits.append((int(players[j]), int(obstacles[i])))
+
+        results = []
+        score = p.column("score")
+        for player_row, obstacle_row in hits:
+            penalty = int(o.arrays["penalty"][obstacle_row])
+            # Progressive penalty for consecutive collisions
+            if consecutive[player_row] > 0:
+                penalty = int(penalty * (1.0 + consecutive[player_row] * 0.3))
+            score[player_row] = max(0, score[player_row] - penalty)
+            blink[player_row] = now
+            last_collision[player_row] = now
+            consecutive[player_row] += 1
+            results.append((player_row, int(o.arrays["type_index"][obstacle_row]), penalty))
+
+        o.keep(~hit_obstacles)
+        return results
+
+    def award_points(self, points: float, max_score: float, difficulty_bonus: float, now: float) -> np.ndarray:
+        """Add this tick's points; returns the rows of players who just reached max_score"""
+        p = self.players
+        score, finished = p.column("score"), p.column("finished")
+        scoring = (score < max_score) & ~finished
+        if not scoring.any():
+            return np.empty(0, dtype=np.intp)
+        # Fewer consecutive collisions earn more
+        collision_modifier = np.maximum(0.5, 1.0 - p.column("consecutive_collisions")[scoring] * 0.1)
+        score[scoring] = np.minimum(score[scoring] + points * collision_modifier * difficulty_bonus, max_score)
+
+        just_finished = np.flatnonzero(scoring & (score >= max_score))
+        finished[just_finished] = True
+        p.column("blink")[just_finished] = now
+        return just_finished
+
+    def reset_players(self, lane: int, y: float, now: float) -> None:
+        """Put every player back at the start of a new round"""
+        p = self.players
+        for name in ("score", "blink", "consecutive_collisions", "last_collision_time", "vertical_speed"):
+            p.column(name)[:] = 0
+        p.column("finished")[:] = False
+        p.column("lane")[:] = lane
+        p.column("target_lane")[:] = lane
+        p.column("x")[:] = self.lane_x[lane]
+        p.column("y")[:] = y
+        p.column("target_y")[:] = y
+        p.column("move_progress")[:] = 1.0
+        p.column("last_heartbeat")[:] = now
+
+    def stale_players(self, now: float, timeout: float) -> List[Player]:
+        """Players whose last heartbeat is older than timeout"""
+        rows = np.flatnonzero(now - self.players.column("last_heartbeat") > timeout)
+        return [self.players.handles[row] for row in rows]
+
+    def player_at(self, row: int) -> Optional[Player]:
+        return self.players.handles[row]
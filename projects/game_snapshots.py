@@ -0,0 +1,325 @@
+"""
+Delta-compressed binary state snapshots for the lane racing GameServer
+Quantized entity state, encoded against the last snapshot each client acknowledged
+"""
+
+import struct
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from game_links import LinkMonitor
+
+SNAPSHOT_MAGIC = 0xA7  # first byte of a binary snapshot; JSON messages start with '{'
+POSITION_SCALE = 4     # positions travel as int16 quarter pixels
+TIME_SCALE = 100       # time left travels in hundredths of a second
+HISTORY_SIZE = 64      # snapshots kept as delta baselines, about a second at 60 Hz
+ROSTER_RESEND_INTERVAL = 0.25
+
+# magic, flags, seq, baseline seq (0 = full snapshot), roster version, time left, total players
+HEADER = struct.Struct("<BBIIHHH")
+COUNT = struct.Struct("<H")
+FLAG_GAME_RUNNING = 0x01
+
+# Quantized fields per entity; each travels as int16
+PLAYER_FIELDS = ("x", "y", "score", "flags")
+OBSTACLE_FIELDS = ("x", "y", "type", "lane")
+PLAYER_FINISHED = 0x01
+PLAYER_BLINKING = 0x02
+PLAYER_LANE_SHIFT = 2         # two bits of lane
+PLAYER_TARGET_LANE_SHIFT = 4  # two bits of target lane
+
+INT16_MIN, INT16_MAX = -32768, 32767
+
+
+class Snapshot:
+    """Quantized game state at one tick; entities sorted by key (player id, obstacle uid)"""
+
+    __slots__ = ("seq", "flags", "roster_version", "time_left", "total_players",
+                 "player_keys", "player_values", "obstacle_keys", "obstacle_values")
+
+    def __init__(self, seq: int, flags: int, roster_version: int, time_left: int, total_players: int,
+                 player_keys: np.ndarray, player_values: np.ndarray,
+                 obstacle_keys: np.ndarray, obstacle_values: np.ndarray):
+        self.seq = seq
+        self.flags = flags
+        self.roster_version = roster_version
+        self.time_left = time_left
+        self.total_players = total_players
+        self.player_keys = player_keys
+        self.player_values = player_values
+        self.obstacle_keys = obstacle_keys
+        self.obstacle_values = obstacle_values
+
+    @property
+    def game_running(self) -> bool:
+        return bool(self.flags & FLAG_GAME_RUNNING)
+
+    @property
+    def time_left_seconds(self) -> float:
+        return self.time_left / TIME_SCALE
+
+    def filtered(self, viewport: Tuple[float, float]) -> "Snapshot":
+        """The entities whose y lies within a client's viewport (top, bottom), in pixels"""
+        top, bottom = viewport[0] * POSITION_SCALE, viewport[1] * POSITION_SCALE
+        players = (self.player_values[:, 1] >= top) & (self.player_values[:, 1] <= bottom)
+        obstacles = (self.obstacle_values[:, 1] >= top) & (self.obstacle_values[:, 1] <= bottom)
+        return Snapshot(self.seq, self.flags, self.roster_version, self.time_left, self.total_players,
+                        self.player_keys[players], self.player_values[players],
+                        self.obstacle_keys[obstacles], self.obstacle_values[obstacles])
+
+    def player_dicts(self) -> List[Dict[str, Any]]:
+        """Players in the same shape as the JSON state (names come from the roster)"""
+        players = []
+        for key, (x, y, score, flags) in zip(self.player_keys.tolist(), self.player_values.tolist()):
+            players.append({
+                "id": key,
+                "x": x / POSITION_SCALE,
+                "y": y / POSITION_SCALE,
+                "score": score,
+                "finished": bool(flags & PLAYER_FINISHED),
+                "blinking": bool(flags & PLAYER_BLINKING),
+                "lane": (flags >> PLAYER_LANE_SHIFT) & 0x3,
+                "target_lane": (flags >> PLAYER_TARGET_LANE_SHIFT) & 0x3
+            })
+        return players
+
+    def obstacle_dicts(self, type_names: List[str]) -> List[Dict[str, Any]]:
+        """Obstacles in the same shape as the JSON state (colors come from the obstacle types)"""
+        return [
+            {"id": key, "x": x / POSITION_SCALE, "y": y / POSITION_SCALE, "type": type_names[type_index], "lane": lane}
+            for key, (x, y, type_index, lane) in zip(self.obstacle_keys.tolist(), self.obstacle_values.tolist())
+        ]
+
+
+def _quantize(values: np.ndarray, scale: float = 1) -> np.ndarray:
+    return np.clip(np.rint(values * scale), INT16_MIN, INT16_MAX).astype(np.int16)
+
+
+def capture_snapshot(seq: int, sim, now: float, blink_duration: float, game_running: bool,
+                     roster_version: int, time_left: float) -> Snapshot:
+    """Quantize the simulation's player and obstacle tables"""
+    p, o = sim.players, sim.obstacles
+
+    flags = (p.column("finished").astype(np.int16) * PLAYER_FINISHED
+             | (now - p.column("blink") < blink_duration).astype(np.int16) * PLAYER_BLINKING
+             | p.column("lane").astype(np.int16) << PLAYER_LANE_SHIFT
+             | p.column("target_lane").astype(np.int16) << PLAYER_TARGET_LANE_SHIFT)
+    player_values = np.column_stack((
+        _quantize(p.column("x"), POSITION_SCALE),
+        _quantize(p.column("y"), POSITION_SCALE),
+        _quantize(p.column("score")),
+        flags
+    )).astype(np.int16).reshape(-1, len(PLAYER_FIELDS))
+    player_keys = p.column("id").astype(np.uint32)
+
+    obstacle_values = np.column_stack((
+        _quantize(o.column("x"), POSITION_SCALE),
+        _quantize(o.column("y"), POSITION_SCALE),
+        o.column("type_index").astype(np.int16),
+        o.column("lane").astype(np.int16)
+    )).astype(np.int16).reshape(-1, len(OBSTACLE_FIELDS))
+    obstacle_keys = o.column("uid").astype(np.uint32)
+
+    player_order = np.argsort(player_keys, kind="stable")
+    obstacle_order = np.argsort(obstacle_keys, kind="stable")
+    return Snapshot(
+        seq,
+        FLAG_GAME_RUNNING if game_running else 0,
+        roster_version & 0xFFFF,
+        int(min(max(round(time_left * TIME_SCALE), 0), 0xFFFF)),
+        min(len(p), 0xFFFF),
+        player_keys[player_order], player_values[player_order],
+        obstacle_keys[obstacle_order], obstacle_values[obstacle_order]
+    )
+
+
+# ---------------- WIRE FORMAT ---------------- #
+#
+# Each entity section (players, then obstacles) is:
+#   removed:  u16 count, u16 baseline indices
+#   added:    u16 count, u32 keys, int16 values (count x fields)
+#   changed:  u16 count, u16 baseline indices, u8 field masks,
+#             then per field the int16 values of the entities whose mask has it
+# A full snapshot is a delta against an empty baseline.
+
+def _encode_section(keys: np.ndarray, values: np.ndarray,
+                    base_keys: Optional[np.ndarray], base_values: Optional[np.ndarray]) -> bytes:
+    field_count = values.shape[1]
+    if base_keys is None or not len(base_keys):
+        removed = np.empty(0, dtype=np.intp)
+        added = np.arange(len(keys))
+        current_rows = base_rows = np.empty(0, dtype=np.intp)
+        diff = np.empty((0, field_count), dtype=bool)
+    else:
+        _, current_rows, base_rows = np.intersect1d(keys, base_keys, assume_unique=True, return_indices=True)
+        removed = np.setdiff1d(np.arange(len(base_keys)), base_rows, assume_unique=True)
+        added = np.setdiff1d(np.arange(len(keys)), current_rows, assume_unique=True)
+        diff = values[current_rows] != base_values[base_rows]
+
+    changed = diff.any(axis=1)
+    diff = diff[changed]
+    changed_values = values[current_rows[changed]]
+    masks = (diff * (1 << np.arange(field_count))).sum(axis=1).astype(np.uint8)
+
+    parts = [
+        COUNT.pack(len(removed)), removed.astype("<u2").tobytes(),
+        COUNT.pack(len(added)), keys[added].astype("<u4").tobytes(), values[added].astype("<i2").tobytes(),
+        COUNT.pack(len(masks)), base_rows[changed].astype("<u2").tobytes(), masks.tobytes()
+    ]
+    parts.extend(changed_values[diff[:, field]][:, field].astype("<i2").tobytes() for field in range(field_count))
+    return b"".join(parts)
+
+
+def _read_array(data: bytes, offset: int, dtype: str, count: int) -> Tuple[np.ndarray, int]:
+    array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+    return array, offset + array.nbytes
+
+
+def _decode_section(data: bytes, offset: int, field_count: int,
+                    base_keys: np.ndarray, base_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+    (removed_count,) = COUNT.unpack_from(data, offset)
+    removed, offset = _read_array(data, offset + COUNT.size, "<u2", removed_count)
+    (added_count,) = COUNT.unpack_from(data, offset)
+    added_keys, offset = _read_array(data, offset + COUNT.size, "<u4", added_count)
+    added_values, offset = _read_array(data, offset, "<i2", added_count * field_count)
+    (changed_count,) = COUNT.unpack_from(data, offset)
+    changed, offset = _read_array(data, offset + COUNT.size, "<u2", changed_count)
+    masks, offset = _read_array(data, offset, "u1", changed_count)
+
+    values = base_values.copy()
+    for field in range(field_count):
+        rows = changed[(masks & (1 << field)) != 0]
+        column, offset = _read_array(data, offset, "<i2", len(rows))
+        values[rows, field] = column
+
+    keep = np.ones(len(base_keys), dtype=bool)
+    keep[removed] = False
+    keys = np.concatenate((base_keys[keep], added_keys.astype(np.uint32)))
+    values = np.concatenate((values[keep], added_values.reshape(-1, field_count).astype(np.int16)))
+    order = np.argsort(keys, kind="stable")
+    return keys[order], values[order], offset
+
+
+_EMPTY_KEYS = np.empty(0, dtype=np.uint32)
+_EMPTY_PLAYERS = np.empty((0, len(PLAYER_FIELDS)), dtype=np.int16)
+_EMPTY_OBSTACLES = np.empty((0, len(OBSTACLE_FIELDS)), dtype=np.int16)
+
+
+def encode_snapshot(snapshot: Snapshot, baseline: Optional[Snapshot] = None) -> bytes:
+    """Binary snapshot, as a delta against baseline when given"""
+    header = HEADER.pack(SNAPSHOT_MAGIC, snapshot.flags, snapshot.seq, baseline.seq if baseline else 0,
+                         snapshot.roster_version, snapshot.time_left, snapshot.total_players)
+    return b"".join((
+        header,
+        _encode_section(snapshot.player_keys, snapshot.player_values,
+                        baseline.player_keys if baseline else None, baseline.player_values if baseline else None),
+        _encode_section(snapshot.obstacle_keys, snapshot.obstacle_values,
+                        baseline.obstacle_keys if baseline else None, baseline.obstacle_values if baseline else None)
+    ))
+
+
+def is_snapshot(data: bytes) -> bool:
+    """Whether a datagram is a binary snapshot rather than JSON"""
+    return len(data) >= HEADER.size and data[0] == SNAPSHOT_MAGIC
+
+
+class SnapshotEncoder:
+    """
+    Server side: recent snapshots and their encodings
+
+    Clients that acknowledged the same snapshot with the same viewport get
+    the same bytes, so each tick encodes once per distinct (baseline, viewport)
+    rather than once per client. A client's baseline is filtered with its own
+    viewport, which is exactly what it was sent.
+    """
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self.history_size = history_size
+        self.history: "OrderedDict[int, Snapshot]" = OrderedDict()
+        self.next_seq = 1  # 0 means "no baseline" on the wire
+        self._current: Optional[Snapshot] = None
+        self._encoded: Dict[Tuple[int, Optional[Tuple[float, float]]], bytes] = {}
+
+    def capture(self, sim, now: float, blink_duration: float, game_running: bool,
+                roster_version: int, time_left: float) -> Snapshot:
+        """Take this tick's snapshot and keep it as a future baseline"""
+        snapshot = capture_snapshot(self.next_seq, sim, now, blink_duration, game_running, roster_version, time_left)
+        self.next_seq += 1
+        self.history[snapshot.seq] = snapshot
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+        self._current = snapshot
+        self._encoded = {}
+        return snapshot
+
+    def encode_for(self, acked_seq: int, viewport: Optional[Tuple[float, float]] = None) -> bytes:
+        """The current snapshot for a client that acknowledged acked_seq (0 = nothing yet)"""
+        baseline = self.history.get(acked_seq)
+        key = (baseline.seq if baseline is not None else 0, viewport)
+        encoded = self._encoded.get(key)
+        if encoded is None:
+            current = self._current
+            if viewport is not None:
+                current = current.filtered(viewport)
+                baseline = baseline.filtered(viewport) if baseline is not None else None
+            encoded = self._encoded[key] = encode_snapshot(current, baseline)
+        return encoded
+
+
+class SnapshotDecoder:
+    """Client side: rebuilds snapshots from deltas against the ones already received"""
+
+    def __init__(self, history_size: int = HISTORY_SIZE * 2):
+        self.history_size = history_size
+        self.history: "OrderedDict[int, Snapshot]" = OrderedDict()
+        self.latest_seq = 0
+
+    def decode(self, data: bytes) -> Optional[Snapshot]:
+        """The snapshot in a datagram; None if it is stale or its baseline is no longer known"""
+        magic, flags, seq, baseline_seq, roster_version, time_left, total_players = HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or seq <= self.latest_seq:
+            return None
+        if baseline_seq:
+            baseline = self.history.get(baseline_seq)
+            if baseline is None:
+                return None
+            base = (baseline.player_keys, baseline.player_values, baseline.obstacle_keys, baseline.obstacle_values)
+        else:
+            base = (_EMPTY_KEYS, _EMPTY_PLAYERS, _EMPTY_KEYS, _EMPTY_OBSTACLES)
+
+        player_keys, player_values, offset = _decode_section(data, HEADER.size, len(PLAYER_FIELDS), base[0], base[1])
+        obstacle_keys, obstacle_values, _ = _decode_section(data, offset, len(OBSTACLE_FIELDS), base[2], base[3])
+        snapshot = Snapshot(seq, flags, roster_version, time_left, total_players,
+                            player_keys, player_values, obstacle_keys, obstacle_values)
+
+        self.latest_seq = seq
+        self.history[seq] = snapshot
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+        return snapshot
+
+
+class SnapshotClient:
+    """What the server knows about one binary-snapshot client"""
+
+    __slots__ = ("acked_seq", "roster_acked", "roster_sent_at", "viewport", "link")
+
+    def __init__(self, viewport: Optional[Tuple[float, float]], max_rate: float):
+        self.acked_seq = 0       # latest snapshot the client acknowledged
+        self.roster_acked = -1   # roster version the client has
+        self.roster_sent_at = 0.0
+        self.viewport = viewport  # area of interest, (top, bottom) in pixels; None = everything
+        self.link = LinkMonitor(max_rate)
+
+    def ack(self, seq: int, roster_version: Optional[int]) -> None:
+        # Acks can arrive out of order; only move forward
+        if seq > self.acked_seq:
+            self.acked_seq = seq
+        if roster_version is not None:
+            self.roster_acked = roster_version
+
+    def needs_roster(self, roster_version: int, now: float) -> bool:
+        """Whether to (re)send the roster; repeated until the client acknowledges it"""
+        return self.roster_acked != roster_version and now - self.roster_sent_at >= ROSTER_RESEND_INTERVAL
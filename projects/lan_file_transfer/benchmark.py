@@ -0,0 +1,369 @@
+"""
+Throughput Benchmark for the LAN File Transfer System
+Runs FileTransferServer and clients on loopback over a sweep of file sizes,
+buffer sizes, concurrency and target-server counts, and records the results as JSON
+
+Example:
+    python benchmark.py --sizes 1KB,1MB,64MB --concurrency 1,4 --output run.json
+    python benchmark.py --sizes 1GB,4GB --repeat 1 --output big.json
+    python benchmark.py --output new.json --compare run.json
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Add the current directory to Python path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import CHUNK_SIZE, SEND_BLOCK_SIZE
+from client import FileTransferSession
+from server import FileTransferServer
+from utils import get_available_port, format_file_size
+
+MB = 1024 * 1024
+GB = 1024 * MB
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": MB, "GB": GB}
+BENCHMARK_PASSWORD = "benchmark"
+
+# Metrics where a larger value is better; everything else compared is "lower is better"
+HIGHER_IS_BETTER = {"mb_per_s"}
+COMPARED_METRICS = ("mb_per_s", "cpu_s_per_gb", "latency_p50_ms", "latency_p99_ms")
+
+
+def parse_size(text: str) -> int:
+    """
+    Parse a human-readable size such as "64KB" or "2GB"
+
+    Args:
+        text (str): Size string (binary units)
+
+    Returns:
+        int: Size in bytes
+    """
+    text = text.strip().upper()
+    for unit in sorted(SIZE_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * SIZE_UNITS[unit])
+    return int(text)
+
+
+def parse_list(text: str, parser=int) -> List[int]:
+    """Parse a comma-separated list of values"""
+    return [parser(item) for item in text.split(",") if item.strip()]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of samples
+
+    Args:
+        samples (List[float]): Samples (need not be sorted)
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: Percentile value (0.0 for no samples)
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def create_payload(directory: Path, size: int) -> Path:
+    """
+    Create a payload file of the given size filled with incompressible data
+
+    Args:
+        directory (Path): Directory to create the file in
+        size (int): File size in bytes
+
+    Returns:
+        Path: Path to the payload
+    """
+    path = directory / f"payload_{size}.bin"
+    block = os.urandom(min(size, MB)) if size else b""
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            written = f.write(block[:remaining])
+            remaining -= written
+    return path
+
+
+def make_copies(payload: Path, count: int) -> List[Path]:
+    """
+    Give the payload one name per concurrent client so receivers never share a file
+
+    Args:
+        payload (Path): Source payload
+        count (int): Number of names needed
+
+    Returns:
+        List[Path]: Paths with distinct file names and identical content
+    """
+    copies = []
+    for index in range(count):
+        copy = payload.with_name(f"{payload.stem}_c{index}{payload.suffix}")
+        if not copy.exists():
+            try:
+                os.link(payload, copy)
+            except OSError:
+                shutil.copyfile(payload, copy)
+        copies.append(copy)
+    return copies
+
+
+def start_servers(count: int, workdir: Path, max_file_size: int, chunk_size: int) -> List[FileTransferServer]:
+    """
+    Start file transfer servers on free loopback ports
+
+    Args:
+        count (int): Number of servers
+        workdir (Path): Directory for the servers' receive folders
+        max_file_size (int): Largest file the servers must accept
+        chunk_size (int): Server recv size
+
+    Returns:
+        List[FileTransferServer]: Running servers
+    """
+    servers = []
+    port = 19000
+    for index in range(count):
+        port = get_available_port(port + 1, 200)
+        if port is None:
+            raise RuntimeError("No free ports for benchmark servers")
+        server = FileTransferServer(port, BENCHMARK_PASSWORD, str(workdir / f"received_{index}"),
+                                    max_file_size=max_file_size, chunk_size=chunk_size)
+        if not server.start_server(enable_discovery=False):
+            raise RuntimeError(f"Failed to start benchmark server on port {port}")
+        servers.append(server)
+    return servers
+
+
+def run_case(workdir: Path, payload: Path, size: int, chunk_size: int, block_size: int,
+             concurrency: int, num_servers: int, repeat: int) -> Dict[str, float]:
+    """
+    Run one benchmark configuration
+
+    Every client sends its copy of the payload to every server, one server
+    after another, and all clients run at the same time.
+
+    Args:
+        workdir (Path): Scratch directory
+        payload (Path): Payload file of the given size
+        size (int): Payload size in bytes
+        chunk_size (int): Server recv size
+        block_size (int): Client send block size
+        concurrency (int): Number of concurrent clients
+        num_servers (int): Number of target servers
+        repeat (int): Number of rounds
+
+    Returns:
+        Dict[str, float]: Configuration and measured metrics
+    """
+    servers = start_servers(num_servers, workdir, max(size, 1), chunk_size)
+    copies = make_copies(payload, concurrency)
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+    wall_total = 0.0
+    cpu_total = 0.0
+
+    def client_worker(file_path: Path):
+        nonlocal failures
+        for server in servers:
+            session = FileTransferSession(BENCHMARK_PASSWORD, block_size)
+            started = time.perf_counter()
+            ok = session.connect_and_send_file("127.0.0.1", server.port, str(file_path))
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    failures += 1
+
+    try:
+        for _ in range(repeat):
+            threads = [threading.Thread(target=client_worker, args=(copy,)) for copy in copies]
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall_total += time.perf_counter() - wall_start
+            cpu_total += time.process_time() - cpu_start
+
+            # Keep disk usage bounded between rounds
+            for server in servers:
+                for received in server.receive_dir.iterdir():
+                    received.unlink()
+    finally:
+        for server in servers:
+            server.stop_server()
+
+    total_bytes = size * concurrency * num_servers * repeat
+    return {
+        "size": size,
+        "size_formatted": format_file_size(size),
+        "chunk_size": chunk_size,
+        "block_size": block_size,
+        "concurrency": concurrency,
+        "servers": num_servers,
+        "repeat": repeat,
+        "transfers": len(latencies),
+        "failures": failures,
+        "wall_s": round(wall_total, 6),
+        "mb_per_s": round(total_bytes / MB / wall_total, 3) if wall_total else 0.0,
+        "cpu_s_per_gb": round(cpu_total / (total_bytes / GB), 3) if total_bytes else 0.0,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def case_key(result: Dict[str, float]) -> tuple:
+    """Identify a benchmark configuration independently of its measurements"""
+    return (result["size"], result["chunk_size"], result["block_size"],
+            result["concurrency"], result["servers"])
+
+
+def get_git_commit() -> Optional[str]:
+    """Get the current git commit, if the benchmark runs inside a checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """
+    Find metrics that got worse than the baseline by more than the tolerance
+
+    Args:
+        baseline (dict): Earlier benchmark report
+        current (dict): New benchmark report
+        tolerance (float): Allowed relative change, e.g. 0.1 for 10%
+
+    Returns:
+        List[str]: Human-readable regression descriptions
+    """
+    previous = {case_key(result): result for result in baseline["results"]}
+    regressions = []
+
+    for result in current["results"]:
+        old = previous.get(case_key(result))
+        if not old:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = old[metric], result[metric]
+            if not before:
+                continue
+            change = (after - before) / before
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append(
+                    f"{result['size_formatted']} chunk={result['chunk_size']} block={result['block_size']} "
+                    f"c={result['concurrency']} servers={result['servers']}: "
+                    f"{metric} {before} -> {after} ({change:+.1%})"
+                )
+
+    return regressions
+
+
+def main():
+    """Run the benchmark sweep"""
+    parser = argparse.ArgumentParser(description='LAN File Transfer throughput benchmark')
+    parser.add_argument('--sizes', default='1KB,1MB,16MB,64MB', help='Comma-separated file sizes (e.g. 1KB,1MB,2GB)')
+    parser.add_argument('--chunk-sizes', default=str(CHUNK_SIZE), help='Comma-separated server recv sizes')
+    parser.add_argument('--block-sizes', default=str(SEND_BLOCK_SIZE), help='Comma-separated client send block sizes')
+    parser.add_argument('--concurrency', default='1,4', help='Comma-separated numbers of concurrent clients')
+    parser.add_argument('--servers', default='1', help='Comma-separated numbers of target servers')
+    parser.add_argument('--repeat', type=int, default=3, help='Rounds per configuration (default: 3)')
+    parser.add_argument('--workdir', help='Scratch directory (default: a temporary directory)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', help='Baseline JSON report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative regression (default: 0.10)')
+    parser.add_argument('--verbose', action='store_true', help='Keep per-transfer log output')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    sizes = parse_list(args.sizes, parse_size)
+    chunk_sizes = parse_list(args.chunk_sizes, parse_size)
+    block_sizes = parse_list(args.block_sizes, parse_size)
+    concurrencies = parse_list(args.concurrency)
+    server_counts = parse_list(args.servers)
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="lft_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    report = {
+        "meta": {
+            "commit": get_git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": []
+    }
+
+    try:
+        for size in sizes:
+            payload_dir = workdir / f"payload_{size}"
+            payload_dir.mkdir(exist_ok=True)
+            payload = create_payload(payload_dir, size)
+
+            for chunk_size, block_size, concurrency, num_servers in itertools.product(
+                    chunk_sizes, block_sizes, concurrencies, server_counts):
+                result = run_case(workdir, payload, size, chunk_size, block_size,
+                                  concurrency, num_servers, args.repeat)
+                report["results"].append(result)
+                print(f"{result['size_formatted']:>9} chunk={chunk_size:<7} block={block_size:<7} "
+                      f"c={concurrency:<3} servers={num_servers:<2} "
+                      f"{result['mb_per_s']:>9.1f} MB/s  {result['cpu_s_per_gb']:>7.2f} CPU s/GB  "
+                      f"p50={result['latency_p50_ms']:.1f}ms p99={result['latency_p99_ms']:.1f}ms"
+                      + (f"  FAILURES={result['failures']}" if result['failures'] else ""))
+
+            shutil.rmtree(payload_dir, ignore_errors=True)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    failed = any(result["failures"] for result in report["results"])
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.tolerance)
+        if regressions:
+            print(f"Regressions against {args.compare} (commit {baseline['meta'].get('commit')}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {args.compare}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,460 @@
+"""
+Content-Addressed Chunk Store for the LAN File Transfer System
+Splits files into hash-named chunks so repeated content is stored and sent only once
+"""
+
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from config import (
+    DEDUP_CHUNKING, DEDUP_CHUNK_SIZE, DEDUP_MIN_CHUNK_SIZE, DEDUP_MAX_CHUNK_SIZE, DEDUP_STAGED_MAX_AGE
+)
+
+# Manifest entry: (sha256 hex digest, chunk size in bytes)
+ChunkRef = Tuple[str, int]
+
+# Gear table for content-defined chunking; fixed seed so every peer cuts identically
+_GEAR = [random.Random(0x4C4654 + i).getrandbits(64) for i in range(256)]
+_MASK64 = (1 << 64) - 1
+READ_SIZE = 1024 * 1024
+
+# Mode for files we write, as open(path, "wb") would create them; mkstemp uses 0600
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def _fixed_chunks(f, chunk_size: int) -> Iterator[bytes]:
+    """Yield fixed-size chunks from a binary file"""
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        yield chunk
+
+
+def _cdc_chunks(f, avg_size: int, min_size: int, max_size: int) -> Iterator[bytes]:
+    """
+    Yield content-defined chunks from a binary file using a gear rolling hash
+
+    Boundaries depend only on nearby content, so inserting bytes early in a
+    file only changes the chunks around the insertion.
+    """
+    mask = (1 << max(avg_size.bit_length() - 1, 1)) - 1
+    gear = _GEAR
+    pending = bytearray()
+    start = 0
+    h = 0
+
+    while True:
+        block = f.read(READ_SIZE)
+        if not block:
+            break
+        pending += block
+
+        i = start
+        end = len(pending)
+        while i < end:
+            h = ((h << 1) + gear[pending[i]]) & _MASK64
+            i += 1
+            length = i
+            if (length >= min_size and not (h & mask)) or length >= max_size:
+                yield bytes(pending[:i])
+                del pending[:i]
+                end -= i
+                i = 0
+                h = 0
+        start = i
+
+    if pending:
+        yield bytes(pending)
+
+
+def iter_chunks(f, mode: str = DEDUP_CHUNKING, chunk_size: int = DEDUP_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Split a binary file into chunks
+
+    Args:
+        f: Binary file object
+        mode (str): "fixed" or "cdc" (content-defined)
+        chunk_size (int): Chunk size for "fixed", average size for "cdc"
+
+    Returns:
+        Iterator[bytes]: The file's chunks in order
+    """
+    if mode == "cdc":
+        return _cdc_chunks(f, chunk_size, min(DEDUP_MIN_CHUNK_SIZE, chunk_size),
+                           max(DEDUP_MAX_CHUNK_SIZE, chunk_size))
+    if mode == "fixed":
+        return _fixed_chunks(f, chunk_size)
+    raise ValueError(f"Unknown chunking mode: {mode}")
+
+
+def build_manifest(file_path: str, mode: str = DEDUP_CHUNKING,
+                   chunk_size: int = DEDUP_CHUNK_SIZE) -> Tuple[List[ChunkRef], str]:
+    """
+    Hash a file's chunks and its whole content in a single read pass
+
+    Args:
+        file_path (str): Path to the file
+        mode (str): Chunking mode
+        chunk_size (int): Chunk size (average size for "cdc")
+
+    Returns:
+        Tuple[List[ChunkRef], str]: (chunk manifest, MD5 of the whole file)
+    """
+    manifest = []
+    hash_md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter_chunks(f, mode, chunk_size):
+            hash_md5.update(chunk)
+            manifest.append((hashlib.sha256(chunk).hexdigest(), len(chunk)))
+    return manifest, hash_md5.hexdigest()
+
+
+class ChunkStore:
+    """
+    Index of which chunk lives where among the files already received
+
+    Received files are the only copy of their content: the store records the
+    chunks of every file it materializes and reads them back from that file
+    when a later transfer repeats them. Each chunk is reference counted by the
+    files that contain it; a file that is deleted or modified drops its
+    references. Chunks that arrive over the network are staged under objects/
+    until the file they belong to has been written, then removed; chunks left
+    behind by a transfer that never finished expire after staged_max_age.
+    """
+
+    def __init__(self, root: str, mode: str = DEDUP_CHUNKING, chunk_size: int = DEDUP_CHUNK_SIZE,
+                 staged_max_age: float = DEDUP_STAGED_MAX_AGE):
+        """
+        Initialize the chunk store
+
+        Args:
+            root (str): Store directory
+            mode (str): Chunking mode peers should use ("fixed" or "cdc")
+            chunk_size (int): Chunk size peers should use (average for "cdc")
+            staged_max_age (float): Seconds an unreferenced staged chunk is kept
+        """
+        if mode not in ("fixed", "cdc"):
+            raise ValueError(f"Unknown chunking mode: {mode}")
+
+        self.root = Path(root)
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.staged_max_age = staged_max_age
+        self.objects_dir = self.root / "objects"
+        self.index_path = self.root / "index.json"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        # Stores from before files were indexed kept a second, hard-linked copy here
+        shutil.rmtree(self.root / "files", ignore_errors=True)
+
+        self._lock = threading.RLock()
+        # path -> {"size", "mtime_ns", "chunks": [[hash, size], ...]}
+        self._files = {}
+        # chunk hash -> {path: offset}; the number of entries is the reference count
+        self._locations = {}
+        self._load_index()
+        self.prune()
+
+    def _object_path(self, chunk_hash: str) -> Path:
+        """Path of a staged chunk blob, fanned out by the first two hex digits"""
+        if len(chunk_hash) != 64 or not all(c in "0123456789abcdef" for c in chunk_hash):
+            raise ValueError(f"Invalid chunk hash: {chunk_hash!r}")
+        return self.objects_dir / chunk_hash[:2] / chunk_hash[2:]
+
+    def has(self, chunk_hash: str) -> bool:
+        """
+        Check whether a chunk is stored
+
+        Args:
+            chunk_hash (str): SHA-256 hex digest
+
+        Returns:
+            bool: True if the chunk is staged or part of an indexed file
+        """
+        path = self._object_path(chunk_hash)
+        with self._lock:
+            return chunk_hash in self._locations or path.exists()
+
+    def ref_count(self, chunk_hash: str) -> int:
+        """
+        Count the indexed files that contain a chunk
+
+        Args:
+            chunk_hash (str): SHA-256 hex digest
+
+        Returns:
+            int: Number of files referencing the chunk
+        """
+        with self._lock:
+            return len(self._locations.get(chunk_hash, ()))
+
+    def missing(self, manifest: List[ChunkRef]) -> List[int]:
+        """
+        Find which chunks of a manifest the store does not have
+
+        Args:
+            manifest (List[ChunkRef]): Chunk manifest
+
+        Returns:
+            List[int]: Indices of chunks that must be sent (first occurrence only)
+        """
+        # Files edited or deleted since they were indexed no longer count
+        self.prune()
+
+        needed = []
+        seen = set()
+        for index, (chunk_hash, _) in enumerate(manifest):
+            if chunk_hash in seen:
+                continue
+            seen.add(chunk_hash)
+            if not self.has(chunk_hash):
+                needed.append(index)
+            else:
+                # This transfer now relies on the chunk; keep a staged copy from expiring
+                self._touch_object(chunk_hash)
+        return needed
+
+    def put(self, chunk_hash: str, data) -> bool:
+        """
+        Stage a chunk after verifying its hash
+
+        Args:
+            chunk_hash (str): Expected SHA-256 hex digest
+            data: Chunk bytes
+
+        Returns:
+            bool: True if stored (or already present), False on hash mismatch
+        """
+        if hashlib.sha256(data).hexdigest() != chunk_hash:
+            return False
+
+        path = self._object_path(chunk_hash)
+        if path.exists():
+            return True
+
+        path.parent.mkdir(exist_ok=True)
+        self._atomic_write(path, [data], self.root)
+        return True
+
+    def get(self, chunk_hash: str, size: int) -> Optional[bytes]:
+        """
+        Read a chunk from the staging area or from a file that contains it
+
+        Args:
+            chunk_hash (str): SHA-256 hex digest
+            size (int): Chunk size in bytes
+
+        Returns:
+            Optional[bytes]: Chunk data, or None if no intact copy is left
+        """
+        path = self._object_path(chunk_hash)
+        try:
+            data = path.read_bytes()
+            if hashlib.sha256(data).hexdigest() == chunk_hash:
+                return data
+        except OSError:
+            pass
+
+        with self._lock:
+            locations = list(self._locations.get(chunk_hash, {}).items())
+        for file_path, offset in locations:
+            try:
+                with open(file_path, "rb") as f:
+                    f.seek(offset)
+                    data = f.read(size)
+            except OSError:
+                data = b""
+            if hashlib.sha256(data).hexdigest() == chunk_hash:
+                return data
+            # The file changed under us; stop trusting any of its chunks
+            self.release(file_path)
+        return None
+
+    def materialize(self, manifest: List[ChunkRef], dest_path: Path) -> Optional[str]:
+        """
+        Write a file built from stored chunks to dest_path and index it
+
+        The file is an independent copy, so editing it later cannot affect the
+        store; its MD5 is computed over the bytes actually written. Once the
+        file is indexed, its staged chunks are no longer needed and are removed.
+
+        Args:
+            manifest (List[ChunkRef]): Chunk manifest of the file
+            dest_path (Path): Where the file should appear
+
+        Returns:
+            Optional[str]: MD5 hex digest of the written content, or None if a
+            chunk could not be read intact
+        """
+        dest_path = Path(dest_path)
+        hash_md5 = hashlib.md5()
+
+        def blocks():
+            for chunk_hash, size in manifest:
+                data = self.get(chunk_hash, size)
+                if data is None:
+                    raise LookupError(chunk_hash)
+                hash_md5.update(data)
+                yield data
+
+        with self._lock:
+            try:
+                self._atomic_write(dest_path, blocks(), dest_path.parent)
+            except LookupError:
+                return None
+
+            self._index_file(str(dest_path.absolute()), manifest)
+            self._save_index()
+            for chunk_hash in {chunk_hash for chunk_hash, _ in manifest}:
+                self._remove_object(chunk_hash)
+
+        return hash_md5.hexdigest()
+
+    def release(self, file_path: Path) -> None:
+        """
+        Drop a file's chunk references, e.g. before it is deleted or overwritten
+
+        Args:
+            file_path (Path): A file previously passed to materialize
+        """
+        with self._lock:
+            if self._unindex_file(str(Path(file_path).absolute())):
+                self._save_index()
+
+    def prune(self) -> None:
+        """
+        Drop files that changed or disappeared, staged chunks that are now
+        indexed, and staged chunks or temporary files older than staged_max_age
+        """
+        cutoff = time.time() - self.staged_max_age
+        with self._lock:
+            stale = [path for path, entry in self._files.items() if not self._is_intact(path, entry)]
+            for path in stale:
+                self._unindex_file(path)
+            if stale:
+                self._save_index()
+
+            for path in self.objects_dir.glob("*/*"):
+                chunk_hash = path.parent.name + path.name
+                if chunk_hash in self._locations or self._older_than(path, cutoff):
+                    self._remove_object(chunk_hash)
+
+            # Left behind by a crash in the middle of _atomic_write
+            for path in self.root.glob(".tmp_*"):
+                if self._older_than(path, cutoff):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+
+    def _index_file(self, path: str, manifest: List[ChunkRef]) -> None:
+        """Record the chunks of a freshly written file, replacing any older entry for the path"""
+        self._unindex_file(path)
+        stat = os.stat(path)
+        self._files[path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "chunks": [[chunk_hash, size] for chunk_hash, size in manifest],
+        }
+        self._add_locations(path, self._files[path]["chunks"])
+
+    def _add_locations(self, path: str, chunks: List[ChunkRef]) -> None:
+        offset = 0
+        for chunk_hash, size in chunks:
+            self._locations.setdefault(chunk_hash, {}).setdefault(path, offset)
+            offset += size
+
+    def _unindex_file(self, path: str) -> bool:
+        """Remove one file's references; chunks with no references left are forgotten"""
+        entry = self._files.pop(path, None)
+        if entry is None:
+            return False
+        for chunk_hash, _ in entry["chunks"]:
+            locations = self._locations.get(chunk_hash)
+            if locations is None:
+                continue
+            locations.pop(path, None)
+            if not locations:
+                del self._locations[chunk_hash]
+        return True
+
+    @staticmethod
+    def _is_intact(path: str, entry: dict) -> bool:
+        """Whether a file still has the size and modification time it was indexed with"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+
+    @staticmethod
+    def _older_than(path: Path, cutoff: float) -> bool:
+        try:
+            return path.stat().st_mtime < cutoff
+        except OSError:
+            return False
+
+    def _touch_object(self, chunk_hash: str) -> None:
+        try:
+            os.utime(self._object_path(chunk_hash))
+        except OSError:
+            pass
+
+    def _remove_object(self, chunk_hash: str) -> None:
+        try:
+            self._object_path(chunk_hash).unlink()
+        except OSError:
+            pass
+
+    def _load_index(self) -> None:
+        try:
+            files = json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            return
+        for path, entry in files.items():
+            self._files[path] = entry
+            self._add_locations(path, entry["chunks"])
+
+    def _save_index(self) -> None:
+        self._atomic_write(self.index_path, [json.dumps(self._files).encode("utf-8")], self.root)
+
+    @staticmethod
+    def _atomic_write(path: Path, blocks, tmp_dir: Path) -> None:
+        """Write blocks to a temporary file in tmp_dir and rename it into place"""
+        fd, tmp_name = tempfile.mkstemp(dir=tmp_dir, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for block in blocks:
+                    f.write(block)
+            os.chmod(tmp_name, FILE_MODE)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+    @property
+    def min_chunk_size(self) -> int:
+        """Smallest chunk peers produce, apart from a file's last one"""
+        if self.mode == "cdc":
+            return min(DEDUP_MIN_CHUNK_SIZE, self.chunk_size)
+        return self.chunk_size
+
+    def get_info(self) -> dict:
+        """
+        Get the chunking parameters peers must use
+
+        Returns:
+            dict: Chunking mode and size
+        """
+        return {"mode": self.mode, "size": self.chunk_size}
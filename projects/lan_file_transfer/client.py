@@ -4,7 +4,6 @@ Handles file transfers with progress tracking and integrity verification
 """
 
 import hashlib
-import json
 import os
 import socket
 import time
@@ -12,12 +11,16 @@ from pathlib import Path
 from typing import Optional, Callable, Tuple
 
 from config import (
-    BUFFER_SIZE, CHUNK_SIZE, DEFAULT_PASSWORD
+    SEND_BLOCK_SIZE, DEFAULT_PASSWORD
 )
 from utils import (
     setup_logging, calculate_file_hash, format_file_size,
-    validate_file_path, log_transfer
+    validate_file_path, log_transfer, TransferProgressLog
 )
+from framing import MAX_MESSAGE_SIZE, enable_nodelay, manifest_message_limit, send_message, receive_message
+from rate_limit import send_shaper
+from discovery import FEATURE_CHUNK_DEDUP
+from chunk_store import build_manifest
 
 
 class FileTransferClient:
@@ -25,16 +28,28 @@ class FileTransferClient:
     TCP client for sending files to the server with progress tracking
     """
     
-    def __init__(self, password: str = DEFAULT_PASSWORD):
+    def __init__(self, password: str = DEFAULT_PASSWORD, block_size: int = SEND_BLOCK_SIZE,
+                 use_dedup: bool = True):
         """
         Initialize the file transfer client
         
         Args:
             password (str): Pre-shared password for authentication
+            block_size (int): Bytes read from disk and sent per write
+            use_dedup (bool): Skip chunks the server already has, if it supports that
         """
         self.password = password
+        self.block_size = block_size
+        self.use_dedup = use_dedup
+        self.server_features = 0
+        self.server_chunking: Optional[dict] = None
         self.logger = setup_logging()
         self.client_socket = None
+        self.server_address = ""
+        
+        # Bandwidth shaping (task_id selects a per-task limit, if one is set)
+        self.shaper = send_shaper
+        self.task_id: Optional[str] = None
         
         # Callbacks for GUI updates
         self.on_connected: Optional[Callable] = None
@@ -61,6 +76,8 @@ class FileTransferClient:
             
             # Connect to server
             self.client_socket.connect((server_ip, server_port))
+            enable_nodelay(self.client_socket)
+            self.server_address = server_ip
             
             self.logger.info(f"Connected to server {server_ip}:{server_port}")
             
@@ -101,6 +118,8 @@ class FileTransferClient:
             auth_result = self._receive_message()
             
             if auth_result and auth_result.get("type") == "auth_success":
+                self.server_features = auth_result.get("features", 0)
+                self.server_chunking = auth_result.get("chunking")
                 self.logger.info("Authentication successful")
                 return True
             else:
@@ -140,9 +159,20 @@ class FileTransferClient:
             filename = file_path_obj.name
             file_size = file_path_obj.stat().st_size
             
-            # Calculate file hash
-            self.logger.info(f"Calculating hash for {filename}...")
-            file_hash = calculate_file_hash(file_path)
+            # Build a chunk manifest if the server can deduplicate, else just hash the file
+            manifest = None
+            if self.use_dedup and self.server_features & FEATURE_CHUNK_DEDUP and self.server_chunking:
+                self.logger.info(f"Calculating chunk manifest for {filename}...")
+                try:
+                    manifest, file_hash = build_manifest(file_path, self.server_chunking["mode"],
+                                                         self.server_chunking["size"])
+                except (OSError, KeyError, ValueError) as e:
+                    self.logger.warning(f"Could not build chunk manifest, sending whole file: {e}")
+                    manifest = None
+            
+            if manifest is None:
+                self.logger.info(f"Calculating hash for {filename}...")
+                file_hash = calculate_file_hash(file_path)
             
             if not file_hash:
                 self.logger.error("Failed to calculate file hash")
@@ -157,10 +187,14 @@ class FileTransferClient:
                 "size": file_size,
                 "hash": file_hash
             }
+            if manifest is not None:
+                metadata["chunks"] = manifest
             self._send_message(metadata)
             
             # Wait for server ready signal
-            ready_response = self._receive_message()
+            # The reply lists the chunks the server is missing, up to the whole manifest
+            ready_response = self._receive_message(manifest_message_limit(len(manifest)) if manifest
+                                                   else MAX_MESSAGE_SIZE)
             if not ready_response or ready_response.get("type") != "ready_for_transfer":
                 error_msg = ready_response.get("message", "Server not ready") if ready_response else "No response"
                 self.logger.error(f"Server not ready: {error_msg}")
@@ -168,28 +202,46 @@ class FileTransferClient:
                     self.on_error(f"Server error: {error_msg}")
                 return False
             
+            # Work out which byte ranges the server still needs
+            if manifest is not None:
+                offsets = [0]
+                for _, size in manifest:
+                    offsets.append(offsets[-1] + size)
+                missing = ready_response.get("missing", range(len(manifest)))
+                ranges = [(offsets[index], manifest[index][1]) for index in missing]
+            else:
+                ranges = [(0, file_size)]
+            
             # Send file data
+            sent_size = file_size - sum(length for _, length in ranges)
+            if sent_size:
+                self.logger.info(f"Server already has {format_file_size(sent_size)} of {filename}")
             self.logger.info(f"Starting file transfer: {filename} ({format_file_size(file_size)})")
-            sent_size = 0
+            progress_log = TransferProgressLog(filename, file_size, "SENT", self.server_address)
             
             with open(file_path, 'rb') as f:
-                while sent_size < file_size:
-                    # Calculate chunk size
-                    remaining = file_size - sent_size
-                    chunk_size = min(CHUNK_SIZE, remaining)
-                    
-                    # Read and send chunk
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
-                    
-                    self.client_socket.send(chunk)
-                    sent_size += len(chunk)
-                    
-                    # Update progress
-                    if self.on_transfer_progress:
-                        progress = (sent_size / file_size) * 100
-                        self.on_transfer_progress(progress, sent_size, file_size)
+                for offset, length in ranges:
+                    f.seek(offset)
+                    end = sent_size + length
+                    while sent_size < end:
+                        # Calculate chunk size
+                        remaining = end - sent_size
+                        chunk_size = min(self.block_size, remaining)
+                        
+                        # Read and send chunk (large blocks, since Nagle is disabled)
+                        chunk = f.read(chunk_size)
+                        if not chunk:
+                            break
+                        
+                        self.shaper.throttle(len(chunk), self.server_address, self.task_id)
+                        self.client_socket.sendall(chunk)
+                        sent_size += len(chunk)
+                        progress_log.update(sent_size)
+                        
+                        # Update progress
+                        if self.on_transfer_progress:
+                            progress = (sent_size / file_size) * 100
+                            self.on_transfer_progress(progress, sent_size, file_size)
             
             # Wait for transfer result
             result = self._receive_message()
@@ -229,46 +281,24 @@ class FileTransferClient:
             message (dict): Message to send
         """
         try:
-            message_str = json.dumps(message)
-            message_bytes = message_str.encode('utf-8')
-            
-            # Send message length first
-            length = len(message_bytes)
-            self.client_socket.send(length.to_bytes(4, byteorder='big'))
-            
-            # Send message
-            self.client_socket.send(message_bytes)
+            send_message(self.client_socket, message)
             
         except Exception as e:
             self.logger.error(f"Error sending message: {e}")
             raise
     
-    def _receive_message(self) -> Optional[dict]:
+    def _receive_message(self, max_size: int = MAX_MESSAGE_SIZE) -> Optional[dict]:
         """
         Receive a JSON message from server
         
+        Args:
+            max_size (int): Largest message accepted, in bytes
+        
         Returns:
             Optional[dict]: Received message or None if error
         """
         try:
-            # Receive message length
-            length_bytes = self.client_socket.recv(4)
-            if not length_bytes:
-                return None
-            
-            length = int.from_bytes(length_bytes, byteorder='big')
-            
-            # Receive message
-            message_bytes = b''
-            while len(message_bytes) < length:
-                chunk = self.client_socket.recv(min(length - len(message_bytes), BUFFER_SIZE))
-                if not chunk:
-                    return None
-                message_bytes += chunk
-            
-            # Parse JSON message
-            message_str = message_bytes.decode('utf-8')
-            return json.loads(message_str)
+            return receive_message(self.client_socket, max_size)
             
         except Exception as e:
             self.logger.error(f"Error receiving message: {e}")
@@ -293,14 +323,15 @@ class FileTransferSession:
     High-level interface for file transfer operations
     """
     
-    def __init__(self, password: str = DEFAULT_PASSWORD):
+    def __init__(self, password: str = DEFAULT_PASSWORD, block_size: int = SEND_BLOCK_SIZE):
         """
         Initialize the file transfer session
         
         Args:
             password (str): Pre-shared password for authentication
+            block_size (int): Bytes read from disk and sent per write
         """
-        self.client = FileTransferClient(password)
+        self.client = FileTransferClient(password, block_size)
         self.connected = False
     
     def connect_and_send_file(self, server_ip: str, server_port: int, 
@@ -19,6 +19,19 @@ PASSWORD_LENGTH = 20  # Maximum password length
 # File Transfer Configuration
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB maximum file size
 CHUNK_SIZE = 1024  # Size of each data chunk during transfer
+SEND_BLOCK_SIZE = 64 * 1024  # Bytes handed to the socket per write when sending file data
+
+# Bandwidth Shaping Configuration
+SHAPER_BURST_SECONDS = 0.25  # Token bucket size as seconds of traffic at the configured rate
+SHAPER_MIN_BURST = 4 * SEND_BLOCK_SIZE  # Never let the bucket be smaller than a few send blocks
+
+# Deduplication Configuration (optional content-addressed chunk store on the server)
+DEDUP_CHUNKING = "fixed"  # "fixed" or "cdc" (content-defined, slower to compute but shift-resistant)
+DEDUP_CHUNK_SIZE = 1024 * 1024  # Chunk size for fixed chunking, average size for CDC
+DEDUP_MIN_CHUNK_SIZE = 256 * 1024  # Smallest CDC chunk
+DEDUP_MAX_CHUNK_SIZE = 4 * 1024 * 1024  # Largest CDC chunk
+DEDUP_STORE_DIR = ".chunks"  # Store location inside the receive directory
+DEDUP_STAGED_MAX_AGE = 24 * 60 * 60  # Seconds before chunks staged by an abandoned transfer are removed
 
 # GUI Configuration
 WINDOW_WIDTH = 600
@@ -29,6 +42,8 @@ PROGRESS_BAR_LENGTH = 300
 LOG_DIR = Path("logs")
 LOG_FILE = LOG_DIR / "transfer_log.txt"
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+TRANSFER_LOG_FILE = LOG_DIR / "transfers.jsonl"  # Structured transfer records, one JSON object per line
+PROGRESS_LOG_INTERVAL = 1.0  # Minimum seconds between logged progress events per transfer
 
 # Create log directory if it doesn't exist
 LOG_DIR.mkdir(exist_ok=True)
@@ -39,3 +54,10 @@ OVERWRITE_PROMPT = True  # Whether to prompt before overwriting files
 # Discovery Configuration
 DISCOVERY_MESSAGE = "LAN_FILE_TRANSFER_DISCOVERY"
 DISCOVERY_RESPONSE = "LAN_FILE_TRANSFER_SERVER"
+DISCOVERY_MULTICAST_GROUP = "239.255.88.89"  # Site-local multicast group for discovery
+DISCOVERY_MULTICAST_TTL = 1  # Keep multicast probes on the local segment
+DISCOVERY_QUIET_PERIOD = 0.5  # Seconds without new replies before discovery returns early
+DISCOVERY_CACHE_TTL = 60  # Seconds a discovered server stays in the cache
+DISCOVERY_REFRESH_INTERVAL = 20  # Seconds between background discovery refreshes
+DISCOVERY_BEACON_MAGIC = b"LFTB"  # Prefix of binary discovery beacons
+DISCOVERY_BEACON_VERSION = 1
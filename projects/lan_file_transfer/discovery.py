@@ -1,18 +1,223 @@
 """
 UDP Peer Discovery System for LAN File Transfer
-Handles automatic server discovery using UDP broadcasts
+Handles automatic server discovery using UDP broadcasts and multicast
 """
 
 import socket
+import struct
 import threading
 import time
-from typing import List, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple, Optional
 
 from config import (
     DISCOVERY_PORT, DISCOVERY_TIMEOUT, DISCOVERY_MESSAGE, 
-    DISCOVERY_RESPONSE, DEFAULT_PORT
+    DISCOVERY_RESPONSE, DEFAULT_PORT, DISCOVERY_MULTICAST_GROUP,
+    DISCOVERY_MULTICAST_TTL, DISCOVERY_QUIET_PERIOD, DISCOVERY_CACHE_TTL,
+    DISCOVERY_REFRESH_INTERVAL, DISCOVERY_BEACON_MAGIC, DISCOVERY_BEACON_VERSION
 )
-from utils import get_local_ip, setup_logging
+from utils import get_broadcast_addresses, get_local_ip, setup_logging
+
+
+# Protocol feature bits advertised in discovery beacons
+FEATURE_PASSWORD_AUTH = 0x0001
+FEATURE_MD5_VERIFY = 0x0002
+FEATURE_CHUNK_DEDUP = 0x0004
+
+# Beacon layout (network byte order, 31 bytes):
+# magic, version, port, IPv4 address, feature bits, active transfers,
+# free disk bytes, recent throughput in bytes/s
+BEACON_FORMAT = struct.Struct("!4sBH4sHHQQ")
+BEACON_FORMAT_SIZE = BEACON_FORMAT.size
+
+
+@dataclass
+class ServerInfo:
+    """A discovered server and the load it last reported"""
+    ip: str
+    port: int
+    features: int = 0
+    active_transfers: int = 0
+    free_disk: int = 0
+    throughput: int = 0
+    last_seen: float = field(default_factory=time.time)
+    advertised_ip: Optional[str] = None  # address in the beacon; only a hint on multi-homed hosts
+    
+    def to_dict(self) -> Dict[str, int]:
+        """Convert ServerInfo to dictionary for JSON serialization"""
+        return {
+            'ip': self.ip,
+            'port': self.port,
+            'advertised_ip': self.advertised_ip,
+            'features': self.features,
+            'active_transfers': self.active_transfers,
+            'free_disk': self.free_disk,
+            'throughput': self.throughput
+        }
+
+
+def encode_beacon(info: ServerInfo) -> bytes:
+    """
+    Encode a server's status as a binary discovery beacon
+    
+    Args:
+        info (ServerInfo): Server status to advertise
+        
+    Returns:
+        bytes: Encoded beacon
+    """
+    return BEACON_FORMAT.pack(
+        DISCOVERY_BEACON_MAGIC, DISCOVERY_BEACON_VERSION, info.port,
+        socket.inet_aton(info.ip), info.features & 0xFFFF,
+        min(info.active_transfers, 0xFFFF), max(info.free_disk, 0), max(int(info.throughput), 0)
+    )
+
+
+def decode_beacon(data: bytes) -> Optional[ServerInfo]:
+    """
+    Decode a discovery reply, accepting both binary beacons and the
+    legacy "LAN_FILE_TRANSFER_SERVER:<ip>:<port>" text reply
+    
+    Args:
+        data (bytes): Datagram payload
+        
+    Returns:
+        Optional[ServerInfo]: Decoded server info, or None if not a reply
+    """
+    if data.startswith(DISCOVERY_BEACON_MAGIC):
+        if len(data) < BEACON_FORMAT_SIZE:
+            return None
+        (_, version, port, ip, features, active,
+         free_disk, throughput) = BEACON_FORMAT.unpack_from(data)
+        if version != DISCOVERY_BEACON_VERSION:
+            return None
+        return ServerInfo(socket.inet_ntoa(ip), port, features, active, free_disk, throughput)
+    
+    message = data.decode('utf-8', errors='replace')
+    if message.startswith(DISCOVERY_RESPONSE):
+        parts = message.split(':')
+        if len(parts) >= 3:
+            return ServerInfo(parts[1], int(parts[2]))
+    
+    return None
+
+
+class ServerCache:
+    """
+    Thread-safe TTL cache of discovered servers with optional background refresh
+    """
+    
+    def __init__(self, ttl: float = DISCOVERY_CACHE_TTL):
+        """
+        Initialize the server cache
+        
+        Args:
+            ttl (float): Seconds a server stays cached after it was last seen
+        """
+        self.ttl = ttl
+        self.last_refresh = 0.0
+        self._servers: Dict[Tuple[str, int], ServerInfo] = {}
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._refresh_stop = threading.Event()
+    
+    def add(self, info: ServerInfo) -> None:
+        """
+        Record a server's latest beacon
+        
+        Args:
+            info (ServerInfo): Server info decoded from the beacon
+        """
+        with self._lock:
+            self._servers[(info.ip, info.port)] = info
+    
+    def mark_refreshed(self) -> None:
+        """Record that a full discovery round just completed"""
+        self.last_refresh = time.time()
+    
+    def get_server_info(self) -> List[ServerInfo]:
+        """
+        Get all servers seen within the TTL, dropping expired entries
+        
+        Returns:
+            List[ServerInfo]: Latest info for each live server
+        """
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            self._servers = {key: info for key, info in self._servers.items()
+                             if info.last_seen >= cutoff}
+            return list(self._servers.values())
+    
+    def get_servers(self) -> List[Tuple[str, int]]:
+        """
+        Get all servers seen within the TTL
+        
+        Returns:
+            List[Tuple[str, int]]: List of (ip_address, port) tuples
+        """
+        return [(info.ip, info.port) for info in self.get_server_info()]
+    
+    def lookup(self, server_ip: str, server_port: int) -> Optional[ServerInfo]:
+        """
+        Get the cached info for one server
+        
+        Args:
+            server_ip (str): Server IP address
+            server_port (int): Server port
+            
+        Returns:
+            Optional[ServerInfo]: Cached info, or None if unknown or expired
+        """
+        with self._lock:
+            info = self._servers.get((server_ip, server_port))
+        if info and info.last_seen >= time.time() - self.ttl:
+            return info
+        return None
+    
+    def is_fresh(self, max_age: float) -> bool:
+        """
+        Check whether a discovery round completed within max_age seconds
+        
+        Args:
+            max_age (float): Maximum acceptable age in seconds
+            
+        Returns:
+            bool: True if the cached results are recent enough
+        """
+        return time.time() - self.last_refresh <= max_age
+    
+    def start_background_refresh(self, interval: float = DISCOVERY_REFRESH_INTERVAL,
+                                 timeout: float = DISCOVERY_TIMEOUT) -> None:
+        """
+        Periodically rediscover servers in a background thread
+        
+        Args:
+            interval (float): Seconds between discovery rounds
+            timeout (float): Timeout for each discovery round
+        """
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        
+        self._refresh_stop.clear()
+        
+        def refresh_loop():
+            service = DiscoveryService()
+            while not self._refresh_stop.is_set():
+                service.discover_servers(timeout)
+                self._refresh_stop.wait(interval)
+        
+        self._refresh_thread = threading.Thread(target=refresh_loop, name="DiscoveryRefresh")
+        self._refresh_thread.daemon = True
+        self._refresh_thread.start()
+    
+    def stop_background_refresh(self) -> None:
+        """Stop the background refresh thread"""
+        self._refresh_stop.set()
+        self._refresh_thread = None
+
+
+# Shared cache of every server seen by any discovery round in this process
+server_cache = ServerCache()
 
 
 class DiscoveryService:
@@ -20,18 +225,23 @@ class DiscoveryService:
     UDP discovery service for finding file transfer servers on the network
     """
     
-    def __init__(self, server_port: int = DEFAULT_PORT):
+    def __init__(self, server_port: int = DEFAULT_PORT,
+                 status_provider: Optional[Callable[[], Dict[str, int]]] = None):
         """
         Initialize the discovery service
         
         Args:
             server_port (int): Port number of the file transfer server
+            status_provider (Optional[Callable]): Returns the current load as a dict with
+                'features', 'active_transfers', 'free_disk' and 'throughput' keys
         """
         self.server_port = server_port
+        self.status_provider = status_provider
         self.logger = setup_logging()
         self.running = False
         self.discovery_socket = None
         self.server_socket = None
+        self.server_info = None
         
     def start_server_discovery(self) -> bool:
         """
@@ -47,6 +257,16 @@ class DiscoveryService:
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
             self.server_socket.bind(('', DISCOVERY_PORT))
             
+            # Also answer probes sent to the discovery multicast group
+            try:
+                membership = socket.inet_aton(DISCOVERY_MULTICAST_GROUP) + socket.inet_aton('0.0.0.0')
+                self.server_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            except OSError as e:
+                self.logger.warning(f"Multicast discovery unavailable: {e}")
+            
+            # Clients connect to the address a reply came from; this one is only a hint
+            self.server_info = ServerInfo(get_local_ip(), self.server_port)
+            
             self.running = True
             self.logger.info(f"Discovery server started on port {DISCOVERY_PORT}")
             
@@ -73,11 +293,8 @@ class DiscoveryService:
                 
                 # Check if it's a discovery request
                 if message == DISCOVERY_MESSAGE:
-                    # Send response with server information
-                    local_ip = get_local_ip()
-                    response = f"{DISCOVERY_RESPONSE}:{local_ip}:{self.server_port}"
-                    
-                    self.server_socket.sendto(response.encode('utf-8'), addr)
+                    # Send a beacon with our address and current load
+                    self.server_socket.sendto(self._build_beacon(), addr)
                     self.logger.info(f"Responded to discovery request from {addr[0]}")
                 
             except socket.timeout:
@@ -86,47 +303,93 @@ class DiscoveryService:
                 if self.running:  # Only log if we're supposed to be running
                     self.logger.error(f"Error in discovery listener: {e}")
     
-    def discover_servers(self, timeout: int = DISCOVERY_TIMEOUT) -> List[Tuple[str, int]]:
+    def _build_beacon(self) -> bytes:
+        """
+        Build a discovery beacon carrying the server's current load
+        
+        Returns:
+            bytes: Encoded beacon
+        """
+        if self.status_provider:
+            try:
+                status = self.status_provider()
+                self.server_info.features = status.get('features', 0)
+                self.server_info.active_transfers = status.get('active_transfers', 0)
+                self.server_info.free_disk = status.get('free_disk', 0)
+                self.server_info.throughput = int(status.get('throughput', 0))
+            except Exception as e:
+                self.logger.error(f"Error collecting server status: {e}")
+        return encode_beacon(self.server_info)
+    
+    def discover_servers(self, timeout: int = DISCOVERY_TIMEOUT,
+                         quiet_period: float = DISCOVERY_QUIET_PERIOD) -> List[Tuple[str, int]]:
         """
         Discover available file transfer servers on the network
         
+        Probes are sent to every interface's broadcast address and to the
+        discovery multicast group. Discovery returns as soon as no new reply
+        has arrived for quiet_period seconds, or after timeout at the latest.
+        
         Args:
             timeout (int): Timeout in seconds for discovery
+            quiet_period (float): Seconds without replies before returning early
             
         Returns:
             List[Tuple[str, int]]: List of (ip_address, port) tuples
         """
-        servers = []
+        servers = {}
         
         try:
             # Create UDP socket for discovery requests
             self.discovery_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            self.discovery_socket.settimeout(timeout)
+            self.discovery_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL,
+                                             DISCOVERY_MULTICAST_TTL)
             
-            # Send discovery broadcast
-            broadcast_addr = ('255.255.255.255', DISCOVERY_PORT)
-            self.discovery_socket.sendto(DISCOVERY_MESSAGE.encode('utf-8'), broadcast_addr)
+            # Send discovery probes on every interface and to the multicast group
+            probe = DISCOVERY_MESSAGE.encode('utf-8')
+            targets = get_broadcast_addresses() + [DISCOVERY_MULTICAST_GROUP]
+            for target in targets:
+                try:
+                    self.discovery_socket.sendto(probe, (target, DISCOVERY_PORT))
+                except OSError as e:
+                    self.logger.warning(f"Could not send discovery probe to {target}: {e}")
             
-            self.logger.info("Sent discovery broadcast")
+            self.logger.info(f"Sent discovery probes to {', '.join(targets)}")
             
-            # Listen for responses
-            start_time = time.time()
-            while time.time() - start_time < timeout:
+            # Listen for responses until they stop arriving
+            deadline = time.time() + timeout
+            last_reply = None
+            while True:
+                now = time.time()
+                wait = deadline - now
+                if last_reply is not None:
+                    wait = min(wait, last_reply + quiet_period - now)
+                if wait <= 0:
+                    break
+                
                 try:
+                    self.discovery_socket.settimeout(wait)
                     data, addr = self.discovery_socket.recvfrom(1024)
-                    message = data.decode('utf-8')
                     
-                    # Parse server response
-                    if message.startswith(DISCOVERY_RESPONSE):
-                        parts = message.split(':')
-                        if len(parts) >= 3:
-                            server_ip = parts[1]
-                            server_port = int(parts[2])
-                            
-                            # Add server to list (including local server for web interface)
-                            servers.append((server_ip, server_port))
-                            self.logger.info(f"Discovered server: {server_ip}:{server_port}")
+                    # Parse server beacon
+                    info = decode_beacon(data)
+                    if info is None:
+                        continue
+                    
+                    # A multi-homed server advertises its default-route address, which may
+                    # not be reachable from here; the address the reply came from is
+                    info.advertised_ip = info.ip
+                    info.ip = addr[0]
+                    
+                    # The same server may answer once per probe it received
+                    key = (info.ip, info.port)
+                    server_cache.add(info)
+                    if key not in servers:
+                        servers[key] = info
+                        last_reply = time.time()
+                        self.logger.info(f"Discovered server: {info.ip}:{info.port} "
+                                         f"({info.active_transfers} active transfers)")
                 
                 except socket.timeout:
                     break
@@ -134,6 +397,7 @@ class DiscoveryService:
                     self.logger.error(f"Error receiving discovery response: {e}")
                     break
             
+            server_cache.mark_refreshed()
             self.logger.info(f"Discovery completed. Found {len(servers)} servers")
             
         except Exception as e:
@@ -144,7 +408,7 @@ class DiscoveryService:
                 self.discovery_socket.close()
                 self.discovery_socket = None
         
-        return servers
+        return list(servers)
     
     def stop_discovery_server(self) -> None:
         """
@@ -202,16 +466,22 @@ class DiscoveryClient:
 
 
 # Convenience functions for easy usage
-def discover_servers(timeout: int = DISCOVERY_TIMEOUT) -> List[Tuple[str, int]]:
+def discover_servers(timeout: int = DISCOVERY_TIMEOUT,
+                     max_age: Optional[float] = None) -> List[Tuple[str, int]]:
     """
     Convenience function to discover servers
     
     Args:
         timeout (int): Timeout in seconds
+        max_age (Optional[float]): Serve cached results if a discovery round
+            completed within this many seconds (None always rediscovers)
         
     Returns:
         List[Tuple[str, int]]: List of (ip_address, port) tuples
     """
+    if max_age is not None and server_cache.is_fresh(max_age):
+        return server_cache.get_servers()
+    
     client = DiscoveryClient()
     return client.find_servers(timeout)
 
@@ -10,16 +10,19 @@ import time
 import shutil
 import atexit
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, make_response
 # Removed Flask-SocketIO dependency for 100% offline operation
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 
 # Import existing components
 from server import FileTransferServer
-from discovery import discover_servers
+from discovery import discover_servers, server_cache
+from config import DISCOVERY_REFRESH_INTERVAL, DISCOVERY_TIMEOUT
 from utils import get_local_ip, format_file_size, setup_logging
 from multi_transfer_manager import transfer_manager, TransferStatus
+from file_index import DirectoryIndex, SORT_KEYS
+from rate_limit import SHAPERS
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -78,6 +81,13 @@ logger = setup_logging()
 # Start transfer manager
 transfer_manager.start()
 
+# Index of the receive folder, kept current by the server callback and a directory watcher
+received_index = DirectoryIndex(app.config['RECEIVE_FOLDER'])
+received_index.start()
+
+# Keep the discovered-server list warm so /api/discover answers instantly
+server_cache.start_background_refresh()
+
 
 def cleanup_files():
     """Clean up all uploaded and received files when server shuts down"""
@@ -301,13 +311,14 @@ def start_server():
         port = data.get('port', 8888)
         password = data.get('password', 'lan_transfer_2024')
         receive_dir = data.get('receive_dir', 'web_received')
+        dedup = bool(data.get('dedup', False))
         
         # Stop existing server if running
         if server_instance:
             server_instance.stop_server()
         
         # Create new server
-        server_instance = FileTransferServer(port, password, receive_dir)
+        server_instance = FileTransferServer(port, password, receive_dir, dedup=dedup)
         
         # Set up callbacks for web updates
         def on_client_connected(client_ip):
@@ -327,6 +338,7 @@ def start_server():
                 'timestamp': time.strftime('%H:%M:%S'),
                 'status': 'success'
             })
+            received_index.update(file_path)
             logger.info(f"File received via web: {filename}")
         
         def on_error(error_message):
@@ -436,6 +448,7 @@ def cleanup_files_api():
     """Manually clean up all uploaded and received files"""
     try:
         cleanup_files()
+        received_index.rescan()
         return jsonify({
             'status': 'success',
             'message': 'Files cleaned up successfully'
@@ -453,15 +466,30 @@ def cleanup_files_api():
 def discover_servers_api():
     """Discover available servers on the network"""
     try:
-        servers = discover_servers(timeout=15)
+        # The background thread completes a round every interval + timeout seconds;
+        # allow one extra round of slack so requests only block on a cold cache
+        servers = discover_servers(timeout=15,
+                                   max_age=DISCOVERY_REFRESH_INTERVAL + 2 * DISCOVERY_TIMEOUT)
         server_list = []
         
         for ip, port in servers:
-            server_list.append({
+            entry = {
                 'ip': ip,
                 'port': port,
                 'display': f"{ip}:{port}"
-            })
+            }
+            
+            # Attach the load each server reported in its beacon
+            info = server_cache.lookup(ip, port)
+            if info:
+                entry.update({
+                    'active_transfers': info.active_transfers,
+                    'free_disk': info.free_disk,
+                    'free_disk_formatted': format_file_size(info.free_disk),
+                    'throughput': info.throughput,
+                    'features': info.features
+                })
+            server_list.append(entry)
         
         return jsonify({
             'status': 'success',
@@ -486,6 +514,7 @@ def upload_batch():
         target_servers_json = request.form.get('target_servers', '[]')
         password = request.form.get('password', 'lan_transfer_2024').strip()
         batch_name = request.form.get('batch_name', f'Batch_{int(time.time())}')
+        distribution = request.form.get('distribution', 'all')
         
         if not files or all(f.filename == '' for f in files):
             return jsonify({
@@ -519,13 +548,21 @@ def upload_batch():
             file.save(temp_path)
             saved_files.append(temp_path)
         
-        # Add batch transfer
-        batch_id = transfer_manager.add_batch_transfer(
-            name=batch_name,
-            files=saved_files,
-            target_servers=target_servers,
-            password=password
-        )
+        # Either send every file to every server, or spread files over the least-loaded ones
+        if distribution == 'balanced':
+            batch_id = transfer_manager.add_balanced_transfer(
+                name=batch_name,
+                files=saved_files,
+                target_servers=target_servers,
+                password=password
+            )
+        else:
+            batch_id = transfer_manager.add_batch_transfer(
+                name=batch_name,
+                files=saved_files,
+                target_servers=target_servers,
+                password=password
+            )
         
         # Add to transfer logs
         for file_path in saved_files:
@@ -685,28 +722,98 @@ def cancel_transfer(task_id):
         }), 500
 
 
+@app.route('/api/bandwidth')
+def bandwidth_limits():
+    """Get the current send and receive bandwidth limits (bytes per second, null for unlimited)"""
+    return jsonify({
+        'status': 'success',
+        'limits': {direction: shaper.get_limits() for direction, shaper in SHAPERS.items()}
+    })
+
+
+@app.route('/api/bandwidth', methods=['POST'])
+def set_bandwidth_limits():
+    """
+    Change bandwidth limits at runtime
+    
+    Body: {"direction": "send" or "receive" (default "send"), "global": rate,
+    "destinations": {ip: rate}, "tasks": {task_id: rate}}
+    where rate is in bytes per second and 0 or null removes the limit
+    """
+    try:
+        data = request.get_json() or {}
+        direction = data.get('direction', 'send')
+        if direction not in SHAPERS:
+            raise ValueError(f"unknown direction {direction!r}")
+        shaper = SHAPERS[direction]
+        
+        if 'global' in data:
+            shaper.set_global_limit(data['global'])
+        for destination, rate in data.get('destinations', {}).items():
+            shaper.set_destination_limit(destination, rate)
+        for task_id, rate in data.get('tasks', {}).items():
+            shaper.set_task_limit(task_id, rate)
+        
+        limits = {direction: shaper.get_limits() for direction, shaper in SHAPERS.items()}
+        logger.info(f"Bandwidth limits updated: {limits}")
+        
+        return jsonify({
+            'status': 'success',
+            'limits': limits
+        })
+        
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid bandwidth limits: {e}'
+        }), 400
+    except Exception as e:
+        logger.error(f"Bandwidth limit error: {e}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
 @app.route('/api/files')
 def list_files():
-    """List received files"""
+    """List received files (supports sort, order, offset and limit query parameters)"""
     try:
-        files = []
-        upload_dir = Path(app.config['RECEIVE_FOLDER'])
+        sort = request.args.get('sort', 'name')
+        order = request.args.get('order', 'asc')
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', None, type=int)
         
-        if upload_dir.exists():
-            for file_path in upload_dir.iterdir():
-                if file_path.is_file():
-                    stat = file_path.stat()
-                    files.append({
-                        'name': file_path.name,
-                        'size': stat.st_size,
-                        'size_formatted': format_file_size(stat.st_size),
-                        'modified': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stat.st_mtime))
-                    })
+        if sort not in SORT_KEYS or order not in ('asc', 'desc'):
+            return jsonify({
+                'status': 'error',
+                'message': f"Invalid sort. Use one of {', '.join(SORT_KEYS)} with order asc or desc"
+            }), 400
         
-        return jsonify({
+        # Listing only changes when the index does, so let clients revalidate cheaply
+        etag = received_index.etag
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+        
+        entries, total = received_index.list_files(sort, order == 'desc', offset, limit)
+        files = [{
+            'name': entry.name,
+            'size': entry.size,
+            'size_formatted': format_file_size(entry.size),
+            'modified': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.mtime))
+        } for entry in entries]
+        
+        response = jsonify({
             'status': 'success',
-            'files': files
+            'files': files,
+            'total': total,
+            'offset': offset,
+            'limit': limit
         })
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         logger.error(f"Error listing files: {e}")
@@ -846,5 +953,7 @@ if __name__ == '__main__':
         # Cleanup
         print("\n🧹 Shutting down and cleaning up...")
         transfer_manager.stop()
+        received_index.stop()
+        server_cache.stop_background_refresh()
         cleanup_files()  # Clean up files on shutdown
         print("✅ Server shutdown complete")
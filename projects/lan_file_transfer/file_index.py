@@ -0,0 +1,332 @@
+"""
+Incremental Directory Index for the LAN File Transfer System
+Keeps an in-memory listing of the receive folder so file listings never walk the disk
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils import setup_logging
+
+
+# inotify event masks (see <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+REMOVE_MASK = IN_DELETE | IN_MOVED_FROM
+EVENT_HEADER = struct.Struct("iIII")
+
+SORT_KEYS = {
+    "name": lambda entry: entry.name.lower(),
+    "size": lambda entry: entry.size,
+    "modified": lambda entry: entry.mtime,
+}
+
+
+@dataclass
+class FileEntry:
+    """A single file in the indexed directory"""
+    name: str
+    size: int
+    mtime: float
+
+
+class DirectoryIndex:
+    """
+    In-memory index of the files in a directory, kept up to date incrementally
+    through explicit updates, inotify events or directory polling
+    """
+
+    def __init__(self, directory: str, poll_interval: float = 2.0):
+        """
+        Initialize the directory index
+
+        Args:
+            directory (str): Directory to index
+            poll_interval (float): Seconds between checks when inotify is unavailable
+        """
+        self.directory = Path(directory)
+        self.poll_interval = poll_interval
+        self.logger = setup_logging()
+
+        self._entries: Dict[str, FileEntry] = {}
+        self._sorted: Dict[Tuple[str, bool], List[FileEntry]] = {}
+        self._version = 0
+        self._epoch = time.time_ns()
+        self._lock = threading.Lock()
+
+        self._running = False
+        self._watch_thread: Optional[threading.Thread] = None
+        self._dir_mtime_ns: Optional[int] = 0
+        self._libc = None
+        self._wd: Optional[int] = None  # inotify watch on the directory, None while it is gone
+
+        self.directory.mkdir(exist_ok=True)
+        self.rescan()
+
+    @property
+    def etag(self) -> str:
+        """Entity tag that changes whenever the listing changes"""
+        return f"{self._epoch:x}-{self._version}"
+
+    def rescan(self) -> None:
+        """
+        Rebuild the index with a single pass over the directory
+        """
+        entries = {}
+        self._dir_mtime_ns = None  # stays None while the directory is missing
+        try:
+            self._dir_mtime_ns = self.directory.stat().st_mtime_ns
+            with os.scandir(self.directory) as it:
+                for dir_entry in it:
+                    try:
+                        if not dir_entry.is_file():
+                            continue
+                        stat = dir_entry.stat()
+                    except OSError:
+                        continue
+                    entries[dir_entry.name] = FileEntry(dir_entry.name, stat.st_size, stat.st_mtime)
+        except OSError as e:
+            self.logger.error(f"Error scanning {self.directory}: {e}")
+
+        with self._lock:
+            self._entries = entries
+            self._changed()
+
+    def update(self, file_path) -> None:
+        """
+        Add or refresh a single file in the index
+
+        Args:
+            file_path: Path to the file, absolute or relative to the indexed directory
+        """
+        path = Path(file_path)
+        if not path.is_absolute() and path.parent == Path('.'):
+            path = self.directory / path
+        if path.parent.resolve() != self.directory.resolve():
+            return
+
+        try:
+            stat = path.stat()
+        except OSError:
+            self.remove(path.name)
+            return
+
+        if not path.is_file():
+            return
+
+        entry = FileEntry(path.name, stat.st_size, stat.st_mtime)
+        with self._lock:
+            if self._entries.get(path.name) != entry:
+                self._entries[path.name] = entry
+                self._changed()
+
+    def remove(self, filename: str) -> None:
+        """
+        Drop a file from the index
+
+        Args:
+            filename (str): Name of the file within the indexed directory
+        """
+        with self._lock:
+            if self._entries.pop(filename, None) is not None:
+                self._changed()
+
+    def list_files(self, sort: str = "name", reverse: bool = False,
+                   offset: int = 0, limit: Optional[int] = None) -> Tuple[List[FileEntry], int]:
+        """
+        Get a sorted page of the indexed files
+
+        Args:
+            sort (str): Sort key - "name", "size" or "modified"
+            reverse (bool): Sort in descending order
+            offset (int): Number of entries to skip
+            limit (Optional[int]): Maximum number of entries to return (None for all)
+
+        Returns:
+            Tuple[List[FileEntry], int]: (page of entries, total number of entries)
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unsupported sort key: {sort}")
+
+        with self._lock:
+            ordered = self._sorted.get((sort, reverse))
+            if ordered is None:
+                ordered = sorted(self._entries.values(), key=SORT_KEYS[sort], reverse=reverse)
+                self._sorted[(sort, reverse)] = ordered
+
+        offset = max(offset, 0)
+        end = None if limit is None else offset + max(limit, 0)
+        return ordered[offset:end], len(ordered)
+
+    def start(self) -> None:
+        """
+        Start watching the directory with inotify, falling back to polling
+        """
+        if self._running:
+            return
+
+        self._running = True
+        inotify_fd = self._open_inotify()
+        if inotify_fd is not None:
+            target, args, mode = self._inotify_loop, (inotify_fd,), "inotify"
+        else:
+            target, args, mode = self._poll_loop, (), "polling"
+
+        self._watch_thread = threading.Thread(target=target, args=args, name="DirectoryIndexWatcher")
+        self._watch_thread.daemon = True
+        self._watch_thread.start()
+        self.logger.info(f"Watching {self.directory} for changes ({mode})")
+
+    def stop(self) -> None:
+        """Stop watching the directory"""
+        self._running = False
+        if self._watch_thread:
+            self._watch_thread.join(timeout=self.poll_interval + 1)
+            self._watch_thread = None
+
+    def _changed(self) -> None:
+        """Invalidate cached sort orders; caller must hold the lock"""
+        self._version += 1
+        self._sorted.clear()
+
+    def _open_inotify(self) -> Optional[int]:
+        """
+        Create an inotify watch on the directory
+
+        Returns:
+            Optional[int]: inotify file descriptor, or None if inotify is unavailable
+        """
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            return None
+
+        try:
+            self._libc = ctypes.CDLL(libc_name, use_errno=True)
+            fd = self._libc.inotify_init1(IN_NONBLOCK)
+            if fd < 0:
+                return None
+            if not self._add_watch(fd):
+                os.close(fd)
+                return None
+            return fd
+        except (AttributeError, OSError):
+            return None
+
+    def _add_watch(self, fd: int) -> bool:
+        """
+        Watch the directory path, e.g. again after it was deleted and recreated
+
+        Args:
+            fd (int): inotify file descriptor
+
+        Returns:
+            bool: True if the directory is now watched
+        """
+        wd = self._libc.inotify_add_watch(fd, os.fsencode(str(self.directory)), WATCH_MASK)
+        if wd < 0:
+            return False
+        self._wd = wd
+        return True
+
+    def _inotify_loop(self, fd: int) -> None:
+        """
+        Apply inotify events to the index until stopped
+
+        Args:
+            fd (int): inotify file descriptor
+        """
+        try:
+            while self._running:
+                if self._wd is None and self.directory.is_dir() and self._add_watch(fd):
+                    # The directory is back; pick up whatever it holds now
+                    self.rescan()
+
+                readable, _, _ = select.select([fd], [], [], self.poll_interval)
+                if not readable:
+                    continue
+
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+
+                changed = set()
+                removed = set()
+                offset = 0
+                while offset + EVENT_HEADER.size <= len(data):
+                    wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+                    offset += EVENT_HEADER.size
+                    name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+                    offset += name_len
+
+                    if mask & IN_Q_OVERFLOW:
+                        # Lost events
+                        self.rescan()
+                        changed.clear()
+                        removed.clear()
+                        continue
+                    if wd != self._wd:
+                        continue  # left over from a watch that was dropped
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                        # The directory itself went away; a moved one keeps its watch, so drop it
+                        # and watch the path again once it is recreated (top of the loop)
+                        if mask & IN_MOVE_SELF:
+                            self._libc.inotify_rm_watch(fd, wd)
+                        self._wd = None
+                        self.rescan()
+                        changed.clear()
+                        removed.clear()
+                        continue
+                    if not name:
+                        continue
+                    if mask & REMOVE_MASK:
+                        removed.add(name)
+                        changed.discard(name)
+                    else:
+                        changed.add(name)
+                        removed.discard(name)
+
+                for name in removed:
+                    self.remove(name)
+                for name in changed:
+                    self.update(self.directory / name)
+        except Exception as e:
+            self.logger.error(f"Directory watcher error, falling back to polling: {e}")
+            if self._running:
+                self._poll_loop()
+        finally:
+            os.close(fd)
+
+    def _poll_loop(self) -> None:
+        """
+        Rescan the directory whenever its modification time changes
+        """
+        while self._running:
+            time.sleep(self.poll_interval)
+            try:
+                mtime_ns = self.directory.stat().st_mtime_ns
+            except OSError:
+                mtime_ns = None  # the directory is gone; empty the listing once
+            if mtime_ns != self._dir_mtime_ns:
+                self.rescan()
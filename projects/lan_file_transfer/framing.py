@@ -0,0 +1,109 @@
+"""
+Length-Prefixed Message Framing for the LAN File Transfer System
+Shared by the server and client for the JSON control messages of the protocol
+"""
+
+import json
+import socket
+import struct
+from typing import Optional
+
+# 4-byte big-endian payload length
+HEADER = struct.Struct("!I")
+
+# Control messages are small. The length is read before authentication, so cap
+# it before allocating the receive buffer; messages that carry a chunk manifest
+# get a larger cap from manifest_message_limit().
+MAX_MESSAGE_SIZE = 1024 * 1024
+# JSON bytes per manifest entry, ["<sha256 hex>", size], with room to spare
+MANIFEST_ENTRY_SIZE = 96
+
+
+def enable_nodelay(sock: socket.socket) -> None:
+    """
+    Disable Nagle's algorithm so small control messages go out immediately
+
+    Args:
+        sock (socket.socket): Connected TCP socket
+    """
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        # Not a TCP socket (e.g. a socketpair in tests); nothing to tune
+        pass
+
+
+def manifest_message_limit(entries: int) -> int:
+    """
+    Size cap for a message carrying a chunk manifest or chunk list
+
+    Args:
+        entries (int): Largest number of chunks the message may describe
+
+    Returns:
+        int: Maximum message size in bytes
+    """
+    return MAX_MESSAGE_SIZE + max(entries, 0) * MANIFEST_ENTRY_SIZE
+
+
+def recv_exact(sock: socket.socket, size: int) -> Optional[bytearray]:
+    """
+    Receive exactly size bytes into a preallocated buffer
+
+    Args:
+        sock (socket.socket): Socket to read from
+        size (int): Number of bytes to read
+
+    Returns:
+        Optional[bytearray]: The bytes read, or None if the peer closed the connection first
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            return None
+        received += count
+    return buffer
+
+
+def send_message(sock: socket.socket, message: dict) -> None:
+    """
+    Send a JSON message as a length header and payload in a single write
+
+    Args:
+        sock (socket.socket): Socket to write to
+        message (dict): Message to send
+    """
+    payload = json.dumps(message).encode('utf-8')
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def receive_message(sock: socket.socket, max_size: int = MAX_MESSAGE_SIZE) -> Optional[dict]:
+    """
+    Receive one length-prefixed JSON message
+
+    Args:
+        sock (socket.socket): Socket to read from
+        max_size (int): Largest payload accepted, in bytes
+
+    Returns:
+        Optional[dict]: Received message, or None if the connection closed
+
+    Raises:
+        ConnectionError: If the peer announces a message larger than max_size
+    """
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+
+    (length,) = HEADER.unpack(header)
+    if length > max_size:
+        raise ConnectionError(f"Message of {length} bytes exceeds the {max_size} byte limit")
+
+    payload = recv_exact(sock, length)
+    if payload is None:
+        return None
+
+    return json.loads(payload.decode('utf-8'))
@@ -14,8 +14,13 @@ from dataclasses import dataclass
 from enum import Enum
 
 from client import FileTransferSession
+from discovery import ServerInfo, server_cache
+from rate_limit import send_shaper
 from utils import setup_logging, format_file_size
 
+# Throughput assumed for receivers that have not reported any yet (bytes/s)
+DEFAULT_RECEIVER_THROUGHPUT = 10 * 1024 * 1024
+
 
 class TransferStatus(Enum):
     """Transfer status enumeration"""
@@ -199,6 +204,109 @@ class MultiTransferManager:
         
         return batch_id
     
+    def add_balanced_transfer(self, name: str, files: List[str],
+                              target_servers: Optional[List[Dict[str, any]]] = None,
+                              password: str = "lan_transfer_2024") -> str:
+        """
+        Add a batch that sends each file to exactly one receiver, placing
+        files on the least-loaded servers according to their discovery beacons
+        
+        Args:
+            name (str): Name for the batch transfer
+            files (List[str]): List of file paths to transfer
+            target_servers (Optional[List[Dict]]): Candidate servers with 'ip' and 'port'
+                keys (None uses every server in the discovery cache)
+            password (str): Authentication password
+            
+        Returns:
+            str: Batch transfer ID
+        """
+        if target_servers is None:
+            candidates = server_cache.get_server_info()
+        else:
+            candidates = [server_cache.lookup(server['ip'], server['port'])
+                          or ServerInfo(server['ip'], server['port'])
+                          for server in target_servers]
+        
+        if not candidates:
+            raise ValueError("No receivers available for balanced transfer")
+        
+        batch_id = f"batch_{int(time.time() * 1000)}"
+        
+        # Include transfers this manager already has in flight to each receiver
+        assigned_count = {(info.ip, info.port): 0 for info in candidates}
+        assigned_bytes = {(info.ip, info.port): 0 for info in candidates}
+        for task in list(self.active_transfers.values()):
+            key = (task.target_server, task.target_port)
+            if key in assigned_count:
+                assigned_count[key] += 1
+                assigned_bytes[key] += task.file_size - task.sent_bytes
+        
+        # A receiver's beacon already counts our in-flight transfers; keep only other senders' load
+        other_load = {(info.ip, info.port): max(info.active_transfers - assigned_count[(info.ip, info.port)], 0)
+                      for info in candidates}
+        
+        def placement_cost(info: ServerInfo) -> tuple:
+            key = (info.ip, info.port)
+            rate = info.throughput or DEFAULT_RECEIVER_THROUGHPUT
+            return (other_load[key] + assigned_count[key],
+                    assigned_bytes[key] / rate,
+                    -info.free_disk)
+        
+        sized_files = []
+        for file_path in files:
+            if not os.path.exists(file_path):
+                self.logger.warning(f"File not found: {file_path}")
+                continue
+            sized_files.append((os.path.getsize(file_path), file_path))
+        
+        # Largest files first so they land on the emptiest receivers
+        transfer_tasks = []
+        for file_size, file_path in sorted(sized_files, reverse=True):
+            filename = os.path.basename(file_path)
+            
+            # Skip receivers that reported too little free disk (0 means unknown)
+            fits = [info for info in candidates
+                    if not info.free_disk
+                    or info.free_disk - assigned_bytes[(info.ip, info.port)] >= file_size]
+            if not fits:
+                self.logger.warning(f"No receiver has space for {filename}")
+                continue
+            
+            target = min(fits, key=placement_cost)
+            assigned_count[(target.ip, target.port)] += 1
+            assigned_bytes[(target.ip, target.port)] += file_size
+            
+            task = TransferTask(
+                id=f"{batch_id}_{filename}_{target.ip}_{target.port}",
+                filename=filename,
+                file_path=file_path,
+                file_size=file_size,
+                target_server=target.ip,
+                target_port=target.port,
+                password=password
+            )
+            transfer_tasks.append(task)
+        
+        batch = BatchTransfer(
+            id=batch_id,
+            name=name,
+            files=transfer_tasks,
+            target_servers=[{'ip': info.ip, 'port': info.port} for info in candidates],
+            created_at=time.time()
+        )
+        
+        self.batch_transfers[batch_id] = batch
+        
+        for task in transfer_tasks:
+            self.transfer_queue.put(task)
+            self.stats['total_transfers'] += 1
+        
+        self.logger.info(f"Added balanced transfer '{name}' with {len(transfer_tasks)} tasks "
+                         f"across {len(candidates)} receivers")
+        
+        return batch_id
+    
     def add_single_transfer(self, file_path: str, target_server: str, target_port: int, 
                            password: str = "lan_transfer_2024") -> str:
         """
@@ -350,6 +458,7 @@ class MultiTransferManager:
             
             # Create transfer session
             session = FileTransferSession(task.password)
+            session.client.task_id = task.id
             task.transfer_session = session
             
             # Set up callbacks
@@ -439,6 +548,9 @@ class MultiTransferManager:
             
             if self.on_error:
                 self.on_error(f"Transfer execution error: {e}")
+        
+        finally:
+            send_shaper.clear_task(task.id)
     
     def _task_to_dict(self, task: TransferTask) -> Dict[str, any]:
         """Convert TransferTask to dictionary for JSON serialization"""
@@ -0,0 +1,200 @@
+"""
+Bandwidth Shaping for the LAN File Transfer System
+Token-bucket rate limits applied globally, per destination and per transfer task
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import SHAPER_BURST_SECONDS, SHAPER_MIN_BURST
+
+
+class TokenBucket:
+    """
+    Token bucket that lets callers reserve bytes ahead of time
+
+    Instead of polling until enough tokens exist, reserve() takes the bytes
+    immediately (the balance may go negative) and returns exactly how long the
+    caller has to wait, so each block costs one lock and at most one sleep.
+    A new bucket starts full, so an idle link sends its first burst at once.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """
+        Initialize the token bucket
+
+        Args:
+            rate (float): Sustained rate in bytes per second
+            burst (Optional[int]): Bucket size in bytes (default derived from rate)
+        """
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self.rate = 0.0
+        self.burst = 0
+        self.set_rate(rate, burst)
+        self._tokens = float(self.burst)
+
+    def set_rate(self, rate: float, burst: Optional[int] = None) -> None:
+        """
+        Change the rate, keeping any reservations already made
+
+        Args:
+            rate (float): Sustained rate in bytes per second
+            burst (Optional[int]): Bucket size in bytes (default derived from rate)
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            # Large enough for several full send blocks so big windows are not chopped up
+            self.burst = int(burst or max(rate * SHAPER_BURST_SECONDS, SHAPER_MIN_BURST))
+            self._tokens = min(self._tokens, self.burst)
+
+    def reserve(self, num_bytes: int) -> float:
+        """
+        Take num_bytes from the bucket
+
+        Args:
+            num_bytes (int): Bytes about to be transferred
+
+        Returns:
+            float: Seconds the caller must wait before transferring them
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= num_bytes
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def _refill(self, now: float) -> None:
+        """Add tokens for the time elapsed; caller must hold the lock"""
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+
+class BandwidthShaper:
+    """
+    Applies global, per-destination and per-task token buckets to a byte stream
+    """
+
+    def __init__(self):
+        """Initialize a shaper with no limits"""
+        self._lock = threading.Lock()
+        self.global_bucket: Optional[TokenBucket] = None
+        self.destination_buckets: Dict[str, TokenBucket] = {}
+        self.task_buckets: Dict[str, TokenBucket] = {}
+
+    def set_global_limit(self, rate: Optional[float]) -> None:
+        """
+        Set or clear the limit shared by all transfers
+
+        Args:
+            rate (Optional[float]): Bytes per second, or None/0 for unlimited
+        """
+        with self._lock:
+            if not rate:
+                self.global_bucket = None
+            elif self.global_bucket:
+                self.global_bucket.set_rate(rate)
+            else:
+                self.global_bucket = TokenBucket(rate)
+
+    def set_destination_limit(self, destination: str, rate: Optional[float]) -> None:
+        """
+        Set or clear the limit for all transfers to or from one host
+
+        Args:
+            destination (str): Peer IP address
+            rate (Optional[float]): Bytes per second, or None/0 for unlimited
+        """
+        with self._lock:
+            self._set_limit(self.destination_buckets, destination, rate)
+
+    def set_task_limit(self, task_id: str, rate: Optional[float]) -> None:
+        """
+        Set or clear the limit for a single transfer task
+
+        Args:
+            task_id (str): Transfer task ID
+            rate (Optional[float]): Bytes per second, or None/0 for unlimited
+        """
+        with self._lock:
+            self._set_limit(self.task_buckets, task_id, rate)
+
+    def clear_task(self, task_id: str) -> None:
+        """
+        Forget the limit for a finished task
+
+        Args:
+            task_id (str): Transfer task ID
+        """
+        with self._lock:
+            self.task_buckets.pop(task_id, None)
+
+    def throttle(self, num_bytes: int, destination: Optional[str] = None,
+                 task_id: Optional[str] = None) -> float:
+        """
+        Wait until num_bytes may be transferred under every applicable limit
+
+        Args:
+            num_bytes (int): Bytes about to be transferred
+            destination (Optional[str]): Peer IP address
+            task_id (Optional[str]): Transfer task ID
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        buckets = self._buckets_for(destination, task_id)
+        if not buckets:
+            return 0.0
+
+        wait = max(bucket.reserve(num_bytes) for bucket in buckets)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def get_limits(self) -> Dict[str, object]:
+        """
+        Get the configured limits
+
+        Returns:
+            Dict: Global, per-destination and per-task rates in bytes per second
+        """
+        with self._lock:
+            return {
+                'global': self.global_bucket.rate if self.global_bucket else None,
+                'destinations': {key: bucket.rate for key, bucket in self.destination_buckets.items()},
+                'tasks': {key: bucket.rate for key, bucket in self.task_buckets.items()}
+            }
+
+    def _buckets_for(self, destination: Optional[str], task_id: Optional[str]) -> List[TokenBucket]:
+        """Collect the buckets that apply to a transfer"""
+        buckets = [self.global_bucket]
+        if destination is not None:
+            buckets.append(self.destination_buckets.get(destination))
+        if task_id is not None:
+            buckets.append(self.task_buckets.get(task_id))
+        return [bucket for bucket in buckets if bucket is not None]
+
+    @staticmethod
+    def _set_limit(buckets: Dict[str, TokenBucket], key: str, rate: Optional[float]) -> None:
+        """Create, update or remove one keyed bucket; caller must hold the lock"""
+        if not rate:
+            buckets.pop(key, None)
+        elif key in buckets:
+            buckets[key].set_rate(rate)
+        else:
+            buckets[key] = TokenBucket(rate)
+
+
+# Process-wide shapers, one per direction: clients charge what they send and
+# servers what they receive, so a transfer between a client and a server in the
+# same process is not charged twice against the same buckets
+send_shaper = BandwidthShaper()
+receive_shaper = BandwidthShaper()
+SHAPERS = {'send': send_shaper, 'receive': receive_shaper}
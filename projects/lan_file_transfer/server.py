@@ -4,8 +4,8 @@ Handles file transfers with security, progress tracking, and integrity verificat
 """
 
 import hashlib
-import json
 import os
+import shutil
 import socket
 import threading
 import time
@@ -13,14 +13,21 @@ from pathlib import Path
 from typing import Optional, Callable
 
 from config import (
-    DEFAULT_PORT, BUFFER_SIZE, MAX_FILE_SIZE, CHUNK_SIZE,
-    DEFAULT_PASSWORD, OVERWRITE_PROMPT
+    DEFAULT_PORT, MAX_FILE_SIZE, CHUNK_SIZE,
+    DEFAULT_PASSWORD, OVERWRITE_PROMPT, DEDUP_STORE_DIR
 )
 from utils import (
     setup_logging, calculate_file_hash, format_file_size,
-    create_safe_filename, log_transfer, get_available_port
+    create_safe_filename, log_transfer, get_available_port, ThroughputMeter,
+    TransferProgressLog
 )
-from discovery import DiscoveryService
+from discovery import (
+    DiscoveryService, FEATURE_PASSWORD_AUTH, FEATURE_MD5_VERIFY, FEATURE_CHUNK_DEDUP
+)
+from framing import (MAX_MESSAGE_SIZE, enable_nodelay, manifest_message_limit, send_message,
+                     receive_message, recv_exact)
+from chunk_store import ChunkStore
+from rate_limit import receive_shaper
 
 
 class FileTransferServer:
@@ -29,7 +36,8 @@ class FileTransferServer:
     """
     
     def __init__(self, port: int = DEFAULT_PORT, password: str = DEFAULT_PASSWORD,
-                 receive_dir: str = "received_files"):
+                 receive_dir: str = "received_files", max_file_size: int = MAX_FILE_SIZE,
+                 chunk_size: int = CHUNK_SIZE, dedup: bool = False):
         """
         Initialize the file transfer server
         
@@ -37,18 +45,41 @@ class FileTransferServer:
             port (int): Port to listen on
             password (str): Pre-shared password for authentication
             receive_dir (str): Directory to save received files
+            max_file_size (int): Largest file accepted, in bytes
+            chunk_size (int): Maximum bytes read from the socket per recv
+            dedup (bool): Keep a content-addressed chunk store so clients can
+                skip chunks the server already has
         """
         self.port = port
         self.password = password
         self.receive_dir = Path(receive_dir)
+        self.max_file_size = max_file_size
+        self.chunk_size = chunk_size
         self.logger = setup_logging()
         self.server_socket = None
         self.running = False
         self.discovery_service = None
         
+        # Load reporting for discovery beacons
+        self.features = FEATURE_PASSWORD_AUTH | FEATURE_MD5_VERIFY
+        self.active_transfers = 0
+        self.throughput_meter = ThroughputMeter()
+        self._active_lock = threading.Lock()
+        
+        # Bandwidth shaping for incoming data, keyed by client address
+        self.shaper = receive_shaper
+        
         # Create receive directory if it doesn't exist
         self.receive_dir.mkdir(exist_ok=True)
         
+        # Optional deduplicating chunk store
+        self.chunk_store = ChunkStore(self.receive_dir / DEDUP_STORE_DIR) if dedup else None
+        self.metadata_limit = MAX_MESSAGE_SIZE
+        if self.chunk_store:
+            self.features |= FEATURE_CHUNK_DEDUP
+            # File metadata carries the chunk manifest, one entry per chunk of the largest file
+            self.metadata_limit = manifest_message_limit(max_file_size // self.chunk_store.min_chunk_size + 1)
+        
         # Callbacks for GUI updates
         self.on_client_connected: Optional[Callable] = None
         self.on_file_received: Optional[Callable] = None
@@ -84,7 +115,7 @@ class FileTransferServer:
             
             # Start discovery service if enabled
             if enable_discovery:
-                self.discovery_service = DiscoveryService(self.port)
+                self.discovery_service = DiscoveryService(self.port, self.get_load_status)
                 self.discovery_service.start_server_discovery()
                 self.logger.info("Discovery service enabled")
             
@@ -125,6 +156,7 @@ class FileTransferServer:
         while self.running:
             try:
                 client_socket, client_addr = self.server_socket.accept()
+                enable_nodelay(client_socket)
                 self.logger.info(f"Client connected from {client_addr[0]}:{client_addr[1]}")
                 
                 if self.on_client_connected:
@@ -189,8 +221,10 @@ class FileTransferServer:
                 client_password = auth_response.get("password", "")
                 
                 if client_password == self.password:
-                    # Send success response
-                    success_response = {"type": "auth_success"}
+                    # Send success response, advertising optional protocol features
+                    success_response = {"type": "auth_success", "features": self.features}
+                    if self.chunk_store:
+                        success_response["chunking"] = self.chunk_store.get_info()
                     self._send_message(client_socket, success_response)
                     return True
                 else:
@@ -215,7 +249,7 @@ class FileTransferServer:
         """
         try:
             # Receive file metadata
-            metadata = self._receive_message(client_socket)
+            metadata = self._receive_message(client_socket, self.metadata_limit)
             
             if not metadata or metadata.get("type") != "file_metadata":
                 self.logger.error("Invalid file metadata received")
@@ -226,10 +260,10 @@ class FileTransferServer:
             file_hash = metadata.get("hash", "")
             
             # Validate file size
-            if file_size > MAX_FILE_SIZE:
+            if file_size > self.max_file_size:
                 error_response = {
                     "type": "transfer_error",
-                    "message": f"File too large. Maximum size: {format_file_size(MAX_FILE_SIZE)}"
+                    "message": f"File too large. Maximum size: {format_file_size(self.max_file_size)}"
                 }
                 self._send_message(client_socket, error_response)
                 return
@@ -244,37 +278,18 @@ class FileTransferServer:
                 # In GUI mode, this would prompt the user
                 self.logger.info(f"Overwriting existing file: {safe_filename}")
             
-            # Send ready signal
-            ready_response = {"type": "ready_for_transfer"}
-            self._send_message(client_socket, ready_response)
-            
-            # Receive file data
-            received_size = 0
-            hash_md5 = hashlib.md5()
-            
-            with open(file_path, 'wb') as f:
-                while received_size < file_size:
-                    # Calculate chunk size
-                    remaining = file_size - received_size
-                    chunk_size = min(CHUNK_SIZE, remaining)
-                    
-                    # Receive chunk
-                    chunk = client_socket.recv(chunk_size)
-                    if not chunk:
-                        break
-                    
-                    # Write chunk to file
-                    f.write(chunk)
-                    received_size += len(chunk)
-                    hash_md5.update(chunk)
-                    
-                    # Update progress
-                    if self.on_transfer_progress:
-                        progress = (received_size / file_size) * 100
-                        self.on_transfer_progress(progress, received_size, file_size)
+            # Clients that saw FEATURE_CHUNK_DEDUP send a chunk manifest instead
+            manifest = metadata.get("chunks")
+            if manifest is not None and self.chunk_store:
+                received_hash = self._receive_chunks(client_socket, client_addr, safe_filename,
+                                                     file_path, file_size, manifest)
+                if received_hash is None:
+                    return
+            else:
+                received_hash = self._receive_file_data(client_socket, client_addr, safe_filename,
+                                                        file_path, file_size)
             
             # Verify file integrity
-            received_hash = hash_md5.hexdigest()
             if received_hash == file_hash:
                 # Transfer successful
                 success_response = {"type": "transfer_success"}
@@ -294,6 +309,8 @@ class FileTransferServer:
                 self._send_message(client_socket, error_response)
                 
                 # Remove corrupted file
+                if self.chunk_store:
+                    self.chunk_store.release(file_path)
                 if file_path.exists():
                     file_path.unlink()
                 
@@ -305,6 +322,150 @@ class FileTransferServer:
             if self.on_error:
                 self.on_error(f"File transfer error: {e}")
     
+    def _receive_file_data(self, client_socket: socket.socket, client_addr: tuple,
+                           safe_filename: str, file_path: Path, file_size: int) -> str:
+        """
+        Receive the raw file contents and write them to file_path
+        
+        Args:
+            client_socket (socket.socket): Client socket
+            client_addr (tuple): Client address
+            safe_filename (str): Sanitized file name
+            file_path (Path): Destination path
+            file_size (int): Expected size in bytes
+        
+        Returns:
+            str: MD5 hex digest of the received data
+        """
+        # Send ready signal
+        ready_response = {"type": "ready_for_transfer"}
+        self._send_message(client_socket, ready_response)
+        
+        # Receive file data
+        received_size = 0
+        hash_md5 = hashlib.md5()
+        
+        progress_log = TransferProgressLog(safe_filename, file_size, "RECEIVED", client_addr[0])
+        
+        # The old contents are about to be overwritten; stop offering their chunks
+        if self.chunk_store:
+            self.chunk_store.release(file_path)
+        
+        with self._active_lock:
+            self.active_transfers += 1
+        
+        try:
+            with open(file_path, 'wb') as f:
+                while received_size < file_size:
+                    # Calculate chunk size
+                    remaining = file_size - received_size
+                    chunk_size = min(self.chunk_size, remaining)
+                    
+                    # Receive chunk
+                    chunk = client_socket.recv(chunk_size)
+                    if not chunk:
+                        break
+                    
+                    # Pace reads so TCP flow control slows the sender down
+                    self.shaper.throttle(len(chunk), client_addr[0])
+                    
+                    # Write chunk to file
+                    f.write(chunk)
+                    received_size += len(chunk)
+                    hash_md5.update(chunk)
+                    self.throughput_meter.add(len(chunk))
+                    progress_log.update(received_size)
+                    
+                    # Update progress
+                    if self.on_transfer_progress:
+                        progress = (received_size / file_size) * 100
+                        self.on_transfer_progress(progress, received_size, file_size)
+        finally:
+            with self._active_lock:
+                self.active_transfers -= 1
+        
+        return hash_md5.hexdigest()
+    
+    def _receive_chunks(self, client_socket: socket.socket, client_addr: tuple, safe_filename: str,
+                        file_path: Path, file_size: int, manifest: list) -> Optional[str]:
+        """
+        Receive only the chunks missing from the chunk store, then build the file from the store
+        
+        Args:
+            client_socket (socket.socket): Client socket
+            client_addr (tuple): Client address
+            safe_filename (str): Sanitized file name
+            file_path (Path): Destination path
+            file_size (int): Expected size in bytes
+            manifest (list): [sha256 hex digest, size] pairs describing the file
+            
+        Returns:
+            Optional[str]: MD5 hex digest of the assembled file, or None if the
+            transfer was aborted (the client has already been told why)
+        """
+        try:
+            manifest = [(str(chunk_hash), int(size)) for chunk_hash, size in manifest]
+            missing = self.chunk_store.missing(manifest)
+        except (TypeError, ValueError):
+            missing = None
+        
+        if missing is None or sum(size for _, size in manifest) != file_size:
+            error_response = {"type": "transfer_error", "message": "Invalid chunk manifest"}
+            self._send_message(client_socket, error_response)
+            return None
+        
+        # Tell the client which chunks to send
+        ready_response = {"type": "ready_for_transfer", "missing": missing}
+        self._send_message(client_socket, ready_response)
+        
+        # Deduplicated bytes count as already received
+        received_size = file_size - sum(manifest[index][1] for index in missing)
+        self.logger.info(f"Deduplicated {format_file_size(received_size)} of {safe_filename}; "
+                         f"receiving {len(missing)} of {len(manifest)} chunks")
+        
+        progress_log = TransferProgressLog(safe_filename, file_size, "RECEIVED", client_addr[0])
+        
+        with self._active_lock:
+            self.active_transfers += 1
+        
+        try:
+            for index in missing:
+                chunk_hash, size = manifest[index]
+                
+                # Pace reads so TCP flow control slows the sender down
+                self.shaper.throttle(size, client_addr[0])
+                
+                data = recv_exact(client_socket, size)
+                if data is None:
+                    self.logger.error(f"Connection closed while receiving {safe_filename}")
+                    return None
+                
+                if not self.chunk_store.put(chunk_hash, data):
+                    error_response = {"type": "transfer_error", "message": "File integrity check failed"}
+                    self._send_message(client_socket, error_response)
+                    self.logger.error(f"Chunk integrity check failed for {safe_filename}")
+                    return None
+                
+                received_size += size
+                self.throughput_meter.add(size)
+                progress_log.update(received_size)
+                
+                # Update progress
+                if self.on_transfer_progress:
+                    progress = (received_size / file_size) * 100 if file_size else 100.0
+                    self.on_transfer_progress(progress, received_size, file_size)
+        finally:
+            with self._active_lock:
+                self.active_transfers -= 1
+        
+        file_hash = self.chunk_store.materialize(manifest, file_path)
+        if file_hash is None:
+            # A file we deduplicated against was changed or deleted mid-transfer
+            error_response = {"type": "transfer_error", "message": "Stored chunks changed, please retry"}
+            self._send_message(client_socket, error_response)
+            self.logger.error(f"Could not assemble {safe_filename} from the chunk store")
+        return file_hash
+    
     def _send_message(self, client_socket: socket.socket, message: dict) -> None:
         """
         Send a JSON message to client
@@ -314,49 +475,26 @@ class FileTransferServer:
             message (dict): Message to send
         """
         try:
-            message_str = json.dumps(message)
-            message_bytes = message_str.encode('utf-8')
-            
-            # Send message length first
-            length = len(message_bytes)
-            client_socket.send(length.to_bytes(4, byteorder='big'))
-            
-            # Send message
-            client_socket.send(message_bytes)
+            send_message(client_socket, message)
             
         except Exception as e:
             self.logger.error(f"Error sending message: {e}")
             raise
     
-    def _receive_message(self, client_socket: socket.socket) -> Optional[dict]:
+    def _receive_message(self, client_socket: socket.socket,
+                         max_size: int = MAX_MESSAGE_SIZE) -> Optional[dict]:
         """
         Receive a JSON message from client
         
         Args:
             client_socket (socket.socket): Client socket
+            max_size (int): Largest message accepted, in bytes
             
         Returns:
             Optional[dict]: Received message or None if error
         """
         try:
-            # Receive message length
-            length_bytes = client_socket.recv(4)
-            if not length_bytes:
-                return None
-            
-            length = int.from_bytes(length_bytes, byteorder='big')
-            
-            # Receive message
-            message_bytes = b''
-            while len(message_bytes) < length:
-                chunk = client_socket.recv(min(length - len(message_bytes), BUFFER_SIZE))
-                if not chunk:
-                    return None
-                message_bytes += chunk
-            
-            # Parse JSON message
-            message_str = message_bytes.decode('utf-8')
-            return json.loads(message_str)
+            return receive_message(client_socket, max_size)
             
         except Exception as e:
             self.logger.error(f"Error receiving message: {e}")
@@ -383,6 +521,25 @@ class FileTransferServer:
         
         self.logger.info("File transfer server stopped")
     
+    def get_load_status(self) -> dict:
+        """
+        Get the current load, as advertised in discovery beacons
+        
+        Returns:
+            dict: Feature bits, active transfers, free disk bytes and throughput
+        """
+        try:
+            free_disk = shutil.disk_usage(self.receive_dir).free
+        except OSError:
+            free_disk = 0
+        
+        return {
+            "features": self.features,
+            "active_transfers": self.active_transfers,
+            "free_disk": free_disk,
+            "throughput": self.throughput_meter.rate()
+        }
+    
     def get_server_info(self) -> dict:
         """
         Get server information
@@ -0,0 +1,179 @@
+"""
+Tests for the deduplicating chunk store
+Run with pytest from the lan_file_transfer directory
+"""
+
+import hashlib
+import io
+import os
+import stat
+import time
+
+from chunk_store import ChunkStore, build_manifest, iter_chunks
+
+
+def _send(store: ChunkStore, data: bytes, dest) -> str:
+    """Simulate one deduplicated transfer of data into dest; returns the stored MD5"""
+    chunks = list(iter_chunks(io.BytesIO(data), "fixed", 4096))
+    manifest = [(hashlib.sha256(chunk).hexdigest(), len(chunk)) for chunk in chunks]
+    for index in store.missing(manifest):
+        assert store.put(manifest[index][0], chunks[index])
+    return store.materialize(manifest, dest)
+
+
+def _staged(store: ChunkStore) -> list:
+    return [path for path in store.objects_dir.rglob("*") if path.is_file()]
+
+
+def test_build_manifest_matches_chunks(tmp_path):
+    """build_manifest hashes every chunk and the whole file in one pass"""
+    data = os.urandom(10000)
+    source = tmp_path / "source.bin"
+    source.write_bytes(data)
+
+    manifest, md5 = build_manifest(str(source), "fixed", 4096)
+    assert [size for _, size in manifest] == [4096, 4096, 1808]
+    assert md5 == hashlib.md5(data).hexdigest()
+
+
+def test_cdc_boundaries_survive_an_insertion():
+    """Content-defined chunks after an insertion are mostly shared with the original"""
+    data = os.urandom(256 * 1024)
+    shifted = b"inserted" + data
+    before = {hashlib.sha256(c).digest() for c in iter_chunks(io.BytesIO(data), "cdc", 8192)}
+    after = [hashlib.sha256(c).digest() for c in iter_chunks(io.BytesIO(shifted), "cdc", 8192)]
+    assert sum(chunk in before for chunk in after) >= len(after) - 2
+
+
+def test_received_file_is_the_only_copy(tmp_path):
+    """Chunks are not kept alongside the file once it is materialized"""
+    store = ChunkStore(tmp_path / ".chunks")
+    data = os.urandom(20000)
+    dest = tmp_path / "a.bin"
+
+    assert _send(store, data, dest) == hashlib.md5(data).hexdigest()
+    assert dest.read_bytes() == data
+    assert _staged(store) == []
+    assert not (tmp_path / ".chunks" / "files").exists()
+
+
+def test_repeat_transfer_sends_nothing(tmp_path):
+    """A second identical file is built from the first one without new chunks"""
+    store = ChunkStore(tmp_path / ".chunks")
+    data = os.urandom(20000)
+    _send(store, data, tmp_path / "a.bin")
+
+    manifest = [(hashlib.sha256(c).hexdigest(), len(c)) for c in iter_chunks(io.BytesIO(data), "fixed", 4096)]
+    assert store.missing(manifest) == []
+    assert store.materialize(manifest, tmp_path / "b.bin") == hashlib.md5(data).hexdigest()
+    assert (tmp_path / "b.bin").read_bytes() == data
+    assert store.ref_count(manifest[0][0]) == 2
+
+
+def test_editing_a_received_file_does_not_corrupt_later_transfers(tmp_path):
+    """An edited file stops being a chunk source, and the next copy matches the source"""
+    store = ChunkStore(tmp_path / ".chunks")
+    data = os.urandom(20000)
+    first = tmp_path / "a.bin"
+    _send(store, data, first)
+
+    with open(first, "r+b") as f:
+        f.write(b"edited by the user")
+
+    second = tmp_path / "b.bin"
+    assert _send(store, data, second) == hashlib.md5(data).hexdigest()
+    assert second.read_bytes() == data
+    assert first.read_bytes().startswith(b"edited by the user")
+
+
+def test_edit_with_same_size_and_mtime_is_caught_on_read(tmp_path):
+    """A chunk whose bytes changed is re-verified before use"""
+    store = ChunkStore(tmp_path / ".chunks")
+    data = os.urandom(8192)
+    first = tmp_path / "a.bin"
+    _send(store, data, first)
+
+    stat = os.stat(first)
+    first.write_bytes(bytes(len(data)))
+    os.utime(first, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    manifest = [(hashlib.sha256(c).hexdigest(), len(c)) for c in iter_chunks(io.BytesIO(data), "fixed", 4096)]
+    assert store.missing(manifest) == []
+    assert store.materialize(manifest, tmp_path / "b.bin") is None
+    assert store.ref_count(manifest[0][0]) == 0
+
+
+def test_deleting_files_releases_their_chunks(tmp_path):
+    """Chunks are referenced until the last file containing them is gone"""
+    store = ChunkStore(tmp_path / ".chunks")
+    data = os.urandom(8192)
+    _send(store, data, tmp_path / "a.bin")
+    _send(store, data, tmp_path / "b.bin")
+    chunk_hash = hashlib.sha256(data[:4096]).hexdigest()
+    assert store.ref_count(chunk_hash) == 2
+
+    (tmp_path / "a.bin").unlink()
+    store.prune()
+    assert store.ref_count(chunk_hash) == 1
+
+    store.release(tmp_path / "b.bin")
+    assert store.ref_count(chunk_hash) == 0
+    assert not store.has(chunk_hash)
+
+
+def test_index_survives_a_restart(tmp_path):
+    """A new store over the same directory still knows the received files"""
+    data = os.urandom(8192)
+    _send(ChunkStore(tmp_path / ".chunks"), data, tmp_path / "a.bin")
+
+    store = ChunkStore(tmp_path / ".chunks")
+    assert store.has(hashlib.sha256(data[:4096]).hexdigest())
+
+
+def test_put_rejects_bad_hash(tmp_path):
+    """A chunk that does not match its announced hash is refused"""
+    store = ChunkStore(tmp_path / ".chunks")
+    assert not store.put(hashlib.sha256(b"expected").hexdigest(), b"something else")
+
+
+def test_materialized_files_get_the_usual_mode(tmp_path):
+    """Received files are created as open(path, "wb") would, not owner-only"""
+    store = ChunkStore(tmp_path / ".chunks")
+    dest = tmp_path / "received.bin"
+    _send(store, os.urandom(5000), dest)
+
+    plain = tmp_path / "plain.bin"
+    plain.write_bytes(b"")
+    assert stat.S_IMODE(dest.stat().st_mode) == stat.S_IMODE(plain.stat().st_mode)
+
+
+def test_chunks_of_abandoned_transfers_expire(tmp_path):
+    """Staged chunks nobody materialized are removed once older than staged_max_age"""
+    store = ChunkStore(tmp_path / ".chunks", staged_max_age=60)
+    chunks = [os.urandom(100), os.urandom(100)]
+    hashes = [hashlib.sha256(chunk).hexdigest() for chunk in chunks]
+    for chunk_hash, chunk in zip(hashes, chunks):
+        store.put(chunk_hash, chunk)
+
+    old = time.time() - 120
+    os.utime(store._object_path(hashes[0]), (old, old))
+    leftover = store.root / ".tmp_crashed"
+    leftover.write_bytes(b"partial")
+    os.utime(leftover, (old, old))
+
+    store.prune()
+    assert not store.has(hashes[0]) and store.has(hashes[1])
+    assert not leftover.exists()
+
+
+def test_reused_staged_chunks_are_kept_fresh(tmp_path):
+    """A transfer that relies on an old staged chunk renews it so it is not expired mid-transfer"""
+    store = ChunkStore(tmp_path / ".chunks", staged_max_age=60)
+    chunk = os.urandom(100)
+    chunk_hash = hashlib.sha256(chunk).hexdigest()
+    store.put(chunk_hash, chunk)
+    old = time.time() - 50
+    os.utime(store._object_path(chunk_hash), (old, old))
+
+    assert store.missing([(chunk_hash, len(chunk))]) == []
+    assert store._object_path(chunk_hash).stat().st_mtime > old + 30
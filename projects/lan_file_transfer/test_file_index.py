@@ -0,0 +1,116 @@
+"""
+Tests for the incremental directory index
+Run with pytest from the lan_file_transfer directory
+"""
+
+import shutil
+import time
+
+import pytest
+
+from file_index import DirectoryIndex
+
+
+def _names(index: DirectoryIndex) -> list:
+    return [entry.name for entry in index.list_files()[0]]
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def watched(request, tmp_path, monkeypatch):
+    """A started index on tmp_path/received, once with inotify and once with the poll fallback"""
+    if request.param == "polling":
+        monkeypatch.setattr(DirectoryIndex, "_open_inotify", lambda self: None)
+    index = DirectoryIndex(str(tmp_path / "received"), poll_interval=0.05)
+    index.start()
+    if request.param == "inotify" and index._wd is None:
+        index.stop()
+        pytest.skip("inotify is not available")
+    yield index
+    index.stop()
+
+
+def test_explicit_updates_bump_version_and_etag(tmp_path):
+    index = DirectoryIndex(str(tmp_path))
+    etag = index.etag
+
+    (tmp_path / "a.txt").write_bytes(b"hello")
+    index.update(tmp_path / "a.txt")
+    assert _names(index) == ["a.txt"] and index.etag != etag
+
+    # Refreshing an unchanged file keeps the ETag, so clients keep their cached listing
+    etag = index.etag
+    index.update("a.txt")
+    assert index.etag == etag
+
+    (tmp_path / "a.txt").unlink()
+    index.update(tmp_path / "a.txt")
+    assert _names(index) == [] and index.etag != etag
+
+
+def test_files_outside_the_directory_are_ignored(tmp_path):
+    (tmp_path / "inner").mkdir()
+    (tmp_path / "outside.txt").write_bytes(b"x")
+    index = DirectoryIndex(str(tmp_path / "inner"))
+    index.update(tmp_path / "outside.txt")
+    assert _names(index) == []
+
+
+def test_sorting_and_paging(tmp_path):
+    for name, size in (("b.txt", 3), ("A.txt", 1), ("c.txt", 2)):
+        (tmp_path / name).write_bytes(b"x" * size)
+    index = DirectoryIndex(str(tmp_path))
+
+    assert _names(index) == ["A.txt", "b.txt", "c.txt"]
+    page, total = index.list_files(sort="size", reverse=True, offset=1, limit=1)
+    assert [entry.name for entry in page] == ["c.txt"] and total == 3
+    with pytest.raises(ValueError):
+        index.list_files(sort="owner")
+
+
+def test_watcher_sees_create_delete_and_rename(watched):
+    directory = watched.directory
+    etag = watched.etag
+
+    (directory / "new.bin").write_bytes(b"data")
+    assert _wait_for(lambda: _names(watched) == ["new.bin"])
+    assert watched.etag != etag
+
+    (directory / "new.bin").rename(directory / "renamed.bin")
+    assert _wait_for(lambda: _names(watched) == ["renamed.bin"])
+
+    (directory / "renamed.bin").unlink()
+    assert _wait_for(lambda: _names(watched) == [])
+
+
+def test_watcher_survives_the_directory_being_recreated(watched):
+    """Deleting or moving the directory empties the listing; recreating it resumes updates"""
+    directory = watched.directory
+    (directory / "old.bin").write_bytes(b"old")
+    assert _wait_for(lambda: _names(watched) == ["old.bin"])
+
+    shutil.rmtree(directory)
+    assert _wait_for(lambda: _names(watched) == [])
+    directory.mkdir()
+    time.sleep(0.2)
+    (directory / "after-delete.bin").write_bytes(b"new")
+    assert _wait_for(lambda: _names(watched) == ["after-delete.bin"])
+
+    directory.rename(directory.with_name("moved"))
+    assert _wait_for(lambda: _names(watched) == [])
+    directory.mkdir()
+    time.sleep(0.2)
+    (directory / "after-move.bin").write_bytes(b"new")
+    assert _wait_for(lambda: _names(watched) == ["after-move.bin"])
+    # Changes in the moved-away directory no longer show up
+    (directory.with_name("moved") / "stray.bin").write_bytes(b"x")
+    time.sleep(0.2)
+    assert _names(watched) == ["after-move.bin"]
@@ -0,0 +1,68 @@
+"""
+Tests for the length-prefixed message framing
+Run with pytest from the lan_file_transfer directory
+"""
+
+import socket
+import threading
+
+import pytest
+
+from framing import HEADER, MAX_MESSAGE_SIZE, manifest_message_limit, recv_exact, receive_message, send_message
+
+
+def test_message_round_trip():
+    """A message sent with send_message comes back unchanged"""
+    left, right = socket.socketpair()
+    with left, right:
+        message = {"type": "file_metadata", "filename": "report.pdf", "size": 12345}
+        send_message(left, message)
+        assert receive_message(right) == message
+
+
+def test_receive_returns_none_on_close():
+    """A peer closing before or inside a message yields None"""
+    left, right = socket.socketpair()
+    with right:
+        left.close()
+        assert receive_message(right) is None
+
+    left, right = socket.socketpair()
+    with right:
+        left.sendall(HEADER.pack(10) + b"{}")
+        left.close()
+        assert receive_message(right) is None
+
+
+def test_recv_exact_reassembles_partial_reads():
+    """recv_exact keeps reading until the requested size has arrived"""
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(b"abc")
+        left.sendall(b"defgh")
+        assert recv_exact(right, 8) == bytearray(b"abcdefgh")
+
+
+def test_oversized_length_is_rejected():
+    """A length above MAX_MESSAGE_SIZE is refused before any buffer is allocated"""
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(HEADER.pack(MAX_MESSAGE_SIZE + 1))
+        with pytest.raises(ConnectionError):
+            receive_message(right)
+
+
+def test_manifest_limit_fits_the_largest_manifest():
+    """A manifest at the smallest chunk size for a multi-GB file passes the raised limit"""
+    max_file_size = 8 * 1024 ** 3
+    entries = max_file_size // (256 * 1024) + 1
+    manifest = [["%064x" % index, 4 * 1024 * 1024] for index in range(entries)]
+    message = {"type": "file_metadata", "filename": "disk.img", "size": max_file_size,
+               "hash": "0" * 32, "chunks": manifest}
+
+    left, right = socket.socketpair()
+    with left, right:
+        sender = threading.Thread(target=send_message, args=(left, message))
+        sender.start()
+        assert receive_message(right, manifest_message_limit(entries)) == message
+        sender.join()
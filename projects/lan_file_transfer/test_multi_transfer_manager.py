@@ -0,0 +1,40 @@
+"""
+Tests for balanced placement in the multi-transfer manager
+Run with pytest from the lan_file_transfer directory
+"""
+
+from discovery import ServerInfo, server_cache
+from multi_transfer_manager import MultiTransferManager, TransferTask
+
+
+def _place(manager: MultiTransferManager, tmp_path) -> tuple:
+    source = tmp_path / "report.pdf"
+    source.write_bytes(b"x" * 100)
+    batch_id = manager.add_balanced_transfer("batch", [str(source)],
+                                             [{"ip": "10.0.0.1", "port": 8000},
+                                              {"ip": "10.0.0.2", "port": 8000}])
+    task = manager.batch_transfers[batch_id].files[0]
+    return task.target_server, task.target_port
+
+
+def _in_flight(manager: MultiTransferManager, count: int, ip: str) -> None:
+    for index in range(count):
+        manager.active_transfers[f"t{index}"] = TransferTask(f"t{index}", "f", "f", 0, ip, 8000, "")
+
+
+def test_own_transfers_are_not_counted_twice(tmp_path):
+    """A receiver's beacon already includes our in-flight transfers to it"""
+    manager = MultiTransferManager()
+    server_cache.add(ServerInfo("10.0.0.1", 8000, active_transfers=2))  # both are ours
+    server_cache.add(ServerInfo("10.0.0.2", 8000, active_transfers=3))  # all from other senders
+    _in_flight(manager, 2, "10.0.0.1")
+    assert _place(manager, tmp_path) == ("10.0.0.1", 8000)
+
+
+def test_beacon_older_than_our_transfers(tmp_path):
+    """A beacon sent before our transfers started never makes the load negative"""
+    manager = MultiTransferManager()
+    server_cache.add(ServerInfo("10.0.0.1", 8000, active_transfers=0))
+    server_cache.add(ServerInfo("10.0.0.2", 8000, active_transfers=1))
+    _in_flight(manager, 2, "10.0.0.1")
+    assert _place(manager, tmp_path) == ("10.0.0.2", 8000)
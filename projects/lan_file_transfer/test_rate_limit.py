@@ -0,0 +1,112 @@
+"""
+Tests for token-bucket bandwidth shaping
+Run with pytest from the lan_file_transfer directory
+"""
+
+import pytest
+
+import rate_limit
+from rate_limit import BandwidthShaper, TokenBucket
+
+
+class FakeClock:
+    """Stands in for time.monotonic and time.sleep so tests never wait"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_bucket_starts_full_and_reserves_ahead(clock):
+    """An idle link sends its first burst at once; beyond it, reserve returns the wait it needs"""
+    bucket = TokenBucket(1000, burst=500)
+    assert bucket.reserve(500) == 0.0
+    assert bucket.reserve(250) == pytest.approx(0.25)
+    # The balance is now negative; the next caller queues behind the first
+    assert bucket.reserve(250) == pytest.approx(0.5)
+
+
+def test_bucket_refills_up_to_burst(clock):
+    bucket = TokenBucket(1000, burst=500)
+    bucket.reserve(500)
+    clock.now += 10
+    assert bucket.reserve(500) == 0.0
+    assert bucket.reserve(100) == pytest.approx(0.1)
+
+
+def test_set_rate_keeps_outstanding_reservations(clock):
+    bucket = TokenBucket(1000, burst=500)
+    bucket.reserve(1500)
+    bucket.set_rate(2000, burst=500)
+    assert bucket.reserve(0) == pytest.approx(0.5)
+
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_default_burst_has_a_floor():
+    """Slow rates still get a bucket of a few send blocks"""
+    assert TokenBucket(10).burst == rate_limit.SHAPER_MIN_BURST
+
+
+def test_shaper_without_limits_never_waits(clock):
+    assert BandwidthShaper().throttle(10 ** 9, '10.0.0.1', 'task') == 0.0
+    assert clock.slept == []
+
+
+def test_shaper_applies_the_tightest_limit(clock):
+    """Global, destination and task limits all apply; the slowest decides the wait"""
+    shaper = BandwidthShaper()
+    shaper.set_global_limit(10_000)
+    shaper.set_destination_limit('10.0.0.1', 1_000)
+    shaper.set_task_limit('task', 5_000)
+    for bucket in [shaper.global_bucket, shaper.destination_buckets['10.0.0.1'], shaper.task_buckets['task']]:
+        bucket.set_rate(bucket.rate, burst=100)
+
+    assert shaper.throttle(1_000, '10.0.0.1', 'task') == pytest.approx(0.9)
+    assert clock.slept == [pytest.approx(0.9)]
+    # Another destination only sees the global and task limits; the task bucket
+    # refilled to its burst during the sleep and is now the slowest
+    assert shaper.throttle(1_000, '10.0.0.2', 'task') == pytest.approx(0.18)
+
+
+def test_limits_can_be_cleared(clock):
+    shaper = BandwidthShaper()
+    shaper.set_global_limit(1_000)
+    shaper.set_destination_limit('10.0.0.1', 2_000)
+    shaper.set_task_limit('task', 3_000)
+    assert shaper.get_limits() == {'global': 1000.0, 'destinations': {'10.0.0.1': 2000.0},
+                                   'tasks': {'task': 3000.0}}
+
+    shaper.set_global_limit(None)
+    shaper.set_destination_limit('10.0.0.1', 0)
+    shaper.clear_task('task')
+    assert shaper.get_limits() == {'global': None, 'destinations': {}, 'tasks': {}}
+
+
+def test_directions_are_shaped_separately(clock):
+    """A client and server in one process each charge their own side of a transfer"""
+    assert rate_limit.SHAPERS == {'send': rate_limit.send_shaper, 'receive': rate_limit.receive_shaper}
+    rate_limit.send_shaper.set_global_limit(1_000)
+    try:
+        assert rate_limit.receive_shaper.get_limits()['global'] is None
+        assert rate_limit.receive_shaper.throttle(10 ** 6, '127.0.0.1') == 0.0
+    finally:
+        rate_limit.send_shaper.set_global_limit(None)
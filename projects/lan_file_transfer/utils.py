@@ -3,46 +3,170 @@ Utility functions for the LAN File Transfer System
 Contains helper functions for file operations, networking, and security
 """
 
+import atexit
 import hashlib
+import ipaddress
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import socket
+import struct
+import threading
 import time
+from collections import deque
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
-from config import BUFFER_SIZE, LOG_FORMAT, LOG_FILE
+from config import (
+    BUFFER_SIZE, LOG_FORMAT, LOG_FILE, TRANSFER_LOG_FILE, PROGRESS_LOG_INTERVAL
+)
+
+# Background listener that performs all handler I/O; created on first setup_logging()
+_log_listener: Optional[logging.handlers.QueueListener] = None
+_log_setup_lock = threading.Lock()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats structured transfer records as one JSON object per line
+    """
+    
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "event": record.getMessage()
+        }
+        event.update(getattr(record, "transfer", {}))
+        return json.dumps(event)
+
+
+def _is_transfer_record(record: logging.LogRecord) -> bool:
+    """Check whether a log record is a structured transfer record"""
+    return hasattr(record, "transfer")
 
 
 def setup_logging() -> logging.Logger:
     """
     Set up logging configuration for the application
     
+    The first call attaches a single QueueHandler to the application logger
+    and starts a QueueListener thread that owns the file and console handlers,
+    so logging calls never do I/O on the calling (transfer) thread. Later
+    calls just return the same logger.
+    
     Returns:
         logging.Logger: Configured logger instance
     """
+    global _log_listener
+    
     # Create logger
     logger = logging.getLogger('lan_file_transfer')
-    logger.setLevel(logging.INFO)
     
-    # Create file handler
-    file_handler = logging.FileHandler(LOG_FILE)
-    file_handler.setLevel(logging.INFO)
+    with _log_setup_lock:
+        if _log_listener is not None:
+            return logger
+        
+        logger.setLevel(logging.INFO)
+        
+        # Create formatter
+        formatter = logging.Formatter(LOG_FORMAT)
+        
+        # Create file handler
+        file_handler = logging.FileHandler(LOG_FILE)
+        file_handler.setLevel(logging.INFO)
+        file_handler.setFormatter(formatter)
+        file_handler.addFilter(lambda record: not _is_transfer_record(record))
+        
+        # Create console handler
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(formatter)
+        console_handler.addFilter(lambda record: not _is_transfer_record(record))
+        
+        # Structured transfer records go to their own JSON lines file
+        transfer_handler = logging.FileHandler(TRANSFER_LOG_FILE)
+        transfer_handler.setFormatter(JsonLinesFormatter())
+        transfer_handler.addFilter(_is_transfer_record)
+        
+        # Hand records to the listener thread through an unbounded queue
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        
+        _log_listener = logging.handlers.QueueListener(
+            log_queue, file_handler, console_handler, transfer_handler,
+            respect_handler_level=True
+        )
+        _log_listener.start()
+        atexit.register(_log_listener.stop)
     
-    # Create console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    return logger
+
+
+def get_transfer_logger() -> logging.Logger:
+    """
+    Get the logger for structured transfer records
     
-    # Create formatter
-    formatter = logging.Formatter(LOG_FORMAT)
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
+    Returns:
+        logging.Logger: Child of the application logger
+    """
+    setup_logging()
+    return logging.getLogger('lan_file_transfer.transfers')
+
+
+class TransferProgressLog:
+    """
+    Sampled structured progress events for a single transfer
     
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    update() is meant to be called for every chunk; it only emits a record
+    when PROGRESS_LOG_INTERVAL has passed since the last one, or when the
+    transfer reaches its total.
+    """
     
-    return logger
+    def __init__(self, filename: str, total: int, direction: str, peer: str = "",
+                 interval: float = PROGRESS_LOG_INTERVAL):
+        """
+        Initialize the progress log
+        
+        Args:
+            filename (str): Name of the transferred file
+            total (int): File size in bytes
+            direction (str): "SENT" or "RECEIVED"
+            peer (str): Address of the other side
+            interval (float): Minimum seconds between emitted events
+        """
+        self.logger = get_transfer_logger()
+        self.filename = filename
+        self.total = total
+        self.direction = direction
+        self.peer = peer
+        self.interval = interval
+        self.started = time.monotonic()
+        self._next_emit = self.started + interval
+    
+    def update(self, done: int) -> None:
+        """
+        Record progress, emitting a structured event if one is due
+        
+        Args:
+            done (int): Bytes transferred so far
+        """
+        now = time.monotonic()
+        if now < self._next_emit and done < self.total:
+            return
+        
+        self._next_emit = now + self.interval
+        elapsed = now - self.started
+        self.logger.info("progress", extra={"transfer": {
+            "filename": self.filename,
+            "direction": self.direction,
+            "peer": self.peer,
+            "bytes": done,
+            "total": self.total,
+            "rate": round(done / elapsed, 1) if elapsed > 0 else None
+        }})
 
 
 def calculate_file_hash(file_path: str) -> str:
@@ -85,6 +209,49 @@ def get_local_ip() -> str:
         return "127.0.0.1"
 
 
+def get_broadcast_addresses() -> List[str]:
+    """
+    Get the directed broadcast address of every IPv4 interface
+    
+    Returns:
+        List[str]: Broadcast addresses, always including 255.255.255.255
+    """
+    addresses = []
+    
+    try:
+        import fcntl
+        
+        SIOCGIFADDR = 0x8915
+        SIOCGIFNETMASK = 0x891b
+        
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for _, ifname in socket.if_nameindex():
+                request = struct.pack('256s', ifname.encode('utf-8')[:15])
+                try:
+                    ip = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, request)[20:24])
+                    netmask = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFNETMASK, request)[20:24])
+                except OSError:
+                    # Interface has no IPv4 address (or the ioctl is not supported here)
+                    continue
+                
+                network = ipaddress.IPv4Network(f"{ip}/{netmask}", strict=False)
+                if network.is_loopback or network.prefixlen >= 31:
+                    continue
+                addresses.append(str(network.broadcast_address))
+    except (ImportError, AttributeError, OSError):
+        pass
+    
+    if not addresses:
+        # Fall back to assuming a /24 around the primary address
+        local_ip = get_local_ip()
+        if not local_ip.startswith("127."):
+            network = ipaddress.IPv4Network(f"{local_ip}/24", strict=False)
+            addresses.append(str(network.broadcast_address))
+    
+    addresses.append("255.255.255.255")
+    return list(dict.fromkeys(addresses))
+
+
 def format_file_size(size_bytes: int) -> str:
     """
     Format file size in human-readable format
@@ -188,6 +355,51 @@ def get_available_port(start_port: int = 8888, max_attempts: int = 10) -> Option
     return None
 
 
+class ThroughputMeter:
+    """
+    Sliding-window byte counter for reporting recent transfer throughput
+    """
+    
+    def __init__(self, window: float = 10.0):
+        """
+        Initialize the throughput meter
+        
+        Args:
+            window (float): Length of the averaging window in seconds
+        """
+        self.window = window
+        self._buckets = deque()  # (whole second, bytes) pairs
+        self._lock = threading.Lock()
+    
+    def add(self, num_bytes: int) -> None:
+        """
+        Record transferred bytes
+        
+        Args:
+            num_bytes (int): Number of bytes transferred just now
+        """
+        second = int(time.time())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += num_bytes
+            else:
+                self._buckets.append([second, num_bytes])
+    
+    def rate(self) -> float:
+        """
+        Get the average throughput over the window
+        
+        Returns:
+            float: Bytes per second
+        """
+        cutoff = time.time() - self.window
+        with self._lock:
+            while self._buckets and self._buckets[0][0] < cutoff:
+                self._buckets.popleft()
+            total = sum(num_bytes for _, num_bytes in self._buckets)
+        return total / self.window
+
+
 def log_transfer(logger: logging.Logger, filename: str, size: int, 
                 direction: str, status: str, client_ip: str = "") -> None:
     """
@@ -202,10 +414,17 @@ def log_transfer(logger: logging.Logger, filename: str, size: int,
         client_ip (str): IP address of the client
     """
     size_str = format_file_size(size)
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
     
     log_message = f"{direction} {filename} ({size_str}) - {status}"
     if client_ip:
         log_message += f" from/to {client_ip}"
     
     logger.info(log_message)
+    
+    get_transfer_logger().info("transfer", extra={"transfer": {
+        "filename": filename,
+        "size": size,
+        "direction": direction,
+        "status": status,
+        "peer": client_ip
+    }})
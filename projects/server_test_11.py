@@ -4,11 +4,16 @@ import time
 import random
 import json
 import logging
-from typing import Dict, List, Any, Optional, Set
-from dataclasses import dataclass
+from typing import Dict, Any, Optional
 import signal
 import sys
 
+import numpy as np
+
+from game_links import HEARTBEAT_INTERVAL
+from game_simulation import PLAYER_HALF_HEIGHT, LaneSimulation, Player, ease_out_back
+from game_snapshots import POSITION_SCALE, SnapshotClient, SnapshotEncoder
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,41 +22,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
-class Player:
-    """Player data class with smooth movement support"""
-    name: str
-    lane: int
-    target_lane: int
-    score: float
-    blink: float
-    last_heartbeat: float
-    addr: Any
-    x: float
-    y: float
-    id: int
-    finished: bool = False
-    move_progress: float = 1.0
-    consecutive_collisions: int = 0  # Track consecutive collisions
-    last_collision_time: float = 0.0  # Time of last collision
-    # ADD VERTICAL MOVEMENT FIELDS
-    vertical_speed: float = 0.0
-    target_y: float = 400.0  # Default vertical position
-
-@dataclass
-class Obstacle:
-    """Obstacle data class with type support"""
-    lane: int
-    y: float
-    x: float
-    id: float
-    type: str
-    width: float
-    height: float
-    speed: float
-    penalty: int
-    color: str
-
 class GameServer:
     """Enhanced multiplayer game server with advanced features and EXACT client road positioning"""
     
@@ -147,6 +117,11 @@ class GameServer:
             }
         }
         
+        # Area of interest for snapshot clients: the band cars can occupy, widened so that
+        # every obstacle that could touch a car is included
+        self.INTEREST_MARGIN = max(t["height"] for t in self.OBSTACLE_TYPES.values()) / 2 + PLAYER_HALF_HEIGHT
+        self.DEFAULT_VIEWPORT = (self.MIN_PLAYER_Y - self.INTEREST_MARGIN, self.MAX_PLAYER_Y + self.INTEREST_MARGIN)
+        
         # Advanced spawn settings with dynamic difficulty and cooldown management
         self.BASE_OBSTACLE_COOLDOWN = 1.5
         self.BASE_OBSTACLE_PROBABILITY = 0.7
@@ -155,9 +130,15 @@ class GameServer:
         self.MAX_OBSTACLES = 8
         self.obstacle_speed_multiplier = 1.0
         
-        # Game state
+        # Game state; numeric entity state lives in the simulation's NumPy tables
+        self.sim = LaneSimulation(self.LANE_X, self.OBSTACLE_TYPES)
         self.players: Dict[Any, Player] = {}
-        self.obstacles: List[Obstacle] = []
+        
+        # Binary snapshot clients get deltas against their last acknowledged snapshot;
+        # names only travel in the roster, which is versioned and resent until acknowledged
+        self.snapshots = SnapshotEncoder()
+        self.snapshot_clients: Dict[Any, SnapshotClient] = {}
+        self.roster_version = 0
         self.game_running = False
         self.start_time: Optional[float] = None
         self.shutdown_requested = False
@@ -170,7 +151,8 @@ class GameServer:
             "total_obstacles_spawned": 0,
             "total_collisions": 0,
             "average_obstacle_lifetime": 0,
-            "game_session_count": 0
+            "game_session_count": 0,
+            "state_bytes_sent": 0
         }
         
         # Network
@@ -228,8 +210,10 @@ class GameServer:
                 self.handle_join(msg, addr)
             elif msg_type == "input":
                 self.handle_input(msg, addr)
+            elif msg_type == "ack":
+                self.handle_ack(msg, addr)
             elif msg_type == "heartbeat":
-                self.handle_heartbeat(addr)
+                self.handle_heartbeat(msg, addr)
             elif msg_type == "leave":
                 self.handle_leave(addr)
             else:
@@ -256,26 +240,39 @@ class GameServer:
                 player_id = self.next_player_id
                 self.next_player_id += 1
                 
-                self.players[addr] = Player(
-                    name=name,
+                self.players[addr] = self.sim.add_player(
+                    name,
+                    addr,
                     lane=start_lane,
                     target_lane=start_lane,
-                    score=0.0,
-                    blink=0.0,
                     last_heartbeat=now,
-                    addr=addr,
                     x=self.LANE_X[start_lane],  # Use exact lane center
                     y=self.PLAYER_Y,
                     id=player_id,
+                    move_progress=1.0,
                     target_y=self.PLAYER_Y  # Initialize target Y position
                 )
                 logger.info(f"New player joined: {name} (ID: {player_id}) from {addr}")
+            
+            # Clients opt in to binary snapshots; others keep getting full JSON states
+            binary = msg.get("snapshots") == "binary"
+            viewport = self.parse_viewport(msg.get("viewport"))
+            if binary:
+                self.snapshot_clients[addr] = SnapshotClient(viewport, self.TICK_RATE)
+            else:
+                self.snapshot_clients.pop(addr, None)
+            self.roster_version += 1
         
         # Send acknowledgement WITH ID and obstacle types for client compatibility
         self.send_message({
             "type": "join_ack",
             "id": player_id,  # Client expects this
             "obstacle_types": self.OBSTACLE_TYPES,  # Send types for client rendering
+            "obstacle_type_order": self.sim.type_names,  # Type indices used in snapshots
+            "snapshots": "binary" if binary else "json",
+            "position_scale": POSITION_SCALE,
+            "viewport": viewport,
+            "heartbeat_interval": HEARTBEAT_INTERVAL,
             "settings": {
                 "blink_duration": self.BLINK_DURATION,
                 "collision_cooldown": self.COLLISION_COOLDOWN
@@ -326,60 +323,76 @@ class GameServer:
             
             player.last_heartbeat = time.time()
 
-    def handle_heartbeat(self, addr: Any):
-        """Handle client heartbeat"""
+    def parse_viewport(self, viewport: Any) -> tuple:
+        """A client's requested area of interest (top, bottom), or the default one"""
+        try:
+            top, bottom = (float(v) for v in viewport)
+        except (TypeError, ValueError):
+            return self.DEFAULT_VIEWPORT
+        if not top < bottom:
+            return self.DEFAULT_VIEWPORT
+        return (top, bottom)
+
+    def handle_heartbeat(self, msg: Dict, addr: Any):
+        """Handle client heartbeat; numbered ones also report the RTT and loss the client measured"""
+        now = time.time()
+        seq = msg.get("seq")
         with self.lock:
             if addr in self.players:
-                self.players[addr].last_heartbeat = time.time()
-        
-        self.send_message({"type": "heartbeat_ack"}, addr)
+                self.players[addr].last_heartbeat = now
+            client = self.snapshot_clients.get(addr)
+            if client is not None:
+                try:
+                    client.link.on_heartbeat(
+                        int(seq) if seq is not None else None,
+                        float(msg["rtt"]) if msg.get("rtt") is not None else None,
+                        float(msg["loss"]) if msg.get("loss") is not None else None,
+                        now
+                    )
+                except (TypeError, ValueError):
+                    logger.warning(f"Malformed heartbeat from {addr}")
+        
+        # Echo the number so the client can time the round trip
+        self.send_message({"type": "heartbeat_ack", "seq": seq}, addr)
+
+    def handle_ack(self, msg: Dict, addr: Any):
+        """Record the latest snapshot and roster version a binary client has"""
+        with self.lock:
+            client = self.snapshot_clients.get(addr)
+            if client is None:
+                return
+            roster = msg.get("roster")
+            client.ack(int(msg.get("seq", 0)), int(roster) if roster is not None else None)
+            self.players[addr].last_heartbeat = time.time()
 
     def handle_leave(self, addr: Any):
         """Handle player leave requests"""
         with self.lock:
             if addr in self.players:
                 player_name = self.players[addr].name
-                del self.players[addr]
+                self.remove_player(addr)
                 logger.info(f"Player left: {player_name} from {addr}")
 
+    def remove_player(self, addr: Any):
+        """Drop a player and its simulation row; caller must hold the lock"""
+        player = self.players.pop(addr)
+        self.sim.remove_player(player)
+        self.snapshot_clients.pop(addr, None)
+        self.roster_version += 1
+
     def update_player_movements(self, dt: float):
         """Update smooth lane transitions AND vertical movement for all players"""
+        # Dynamic transition speed based on game state
+        transition_speed = self.LANE_CHANGE_DURATION
+        if self.game_progress > 0.7:  # Faster transitions in late game
+            transition_speed *= 0.8
+        
         with self.lock:
-            for player in self.players.values():
-                # Update lane transitions
-                if player.move_progress < 1.0:
-                    # Continue lane transition with dynamic speed based on game state
-                    transition_speed = self.LANE_CHANGE_DURATION
-                    if self.game_progress > 0.7:  # Faster transitions in late game
-                        transition_speed *= 0.8
-                    
-                    player.move_progress += dt / transition_speed
-                    player.move_progress = min(1.0, player.move_progress)
-                    
-                    # Calculate interpolated position with enhanced easing
-                    start_x = self.LANE_X[player.lane]
-                    target_x = self.LANE_X[player.target_lane]
-                    
-                    # Enhanced easing function for smoother animation
-                    progress = self.ease_out_back(player.move_progress)
-                    player.x = start_x + (target_x - start_x) * progress
-                    
-                    # Complete transition
-                    if player.move_progress >= 1.0:
-                        player.lane = player.target_lane
-                        player.x = self.LANE_X[player.lane]
-                
-                # NEW: Update vertical movement
-                if player.vertical_speed != 0.0:
-                    new_y = player.y + player.vertical_speed * dt
-                    # Clamp Y position within screen boundaries
-                    player.y = max(self.MIN_PLAYER_Y, min(self.MAX_PLAYER_Y, new_y))
+            self.sim.move_players(dt, transition_speed, self.MIN_PLAYER_Y, self.MAX_PLAYER_Y)
 
     def ease_out_back(self, x: float) -> float:
         """Enhanced easing function for smoother animations"""
-        c1 = 1.70158
-        c2 = c1 * 1.525
-        return 1 + c2 * (x - 1) ** 3 + c1 * (x - 1) ** 2
+        return ease_out_back(x)
 
     def send_message(self, message: Dict, addr: Any):
         """Send message to client with enhanced error handling"""
@@ -392,17 +405,12 @@ class GameServer:
     def check_timeouts(self):
         """Remove players who haven't sent heartbeats with enhanced tracking"""
         now = time.time()
-        timeout_players = []
         
         with self.lock:
-            for addr, player in self.players.items():
-                if now - player.last_heartbeat > self.HEARTBEAT_TIMEOUT:
-                    timeout_players.append(addr)
-            
-            for addr in timeout_players:
-                if addr in self.players:
-                    logger.info(f"Player timeout: {self.players[addr].name} from {addr}")
-                    del self.players[addr]
+            timeout_players = self.sim.stale_players(now, self.HEARTBEAT_TIMEOUT)
+            for player in timeout_players:
+                logger.info(f"Player timeout: {player.name} from {player.addr}")
+                self.remove_player(player.addr)
         
         return len(timeout_players) > 0
 
@@ -419,7 +427,7 @@ class GameServer:
         # Adjust based on player performance (if players are doing well, increase difficulty)
         performance_factor = 1.0
         with self.lock:
-            if any(p.score > self.MAX_SCORE * 0.7 for p in self.players.values()):
+            if np.any(self.sim.players.column("score") > self.MAX_SCORE * 0.7):
                 performance_factor = 1.2
         
         # Combined difficulty with smooth transitions
@@ -433,73 +441,111 @@ class GameServer:
         # Update game duration based on difficulty
         self.GAME_DURATION = self.BASE_GAME_DURATION * (1.0 + (difficulty - 1.0) * 0.3)
 
-    def broadcast_state(self):
-        """Broadcast game state to all connected players with enhanced data"""
+    def broadcast_state(self, force: bool = False):
+        """Broadcast game state: binary snapshot deltas, or full JSON states for older clients"""
+        packets = []
         with self.lock:
             now = time.time()
             elapsed = now - self.start_time if self.start_time else 0
             time_left = max(0, self.GAME_DURATION - elapsed)
             
-            # Build enhanced player list
-            player_list = []
-            for player in self.players.values():
-                player_list.append({
-                    "id": player.id,
-                    "x": player.x,
-                    "y": player.y,  # This now includes vertical movement updates
-                    "name": player.name,
-                    "score": round(player.score),
-                    "finished": player.finished,
-                    "lane": player.lane,
-                    "blink": player.blink,
-                    "target_lane": player.target_lane,
-                    "move_progress": player.move_progress
-                })
-            
-            # Build obstacle list with all necessary fields
-            obstacle_list = []
-            for obs in self.obstacles:
-                obstacle_list.append({
-                    "x": obs.x,
-                    "y": obs.y,
-                    "lane": obs.lane,
-                    "id": obs.id,
-                    "type": obs.type,
-                    "color": obs.color,
-                    "width": obs.width,  # Send dimensions for client rendering
-                    "height": obs.height
-                })
-            
             self.state_sequence += 1
+            json_addrs = [addr for addr in self.players if addr not in self.snapshot_clients]
+            state = self.build_json_state(now, time_left) if json_addrs else None
             
-            state = {
-                "type": "state",
-                "seq": self.state_sequence,
-                "players": player_list,
-                "obstacles": obstacle_list,
-                "time_left": time_left,
-                "game_running": self.game_running,
-                "game_progress": self.game_progress,
-                "difficulty": self.difficulty_level,
-                "total_players": len(self.players),
-                "server_time": now
-            }
+            if self.snapshot_clients:
+                self.snapshots.capture(self.sim, now, self.BLINK_DURATION, self.game_running,
+                                       self.roster_version, time_left)
+                roster = None
+                for addr, client in self.snapshot_clients.items():
+                    if client.needs_roster(self.roster_version, now):
+                        if roster is None:
+                            roster = self.build_roster()
+                        client.roster_sent_at = now
+                        packets.append((roster, addr))
+                    # Per-client send rate, adapted to the link; skipped ticks fold into the next delta
+                    if client.link.due() or force:
+                        packets.append((self.snapshots.encode_for(client.acked_seq, client.viewport), addr))
         
         # Enhanced broadcasting with compression consideration
-        data = json.dumps(state, separators=(',', ':')).encode('utf-8')
+        if state is not None:
+            data = json.dumps(state, separators=(',', ':')).encode('utf-8')
+            packets.extend((data, addr) for addr in json_addrs)
         disconnected = []
         
         with self.lock:
-            for addr in list(self.players.keys()):
+            for data, addr in packets:
                 try:
                     self.sock.sendto(data, addr)
+                    self.performance_stats["state_bytes_sent"] += len(data)
                 except Exception as e:
                     logger.warning(f"Failed to send state to {addr}: {e}")
                     disconnected.append(addr)
             
             for addr in disconnected:
                 if addr in self.players:
-                    del self.players[addr]
+                    self.remove_player(addr)
+
+    def build_json_state(self, now: float, time_left: float) -> Dict:
+        """Full JSON game state; caller must hold the lock"""
+        # Build enhanced player list, a column at a time
+        p = self.sim.players
+        player_list = [
+            {
+                "id": pid,
+                "x": x,
+                "y": y,  # This now includes vertical movement updates
+                "name": player.name,
+                "score": round(score),
+                "finished": finished,
+                "lane": lane,
+                "blink": blink,
+                "target_lane": target_lane,
+                "move_progress": move_progress
+            }
+            for player, pid, x, y, score, finished, lane, blink, target_lane, move_progress in zip(
+                p.handles, *(p.column(name).tolist() for name in (
+                    "id", "x", "y", "score", "finished", "lane", "blink", "target_lane", "move_progress")))
+        ]
+        
+        # Build obstacle list with all necessary fields
+        o = self.sim.obstacles
+        obstacle_list = []
+        for x, y, lane, oid, type_index, width, height in zip(*(o.column(name).tolist() for name in (
+                "x", "y", "lane", "id", "type_index", "width", "height"))):
+            obstacle_type = self.sim.type_names[type_index]
+            obstacle_list.append({
+                "x": x,
+                "y": y,
+                "lane": lane,
+                "id": oid,
+                "type": obstacle_type,
+                "color": self.OBSTACLE_TYPES[obstacle_type]["color"],
+                "width": width,  # Send dimensions for client rendering
+                "height": height
+            })
+        
+        return {
+            "type": "state",
+            "seq": self.state_sequence,
+            "players": player_list,
+            "obstacles": obstacle_list,
+            "time_left": time_left,
+            "game_running": self.game_running,
+            "game_progress": self.game_progress,
+            "difficulty": self.difficulty_level,
+            "total_players": len(self.players),
+            "server_time": now
+        }
+
+    def build_roster(self) -> bytes:
+        """Encoded roster message: the static per-player data snapshots leave out"""
+        roster = {
+            "type": "roster",
+            "version": self.roster_version,
+            "players": [{"id": player.id, "name": player.name} for player in self.players.values()]
+        }
+        return json.dumps(roster, separators=(',', ':')).encode('utf-8')
 
     def get_obstacle_weights(self) -> tuple:
         """Enhanced weighted obstacle types based on game progress and player performance"""
@@ -512,7 +558,7 @@ class GameServer:
         avg_score = 0
         with self.lock:
             if self.players:
-                avg_score = sum(p.score for p in self.players.values()) / len(self.players)
+                avg_score = float(self.sim.players.column("score").mean())
         
         # Players doing well = harder obstacles
         performance_modifier = 1.0 + (avg_score / self.MAX_SCORE) * 0.5
@@ -544,24 +590,16 @@ class GameServer:
         self.game_progress = self.calculate_game_progress(current_time)
         self.update_difficulty()
         
-        # Enhanced obstacle movement with progressive speed
-        new_obstacles = []
-        for obs in self.obstacles:
-            # Apply progressive speed scaling based on type and difficulty
-            type_speed = obs.speed
-            speed_multiplier = self.obstacle_speed_multiplier
-            
-            # Faster obstacles in later game stages
-            if self.game_progress > 0.8:
-                speed_multiplier *= 1.2
-            
-            obs.y += (type_speed * speed_multiplier) * dt
-            
-            # Keep obstacle while any part is still on screen
-            if obs.y < self.SCREEN_H + obs.height + 100:  # Slightly larger buffer
-                new_obstacles.append(obs)
+        # Enhanced obstacle movement with progressive speed scaling by type and difficulty
+        speed_multiplier = self.obstacle_speed_multiplier
+        
+        # Faster obstacles in later game stages
+        if self.game_progress > 0.8:
+            speed_multiplier *= 1.2
         
-        self.obstacles = new_obstacles
+        # Moves every obstacle and drops those that have left the screen
+        with self.lock:
+            self.sim.move_obstacles(dt, speed_multiplier, self.SCREEN_H)
 
         # Enhanced obstacle spawning with type-specific cooldowns
         if self.game_running:
@@ -569,7 +607,7 @@ class GameServer:
             
             # Check if we can spawn based on cooldown and probability
             can_spawn = (time_since_last_spawn >= self.obstacle_cooldown and 
-                        len(self.obstacles) < self.MAX_OBSTACLES and 
+                        len(self.sim.obstacles) < self.MAX_OBSTACLES and 
                         random.random() < self.obstacle_probability)
             
             if can_spawn:
@@ -585,20 +623,19 @@ class GameServer:
                 obstacle_x = self.LANE_X[lane_choice]
                 obstacle_y = -props["height"]
                 
-                new_obstacle = Obstacle(
-                    lane=lane_choice,
-                    y=obstacle_y,
-                    x=obstacle_x,
-                    id=current_time,
-                    type=obstacle_type,
-                    width=props["width"],
-                    height=props["height"],
-                    speed=props["speed"],
-                    penalty=props["penalty"],
-                    color=props["color"]
-                )
+                with self.lock:
+                    self.sim.add_obstacle(
+                        obstacle_type,
+                        lane=lane_choice,
+                        y=obstacle_y,
+                        x=obstacle_x,
+                        id=current_time,
+                        width=props["width"],
+                        height=props["height"],
+                        speed=props["speed"],
+                        penalty=props["penalty"]
+                    )
                 
-                self.obstacles.append(new_obstacle)
                 self.obstacles_spawned += 1
                 self.performance_stats["total_obstacles_spawned"] += 1
                 
@@ -619,102 +656,34 @@ class GameServer:
         # Apply smoothing to progress for better difficulty transitions
         return raw_progress
 
-    def check_collision(self, player, obstacle) -> bool:
-        """Enhanced collision detection with better bounding boxes"""
-        # Player bounds (matching client car rendering exactly)
-        player_left = player.x - 30
-        player_right = player.x + 30
-        player_top = player.y - 40
-        player_bottom = player.y + 40
-        
-        # Obstacle bounds with slight padding for better gameplay feel
-        padding = 5
-        obstacle_left = obstacle.x - obstacle.width / 2 + padding
-        obstacle_right = obstacle.x + obstacle.width / 2 - padding
-        obstacle_top = obstacle.y - obstacle.height / 2 + padding
-        obstacle_bottom = obstacle.y + obstacle.height / 2 - padding
-        
-        # Bounding box collision check
-        collision = (player_right > obstacle_left and 
-                    player_left < obstacle_right and 
-                    player_bottom > obstacle_top and 
-                    player_top < obstacle_bottom)
-        
-        return collision
-
     def update_collisions(self, current_time: float):
         """Enhanced collision detection with progressive penalties"""
         if not self.start_time:
             return
-            
-        obstacles_to_remove: Set[float] = set()
         
         with self.lock:
-            for obs in self.obstacles:
-                for player in self.players.values():
-                    # Enhanced invulnerability check
-                    time_since_blink = current_time - player.blink
-                    time_since_last_collision = current_time - player.last_collision_time
-                    is_invulnerable = (time_since_blink < self.BLINK_DURATION)
-                    
-                    # Reset consecutive collisions if enough time has passed
-                    if time_since_last_collision > self.COLLISION_RESET_TIME:
-                        player.consecutive_collisions = 0
-                    
-                    if is_invulnerable or player.finished:
-                        continue
-                    
-                    # Check collision and same lane
-                    if self.check_collision(player, obs) and obs.lane == player.lane:
-                        logger.info(f"Collision: {player.name} hit {obs.type} in lane {player.lane}")
-                        
-                        # Enhanced penalty calculation
-                        base_penalty = obs.penalty
-                        
-                        # Progressive penalty for consecutive collisions
-                        if player.consecutive_collisions > 0:
-                            penalty_multiplier = 1.0 + (player.consecutive_collisions * 0.3)
-                            base_penalty = int(base_penalty * penalty_multiplier)
-                            logger.info(f"Consecutive collision #{player.consecutive_collisions + 1}, penalty: {base_penalty}")
-                        
-                        # Apply penalty
-                        player.score = max(0, player.score - base_penalty)
-                        player.blink = current_time
-                        player.last_collision_time = current_time
-                        player.consecutive_collisions += 1
-                        
-                        self.performance_stats["total_collisions"] += 1
-                        
-                        # Remove obstacle
-                        obstacles_to_remove.add(obs.id)
-                        break
-        
-        # Remove obstacles that caused collisions
-        if obstacles_to_remove:
-            self.obstacles = [obs for obs in self.obstacles if obs.id not in obstacles_to_remove]
+            # Vectorized AABB tests per lane; obstacles that hit are removed
+            hits = self.sim.collide(current_time, self.BLINK_DURATION, self.COLLISION_RESET_TIME)
+            
+            for row, type_index, penalty in hits:
+                player = self.sim.player_at(row)
+                logger.info(f"Collision: {player.name} hit {self.sim.type_names[type_index]} in lane {player.lane}")
+                if player.consecutive_collisions > 1:
+                    logger.info(f"Consecutive collision #{player.consecutive_collisions}, penalty: {penalty}")
+                
+                self.performance_stats["total_collisions"] += 1
 
     def update_scores(self):
         """Enhanced scoring system with progressive rewards"""
+        # Progressive difficulty bonus
+        difficulty_bonus = 1.0 + (self.game_progress * 0.3)
+        
         with self.lock:
-            for player in self.players.values():
-                if player.score < self.MAX_SCORE and not player.finished:
-                    # Progressive scoring based on game state and player performance
-                    base_points = self.POINTS_PER_TICK
-                    
-                    # Bonus points for good performance (few collisions)
-                    collision_modifier = max(0.5, 1.0 - (player.consecutive_collisions * 0.1))
-                    
-                    # Progressive difficulty bonus
-                    difficulty_bonus = 1.0 + (self.game_progress * 0.3)
-                    
-                    total_points = base_points * collision_modifier * difficulty_bonus
-                    player.score += total_points
-                    player.score = min(player.score, self.MAX_SCORE)
-                    
-                    if player.score >= self.MAX_SCORE and not player.finished:
-                        player.finished = True
-                        player.blink = time.time()
-                        logger.info(f"🎉 {player.name} reached max score with {player.consecutive_collisions} collisions!")
+            # Points scale down with consecutive collisions; see LaneSimulation.award_points
+            finished = self.sim.award_points(self.POINTS_PER_TICK, self.MAX_SCORE, difficulty_bonus, time.time())
+            for row in finished:
+                player = self.sim.player_at(row)
+                logger.info(f"🎉 {player.name} reached max score with {player.consecutive_collisions} collisions!")
 
     def game_loop(self):
         """Enhanced main game loop with performance tracking"""
@@ -765,8 +734,7 @@ class GameServer:
         
         with self.lock:
             # End if all active players finished
-            active_players = [p for p in self.players.values() if not p.finished]
-            if not active_players and self.players:
+            if self.players and np.all(self.sim.players.column("finished")):
                 return True
         
         return False
@@ -774,22 +742,10 @@ class GameServer:
     def reset_game(self):
         """Enhanced game state reset for new rounds"""
         with self.lock:
-            for player in self.players.values():
-                player.score = 0.0
-                player.lane = 1
-                player.target_lane = 1
-                player.x = self.LANE_X[1]
-                player.y = self.PLAYER_Y
-                player.blink = 0.0
-                player.finished = False
-                player.move_progress = 1.0
-                player.consecutive_collisions = 0
-                player.last_collision_time = 0.0
-                player.last_heartbeat = time.time()
-                player.vertical_speed = 0.0  # Reset vertical movement
-                player.target_y = self.PLAYER_Y  # Reset target Y
+            # Middle lane, no score or collisions, vertical movement stopped
+            self.sim.reset_players(1, self.PLAYER_Y, time.time())
             
-            self.obstacles = []
+            self.sim.obstacles.clear()
             self.obstacles_spawned = 0
             self.last_obstacle_spawn = time.time()
             self.start_time = time.time()
@@ -813,8 +769,13 @@ class GameServer:
                 logger.info(f"  Obstacles spawned: {self.obstacles_spawned}")
                 logger.info(f"  Total collisions: {self.performance_stats['total_collisions']}")
                 logger.info(f"  Game sessions: {self.performance_stats['game_session_count']}")
+                for addr, client in self.snapshot_clients.items():
+                    link = client.link
+                    rtt = f"{link.rtt * 1000:.0f}ms" if link.rtt is not None else "n/a"
+                    logger.info(f"  Link {self.players[addr].name}: {link.rate:.0f} Hz, RTT {rtt}, loss {link.loss:.0%}")
         
-        self.broadcast_state()
+        # Every client gets the final state, whatever its send rate
+        self.broadcast_state(force=True)
         logger.info("Game ended")
 
     def wait_for_players(self) -> bool:
@@ -872,6 +833,7 @@ class GameServer:
         logger.info(f"  Total obstacles spawned: {self.performance_stats['total_obstacles_spawned']}")
         logger.info(f"  Total collisions: {self.performance_stats['total_collisions']}")
         logger.info(f"  Game sessions completed: {self.performance_stats['game_session_count']}")
+        logger.info(f"  State bytes sent: {self.performance_stats['state_bytes_sent']}")
         
         self.sock.close()
         logger.info("Server shutdown complete")
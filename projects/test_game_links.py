@@ -0,0 +1,73 @@
+"""
+Tests for per-client link monitoring and send-rate control
+Run with pytest from the projects directory
+"""
+
+import pytest
+
+from game_links import LOSS_WINDOW, MIN_SEND_RATE, RATE_INCREASE, LinkMonitor
+
+
+def test_healthy_link_keeps_the_full_rate():
+    link = LinkMonitor(max_rate=60)
+    for seq in range(1, 6):
+        link.on_heartbeat(seq, 0.02, 0.0, now=seq * 0.5)
+    assert link.rate == 60 and link.loss == 0.0
+    assert all(link.due() for _ in range(10))
+
+
+def test_sequence_gaps_count_as_upstream_loss():
+    link = LinkMonitor(max_rate=60)
+    link.on_heartbeat(1, None, None, now=1.0)
+    link.on_heartbeat(4, None, None, now=2.5)
+    assert link.upstream_loss == pytest.approx(2 / 4)
+    # Duplicates and reordered heartbeats are ignored
+    link.on_heartbeat(3, None, None, now=2.6)
+    assert link.last_seq == 4
+    # The estimate only covers the last LOSS_WINDOW heartbeats
+    for seq in range(5, 5 + LOSS_WINDOW):
+        link.on_heartbeat(seq, None, None, now=3.0 + seq)
+    assert link.upstream_loss == 0.0
+
+
+def test_loss_halves_the_rate_once_per_round_trip():
+    link = LinkMonitor(max_rate=60)
+    link.on_heartbeat(1, 0.05, 0.2, now=1.0)
+    assert link.rate == 30
+    link.on_heartbeat(2, 0.05, 0.2, now=1.1)
+    assert link.rate == 30
+    link.on_heartbeat(3, 0.05, 0.2, now=1.6)
+    assert link.rate == 15
+    for seq in range(4, 10):
+        link.on_heartbeat(seq, 0.05, 0.2, now=seq)
+    assert link.rate == MIN_SEND_RATE
+
+
+def test_rate_recovers_additively():
+    link = LinkMonitor(max_rate=60)
+    link.on_heartbeat(1, 0.05, 0.5, now=1.0)
+    link.on_heartbeat(2, 0.05, 0.0, now=1.5)
+    assert link.rate == 30 + RATE_INCREASE
+
+
+def test_rising_rtt_is_congestion():
+    """Queueing delay backs off even without loss or a high absolute RTT"""
+    link = LinkMonitor(max_rate=60)
+    link.on_heartbeat(1, 0.02, 0.0, now=1.0)
+    for seq in range(2, 30):
+        link.on_heartbeat(seq, 0.2, 0.0, now=seq)
+        if link.rate < 60:
+            break
+    assert link.rate == 30
+
+
+def test_due_spreads_snapshots_over_ticks():
+    link = LinkMonitor(max_rate=60)
+    link.rate = 15
+    sent = [link.due() for _ in range(8)]
+    assert sent.count(True) == 2 and sent[0]
+
+
+def test_min_rate_never_exceeds_max_rate():
+    link = LinkMonitor(max_rate=4)
+    assert link.min_rate == 4
@@ -0,0 +1,109 @@
+"""
+Tests for the vectorized lane racing simulation
+Run with pytest from the projects directory
+"""
+
+import numpy as np
+import pytest
+
+from game_simulation import EntityTable, LaneSimulation, PLAYER_FIELDS
+
+LANES = [100.0, 200.0, 300.0]
+OBSTACLE_TYPES = {'cone': {}, 'truck': {}}
+
+
+def _simulation():
+    return LaneSimulation(LANES, OBSTACLE_TYPES)
+
+
+def test_entity_table_grows_and_keeps_order():
+    table = EntityTable(PLAYER_FIELDS, capacity=2)
+    for i in range(5):
+        table.add(id=i, score=i * 10)
+    table.keep(np.array([True, False, True, False, True]))
+    assert list(table.column('id')) == [0, 2, 4]
+    table.remove(1)
+    assert list(table.column('score')) == [0.0, 40.0]
+
+
+def test_player_views_follow_their_row():
+    sim = _simulation()
+    first = sim.add_player('a', None, id=1, score=5)
+    second = sim.add_player('b', None, id=2, score=7)
+    sim.remove_player(first)
+    assert second.row == 0 and second.score == 7.0
+    second.score = 9
+    assert sim.players.column('score')[0] == 9.0
+
+
+def test_lane_change_eases_to_the_target():
+    sim = _simulation()
+    player = sim.add_player('a', None, lane=0, target_lane=2, x=LANES[0], move_progress=0.0)
+    sim.move_players(0.1, 0.2, 0, 600)
+    assert LANES[0] < player.x and player.lane == 0
+    sim.move_players(0.1, 0.2, 0, 600)
+    assert player.x == LANES[2] and player.lane == 2
+
+
+def test_vertical_movement_is_clamped():
+    sim = _simulation()
+    player = sim.add_player('a', None, y=500, vertical_speed=1000, move_progress=1.0)
+    sim.move_players(1.0, 0.2, 100, 550)
+    assert player.y == 550
+
+
+def test_obstacles_move_and_leave_the_screen():
+    sim = _simulation()
+    sim.add_obstacle('cone', y=0, height=50, speed=100)
+    sim.add_obstacle('truck', y=700, height=50, speed=100)
+    sim.move_obstacles(1.0, 1.0, 600)
+    assert list(sim.obstacles.column('y')) == [100.0]
+    assert list(sim.obstacles.column('uid')) == [1]
+
+
+def test_collision_penalises_the_first_player_once():
+    sim = _simulation()
+    first = sim.add_player('a', None, lane=1, x=LANES[1], y=500, score=100, blink=-10)
+    second = sim.add_player('b', None, lane=1, x=LANES[1], y=500, score=100, blink=-10)
+    sim.add_obstacle('truck', lane=1, x=LANES[1], y=500, width=60, height=80, penalty=20)
+
+    hits = sim.collide(now=1.0, blink_duration=2.0, reset_time=3.0)
+    assert hits == [(0, 1, 20)]
+    assert first.score == 80 and second.score == 100
+    assert len(sim.obstacles) == 0
+
+    # Blinking players are invulnerable, so the next obstacle misses them
+    sim.add_obstacle('cone', lane=1, x=LANES[1], y=500, width=60, height=80, penalty=20)
+    hits = sim.collide(now=1.5, blink_duration=2.0, reset_time=3.0)
+    assert hits == [(1, 0, 20)]
+
+
+def test_consecutive_collisions_cost_more():
+    sim = _simulation()
+    player = sim.add_player('a', None, lane=0, x=LANES[0], y=500, score=100, blink=-10,
+                            consecutive_collisions=2, last_collision_time=0.5)
+    sim.add_obstacle('cone', lane=0, x=LANES[0], y=500, width=60, height=80, penalty=10)
+    assert sim.collide(now=1.0, blink_duration=0.0, reset_time=3.0) == [(0, 0, 16)]
+    assert player.consecutive_collisions == 3
+
+
+def test_award_points_and_finish():
+    sim = _simulation()
+    leader = sim.add_player('a', None, score=95)
+    sim.add_player('b', None, score=0, consecutive_collisions=3)
+    finished = sim.award_points(10, 100, 1.0, now=5.0)
+    assert list(finished) == [0]
+    assert leader.finished and leader.score == 100 and leader.blink == 5.0
+    assert sim.players.column('score')[1] == pytest.approx(7.0)
+
+
+def test_reset_and_stale_players():
+    sim = _simulation()
+    fresh = sim.add_player('a', None, score=50, finished=True, last_heartbeat=9.0)
+    stale = sim.add_player('b', None, last_heartbeat=1.0)
+    assert sim.stale_players(now=10.0, timeout=5.0) == [stale]
+
+    sim.reset_players(lane=1, y=500, now=10.0)
+    assert fresh.score == 0 and not fresh.finished
+    assert fresh.x == LANES[1] and fresh.y == 500 and fresh.move_progress == 1.0
+    assert sim.stale_players(now=10.0, timeout=5.0) == []
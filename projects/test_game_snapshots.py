@@ -0,0 +1,117 @@
+"""
+Tests for delta-compressed game state snapshots
+Run with pytest from the projects directory
+"""
+
+import numpy as np
+
+from game_simulation import LaneSimulation
+from game_snapshots import (ROSTER_RESEND_INTERVAL, SnapshotClient, SnapshotDecoder, SnapshotEncoder,
+                            capture_snapshot, encode_snapshot, is_snapshot)
+
+LANES = [100.0, 200.0, 300.0]
+TYPES = ['cone', 'truck']
+
+
+def _simulation():
+    sim = LaneSimulation(LANES, {name: {} for name in TYPES})
+    sim.add_player('a', None, id=7, lane=1, target_lane=2, x=200.25, y=500, score=42, blink=-10)
+    sim.add_player('b', None, id=3, lane=0, target_lane=0, x=100, y=450.5, score=10, finished=True, blink=-10)
+    sim.add_obstacle('truck', lane=2, x=300, y=120.75)
+    sim.add_obstacle('cone', lane=0, x=100, y=-40)
+    return sim
+
+
+def _capture(sim, seq, now=0.0):
+    return capture_snapshot(seq, sim, now, blink_duration=1.0, game_running=True, roster_version=2, time_left=30.5)
+
+
+def _assert_same(decoded, snapshot):
+    assert decoded.seq == snapshot.seq and decoded.flags == snapshot.flags
+    assert decoded.time_left == snapshot.time_left and decoded.total_players == snapshot.total_players
+    np.testing.assert_array_equal(decoded.player_keys, snapshot.player_keys)
+    np.testing.assert_array_equal(decoded.player_values, snapshot.player_values)
+    np.testing.assert_array_equal(decoded.obstacle_keys, snapshot.obstacle_keys)
+    np.testing.assert_array_equal(decoded.obstacle_values, snapshot.obstacle_values)
+
+
+def test_capture_quantizes_and_sorts():
+    snapshot = _capture(_simulation(), 1)
+    assert snapshot.game_running and snapshot.time_left_seconds == 30.5
+    players = snapshot.player_dicts()
+    assert [player['id'] for player in players] == [3, 7]
+    assert players[0]['finished'] and not players[0]['blinking']
+    assert players[1] == {'id': 7, 'x': 200.25, 'y': 500.0, 'score': 42, 'finished': False,
+                          'blinking': False, 'lane': 1, 'target_lane': 2}
+    obstacles = snapshot.obstacle_dicts(TYPES)
+    assert obstacles[0] == {'id': 1, 'x': 300.0, 'y': 120.75, 'type': 'truck', 'lane': 2}
+
+
+def test_full_snapshot_round_trip():
+    snapshot = _capture(_simulation(), 1)
+    data = encode_snapshot(snapshot)
+    assert is_snapshot(data) and not is_snapshot(b'{"type": "state"}')
+    _assert_same(SnapshotDecoder().decode(data), snapshot)
+
+
+def test_delta_round_trip():
+    """Moved, added and removed entities all survive a delta against the previous snapshot"""
+    sim = _simulation()
+    first = _capture(sim, 1)
+    sim.players.column('y')[0] -= 12.5
+    sim.players.column('score')[1] += 1
+    sim.obstacles.remove(1)
+    sim.add_obstacle('cone', lane=1, x=200, y=0)
+    sim.add_player('c', None, id=1, lane=2, target_lane=2, x=300, y=520)
+    second = _capture(sim, 2, now=0.5)
+
+    decoder = SnapshotDecoder()
+    decoder.decode(encode_snapshot(first))
+    delta = encode_snapshot(second, first)
+    _assert_same(decoder.decode(delta), second)
+    assert len(delta) < len(encode_snapshot(second))
+
+
+def test_unchanged_state_encodes_to_empty_sections():
+    """A delta with nothing to say is as small as a snapshot of an empty game"""
+    sim = _simulation()
+    first, second = _capture(sim, 1), _capture(sim, 2)
+    delta = encode_snapshot(second, first)
+    assert len(delta) == len(encode_snapshot(_capture(LaneSimulation(LANES, {}), 2)))
+
+
+def test_decoder_drops_stale_and_unknown_baselines():
+    sim = _simulation()
+    first, second, third = _capture(sim, 1), _capture(sim, 2), _capture(sim, 3)
+    decoder = SnapshotDecoder()
+    # A delta whose baseline never arrived cannot be rebuilt
+    assert decoder.decode(encode_snapshot(third, second)) is None
+    assert decoder.decode(encode_snapshot(second)) is not None
+    assert decoder.decode(encode_snapshot(first)) is None  # older than what we have
+    assert decoder.decode(encode_snapshot(third, second)).seq == 3
+
+
+def test_encoder_shares_encodings_and_filters_viewports():
+    sim = _simulation()
+    encoder = SnapshotEncoder(history_size=2)
+    encoder.capture(sim, 0.0, 1.0, True, 1, 30)
+    encoder.capture(sim, 0.1, 1.0, True, 1, 30)
+    assert encoder.encode_for(1) is encoder.encode_for(1)
+    # An acked snapshot that fell out of the history gets a full snapshot
+    encoder.capture(sim, 0.2, 1.0, True, 1, 30)
+    assert encoder.encode_for(1) == encoder.encode_for(0)
+
+    visible = SnapshotDecoder().decode(encoder.encode_for(0, viewport=(0, 200)))
+    assert visible.player_keys.size == 0
+    assert visible.obstacle_keys.tolist() == [1]
+
+
+def test_snapshot_client_acks_and_roster():
+    client = SnapshotClient(viewport=None, max_rate=30)
+    client.ack(5, None)
+    client.ack(4, 2)
+    assert client.acked_seq == 5 and client.roster_acked == 2
+    assert not client.needs_roster(2, now=10.0)
+    client.roster_sent_at = 10.0
+    assert not client.needs_roster(3, now=10.0)
+    assert client.needs_roster(3, now=10.0 + ROSTER_RESEND_INTERVAL)